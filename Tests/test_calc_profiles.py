@@ -10,6 +10,11 @@ if raw_path not in os.sys.path:
     os.sys.path.append(raw_path)
 
 import bioxtasraw.RAWAPI as raw
+import bioxtasraw.BIFT as BIFT
+import bioxtasraw.SASCalc as SASCalc
+import bioxtasraw.SASM as SASM
+import bioxtasraw.SASProc as SASProc
+import bioxtasraw.sascalc_exts as sascalc_exts
 
 def test_auto_guinier(clean_gi_sub_profile):
     profile = copy.deepcopy(clean_gi_sub_profile)
@@ -29,6 +34,38 @@ def test_auto_guinier(clean_gi_sub_profile):
     assert idx_max == 50
     assert r_sqr == 00.9942014318763518
 
+@pytest.mark.parametrize('single_fit,error_weight', [(False, True),
+    (True, True), (False, False)])
+def test_auto_guinier_levels(clean_gi_sub_profile, single_fit, error_weight):
+    profile = copy.deepcopy(clean_gi_sub_profile)
+
+    q = profile.getQ()
+    i = profile.getI()
+    err = profile.getErr()
+
+    # Noisy data needs relaxed search criteria
+    noisy_i = i + np.random.default_rng(1).normal(0, 3, len(i))*err
+
+    for intensity in [i, noisy_i]:
+        profile = SASM.SASM(intensity, q, err, {})
+
+        for level in SASCalc.autorg_levels:
+            min_window, min_qrg, max_qrg, quality_thresh, data_range_scale = level
+
+            try:
+                expected = SASCalc.autoRg_inner(q, intensity, err, 0,
+                    single_fit, error_weight, min_window, min_qrg, max_qrg,
+                    quality_thresh, data_range_scale)
+            except Exception:
+                expected = (-1, -1, -1, -1, -1, -1)
+
+            if expected[0] != -1:
+                break
+
+        result = SASCalc.autoRg(profile, single_fit, error_weight)
+
+        assert result == expected
+
 def test_guinier_fit(clean_gi_sub_profile):
     profile = copy.deepcopy(clean_gi_sub_profile)
 
@@ -373,6 +410,117 @@ def test_bift_single_proc(clean_gi_sub_profile, old_settings, gi_bift_ift):
     assert np.allclose(ift.r, gi_bift_ift.r)
     assert np.allclose(ift.p, gi_bift_ift.p)
 
+@pytest.mark.slow
+def test_bift_engine(clean_gi_sub_profile, old_settings, gi_bift_ift):
+    profile = copy.deepcopy(clean_gi_sub_profile)
+
+    with BIFT.BiftEngine(nprocs=2) as engine:
+        for j in range(2):
+            (ift, dmax, rg, i0, dmax_err, rg_err, i0_err, chi_sq, log_alpha,
+                log_alpha_err, evidence, evidence_err) = raw.bift(profile,
+                settings=old_settings, engine=engine)
+
+            assert np.allclose(dmax, gi_bift_ift.getParameter('dmax'))
+            assert np.allclose(rg, gi_bift_ift.getParameter('rg'))
+            assert np.allclose(ift.r, gi_bift_ift.r)
+            assert np.allclose(ift.p, gi_bift_ift.p)
+
+@pytest.mark.slow
+def test_bift_direct_solver(clean_gi_sub_profile, old_settings, gi_bift_ift):
+    profile = copy.deepcopy(clean_gi_sub_profile)
+
+    (ift, dmax, rg, i0, dmax_err, rg_err, i0_err, chi_sq, log_alpha,
+        log_alpha_err, evidence, evidence_err) = raw.bift(profile,
+        settings=old_settings, solver='direct')
+
+    assert np.isclose(dmax, float(gi_bift_ift.getParameter('dmax')), rtol=0.01)
+    assert np.isclose(rg, float(gi_bift_ift.getParameter('rg')), rtol=0.01)
+
+@pytest.mark.slow
+@pytest.mark.parametrize('profile_name', ['lysozyme', 'bsa'])
+def test_bift_direct_solver_regression(profile_name, old_settings):
+    if profile_name == 'lysozyme':
+        profile = raw.load_profiles([os.path.join('.', 'data',
+            'lys_saxs.dat')])[0]
+    else:
+        series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+        sub_profiles = raw.set_buffer_range(series, [[18, 53]],
+            do_calcs=False)[0]
+        profile = SASProc.average(sub_profiles[150:160], copy_params=False)
+
+    raw.auto_guinier(profile, settings=old_settings)
+
+    results = []
+
+    for solver in ['iterative', 'direct']:
+        np.random.seed(1)
+        results.append(raw.bift(profile, mc_runs=20, settings=old_settings,
+            solver=solver))
+
+    iter_res, direct_res = results
+
+    assert np.isclose(direct_res[1], iter_res[1], rtol=0.01)   # Dmax
+    assert np.isclose(direct_res[2], iter_res[2], rtol=0.01)   # Rg
+    assert np.isclose(direct_res[3], iter_res[3], rtol=0.01)   # I0
+
+def test_bift_direct_fallback():
+    profile = raw.load_profiles([os.path.join('.', 'data', 'lys_saxs.dat')])[0]
+
+    q = profile.getQ()
+    i = profile.getI()
+    err = profile.getErr()
+    N = 49
+
+    # The direct solver doesn't converge at this low alpha, so the iterative
+    # solver is used
+    params = (np.log(1e2), 40.)
+
+    ev, c, f, r = BIFT.getEvidence(params, q, i, err, N)
+    direct_ev, direct_c, direct_f, direct_r = BIFT.getEvidence(params, q, i,
+        err, N, 'direct')
+
+    assert direct_ev == ev
+    assert direct_c == c
+    assert np.all(direct_f == f)
+
+def test_bift_direct_evidence(clean_gi_sub_profile):
+    q = clean_gi_sub_profile.getQ()
+    i = clean_gi_sub_profile.getI()
+    err = clean_gi_sub_profile.getErr()
+    N = 50
+
+    params = (np.log(1e6), 105.)
+
+    ev, c, f, r = BIFT.getEvidence(params, q, i, err, N)
+    direct_ev, direct_c, direct_f, direct_r = BIFT.getEvidence(params, q, i,
+        err, N, 'direct')
+
+    assert np.isclose(direct_ev, ev, rtol=1e-3)
+    assert np.isclose(direct_c, c, rtol=1e-3)
+    assert np.allclose(direct_f, f, rtol=0, atol=0.01*f.max())
+
+def test_bift_evidence_grid(clean_gi_sub_profile):
+    q = clean_gi_sub_profile.getQ()
+    i = clean_gi_sub_profile.getI()
+    err = clean_gi_sub_profile.getErr()
+    N = 50
+
+    log_alphas = np.linspace(np.log(150), np.log(1e10), 4)
+    cache = BIFT.EvidenceCache(q, i, err, N)
+
+    for dmax in [50., 100.]:
+        evidence, chi = BIFT.getEvidenceGrid(dmax, log_alphas, q, i, err, N)
+
+        for j, log_alpha in enumerate(log_alphas):
+            ev, c, f, r = BIFT.getEvidence((log_alpha, dmax), q, i, err, N)
+            cache_ev, cache_c, cache_f, cache_r = cache.getEvidence((log_alpha, dmax))
+
+            assert evidence[j] == ev
+            assert chi[j] == c
+            assert cache_ev == ev
+            assert np.array_equal(cache_f, f)
+
 @pytest.mark.atsas
 def test_datgnom(clean_gi_sub_profile):
     profile = copy.deepcopy(clean_gi_sub_profile)
@@ -774,6 +922,52 @@ def test_cormap_ref(bsa_series_profiles):
     assert corrected_pvals[5] == 0.54454
     assert len(failed_comparisons) == 0
 
+def test_cormap_parallel(bsa_series_profiles):
+    pvals, corrected_pvals, failed_comparisons = raw.cormap(bsa_series_profiles)
+    (par_pvals, par_corrected_pvals,
+        par_failed_comparisons) = raw.cormap(bsa_series_profiles, parallel=True)
+
+    assert np.array_equal(pvals, par_pvals)
+    assert np.array_equal(corrected_pvals, par_corrected_pvals)
+    assert failed_comparisons == par_failed_comparisons
+
+    ref_profile = bsa_series_profiles[0]
+    pvals, corrected_pvals, failed_comparisons = raw.cormap(bsa_series_profiles,
+        ref_profile, parallel=True)
+
+    assert pvals[1] == 0.202088
+    assert pvals[5] == 0.054454
+
+def test_longest_run_probabilities(temp_directory):
+    lroh = sascalc_exts.LongestRunOfHeads(str(temp_directory))
+
+    for n in [1, 2, 10, 57]:
+        for c in range(1, n+2):
+            if c > n:
+                expected = 0
+            else:
+                # Exact probability from the number of sequences
+                expected = (2**n - lroh.B(n, c-1))/2**n
+
+            assert lroh.probaB(n, c) == pytest.approx(expected, rel=1e-12,
+                abs=1e-300)
+
+    assert os.path.exists(os.path.join(str(temp_directory), 'lroh_57.npy'))
+
+    warm_lroh = sascalc_exts.LongestRunOfHeads(str(temp_directory))
+    assert np.array_equal(warm_lroh._load_table(57), lroh.table(57))
+
+def test_cormap_longest_run():
+    rng = np.random.default_rng(1)
+
+    for data in [np.zeros(20), np.ones(20), -np.ones(20),
+        np.round(rng.normal(size=200)), rng.normal(size=200),
+        np.array([1., np.nan, -1., -1., 0., 0., 0., 2.]),
+        np.array([1., np.nan, np.nan, -1., -1., 2.])]:
+
+        assert (SASProc.cormap_longest_run(np.zeros_like(data), data)
+            == SASProc.measure_longest(data))
+
 @pytest.mark.atsas
 @pytest.mark.slow
 def test_crysol_model(temp_directory):
@@ -905,6 +1099,67 @@ def test_dift_dmax_alpha(clean_gi_sub_profile, old_settings, gi_dift_ift):
     assert np.allclose(ift.r, gi_dift_ift.r)
     assert np.allclose(ift.p, gi_dift_ift.p)
 
+def test_batch_dift(clean_gi_sub_profile, gi_dift_ift):
+    profiles = [copy.deepcopy(clean_gi_sub_profile) for j in range(3)]
+
+    ifts, summary = raw.batch_ift(profiles, method='denss', framei=1)
+
+    assert len(ifts) == 2
+    assert summary.shape == (2, 3)
+    assert np.allclose(summary[:, 0], gi_dift_ift.getParameter('dmax'))
+    assert np.allclose(summary[:, 1], gi_dift_ift.getParameter('rg'))
+    assert np.allclose(ifts[1].p, gi_dift_ift.p)
+    assert 'denss_ift' in profiles[1].getParameter('analysis')
+    assert 'denss_ift' not in profiles[0].getParameter('analysis')
+
+@pytest.mark.slow
+def test_batch_bift(clean_gi_sub_profile, old_settings, gi_bift_ift):
+    profiles = [copy.deepcopy(clean_gi_sub_profile) for j in range(2)]
+
+    ifts, summary = raw.batch_ift(profiles, settings=old_settings, n_proc=2)
+
+    assert np.allclose(summary[:, 0], gi_bift_ift.getParameter('dmax'))
+    assert np.allclose(summary[:, 1], gi_bift_ift.getParameter('rg'))
+    assert np.allclose(ifts[1].p, gi_bift_ift.p)
+    assert 'BIFT' in profiles[1].getParameter('analysis')
+
+@pytest.mark.slow
+def test_batch_bift_seed(clean_gi_sub_profile):
+    profiles = [copy.deepcopy(clean_gi_sub_profile) for j in range(2)]
+
+    ifts, summary = raw.batch_ift(profiles, ift_settings={'mc_runs': 20},
+        seed=1)
+    parallel_ifts, parallel_summary = raw.batch_ift(profiles,
+        ift_settings={'mc_runs': 20}, n_proc=2, seed=1)
+
+    assert np.all(summary == parallel_summary)
+
+    for ift, parallel_ift in zip(ifts, parallel_ifts):
+        assert np.all(ift.err == parallel_ift.err)
+
+    # Each profile gets an independent monte carlo error estimate
+    assert not np.all(ifts[0].err == ifts[1].err)
+
+def test_batch_bift_error(clean_gi_sub_profile, old_settings, caplog):
+    # Too few points to calculate the IFT
+    bad_profile = SASM.SASM(np.ones(3), np.array([0.01, 0.02, 0.03]),
+        np.ones(3), {'filename': 'bad_profile'})
+
+    profiles = [bad_profile, copy.deepcopy(clean_gi_sub_profile)]
+
+    ifts, summary = raw.batch_ift(profiles, settings=old_settings,
+        ift_settings={'mc_runs': 20})
+
+    assert ifts[0] is None
+    assert np.all(summary[0] == -1)
+    assert ifts[1] is not None
+    assert summary[1, 0] > 0
+    assert 'IFT failed for bad_profile' in caplog.text
+
+def test_batch_bift_bad_settings(clean_gi_sub_profile):
+    with pytest.raises(ValueError):
+        raw.batch_ift([clean_gi_sub_profile], ift_settings={'nprocs': 2})
+
 def test_pdb2sas_modelonly(temp_directory, gi_pdb2sas_modelonly_ift):
     shutil.copy2(os.path.join('./data/dammif_data', '1XIB_4mer.pdb'),
             os.path.join(temp_directory, '1XIB_4mer.pdb'))
@@ -1,5 +1,6 @@
 import os
 import copy
+import queue
 
 import pytest
 import numpy as np
@@ -9,6 +10,7 @@ if raw_path not in os.sys.path:
     os.sys.path.append(raw_path)
 
 import bioxtasraw.RAWAPI as raw
+import bioxtasraw.SASCalc as SASCalc
 
 
 @pytest.fixture(scope="function")
@@ -66,6 +68,42 @@ def test_svd_list(bsa_series):
     svd_s, svd_U, svd_V = raw.svd(sasms)
     assert np.allclose(svd_s[0], 7474.750264659797)
 
+def test_svd_rank():
+    bsa_series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+
+    svd_s, svd_U, svd_V = raw.svd(bsa_series, profile_type='unsub')
+    rank_s, rank_U, rank_V = raw.svd(bsa_series, profile_type='unsub',
+        rank=5)
+
+    assert rank_s.shape == (5,)
+    assert rank_U.shape == (svd_U.shape[0], 5)
+    assert rank_V.shape == (svd_V.shape[0], 5)
+    assert np.allclose(rank_s[:3], svd_s[:3])
+    assert np.allclose(np.abs(rank_U[:,0]), np.abs(svd_U[:,0]), atol=1e-6)
+
+def test_svd_significance_rank():
+    bsa_series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    sasms = bsa_series.getAllSASMs()
+
+    for start, end in [(20, 50), (140, 180), (150, 250)]:
+        svd_a = SASCalc.prepareSASMsforSVD(sasms[start:end+1],
+            do_binning=False)[0]
+
+        (svd_U, svd_s, svd_V, svd_U_autocor, svd_V_autocor,
+            success) = SASCalc.doSVDonSASMs(svd_a)
+
+        svals = SASCalc.findSignificantSingularValues(svd_s, svd_U_autocor,
+            svd_V_autocor)
+        svals = max(svals, 1)
+
+        svd_results = SASCalc.findSVDSignificance(svd_a)
+
+        assert svd_results['svals'] == svals
+        assert len(svd_results['u_autocor']) == SASCalc.significance_svd_rank
+        assert np.allclose(svd_results['u_autocor'][0], svd_U_autocor[0])
+
 def test_efa(bsa_series):
     efa_profiles, converged, conv_data, rotation_data = raw.efa(bsa_series,
         [[130, 187], [149, 230]], framei=130, framef=230)
@@ -76,6 +114,93 @@ def test_efa(bsa_series):
     assert len(efa_profiles) == 2
     assert np.allclose(efa_profiles[0].getI().sum(), 75885.43573919893)
 
+def test_incremental_efa():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    sasms = series.getAllSASMs()[100:250]
+
+    svd_a = SASCalc.prepareSASMsforSVD(sasms, do_binning=False)[0]
+
+    for forward in [True, False]:
+        slist = SASCalc.runEFA(svd_a, forward)
+        inc_slist = SASCalc.runEFA(svd_a, forward, nsvs=4)
+
+        assert inc_slist.shape == (4, len(sasms))
+        assert np.allclose(inc_slist, slist[:4], rtol=1e-9, atol=0)
+
+    # More frames than q points, so the row Gram matrix is used
+    svd_a = svd_a[::10]
+
+    forward, backward = SASCalc.runForwardBackwardEFA(svd_a, 3)
+
+    assert np.allclose(forward, SASCalc.runEFA(svd_a)[:3], rtol=1e-9, atol=0)
+    assert np.allclose(backward, SASCalc.runEFA(svd_a, False)[:3], rtol=1e-9,
+        atol=0)
+
+def test_efa_svs():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    raw.set_buffer_range(series, [[81, 116]])
+
+    efa_profiles, converged, conv_data, rotation_data = raw.efa(series,
+        [[130, 187], [149, 230]], framei=130, framef=230, efa_svs=3)
+
+    assert converged
+    assert conv_data['forward_efa'].shape == (3, 101)
+    assert conv_data['backward_efa'].shape == (3, 101)
+
+    svd_a = SASCalc.prepareSASMsforSVD(series.getSASMList(130, 230, 'sub'),
+        do_binning=False)[0]
+
+    assert np.allclose(conv_data['forward_efa'], SASCalc.runEFA(svd_a)[:3])
+
+def test_efa_accelerated():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    raw.set_buffer_range(series, [[81, 116]])
+
+    efa_profiles, converged, conv_data, rotation_data = raw.efa(series,
+        [[130, 187], [149, 230]], framei=130, framef=230)
+
+    acc_profiles, acc_converged, acc_conv_data, acc_rotation_data = raw.efa(series,
+        [[130, 187], [149, 230]], framei=130, framef=230, method='Accelerated')
+
+    assert acc_converged
+    assert acc_conv_data['iterations'] < conv_data['iterations']
+    assert len(acc_conv_data['steps']) == acc_conv_data['iterations']
+    assert np.allclose(acc_rotation_data['C'], rotation_data['C'], atol=1e-10)
+    assert np.allclose(acc_profiles[0].getI(), efa_profiles[0].getI())
+
+def test_efa_rotation_solver():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    raw.set_buffer_range(series, [[81, 116]])
+
+    sasms = series.getSASMList(130, 230, 'sub')
+    svd_a = SASCalc.prepareSASMsforSVD(sasms, do_binning=False)[0]
+
+    ranges = np.array([[0, 57], [19, 100]])
+    M = np.zeros((len(sasms), 2))
+    for j, efa_range in enumerate(ranges):
+        M[efa_range[0]:efa_range[1]+1, j] = 1
+
+    np.random.seed(1)
+    C = np.random.rand(len(sasms), 2)
+
+    solver = SASCalc.EFARotationSolver(M, svd_a, [True, False])
+
+    assert np.allclose(solver.update(C), SASCalc.EFAUpdateRotation(M, C,
+        svd_a, [True, False]))
+
+    iterations = []
+    U, s, Vt = np.linalg.svd(svd_a)
+    converged, conv_data, rotation_data = SASCalc.runRotation(svd_a,
+        svd_a, np.ones_like(svd_a), ranges, [True, True], Vt.T,
+        method='Accelerated', callback=lambda k, dck, dt: iterations.append(k))
+
+    assert converged
+    assert iterations == list(range(1, conv_data['iterations']+1))
+
 def test_efa_list(bsa_series):
     sasms = bsa_series.subtracted_sasm_list
 
@@ -88,7 +213,8 @@ def test_efa_list(bsa_series):
     assert len(efa_profiles) == 2
     assert np.allclose(efa_profiles[0].getI().sum(), 75885.43573919893)
 
-def test_regals(bsa_series):
+@pytest.mark.parametrize("in_place", [False, True])
+def test_regals(bsa_series, in_place):
     prof1_settings = {
         'type'          : 'simple',
         'lambda'        : 0.0,
@@ -133,7 +259,7 @@ def test_regals(bsa_series):
         (prof2_settings, conc2_settings)]
 
     regals_profiles, regals_ifts, concs, reg_concs, mixture, params, residual = raw.regals(bsa_series,
-        comp_settings, framei=130, framef=230)
+        comp_settings, framei=130, framef=230, in_place=in_place)
 
     assert len(regals_profiles) == 2
     assert len(regals_ifts) == 2
@@ -344,6 +470,171 @@ def test_series_calc(bsa_series):
     assert vcmw[200] == 65.39761365015703
     assert vpmw[200] == 69.44895475238502
 
+def test_stream_series():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    ref_series = copy.deepcopy(series)
+    raw.set_buffer_range(ref_series, [[18, 53]])
+
+    profiles = copy.deepcopy(series.getAllSASMs())
+    stream = [profiles[i:i+7] for i in range(0, len(profiles), 7)]
+
+    first_frames = []
+    for new_series, first_frame in raw.stream_series(stream,
+        buffer_range=[[18, 53]]):
+        first_frames.append(first_frame)
+
+    assert first_frames == list(range(0, len(profiles), 7))
+    assert len(new_series.getAllSASMs()) == len(profiles)
+    assert new_series.buffer_range == [[18, 53]]
+    assert np.all(new_series.getIntI(int_type='sub') == ref_series.getIntI(int_type='sub'))
+    assert np.all(new_series.getRg()[0] == ref_series.getRg()[0])
+    assert np.all(new_series.getI0()[0] == ref_series.getI0()[0])
+    assert np.all(new_series.getVcMW()[0] == ref_series.getVcMW()[0])
+    assert np.all(new_series.getVpMW()[0] == ref_series.getVpMW()[0])
+
+def test_stream_series_queue():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+
+    profile_queue = queue.Queue()
+    for profile in copy.deepcopy(series.getAllSASMs()):
+        profile_queue.put(profile)
+    profile_queue.put(None)
+
+    results = list(raw.stream_series(profile_queue))
+
+    new_series, first_frame = results[-1]
+
+    assert len(new_series.getAllSASMs()) == len(series.getAllSASMs())
+    assert len(new_series.buffer_range) == 1
+    assert len(new_series.subtracted_sasm_list) == len(series.getAllSASMs())
+    assert new_series.getRg()[0].max() > 0
+
+def test_series_calc_parallel():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    sub_profiles = raw.set_buffer_range(series, [[18, 53]], do_calcs=False)[0]
+    sasms = sub_profiles[100:300]
+
+    assert len(sasms) >= SASCalc.secm_parallel_min_calcs
+
+    results = raw.series_calc(sasms)
+    parallel_results = raw.series_calc(sasms, n_proc=2)
+
+    for serial_vals, parallel_vals in zip(results, parallel_results):
+        assert np.all(serial_vals == parallel_vals)
+
+    assert results[0].max() > 0
+
+    # The worker pool is kept for the next calculation
+    mp_pool = SASCalc._secm_pool
+    assert mp_pool is not None
+
+    raw.series_calc(sasms, n_proc=2)
+    assert SASCalc._secm_pool is mp_pool
+
+    SASCalc.closeSECMPool()
+    assert SASCalc._secm_pool is None
+
+def test_sliding_window_average():
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    sasms = series.getAllSASMs()[150:200]
+
+    q, all_i, all_err = SASCalc.stackSASMs(sasms)
+    win_i, win_err = SASCalc.slidingWindowAverage(all_i, all_err, 5)
+
+    assert win_i.shape == (46, len(q))
+
+    for a in [0, 17, 45]:
+        avg_profile = raw.average(sasms[a:a+5], copy_metadata=False)
+        assert np.all(win_i[a] == avg_profile.getI())
+        assert np.all(win_err[a] == avg_profile.getErr())
+
+def test_range_search_data(monkeypatch):
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    raw.set_buffer_range(series, [[81, 116]])
+
+    sasms = series.getAllSASMs()
+    sub_sasms = series.subtracted_sasm_list
+    intensity = np.array([sasm.getTotalI() for sasm in sasms])
+    sub_intensity = np.array([sasm.getTotalI() for sasm in sub_sasms])
+    rg = series.getRg()[0]
+    vcmw = series.getVcMW()[0]
+    vpmw = series.getVpMW()[0]
+
+    search_data = SASCalc.prepareRangeSearch(sasms)
+    sub_search_data = SASCalc.prepareRangeSearch(sub_sasms)
+
+    for start, end in [(20, 50), (81, 116), (150, 160), (186, 204), (190, 210)]:
+        frames = list(range(start, end+1))
+
+        results = SASCalc.validateBuffer(sasms[start:end+1], frames,
+            intensity[start:end+1], 'CorMap', 'Bonferroni', 0.01, False)
+        fast_results = SASCalc.validateBuffer(sasms[start:end+1], frames,
+            intensity[start:end+1], 'CorMap', 'Bonferroni', 0.01, False,
+            search_data)
+
+        assert results[0] == fast_results[0]
+        assert results[1]['all_similar'] == fast_results[1]['all_similar']
+        assert np.all(results[1]['all_outliers'] == fast_results[1]['all_outliers'])
+        assert results[2]['svals'] == fast_results[2]['svals']
+        assert results[3] == fast_results[3]
+
+        results = SASCalc.validateSample(sub_sasms[start:end+1], frames,
+            sub_intensity[start:end+1], rg[start:end+1], vcmw[start:end+1],
+            vpmw[start:end+1], 'CorMap', 'Bonferroni', 0.01, False)
+        fast_results = SASCalc.validateSample(sub_sasms[start:end+1], frames,
+            sub_intensity[start:end+1], rg[start:end+1], vcmw[start:end+1],
+            vpmw[start:end+1], 'CorMap', 'Bonferroni', 0.01, False,
+            sub_search_data)
+
+        assert results[0] == fast_results[0]
+        assert results[1]['all_similar'] == fast_results[1]['all_similar']
+        assert np.all(results[1]['all_outliers'] == fast_results[1]['all_outliers'])
+        assert results[3]['svals'] == fast_results[3]['svals']
+        assert np.all(results[4]['low_sn'] == fast_results[4]['low_sn'])
+
+    buffer_range = raw.find_buffer_range(series)
+    sample_range = raw.find_sample_range(series)
+    baseline_range = raw.find_baseline_range(series)
+
+    monkeypatch.setattr(SASCalc, 'prepareRangeSearch', lambda sasms: None)
+
+    assert raw.find_buffer_range(series) == buffer_range
+    assert raw.find_sample_range(series) == sample_range
+    assert raw.find_baseline_range(series) == baseline_range
+
+def test_find_first_valid_region(monkeypatch):
+    monkeypatch.setattr(SASCalc.os, 'cpu_count', lambda: 4)
+
+    valid_starts = [2, 5, 9]
+    region_starts = list(range(12))
+
+    for parallel in [False, True]:
+        assert SASCalc.findFirstValidRegion(lambda idx: idx in valid_starts,
+            region_starts, parallel) == 2
+        assert SASCalc.findFirstValidRegion(lambda idx: idx in valid_starts,
+            region_starts[::-1], parallel) == 9
+        assert SASCalc.findFirstValidRegion(lambda idx: False,
+            region_starts, parallel) is None
+
+def test_find_ranges_parallel(monkeypatch):
+    monkeypatch.setattr(SASCalc.os, 'cpu_count', lambda: 4)
+
+    series = raw.load_series([os.path.join('.', 'data',
+            'clean_BSA_001.hdf5')])[0]
+    raw.set_buffer_range(series, [[81, 116]])
+
+    assert (raw.find_buffer_range(series, parallel=True)
+        == raw.find_buffer_range(series))
+    assert (raw.find_sample_range(series, parallel=True)
+        == raw.find_sample_range(series))
+    assert (raw.find_baseline_range(series, parallel=True)
+        == raw.find_baseline_range(series))
+
 def test_find_sample_range(bsa_series):
     success, region_start, region_end = raw.find_sample_range(bsa_series)
 
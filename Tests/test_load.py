@@ -1,4 +1,5 @@
 import os
+import glob
 
 import pytest
 import numpy as np
@@ -10,7 +11,11 @@ if raw_path not in os.sys.path:
 import bioxtasraw.RAWAPI as raw
 import bioxtasraw.RAWSettings as RAWSettings
 import bioxtasraw.SASM as SASM
+import bioxtasraw.SASImage as SASImage
+import bioxtasraw.SASFileWatcher as SASFileWatcher
 import bioxtasraw.SECM as SECM
+import bioxtasraw.SASExceptions as SASExceptions
+import bioxtasraw.SASFileIO as SASFileIO
 
 
 @pytest.fixture(scope="package")
@@ -1428,6 +1433,29 @@ def test_load_images_biocat_eiger(settings_biocat_eiger):
     assert img2.min() == 0
     assert img2[50, 50] == 0
 
+def test_iter_images_biocat_eiger(settings_biocat_eiger):
+    filenames = [os.path.join('.', 'data', 'vac_007_data_000001.h5')]
+
+    img_list, img_hdr_list = raw.load_images(filenames, settings_biocat_eiger)
+
+    frames = list(raw.iter_images(filenames, settings_biocat_eiger))
+
+    assert len(frames) == len(img_list)
+
+    for (img, img_hdr), ref_img, ref_hdr in zip(frames, img_list, img_hdr_list):
+        assert img.dtype == ref_img.dtype
+        assert np.all(img == ref_img)
+        assert img_hdr == ref_hdr
+
+    source = SASFileIO.ImageFrameSource(filenames[0], max_block_bytes=1)
+
+    assert len(source) == 2
+
+    blocks = list(source.iterBlocks())
+
+    assert [start for start, imgs, hdrs in blocks] == [0, 1]
+    assert np.all(blocks[1][1][0] == img_list[1])
+
 def test_load_and_integrate_images(old_settings):
     filenames = [os.path.join('.', 'data', 'GI2_A9_19_001_0000.tiff')]
 
@@ -1558,6 +1586,236 @@ def test_load_integrate_images_biocat_eiger(settings_biocat_eiger):
     assert params2['counters']['Experiment_type'] == 'SEC-SAXS'
     assert 'calibration_params' in params2
 
+def test_load_counter_values_growing_log(settings_biocat_eiger, temp_directory):
+    log_name = os.path.join(temp_directory, 'vac_007.log')
+    image_name = os.path.join(temp_directory, 'vac_007_data_000001.h5')
+
+    with open(os.path.join('.', 'data', 'vac_007.log')) as f:
+        log_lines = f.read()
+
+    with open(log_name, 'w') as f:
+        f.write(log_lines)
+
+    counters = raw.load_counter_values([image_name, image_name],
+        settings_biocat_eiger, ['vac_007_data_000001_00001.h5',
+        'vac_007_data_000001_00002.h5'])
+
+    assert float(counters[0]['I0']) == 5416158.49623
+    assert float(counters[1]['I0']) == 5413885.48304
+    assert counters[1]['Experiment_type'] == 'SEC-SAXS'
+
+    with open(log_name, 'a') as f:
+        f.write('vac_007_000003\t2.0\t0.5\t5410000.0\t11330000.0\t100.2\n')
+
+    counters = raw.load_counter_values([image_name], settings_biocat_eiger,
+        ['vac_007_data_000001_00003.h5'])
+
+    assert float(counters[0]['I0']) == 5410000.0
+    assert counters[0]['Experiment_type'] == 'SEC-SAXS'
+
+def test_integration_geometry_cache(settings_biocat_eiger):
+    filenames = [os.path.join('.', 'data', 'vac_007_data_000001.h5')]
+
+    SASImage.geometry_cache.clear()
+
+    profile_list, img_list = raw.load_and_integrate_images(filenames,
+        settings_biocat_eiger)
+
+    info = SASImage.geometry_cache.getInfo()
+
+    assert len(profile_list) == 2
+    assert info['misses'] == 1
+    assert info['hits'] == 1
+    assert info['size'] == 1
+
+    cached_profile_list, img_list = raw.load_and_integrate_images(filenames,
+        settings_biocat_eiger)
+
+    info = SASImage.geometry_cache.getInfo()
+
+    assert info['misses'] == 1
+    assert info['hits'] == 3
+    assert np.all(profile_list[0].getI() == cached_profile_list[0].getI())
+
+    # The solid angle and polarization arrays are kept by the cached
+    # integrator, so they are only calculated once
+    ai = settings_biocat_eiger.get('AzimuthalIntegrator')
+    img_shape = img_list[0].shape
+
+    assert ai.solidAngleArray(img_shape) is ai.solidAngleArray(img_shape)
+    assert (ai.polarization(img_shape, 0.99)
+        is ai.polarization(img_shape, 0.99))
+
+def test_integration_mask_key():
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[2:4, 5:8] = True
+
+    key = SASImage.getMaskKey(mask)
+
+    # The key is only calculated once per mask
+    assert SASImage.getMaskKey(mask) is key
+    assert SASImage.getMaskKey(mask.copy()) == key
+    assert SASImage.getMaskKey(np.logical_not(mask)) != key
+    assert SASImage.getMaskKey(None) is None
+
+def test_load_files_parallel(old_settings):
+    filenames = sorted(glob.glob(os.path.join('.', 'data', 'series_dats',
+        '*.dat')))[:10]
+    filenames.append(os.path.join('.', 'data', 'GI2_A9_19_001_0000.tiff'))
+
+    profiles, ifts, series, imgs = raw.load_files(filenames, old_settings)
+
+    par_profiles, par_ifts, par_series, par_imgs = raw.load_files(filenames,
+        old_settings, n_proc=2)
+
+    assert len(par_profiles) == len(profiles)
+    assert len(par_imgs) == len(imgs)
+    assert np.all(par_imgs[0] == imgs[0])
+
+    for profile, par_profile in zip(profiles, par_profiles):
+        assert profile.getParameter('filename') == par_profile.getParameter('filename')
+        assert np.all(profile.getI() == par_profile.getI())
+        assert np.all(profile.getErr() == par_profile.getErr())
+
+@pytest.mark.parametrize("n_proc", [1, 2])
+def test_load_files_errors(old_settings, n_proc):
+    filenames = [os.path.join('.', 'data', 'glucose_isomerase.dat'),
+        os.path.join('.', 'data', 'does_not_exist.dat')]
+
+    with pytest.raises(SASExceptions.FileLoadError) as excinfo:
+        raw.load_files(filenames, old_settings, n_proc=n_proc)
+
+    errors = excinfo.value.errors
+
+    assert len(errors) == 1
+    assert errors[0][0].endswith('does_not_exist.dat')
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher(tmp_path, use_inotify):
+    with open(tmp_path / 'existing.dat', 'w') as f:
+        f.write('1 2 3\n')
+
+    filt_list = [['Ignore', 'ignore', 'At start']]
+
+    watcher = SASFileWatcher.FileWatcher(str(tmp_path), filt_list, True,
+        ['.dat'], use_inotify=use_inotify)
+    watcher.start()
+
+    for name in ['new.dat', 'ignore_me.dat', 'new.tiff']:
+        with open(tmp_path / name, 'w') as f:
+            f.write('1 2 3\n')
+
+    new_files = []
+    for i in range(3):
+        new, modified = watcher.check()
+        new_files.extend(new)
+
+    watcher.stop()
+
+    assert new_files == [str(tmp_path / 'new.dat')]
+
+def test_file_watcher_missed_events(tmp_path):
+    watcher = SASFileWatcher.FileWatcher(str(tmp_path), use_inotify=True,
+        rescan_interval=0)
+    watcher.start()
+
+    with open(tmp_path / 'remote.dat', 'w') as f:
+        f.write('1 2 3\n')
+
+    # Drop the events, like for a file written by another machine on a
+    # network filesystem
+    if watcher.usingInotify():
+        watcher._inotify.read()
+
+    new_files = []
+    for i in range(3):
+        new, modified = watcher.check()
+        new_files.extend(new)
+
+    watcher.stop()
+
+    assert new_files == [str(tmp_path / 'remote.dat')]
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher_modified(tmp_path, use_inotify):
+    watcher = SASFileWatcher.FileWatcher(str(tmp_path), use_inotify=use_inotify,
+        check_modified=True, modified_interval=0)
+    watcher.start()
+
+    with open(tmp_path / 'new.dat', 'w') as f:
+        f.write('1 2 3\n')
+
+    new_files = []
+    for i in range(3):
+        new, modified = watcher.check()
+        new_files.extend(new)
+
+    assert new_files == [str(tmp_path / 'new.dat')]
+
+    with open(tmp_path / 'new.dat', 'w') as f:
+        f.write('1 2 3\n4 5 6\n')
+
+    modified_files = []
+    for i in range(3):
+        new, modified = watcher.check()
+        assert new == []
+        modified_files.extend(modified)
+
+    assert modified_files == [str(tmp_path / 'new.dat')]
+
+    # Rewritten with a new size, so can be treated as a new file
+    with open(tmp_path / 'new.dat', 'w') as f:
+        f.write('1 2 3\n')
+
+    new_files = []
+    for i in range(3):
+        new, modified = watcher.check(resized_as_new=True)
+        assert modified == []
+        new_files.extend(new)
+
+    watcher.stop()
+
+    assert new_files == [str(tmp_path / 'new.dat')]
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_file_watcher_no_stat_known(tmp_path, use_inotify, monkeypatch):
+    for j in range(20):
+        with open(tmp_path / 'old_{}.dat'.format(j), 'w') as f:
+            f.write('1 2 3\n')
+
+    filt_list = [['Ignore', 'ignore', 'At start']]
+
+    watcher = SASFileWatcher.FileWatcher(str(tmp_path), filt_list, True,
+        use_inotify=use_inotify, check_modified=True, rescan_interval=0)
+    watcher.start()
+
+    for name in ['new.dat', 'ignore_me.dat']:
+        with open(tmp_path / name, 'w') as f:
+            f.write('1 2 3\n')
+
+    # Checking only looks at the new files, not every file in the directory
+    stat_paths = []
+    orig_stat = SASFileWatcher.FileWatcher._getStat
+
+    def count_stat(self, path):
+        stat_paths.append(getattr(path, 'name', path))
+        return orig_stat(self, path)
+
+    monkeypatch.setattr(SASFileWatcher.FileWatcher, '_getStat', count_stat)
+
+    new_files = []
+    ignored_files = []
+    for i in range(3):
+        new, modified, ignored = watcher.check(return_ignored=True)
+        new_files.extend(new)
+        ignored_files.extend(ignored)
+
+    watcher.stop()
+
+    assert new_files == [str(tmp_path / 'new.dat')]
+    assert ignored_files == [str(tmp_path / 'ignore_me.dat')]
+    assert not any('old_' in str(path) for path in stat_paths)
+
 def test_profile_to_series():
     filenames = [os.path.join('.', 'data', 'series_dats',
         'BSA_001_{:04d}.dat'.format(i)) for i in range(10)]
@@ -1899,6 +2157,100 @@ def test_load_tab_2col():
     assert len(profile.getI()) == 474
     assert len(profile.getErr()) == 474
 
+def test_load_dat_block_ends_at_comment(tmp_path):
+    with open(tmp_path / 'comment.dat', 'w') as f:
+        f.write('# q I err\n'
+            '0.01 2.0 0.1\n'
+            '0.02 1.5 0.1\n'
+            '# Comment in the data\n'
+            '0.03 1.0 0.05\n'
+            '0.04 0.5 0.05 # trailing comment\n'
+            '0.05 0.25 0.025\n')
+
+    profile = raw.load_profiles([str(tmp_path / 'comment.dat')])[0]
+
+    assert np.all(profile.getQ() == [0.01, 0.02, 0.03, 0.04, 0.05])
+    assert np.all(profile.getI() == [2.0, 1.5, 1.0, 0.5, 0.25])
+    assert np.all(profile.getErr() == [0.1, 0.1, 0.05, 0.05, 0.025])
+
+def test_load_dat_block_ends_at_blank_line(tmp_path):
+    with open(tmp_path / 'blank.dat', 'w') as f:
+        f.write('# q I err\n'
+            '0.01 2.0 0.1\n'
+            '0.02 1.5 -0.1\n'
+            '   \n'
+            '0.03 1.0 0.05\n'
+            '\n'
+            '0.04 0.5 0.05')
+
+    profile = raw.load_profiles([str(tmp_path / 'blank.dat')])[0]
+
+    assert np.all(profile.getQ() == [0.01, 0.02, 0.03, 0.04])
+    assert np.all(profile.getI() == [2.0, 1.5, 1.0, 0.5])
+    assert np.all(profile.getErr() == [0.1, 0.1, 0.05, 0.05])
+
+def test_load_dat_leading_decimal(tmp_path):
+    with open(tmp_path / 'decimal.dat', 'w') as f:
+        f.write('# q I err\n'
+            '0.01 2.0 0.1\n'
+            '0.02 .5 0.1\n'
+            '0.03 1.0 0.05\n')
+
+    profile = raw.load_profiles([str(tmp_path / 'decimal.dat')])[0]
+
+    # The leading decimal value doesn't match the data line expression
+    assert np.all(profile.getQ() == [0.01, 0.03])
+    assert np.all(profile.getI() == [2.0, 1.0])
+    assert np.all(profile.getErr() == [0.1, 0.05])
+
+@pytest.mark.parametrize("sep, has_err", [(',', False), (' ', True)])
+def test_load_csv_4col(tmp_path, sep, has_err):
+    with open(tmp_path / 'four_col.csv', 'w') as f:
+        for vals in [('0.01', '4.0', '0.1', '7'), ('0.02', '2.25', '0.2', '8'),
+            ('0.03', '1.0', '0.3', '9')]:
+            f.write(sep.join(vals) + '\n')
+
+    profile = raw.load_profiles([str(tmp_path / 'four_col.csv')])[0]
+
+    assert np.all(profile.getQ() == [0.01, 0.02, 0.03])
+    assert np.all(profile.getI() == [4.0, 2.25, 1.0])
+
+    # Comma separated lines with more than three values don't have an
+    # error column
+    if has_err:
+        assert np.all(profile.getErr() == [0.1, 0.2, 0.3])
+    else:
+        assert np.all(profile.getErr() == [2.0, 1.5, 1.0])
+
+def test_load_foxs_fit_dat(tmp_path):
+    with open(tmp_path / 'foxs_fit.dat', 'w') as f:
+        f.write('# q intensity model_intensity error\n'
+            '0.01 2.0 2.1 0.1\n'
+            '0.02 1.5 1.4 -0.1\n'
+            '0.03 1.0 1.05 0.05\n')
+
+    profiles = raw.load_profiles([str(tmp_path / 'foxs_fit.dat')])
+
+    assert len(profiles) == 2
+    assert np.all(profiles[0].getQ() == [0.01, 0.02, 0.03])
+    assert np.all(profiles[0].getI() == [2.0, 1.5, 1.0])
+    assert np.all(profiles[0].getErr() == [0.1, 0.1, 0.05])
+    assert np.all(profiles[1].getI() == [2.1, 1.4, 1.05])
+
+def test_load_sans_dat(tmp_path):
+    with open(tmp_path / 'sans.dat', 'w') as f:
+        f.write('#      Q      I(Q)     Error     dQ\n'
+            '0.01 2.0 0.1 0.001\n'
+            '0.02 1.5 0.1 -0.002\n'
+            '0.03 1.0 0.05 0.003\n')
+
+    profile = raw.load_profiles([str(tmp_path / 'sans.dat')])[0]
+
+    assert np.all(profile.getQ() == [0.01, 0.02, 0.03])
+    assert np.all(profile.getI() == [2.0, 1.5, 1.0])
+    assert np.all(profile.getErr() == [0.1, 0.1, 0.05])
+    assert np.all(profile.getQErr() == [0.001, 0.002, 0.003])
+
 def test_load_counter_values(old_settings):
     filenames = [os.path.join('.', 'data', 'GI2_A9_19_001_0000.tiff')]
 
@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 
 import pytest
 import numpy as np
@@ -8,6 +9,7 @@ if raw_path not in os.sys.path:
     os.sys.path.append(raw_path)
 
 import bioxtasraw.RAWAPI as raw
+import bioxtasraw.SASFileIO as SASFileIO
 
 @pytest.fixture()
 def new_settings():
@@ -102,6 +104,127 @@ def test_save_profile_sans(sans_profile, temp_directory):
 
     assert test_profile == exp_profile
 
+def test_save_profile_queue(gi_sub_profile, new_settings, temp_directory):
+    save_queue = SASFileIO.ProfileSaveQueue()
+
+    raw.save_profile(gi_sub_profile, 'test_queue_profile.dat', temp_directory,
+        save_queue=save_queue)
+    raw.save_profile(gi_sub_profile, 'test_direct_profile.dat', temp_directory)
+
+    save_queue.put(gi_sub_profile, os.path.join(temp_directory, 'missing_dir'),
+        new_settings)
+
+    save_queue.join()
+    save_queue.stop()
+
+    with open(os.path.join(temp_directory, 'test_queue_profile.dat'), 'r') as f:
+        test_profile = f.read()
+
+    with open(os.path.join(temp_directory, 'test_direct_profile.dat'), 'r') as f:
+        exp_profile = f.read()
+
+    test_profile = test_profile.replace('test_queue_profile', 'test_direct_profile')
+
+    assert test_profile == exp_profile
+    assert len(save_queue.errors) == 1
+
+def test_save_profile_collection(gi_sub_profile, sans_profile, temp_directory):
+    fname = 'test_collection.hdf5'
+    coll_name = os.path.join(temp_directory, fname)
+
+    names = raw.save_profile_collection([gi_sub_profile, sans_profile], fname,
+        temp_directory)
+    names.extend(raw.save_profile_collection(gi_sub_profile, fname,
+        temp_directory))
+
+    gi_name = gi_sub_profile.getParameter('filename')
+    gi_root, gi_ext = os.path.splitext(gi_name)
+
+    assert names == [gi_name, sans_profile.getParameter('filename'),
+        gi_root + '_2' + gi_ext]
+
+    profiles = raw.load_profiles([coll_name])
+
+    assert len(profiles) == 3
+    assert [profile.getParameter('filename') for profile in profiles] == names
+    assert np.all(profiles[0].getI() == gi_sub_profile.getI())
+    assert np.all(profiles[1].getQErr() == sans_profile.getQErr())
+
+    sans = raw.load_profile_collection(coll_name, [names[1]])[0]
+
+    assert np.all(sans.getQ() == sans_profile.getQ())
+    assert sans.getAllParameters() == profiles[1].getAllParameters()
+
+    export_dir = os.path.join(temp_directory, 'collection_export')
+    os.mkdir(export_dir)
+
+    raw.export_profile_collection(coll_name, export_dir, names=[names[0]])
+    raw.save_profile(gi_sub_profile, 'direct_profile.dat', export_dir)
+
+    with open(os.path.join(export_dir, os.path.splitext(gi_name)[0]+'.dat')) as f:
+        test_profile = f.read()
+
+    with open(os.path.join(export_dir, 'direct_profile.dat')) as f:
+        exp_profile = f.read()
+
+    assert test_profile == exp_profile.replace('direct_profile.dat', gi_name)
+
+def test_export_profile_collection_same_name(gi_sub_profile, temp_directory):
+    coll_name = os.path.join(temp_directory, 'test_same_name.hdf5')
+
+    scaled_profile = gi_sub_profile.copy()
+    scaled_profile.scaleRawIntensity(2.)
+
+    sub_profile = gi_sub_profile.copy()
+    sub_profile.setParameter('filename',
+        os.path.splitext(gi_sub_profile.getParameter('filename'))[0] + '.sub')
+
+    raw.save_profile_collection([gi_sub_profile, scaled_profile, sub_profile],
+        'test_same_name.hdf5', temp_directory)
+
+    export_dir = os.path.join(temp_directory, 'same_name_export')
+    os.mkdir(export_dir)
+
+    names = raw.export_profile_collection(coll_name, export_dir)
+
+    gi_root = os.path.splitext(gi_sub_profile.getParameter('filename'))[0]
+
+    assert len(names) == 3
+    assert sorted(os.listdir(export_dir)) == sorted([gi_root + '.dat',
+        gi_root + '_2.dat', gi_root + '_3.dat'])
+
+    profiles = raw.load_profiles([os.path.join(export_dir, gi_root + '.dat'),
+        os.path.join(export_dir, gi_root + '_2.dat')])
+
+    assert np.allclose(profiles[1].getI(), 2*profiles[0].getI())
+
+def test_save_profile_collection_during_run(gi_sub_profile, temp_directory):
+    fname = 'test_run_collection.hdf5'
+    coll_name = os.path.join(temp_directory, fname)
+
+    writer = SASFileIO.ProfileCollectionWriter(coll_name)
+    writer.append(gi_sub_profile)
+
+    # Another process can read the collection while it is being written
+    with multiprocessing.Pool(1) as pool:
+        profiles = pool.apply(raw.load_profile_collection, (coll_name,))
+
+    assert len(profiles) == 1
+
+    writer.append(gi_sub_profile)
+    raw.save_profile(gi_sub_profile, datadir=temp_directory, collection=fname)
+
+    profiles = raw.load_profile_collection(coll_name)
+
+    assert len(profiles) == 3
+
+    with open(os.path.join(temp_directory, 'not_collection.dat'), 'w') as f:
+        f.write('1 2 3\n')
+
+    assert not SASFileIO.is_profile_collection(os.path.join(temp_directory,
+        'not_collection.dat'))
+    assert SASFileIO.is_profile_collection(coll_name)
+
 def test_save_gnom_ift(gi_gnom_ift, temp_directory):
     raw.save_ift(gi_gnom_ift, 'test_gnom_ift.out', temp_directory)
 
@@ -218,6 +341,39 @@ def test_save_series_images(series_images, temp_directory):
     assert len(test_series.use_baseline_subtracted_sasm) == len(series_images.use_baseline_subtracted_sasm)
     assert all(test_series.total_i_bcsub == series_images.total_i_bcsub)
 
+def test_save_series_columnar(series_images, temp_directory):
+    raw.save_series(series_images, 'test_series_columnar.hdf5', temp_directory,
+        columnar=True)
+
+    test_series = raw.load_series([os.path.join(temp_directory,
+        'test_series_columnar.hdf5')])[0]
+
+    assert test_series.file_list == series_images.file_list
+    assert all(test_series.total_i == series_images.total_i)
+    assert all(test_series.mean_i == series_images.mean_i)
+    assert test_series.buffer_range == series_images.buffer_range
+    assert test_series.sample_range == series_images.sample_range
+    assert all(test_series.rg_list == series_images.rg_list)
+    assert test_series._scale_factor == series_images._scale_factor
+    assert len(test_series.subtracted_sasm_list) == len(series_images.subtracted_sasm_list)
+    assert all(test_series.total_i_sub == series_images.total_i_sub)
+    assert len(test_series.baseline_subtracted_sasm_list) == len(series_images.baseline_subtracted_sasm_list)
+    assert all(test_series.total_i_bcsub == series_images.total_i_bcsub)
+
+    for int_type in ['unsub', 'sub']:
+        test_sasm = test_series.getSASM(5, int_type)
+        sasm = series_images.getSASM(5, int_type)
+
+        assert all(test_sasm.getQ() == sasm.getQ())
+        assert all(test_sasm.getI() == sasm.getI())
+        assert all(test_sasm.getErr() == sasm.getErr())
+        assert test_sasm.getParameter('filename') == sasm.getParameter('filename')
+
+    test_sasms = test_series.getSASMList(0, 10)
+
+    assert len(test_sasms) == 11
+    assert test_sasms[5] is test_series.getSASM(5)
+
 def test_save_series_sasbdb_keywords(series_sasbdb_keywords, temp_directory):
     raw.save_series(series_sasbdb_keywords, 'test_series_sasbdb_keywords.hdf5', temp_directory)
 
@@ -103,16 +103,21 @@ def bift_inner_loop(f, p, B, alpha, N, sum_dia):
 
     sigma = np.zeros_like(p)
 
+    # Explicit loops avoid allocating temporary arrays each iteration, and
+    # give the same results as the equivalent array operations.
+
     #Start loop
     while ite < maxit and not (ite > minit and dotsp > xprec):
         ite = ite + 1
 
         #Apply positivity constraint
-        sigma[1:-1] = np.abs(p[1:-1]+1e-10)
-        p_neg_idx = p[1:-1]<=0
-        f_neg_idx = f[1:-1]<=0
-        p[1:-1][p_neg_idx] = p[1:-1][p_neg_idx]*-1+1e-10
-        f[1:-1][f_neg_idx] = f[1:-1][f_neg_idx]*-1+1e-10
+        for k in range(1, p.size-1):
+            sigma[k] = np.abs(p[k]+1e-10)
+
+            if p[k] <= 0:
+                p[k] = p[k]*-1+1e-10
+            if f[k] <= 0:
+                f[k] = f[k]*-1+1e-10
 
         #Apply smoothness constraint
         for k in range(2, N-1):
@@ -140,31 +145,131 @@ def bift_inner_loop(f, p, B, alpha, N, sum_dia):
             f[k] = (1-omega)*f[k]+omega*fx
 
         # Calculate convergence
-        gradsi = -2*(f[1:-1]-p[1:-1])/sigma[1:-1]
-        gradci = 2*(np.sum(B[1:-1,1:-1]*f[1:-1], axis=1)-sum_dia[1:-1])
+        gradsi_sq = 0.
+        gradci_sq = 0.
+        grad_dot = 0.
+
+        for k in range(1, p.size-1):
+            gradsi = -2*(f[k]-p[k])/sigma[k]
+
+            bf_sum = 0.
+            for j in range(1, p.size-1):
+                bf_sum += B[k, j]*f[j]
 
-        wgrads = np.sqrt(np.abs(np.sum(gradsi**2)))
-        wgradc = np.sqrt(np.abs(np.sum(gradci**2)))
+            gradci = 2*(bf_sum-sum_dia[k])
+
+            gradsi_sq += gradsi**2
+            gradci_sq += gradci**2
+            grad_dot += gradsi*gradci
+
+        wgrads = np.sqrt(np.abs(gradsi_sq))
+        wgradc = np.sqrt(np.abs(gradci_sq))
 
         if wgrads*wgradc == 0:
             dotsp = 1
         else:
-            dotsp = np.sum(gradsi*gradci)/(wgrads*wgradc)
+            dotsp = grad_dot/(wgrads*wgradc)
 
     return f, p, sigma, dotsp, xprec
 
 @jit(nopython=True, cache=True)
-def getEvidence(params, q, i, orig_err, N):
-    log_alpha, dmax = params
-    alpha = np.exp(log_alpha)
+def bift_inner_loop_direct(f, p, B, alpha, N, sum_dia):
+    """
+    Alternative to bift_inner_loop that finds the same solution, where f
+    and the smoothness prior p made from f are self consistent. Instead of
+    updating one point at a time, for a fixed sigma the equations for all
+    points, including p as a function of f, are linear and are solved
+    directly. Sigma is then updated from the new p and the solve repeated,
+    which typically converges in a few tens of iterations instead of
+    hundreds. As in bift_inner_loop, solutions that haven't converged are
+    indicated by dotsp < xprec. Also returns whether the relative change
+    in the solution dropped below tolerance before the iteration limit.
+    """
+    ite = 0
+    maxit = 50
+    xprec = 0.999
+    dotsp = 0
+    omega = 0.5
+    tol = 1e-8
+    change = 1.
+
+    sigma = np.zeros_like(p)
+
+    B_inner = B[1:N,1:N].copy()
+
+    while ite < maxit and change > tol:
+        ite = ite + 1
+
+        #Apply positivity constraint
+        sigma[1:-1] = np.abs(p[1:-1]+1e-10)
+        p_neg_idx = p[1:-1]<=0
+        f_neg_idx = f[1:-1]<=0
+        p[1:-1][p_neg_idx] = p[1:-1][p_neg_idx]*-1+1e-10
+        f[1:-1][f_neg_idx] = f[1:-1][f_neg_idx]*-1+1e-10
+
+        #Apply smoothness constraint
+        for k in range(2, N-1):
+            p[k] = (f[k-1] + f[k+1])/2.
+
+        p[1] = f[2]/2.
+        p[-2] = p[-3]/2.
+
+        p[0] = f[0]
+        p[-1] = f[-1]
+
+        sigma[0] = 10
+
+        # Solve B*f + 2*alpha/sigma*(f - p(f)) = sum_dia, where p(f) is the
+        # smoothness constraint above
+        A = B_inner.copy()
+
+        for k in range(1, N):
+            w = 2*alpha/sigma[k]
+            A[k-1, k-1] = A[k-1, k-1] + w
+
+            if k == 1:
+                A[0, 1] = A[0, 1] - w/2.
+            elif k == N-1:
+                A[k-1, k-3] = A[k-1, k-3] - w/4.
+                A[k-1, k-1] = A[k-1, k-1] - w/4.
+            else:
+                A[k-1, k-2] = A[k-1, k-2] - w/2.
+                A[k-1, k] = A[k-1, k] - w/2.
+
+        fx = np.linalg.solve(A, sum_dia[1:N])
+
+        change = np.abs(fx - f[1:N]).max()/np.abs(fx).max()
+
+        f[1:N] = (1-omega)*f[1:N]+omega*fx
+
+    # Calculate convergence
+    gradsi = -2*(f[1:-1]-p[1:-1])/sigma[1:-1]
+    gradci = 2*(np.sum(B[1:-1,1:-1]*f[1:-1], axis=1)-sum_dia[1:-1])
+
+    wgrads = np.sqrt(np.abs(np.sum(gradsi**2)))
+    wgradc = np.sqrt(np.abs(np.sum(gradci**2)))
+
+    if wgrads*wgradc == 0:
+        dotsp = 1
+    else:
+        dotsp = np.sum(gradsi*gradci)/(wgrads*wgradc)
+
+    converged = change <= tol
+
+    return f, p, sigma, dotsp, xprec, converged
+
+@jit(nopython=True, cache=True)
+def getEvidenceMatrices(q, i, orig_err, N, dmax):
+    """
+    Calculates the quantities used by getEvidence that only depend on dmax
+    (and the data), so that they can be reused for multiple alpha values.
+    Returns the prior p(r), r, the transform matrix T, B, and sum_dia.
+    """
     err = orig_err**2
 
     p, r = makePriorDistribution(i[0], N, dmax, 'sphere') #Note, here I use p for what Hansen calls m
     T = createTransMatrix(q, r)
 
-    p[0] = 0
-    f = np.zeros_like(p)
-
     # norm_T = T/err[:,None]  #Slightly faster to create this first
     norm_T = T/err.reshape((err.size, 1))  #Slightly faster to create this first
 
@@ -176,6 +281,25 @@ def getEvidence(params, q, i, orig_err, N):
     B[0,:] = 0
     B[:,0] = 0
 
+    return p, r, T, B, sum_dia
+
+@jit(nopython=True, cache=True)
+def getEvidenceFromMatrices(log_alpha, dmax, i, orig_err, N, prior, r, T, B,
+    sum_dia, solver='iterative'):
+    """
+    Calculates the evidence using the results of getEvidenceMatrices for
+    the given dmax. solver can be 'iterative' (bift_inner_loop) or 'direct'
+    (bift_inner_loop_direct). The direct solver is experimental. If it
+    doesn't converge, the iterative solver is used instead.
+    """
+    alpha = np.exp(log_alpha)
+    err = orig_err**2
+
+    p = prior.copy()
+
+    p[0] = 0
+    f = np.zeros_like(p)
+
     #Do some kind of rescaling of the input
     c1 = np.sum(np.sum(T[1:4,1:-1]*p[1:-1], axis=1)/err[1:4])
     c2 = np.sum(i[1:4]/err[1:4])
@@ -183,7 +307,20 @@ def getEvidence(params, q, i, orig_err, N):
     f[1:-1] = p[1:-1]*1.001     #Note: f is called P in the original RAW BIFT code
 
     # Do the optimization
-    f, p, sigma, dotsp, xprec = bift_inner_loop(f, p, B, alpha, N, sum_dia)
+    converged = False
+
+    if solver == 'direct':
+        f_direct, p_direct, sigma, dotsp, xprec, converged = bift_inner_loop_direct(
+            f.copy(), p.copy(), B, alpha, N, sum_dia)
+
+        converged = converged and dotsp >= xprec
+
+        if converged:
+            f = f_direct
+            p = p_direct
+
+    if not converged:
+        f, p, sigma, dotsp, xprec = bift_inner_loop(f, p, B, alpha, N, sum_dia)
 
     # Calculate the evidence
     s = np.sum(-(f[1:-1]-p[1:-1])**2/sigma[1:-1])
@@ -209,88 +346,188 @@ def getEvidence(params, q, i, orig_err, N):
 
     return evidence, c, f, r
 
-def getEvidenceOptimize(params, q, i, err, N):
-    evidence, c, f, r = getEvidence(params, q, i, err, N)
+@jit(nopython=True, cache=True)
+def getEvidence(params, q, i, orig_err, N, solver='iterative'):
+    log_alpha, dmax = params
+
+    p, r, T, B, sum_dia = getEvidenceMatrices(q, i, orig_err, N, dmax)
+
+    return getEvidenceFromMatrices(log_alpha, dmax, i, orig_err, N, p, r, T,
+        B, sum_dia, solver)
+
+@jit(nopython=True, cache=True)
+def getEvidenceGrid(dmax, log_alphas, q, i, orig_err, N, solver='iterative'):
+    """
+    Calculates the evidence and chi squared for each alpha in log_alphas
+    at a single dmax, calculating the dmax dependent matrices only once.
+    """
+    p, r, T, B, sum_dia = getEvidenceMatrices(q, i, orig_err, N, dmax)
+
+    evidence = np.zeros(log_alphas.size)
+    chi = np.zeros(log_alphas.size)
+
+    for j in range(log_alphas.size):
+        ev, c, f, r = getEvidenceFromMatrices(log_alphas[j], dmax, i, orig_err,
+            N, p, r, T, B, sum_dia, solver)
+
+        evidence[j] = ev
+        chi[j] = c
+
+    return evidence, chi
+
+class EvidenceCache(object):
+    """
+    Cache of the results of getEvidenceMatrices for recently used dmax values,
+    used when the evidence is repeatedly calculated for the same dmax with
+    different alphas, such as during minimization.
+    """
+
+    def __init__(self, q, i, err, N, max_size=10, solver='iterative'):
+        self.q = q
+        self.i = i
+        self.err = err
+        self.N = N
+        self.max_size = max_size
+        self.solver = solver
+
+        self._cache = {}
+
+    def getEvidence(self, params):
+        log_alpha, dmax = params
+
+        if dmax not in self._cache:
+            if len(self._cache) >= self.max_size:
+                self._cache.pop(next(iter(self._cache)))
+
+            self._cache[dmax] = getEvidenceMatrices(self.q, self.i, self.err,
+                self.N, dmax)
+
+        p, r, T, B, sum_dia = self._cache[dmax]
+
+        return getEvidenceFromMatrices(log_alpha, dmax, self.i, self.err,
+            self.N, p, r, T, B, sum_dia, self.solver)
+
+def getEvidenceOptimize(params, q, i, err, N, cache=None):
+    if cache is None:
+        evidence, c, f, r = getEvidence(params, q, i, err, N)
+    else:
+        evidence, c, f, r = cache.getEvidence(params)
     #Negative so you can minimize on it
     return -evidence
 
+class BiftEngine(object):
+    """
+    A pool of worker processes for BIFT that can be reused for the grid search
+    and monte carlo error estimate of many BIFT calculations, avoiding the
+    cost of starting a new pool each time. Use as a context manager, e.g.:
+
+    with BiftEngine(nprocs=4) as engine:
+        for q, i, err, filename in data:
+            doBift(q, i, err, filename, ..., engine=engine)
+
+    or call close when done with it.
+    """
+
+    def __init__(self, nprocs=0):
+        if nprocs == 0:
+            self.n_proc = max(multiprocessing.cpu_count()-1, 1)
+        else:
+            self.n_proc = min(nprocs, multiprocessing.cpu_count())
+
+        self._pool = multiprocessing.Pool(processes=self.n_proc)
+
+    def map(self, func, iterable):
+        return self._pool.map(func, iterable)
+
+    def imap(self, func, iterable):
+        return self._pool.imap(func, iterable)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 def calc_bift_errors(opt_params, q, i, err, N, mc_runs=300, abort_check=False,
-    single_proc=False, nprocs=0):
+    single_proc=False, nprocs=0, engine=None, solver='iterative'):
     #First, randomly generate a set of parameters similar but not quite the same as the best parameters (monte carlo)
     #Then, calculate the evidence, pr, and other results for each set of parameters
     alpha_opt, dmax_opt = opt_params
     mult = 3.0
 
-    if not single_proc:
-        if nprocs == 0:
-            n_proc = max(multiprocessing.cpu_count()-1, 1)
-        else:
-            n_proc = min(nprocs, multiprocessing.cpu_count())
-        mp_pool = multiprocessing.Pool(processes=n_proc)
-        mp_get_evidence = functools.partial(getEvidence, q=q, i=i, orig_err=err, N=N)
-    else:
-        n_proc = nprocs
+    # If a BiftEngine is provided it is used (and left open), otherwise one
+    # is created for this calculation if using multiple processors
+    own_engine = engine is None and not single_proc
 
-    ev_array = np.zeros(mc_runs)
-    c_array = np.zeros(mc_runs)
-    f_array = np.zeros((mc_runs, N+1))
-    r_array = np.zeros((mc_runs, N+1))
+    if own_engine:
+        engine = BiftEngine(nprocs)
 
-    max_dmax = dmax_opt+0.1*dmax_opt*0.5*mult
+    try:
+        if engine is not None:
+            mp_get_evidence = functools.partial(getEvidence, q=q, i=i, orig_err=err,
+                N=N, solver=solver)
 
-    _, ref_r = makePriorDistribution(i[0], N, max_dmax, 'sphere')
+        ev_array = np.zeros(mc_runs)
+        c_array = np.zeros(mc_runs)
+        f_array = np.zeros((mc_runs, N+1))
+        r_array = np.zeros((mc_runs, N+1))
 
-    run_mc = True
+        max_dmax = dmax_opt+0.1*dmax_opt*0.5*mult
 
-    while run_mc:
+        _, ref_r = makePriorDistribution(i[0], N, max_dmax, 'sphere')
 
-        alpha_array = alpha_opt+0.1*alpha_opt*(np.random.random(mc_runs)-0.5)*mult
-        dmax_array = dmax_opt+0.1*dmax_opt*(np.random.random(mc_runs)-0.5)*mult
-        alpha_array[0] = alpha_opt
-        dmax_array[0] = dmax_opt
+        run_mc = True
 
-        pts = list(zip(alpha_array, dmax_array))
+        while run_mc:
 
-        if not single_proc:
-            try:
-                results = mp_pool.map(mp_get_evidence, pts)
-            except Exception:
-                mp_pool.close()
-                mp_pool.join()
-                raise
-        else:
-            results = [getEvidence(params, q, i, err, N) for params in pts]
+            alpha_array = alpha_opt+0.1*alpha_opt*(np.random.random(mc_runs)-0.5)*mult
+            dmax_array = dmax_opt+0.1*dmax_opt*(np.random.random(mc_runs)-0.5)*mult
+            alpha_array[0] = alpha_opt
+            dmax_array[0] = dmax_opt
 
-        for res_idx, res in enumerate(results):
-            dmax = dmax_array[res_idx]
+            pts = list(zip(alpha_array, dmax_array))
 
-            evidence, c, f, r = res
+            if engine is not None:
+                results = engine.map(mp_get_evidence, pts)
+            else:
+                results = [getEvidence(params, q, i, err, N, solver) for params in pts]
 
-            interp = scipy.interpolate.interp1d(r, f, copy=False)
+            for res_idx, res in enumerate(results):
+                dmax = dmax_array[res_idx]
 
-            f_interp = np.zeros_like(ref_r)
-            f_interp[ref_r<dmax] = interp(ref_r[ref_r<dmax])
+                evidence, c, f, r = res
 
-            ev_array[res_idx] = evidence
-            c_array[res_idx] = c
-            f_array[res_idx,:] = f_interp
-            r_array[res_idx,:] = ref_r
+                interp = scipy.interpolate.interp1d(r, f, copy=False)
 
-        if np.abs(ev_array).max() >= 9e8:
-            mult = mult/2.
+                f_interp = np.zeros_like(ref_r)
+                f_interp[ref_r<dmax] = interp(ref_r[ref_r<dmax])
 
-            if mult < 0.001:
-                run_mc = False
+                ev_array[res_idx] = evidence
+                c_array[res_idx] = c
+                f_array[res_idx,:] = f_interp
+                r_array[res_idx,:] = ref_r
 
-            if abort_check.is_set():
-                run_mc = False
+            if np.abs(ev_array).max() >= 9e8:
+                mult = mult/2.
 
-        else:
-            run_mc = False
+                if mult < 0.001:
+                    run_mc = False
 
-    if not single_proc:
-        mp_pool.close()
-        mp_pool.join()
+                if abort_check.is_set():
+                    run_mc = False
+
+            else:
+                run_mc = False
+
+    finally:
+        if own_engine:
+            engine.close()
 
     #Then, calculate the probability of each result as exp(evidence - evidence_max)**(1/minimum_chisq), normalized by the sum of all result probabilities
 
@@ -338,7 +575,7 @@ def make_fit(q, r, pr):
 
 def doBift(q, i, err, filename, npts, alpha_min, alpha_max, alpha_n, dmax_min,
     dmax_max, dmax_n, mc_runs, queue=None, abort_check=threading.Event(),
-    single_proc=False, nprocs=0):
+    single_proc=False, nprocs=0, engine=None, solver='iterative'):
 
     # Clean up data
     start_idx = 0
@@ -385,185 +622,180 @@ def doBift(q, i, err, filename, npts, alpha_min, alpha_max, alpha_n, dmax_min,
 
     N = npts - 1
 
-    if not single_proc:
-        if nprocs == 0:
-            n_proc = max(multiprocessing.cpu_count()-1, 1)
-        else:
-            n_proc = min(nprocs, multiprocessing.cpu_count())
-        mp_pool = multiprocessing.Pool(processes=n_proc)
-        mp_get_evidence = functools.partial(getEvidence, q=q, i=i, orig_err=err, N=N)
-    else:
-        n_proc = nprocs
-
-    # Loop through a range of dmax and alpha to get a starting point for the minimization
-
-    if abort_check.is_set():
-        if queue is not None:
-            queue.put({'canceled' : True})
-
-        if not single_proc:
-            mp_pool.close()
-            mp_pool.join()
-
-        return None
+    # If a BiftEngine is provided it is used (and left open), otherwise one
+    # is created for this calculation if using multiple processors. The same
+    # engine is used for the grid search and the monte carlo errors.
+    own_engine = engine is None and not single_proc
 
-    for d_idx, dmax in enumerate(dmax_points):
+    if own_engine:
+        engine = BiftEngine(nprocs)
 
-        pts = [(alpha, dmax) for alpha in alpha_points]
-
-        if not single_proc:
-            try:
-                results = mp_pool.map(mp_get_evidence, pts)
-            except Exception:
-                mp_pool.close()
-                mp_pool.join()
-                raise
-        else:
-            results = [getEvidence(params, q, i, err, N) for params in pts]
-
-        for res_idx, res in enumerate(results):
-            all_posteriors[d_idx, res_idx] = res[0]
-
-        if queue is not None:
-            bift_status = {
-                'alpha'     : pts[-1][0],
-                'evidence'  : res[0],
-                'chi'       : res[1],          #Actually chi squared
-                'dmax'      : pts[-1][1],
-                'spoint'    : (d_idx+1)*(res_idx+1),
-                'tpoint'    : alpha_points.size*dmax_points.size,
-                }
-
-            queue.put({'update' : bift_status})
+    try:
+        # Loop through a range of dmax and alpha to get a starting point for the minimization
 
         if abort_check.is_set():
             if queue is not None:
                 queue.put({'canceled' : True})
 
-            if not single_proc:
-                mp_pool.close()
-                mp_pool.join()
-
             return None
 
-    if not single_proc:
-        mp_pool.close()
-        mp_pool.join()
+        # Each dmax is done as a single task, so the dmax dependent matrices are
+        # only calculated once for all of the alpha values
+        if engine is not None:
+            mp_get_evidence_grid = functools.partial(getEvidenceGrid,
+                log_alphas=alpha_points, q=q, i=i, orig_err=err, N=N, solver=solver)
 
-    if queue is not None:
-        bift_status = {
-            'alpha'     : pts[-1][0],
-            'evidence'  : res[0],
-            'chi'       : res[1],          #Actually chi squared
-            'dmax'      : pts[-1][1],
-            'spoint'    : alpha_points.size*dmax_points.size,
-            'tpoint'    : alpha_points.size*dmax_points.size,
-            'status'    : 'Running minimization',
-            }
+            grid_results = engine.imap(mp_get_evidence_grid, dmax_points)
 
-        queue.put({'update' : bift_status})
-
-    min_idx = np.unravel_index(np.argmax(all_posteriors, axis=None), all_posteriors.shape)
-
-    min_dmax = dmax_points[min_idx[0]]
-    min_alpha = alpha_points[min_idx[1]]
-
-    # Once a starting point is found, do an actual minimization to find the best alpha/dmax
-    opt_res = scipy.optimize.minimize(getEvidenceOptimize, (min_alpha, min_dmax),
-        (q, i, err, N), method='Powell')
+        else:
+            grid_results = (getEvidenceGrid(dmax, alpha_points, q, i, err, N, solver)
+                for dmax in dmax_points)
 
-    if abort_check.is_set():
-        if queue is not None:
-            queue.put({'canceled' : True})
-        return None
+        for d_idx, dmax in enumerate(dmax_points):
 
-    if opt_res.get('success'):
-        alpha, dmax = opt_res.get('x')
+            evidence, chi = next(grid_results)
 
-        if dmax > 0:
-            evidence, c, f, r = getEvidence((alpha, dmax), q, i, err, N)
+            all_posteriors[d_idx, :] = evidence
 
             if queue is not None:
                 bift_status = {
-                    'alpha'     : alpha,
-                    'evidence'  : evidence,
-                    'chi'       : c,          #Actually chi squared
+                    'alpha'     : alpha_points[-1],
+                    'evidence'  : evidence[-1],
+                    'chi'       : chi[-1],          #Actually chi squared
                     'dmax'      : dmax,
-                    'spoint'    : alpha_points.size*dmax_points.size,
+                    'spoint'    : (d_idx+1)*alpha_points.size,
                     'tpoint'    : alpha_points.size*dmax_points.size,
-                    'status'    : 'Calculating Monte Carlo errors',
                     }
 
                 queue.put({'update' : bift_status})
 
-            pr = f
+            if abort_check.is_set():
+                if queue is not None:
+                    queue.put({'canceled' : True})
+
+                return None
+
+        if queue is not None:
+            bift_status = {
+                'alpha'     : alpha_points[-1],
+                'evidence'  : evidence[-1],
+                'chi'       : chi[-1],          #Actually chi squared
+                'dmax'      : dmax_points[-1],
+                'spoint'    : alpha_points.size*dmax_points.size,
+                'tpoint'    : alpha_points.size*dmax_points.size,
+                'status'    : 'Running minimization',
+                }
 
-            area = integrate.trapezoid(pr, r)
-            area2 = integrate.trapezoid(np.array(pr)*np.array(r)**2, r)
+            queue.put({'update' : bift_status})
 
-            rg = np.sqrt(abs(area2/(2.*area)))
-            i0 = area*4*np.pi
+        min_idx = np.unravel_index(np.argmax(all_posteriors, axis=None), all_posteriors.shape)
 
-            fit = make_fit(q, r, pr)
+        min_dmax = dmax_points[min_idx[0]]
+        min_alpha = alpha_points[min_idx[1]]
 
-            q_extrap = np.arange(0, q[1]-q[0], q[1])
-            q_extrap = np.concatenate((q_extrap, q))
+        # Once a starting point is found, do an actual minimization to find the best alpha/dmax
+        opt_res = scipy.optimize.minimize(getEvidenceOptimize, (min_alpha, min_dmax),
+            (q, i, err, N, EvidenceCache(q, i, err, N, solver=solver)),
+            method='Powell')
 
-            fit_extrap = make_fit(q_extrap, r, pr)
+        if abort_check.is_set():
+            if queue is not None:
+                queue.put({'canceled' : True})
 
-            # Use a monte carlo method to estimate the errors in pr function, values found
-            err_calc = calc_bift_errors((alpha, dmax), q, i, err, N, mc_runs,
-                abort_check=abort_check, single_proc=single_proc, nprocs=n_proc)
+            return None
 
-            if abort_check.is_set():
-                if queue is not None:
-                    queue.put({'canceled' : True})
-                return None
+        if opt_res.get('success'):
+            alpha, dmax = opt_res.get('x')
 
-            r_err, _, pr_err, a_res, d_res, c_res, ev_res, rg_res, i0_res = err_calc
-
-            # NOTE: Unlike Hansen, we don't return the average pr function from the montecarlo
-            # error estimate, but rather the best pr from the optimal dmax/alpha found above
-            # This is consistent with the old RAW behavior. In the future this could change.
-
-            rg_sd = rg_res[1]
-            i0_sd = i0_res[1]
-            alpha_sd = a_res[1]
-            dmax_sd = d_res[1]
-            c_sd = c_res[1]
-            ev_sd = ev_res[1]
-
-            interp = scipy.interpolate.interp1d(r_err, pr_err, copy=False)
-            err_interp = interp(r)
-
-            results = {
-                'dmax'          : dmax,         # Dmax
-                'dmaxer'        : dmax_sd,      # Uncertainty in Dmax
-                'rg'            : rg,           # Real space Rg
-                'rger'          : rg_sd,        # Real space rg error
-                'i0'            : i0,           # Real space I0
-                'i0er'          : i0_sd,        # Real space I0 error
-                'chisq'         : c,            # Actual chi squared value
-                'chisq_er'      : c_sd,         # Uncertainty in chi squared
-                'alpha'         : alpha,        # log(Alpha) used for the IFT
-                'alpha_er'      : alpha_sd,     # Uncertainty in log(alpha)
-                'evidence'      : evidence,     # Evidence of solution
-                'evidence_er'   : ev_sd,        # Uncertainty in evidence of solution
-                'qmin'          : q[0],         # Minimum q
-                'qmax'          : q[-1],        # Maximum q
-                'algorithm'     : 'BIFT',       # Lets us know what algorithm was used to find the IFT
-                'filename'      : os.path.splitext(filename)[0]+'.ift'
-                }
+            if dmax > 0:
+                evidence, c, f, r = getEvidence((alpha, dmax), q, i, err, N, solver)
+
+                if queue is not None:
+                    bift_status = {
+                        'alpha'     : alpha,
+                        'evidence'  : evidence,
+                        'chi'       : c,          #Actually chi squared
+                        'dmax'      : dmax,
+                        'spoint'    : alpha_points.size*dmax_points.size,
+                        'tpoint'    : alpha_points.size*dmax_points.size,
+                        'status'    : 'Calculating Monte Carlo errors',
+                        }
+
+                    queue.put({'update' : bift_status})
+
+                pr = f
+
+                area = integrate.trapezoid(pr, r)
+                area2 = integrate.trapezoid(np.array(pr)*np.array(r)**2, r)
+
+                rg = np.sqrt(abs(area2/(2.*area)))
+                i0 = area*4*np.pi
+
+                fit = make_fit(q, r, pr)
+
+                q_extrap = np.arange(0, q[1]-q[0], q[1])
+                q_extrap = np.concatenate((q_extrap, q))
+
+                fit_extrap = make_fit(q_extrap, r, pr)
+
+                # Use a monte carlo method to estimate the errors in pr function, values found
+                err_calc = calc_bift_errors((alpha, dmax), q, i, err, N, mc_runs,
+                    abort_check=abort_check, single_proc=single_proc,
+                    engine=engine, solver=solver)
+
+                if abort_check.is_set():
+                    if queue is not None:
+                        queue.put({'canceled' : True})
+                    return None
+
+                r_err, _, pr_err, a_res, d_res, c_res, ev_res, rg_res, i0_res = err_calc
+
+                # NOTE: Unlike Hansen, we don't return the average pr function from the montecarlo
+                # error estimate, but rather the best pr from the optimal dmax/alpha found above
+                # This is consistent with the old RAW behavior. In the future this could change.
+
+                rg_sd = rg_res[1]
+                i0_sd = i0_res[1]
+                alpha_sd = a_res[1]
+                dmax_sd = d_res[1]
+                c_sd = c_res[1]
+                ev_sd = ev_res[1]
+
+                interp = scipy.interpolate.interp1d(r_err, pr_err, copy=False)
+                err_interp = interp(r)
+
+                results = {
+                    'dmax'          : dmax,         # Dmax
+                    'dmaxer'        : dmax_sd,      # Uncertainty in Dmax
+                    'rg'            : rg,           # Real space Rg
+                    'rger'          : rg_sd,        # Real space rg error
+                    'i0'            : i0,           # Real space I0
+                    'i0er'          : i0_sd,        # Real space I0 error
+                    'chisq'         : c,            # Actual chi squared value
+                    'chisq_er'      : c_sd,         # Uncertainty in chi squared
+                    'alpha'         : alpha,        # log(Alpha) used for the IFT
+                    'alpha_er'      : alpha_sd,     # Uncertainty in log(alpha)
+                    'evidence'      : evidence,     # Evidence of solution
+                    'evidence_er'   : ev_sd,        # Uncertainty in evidence of solution
+                    'qmin'          : q[0],         # Minimum q
+                    'qmax'          : q[-1],        # Maximum q
+                    'algorithm'     : 'BIFT',       # Lets us know what algorithm was used to find the IFT
+                    'filename'      : os.path.splitext(filename)[0]+'.ift'
+                    }
 
-            iftm = SASM.IFTM(pr, r, err_interp, i, q, err, fit, results, fit_extrap, q_extrap)
+                iftm = SASM.IFTM(pr, r, err_interp, i, q, err, fit, results, fit_extrap, q_extrap)
 
+            else:
+                if queue is not None:
+                    queue.put({'failed' : True})
+                return None
         else:
             if queue is not None:
                 queue.put({'failed' : True})
             return None
-    else:
-        if queue is not None:
-            queue.put({'failed' : True})
-        return None
 
-    return iftm
+        return iftm
+
+    finally:
+        if own_engine:
+            engine.close()
@@ -94,6 +94,7 @@ if raw_path not in os.sys.path:
 import bioxtasraw.SASFileIO as SASFileIO
 import bioxtasraw.SASM as SASM
 import bioxtasraw.SASExceptions as SASExceptions
+import bioxtasraw.SASFileWatcher as SASFileWatcher
 import bioxtasraw.SASCalc as SASCalc
 import bioxtasraw.SASCalib as SASCalib
 import bioxtasraw.SASMask as SASMask
@@ -3694,7 +3695,7 @@ class OnlineController(object):
 
         self.online_timer.Bind(wx.EVT_TIMER, self.onOnlineTimer)
 
-        self.old_dir_list_dict = {}
+        self.watcher = None
         self.is_online = False
         self.seek_dir = []
         self.bg_filename = None
@@ -3737,14 +3738,7 @@ class OnlineController(object):
             found_path = self.selectSearchDir()
 
             if found_path is not None:
-                dir_list = os.listdir(self.seek_dir)
-
-                dir_list_dict = {}
-                for each_file in dir_list:
-                    dir_list_dict[each_file] = (os.path.getmtime(os.path.join(self.seek_dir, each_file)),
-                        os.path.getsize(os.path.join(self.seek_dir, each_file)))
-
-                self.old_dir_list_dict = dir_list_dict
+                self._startWatcher()
 
                 return True
 
@@ -3758,14 +3752,7 @@ class OnlineController(object):
             found_path = True
 
         if found_path:
-            dir_list = os.listdir(self.seek_dir)
-
-            dir_list_dict = {}
-            for each_file in dir_list:
-                dir_list_dict[each_file] = (os.path.getmtime(os.path.join(self.seek_dir, each_file)),
-                    os.path.getsize(os.path.join(self.seek_dir, each_file)))
-
-            self.old_dir_list_dict = dir_list_dict
+            self._startWatcher()
 
             self.online_timer.Start(2000)
             return True
@@ -3775,8 +3762,22 @@ class OnlineController(object):
     def goOffline(self):
         self.main_frame.setStatus('', 0)
 
+        if self.watcher is not None:
+            self.watcher.stop()
+
         return self.online_timer.Stop()
 
+    def _startWatcher(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+
+        self.watcher = SASFileWatcher.FileWatcher(self.seek_dir,
+            self._raw_settings.get('OnlineFilterList'),
+            self._raw_settings.get('EnableOnlineFiltering'),
+            check_modified=True)
+
+        self.watcher.start()
+
     def startTimer(self):
         return self.online_timer.Start(2000)
 
@@ -3828,100 +3829,37 @@ class OnlineController(object):
                 item.Check(True)
                 return
 
-        dir_list = os.listdir(self.seek_dir)
-
-        dir_list_dict = {}
+        self.watcher.setFilters(self._filt_list, self._enable_filt)
 
-        for each_file in dir_list:
-            try:
-                dir_list_dict[each_file] = (os.path.getmtime(os.path.join(self.seek_dir, each_file)), os.path.getsize(os.path.join(self.seek_dir, each_file)))
-            except OSError:
-                pass
+        # With filtering on, rewritten files with a new size are loaded and
+        # plotted again, rather than only updating the data
+        try:
+            new_files, modified_files, ignored_files = self.watcher.check(
+                resized_as_new=self._enable_filt, return_ignored=True)
+        except OSError:
+            return
 
-        diff_list = list(set(dir_list_dict.items()) - set(self.old_dir_list_dict.items()))
-        diff_list.sort(key = lambda name: name[0])
+        for filepath in ignored_files:
+            print('Ignored: '+str(os.path.split(filepath)[1]))
 
         files_to_plot=[]
 
-        if diff_list != []:
-            if not self._enable_filt:
-
-                for each in diff_list:
-                    each_newfile = each[0]
-
-                    process_str = 'Processing incomming file: ' + str(each_newfile)
-                    self.main_frame.setStatus(process_str, 0)
-
-                    filepath = os.path.join(self.seek_dir, str(each_newfile))
-
-                    if self._fileTypeIsCompatible(filepath):
-
-                        if each_newfile in self.old_dir_list_dict:
-                            #ONLY UPDATE IMAGE
-                            mainworker_cmd_queue.put(['online_mode_update_data', [filepath]])
-                            print('Changed: ' + str(each_newfile))
-                        else:
-                            print(process_str)
-                            files_to_plot.append(filepath)
-                            # mainworker_cmd_queue.put(['plot', [filepath]])
-                            #UPDATE PLOT
-
-            else:
-                for each in diff_list:
-                    load=True
-                    each_newfile = each[0]
-
-                    for item in self._filt_list:
-                        if item[0]=='Ignore':
-                            if item[2]=='At start':
-                                if each_newfile.startswith(item[1]):
-                                    load=False
-                            elif item[2]=='Anywhere':
-                                if each_newfile.find(item[1])!=-1:
-                                    load=False
-                            else:
-                                if each_newfile.endswith(item[1]):
-                                    load=False
-                        else:
-                            if item[2]=='At start':
-                                if not each_newfile.startswith(item[1]):
-                                    load=False
-                            elif item[2]=='Anywhere':
-                                if not each_newfile.find(item[1])!=-1:
-                                    load=False
-                            else:
-                                if not each_newfile.endswith(item[1]):
-                                    load=False
-
-                    if load:
-                        process_str = 'Processing incomming file: ' + str(each_newfile)
-                        self.main_frame.setStatus(process_str, 0)
-
-                        filepath = os.path.join(self.seek_dir, str(each_newfile))
-
-                        if self._fileTypeIsCompatible(filepath):
-
-                            if each_newfile in self.old_dir_list_dict:
-                                if each[1][1] == self.old_dir_list_dict[each_newfile][1]:
-                                    #If the size is the same, ONLY UPDATE IMAGE
-                                    mainworker_cmd_queue.put(['online_mode_update_data', [filepath]])
-                                    print('Changed: ' + str(each_newfile))
-                                else:
-                                    print(process_str)
-                                    files_to_plot.append(filepath)
-                            else:
-                                print(process_str)
-                                files_to_plot.append(filepath)
-                                # mainworker_cmd_queue.put(['plot', [filepath]])
-                                #UPDATE PLOT
-                    else:
-                        print('Ignored: '+str(each_newfile))
+        for filepath in modified_files:
+            if self._fileTypeIsCompatible(filepath):
+                #ONLY UPDATE IMAGE
+                mainworker_cmd_queue.put(['online_mode_update_data', [filepath]])
+                print('Changed: ' + str(os.path.split(filepath)[1]))
 
-            if len(files_to_plot) > 0:
-                mainworker_cmd_queue.put(['plot', files_to_plot])
+        for filepath in new_files:
+            process_str = 'Processing incomming file: ' + str(os.path.split(filepath)[1])
+            self.main_frame.setStatus(process_str, 0)
 
-            self.old_dir_list_dict.update(diff_list)
+            if self._fileTypeIsCompatible(filepath):
+                print(process_str)
+                files_to_plot.append(filepath)
 
+        if len(files_to_plot) > 0:
+            mainworker_cmd_queue.put(['plot', files_to_plot])
 
     def _fileTypeIsCompatible(self, path):
         root, ext = os.path.splitext(path)
@@ -3934,16 +3872,8 @@ class OnlineController(object):
             return False
 
     def updateSkipList(self, file_list):
-        dir_list_dict = {}
-
-        for each_file in file_list:
-            dir_list_dict[each_file] = (os.path.getmtime(os.path.join(self.seek_dir, each_file)),
-                os.path.getsize(os.path.join(self.seek_dir, each_file)))
-
-        diff_list = list(set(dir_list_dict.items()) - set(self.old_dir_list_dict.items()))
-        diff_list.sort(key = lambda name: name[0])
-
-        self.old_dir_list_dict.update(diff_list)
+        if self.watcher is not None:
+            self.watcher.skip(file_list)
 
 class OnlineSECController(object):
     def __init__(self, parent, raw_settings):
@@ -4571,7 +4501,12 @@ class MainWorkerThread(threading.Thread):
                         save_path = self._raw_settings.get('ProcessedFilePath')
 
                         try:
-                            self._saveSASM(sasm, '.dat', save_path)
+                            if self._raw_settings.get('AutoSaveProcessedCollection'):
+                                collection = self._raw_settings.get('ProcessedCollectionName')
+                            else:
+                                collection = None
+
+                            self._saveSASM(sasm, '.dat', save_path, collection)
                         except IOError as e:
                             self._raw_settings.set('AutoSaveOnImageFiles', False)
                             do_auto_save = False
@@ -4968,6 +4903,7 @@ class MainWorkerThread(threading.Thread):
 
         threshold = self._raw_settings.get('secCalcThreshold')
         error_weight = self._raw_settings.get('errorWeight')
+        n_proc = self._raw_settings.get('secCalcNProcs')
         sim_threshold = self._raw_settings.get('similarityThreshold')
         sim_test = self._raw_settings.get('similarityTest')
         correction = self._raw_settings.get('similarityCorrection')
@@ -5264,13 +5200,13 @@ class MainWorkerThread(threading.Thread):
             success, results = SASCalc.run_secm_calcs(bl_sasms,
                 baseline_use_subtracted_sasms, window_size, is_protein, error_weight,
                 vp_density, vp_cutoff, vp_qmax, vc_cutoff, vc_qmax, vc_a_prot,
-                vc_b_prot, vc_a_rna, vc_b_rna)
+                vc_b_prot, vc_a_rna, vc_b_rna, n_proc=n_proc)
 
         else:
             success, results = SASCalc.run_secm_calcs(subtracted_sasm_list,
                 use_subtracted_sasm, window_size, is_protein, error_weight,
                 vp_density, vp_cutoff, vp_qmax, vc_cutoff, vc_qmax, vc_a_prot,
-                vc_b_prot, vc_a_rna, vc_b_rna)
+                vc_b_prot, vc_a_rna, vc_b_rna, n_proc=n_proc)
 
         if not success:
             secm.releaseSemaphore()
@@ -6253,7 +6189,7 @@ class MainWorkerThread(threading.Thread):
             item_colour = RAWGlobals.general_text_color,)
 
 
-    def _saveSASM(self, sasm, filetype = 'dat', save_path = ''):
+    def _saveSASM(self, sasm, filetype = 'dat', save_path = '', collection = None):
 
         if (self.main_frame.OnlineControl.isRunning() and
             save_path == self.main_frame.OnlineControl.getTargetDir()):
@@ -6265,18 +6201,28 @@ class MainWorkerThread(threading.Thread):
         RAWGlobals.save_in_progress = True
         wx.CallAfter(self.main_frame.setStatus, 'Saving dat item(s)', 0)
 
-        newext = filetype
+        if collection is None:
+            newext = filetype
 
-        filename = sasm.getParameter('filename')
-        check_filename, ext = os.path.splitext(filename)
-        check_filename = check_filename + newext
+            filename = sasm.getParameter('filename')
+            check_filename, ext = os.path.splitext(filename)
+            check_filename = check_filename + newext
+
+        else:
+            # The profile is added to a profile collection file instead
+            check_filename = collection
 
-        filepath = os.path.join(save_path, check_filename)
-        # file_exists = os.path.isfile(filepath)
         filepath = save_path
 
         try:
-            SASFileIO.saveMeasurement(sasm, filepath, self._raw_settings, filetype = newext)
+            if collection is None:
+                SASFileIO.saveMeasurement(sasm, filepath, self._raw_settings, filetype = newext)
+            else:
+                if not isinstance(sasm, list):
+                    sasm = [sasm]
+
+                SASFileIO.save_profile_collection(os.path.join(save_path,
+                    collection), sasm)
         except SASExceptions.HeaderSaveError:
             wx.CallAfter(self._showSaveError, 'header')
         except Exception as e:
@@ -39,6 +39,7 @@ import tempfile
 import traceback
 import copy
 import threading
+import multiprocessing
 import queue
 import logging
 import time
@@ -54,6 +55,7 @@ if raw_path not in os.sys.path:
 import bioxtasraw.SASCalc as SASCalc
 import bioxtasraw.SASExceptions as SASExceptions
 import bioxtasraw.SASFileIO as SASFileIO
+import bioxtasraw.SASFileWatcher as SASFileWatcher
 import bioxtasraw.SASMask as SASMask
 import bioxtasraw.SASM as SASM
 import bioxtasraw.SASProc as SASProc
@@ -129,7 +131,7 @@ def load_settings(file, settings=None):
 
     return settings
 
-def load_files(filename_list, settings, return_all_images=False):
+def load_files(filename_list, settings, return_all_images=False, n_proc=1):
     """
     Loads all types of files that RAW knows how to load. If images are
     included in the list, then the images are radially averaged as part
@@ -146,7 +148,16 @@ def load_files(filename_list, settings, return_all_images=False):
     return_all_images: bool
         If True, all loaded images are returned. If false, only the first loaded
         image of the last file is returned. Useful for minimizing memory use
-        if loading and processing a large number of images. False by default.
+        if loading and processing a large number of images. Frames of
+        multi-frame files are read as they are integrated, so with this
+        set to False the whole file is never in memory. False by default.
+    n_proc: int
+        The number of processes to use to load the files. If greater than 1,
+        files are loaded in parallel on a process pool, with the settings sent
+        to each worker process once. Profiles are returned in the same order
+        as the input files. If return_all_images is False, images are dropped
+        in the worker processes, so only the first image of each file is sent
+        back. Default is 1, which loads files sequentially in this process.
 
     Returns
     -------
@@ -161,6 +172,14 @@ def load_files(filename_list, settings, return_all_images=False):
         loaded in.
     img_list: list
         A list of individual images (:class:`numpy.array`) loaded in.
+
+    Raises
+    ------
+    SASExceptions.FileLoadError
+        If any of the files could not be loaded. All files are still
+        attempted, and the exception lists the error for each file that
+        failed. The errors attribute of the exception is a list of
+        (filename, error message) tuples.
     """
 
     if not isinstance(filename_list, list):
@@ -171,70 +190,157 @@ def load_files(filename_list, settings, return_all_images=False):
     series_list = []
     img_list = []
 
-    for filename in filename_list:
-        filename = os.path.abspath(os.path.expanduser(filename))
+    filename_list = [os.path.abspath(os.path.expanduser(filename))
+        for filename in filename_list]
 
-        file_ext = os.path.splitext(filename)[1]
+    n_proc = min(n_proc, len(filename_list))
 
-        is_profile = False
+    load_errors = []
 
-        if file_ext == '.sec':
-            secm = SASFileIO.loadSeriesFile(filename, settings)
-            series_list.append(secm)
+    if n_proc > 1:
+        chunksize = max(len(filename_list)//(n_proc*4), 1)
 
-        elif file_ext == '.ift' or file_ext == '.out':
-            iftm, img = SASFileIO.loadFile(filename, settings, return_all_images=False)
+        with multiprocessing.Pool(n_proc, initializer=_init_load_worker,
+            initargs=(settings, return_all_images)) as mp_pool:
 
-            if isinstance(iftm, list):
-                ift_list.append(iftm[0])
+            results = mp_pool.imap(_load_file_worker, filename_list, chunksize)
 
-        elif file_ext == '.hdf5':
-            try:
-                secm = SASFileIO.loadSeriesFile(filename, settings)
-                series_list.append(secm)
-            except Exception:
-                is_profile = True
+            for filename, (loaded, error) in zip(filename_list, results):
+                if error is not None:
+                    load_errors.append((filename, error))
+                else:
+                    _add_loaded_file(loaded, profile_list, ift_list,
+                        series_list, img_list, return_all_images)
 
-        else:
+    else:
+        for filename in filename_list:
+            loaded, error = _try_load_file(filename, settings,
+                return_all_images)
+
+            if error is not None:
+                load_errors.append((filename, error))
+            else:
+                _add_loaded_file(loaded, profile_list, ift_list, series_list,
+                    img_list, return_all_images)
+
+    if len(load_errors) > 0:
+        msg = ('The following files could not be loaded:\n'
+            + '\n'.join(['{}: {}'.format(fname, err) for fname, err
+            in load_errors]))
+        raise SASExceptions.FileLoadError(msg, load_errors)
+
+    return profile_list, ift_list, series_list, img_list
+
+def _load_file(filename, settings, return_all_images):
+    """
+    Loads a single file for load_files. Returns lists of the profiles,
+    ifts, and series loaded, and either a list of the images loaded or
+    None if the file wasn't an image.
+    """
+    file_ext = os.path.splitext(filename)[1]
+
+    is_profile = False
+
+    profiles = []
+    ifts = []
+    series = []
+    imgs = None
+
+    if file_ext == '.sec':
+        secm = SASFileIO.loadSeriesFile(filename, settings)
+        series.append(secm)
+
+    elif file_ext == '.ift' or file_ext == '.out':
+        iftm, img = SASFileIO.loadFile(filename, settings, return_all_images=False)
+
+        if isinstance(iftm, list):
+            ifts.append(iftm[0])
+
+    elif file_ext == '.hdf5' and SASFileIO.is_profile_collection(filename):
+        is_profile = True
+
+    elif file_ext == '.hdf5':
+        try:
+            secm = SASFileIO.loadSeriesFile(filename, settings)
+            series.append(secm)
+        except Exception:
             is_profile = True
 
-        if is_profile:
-            sasm, img = SASFileIO.loadFile(filename, settings,
-                return_all_images=return_all_images)
+    else:
+        is_profile = True
 
-            if img is not None:
-                start_point = settings.get('StartPoint')
-                end_point = settings.get('EndPoint')
+    if is_profile:
+        sasm, img = SASFileIO.loadFile(filename, settings,
+            return_all_images=return_all_images)
 
-                if not isinstance(sasm, list):
-                    qrange = (start_point, len(sasm.getRawQ())-end_point)
-                    sasm.setQrange(qrange)
-                else:
-                    qrange = (start_point, len(sasm[0].getRawQ())-end_point)
-                    for each_sasm in sasm:
-                        each_sasm.setQrange(qrange)
-
-                if isinstance(img, list):
-                    if not return_all_images and len(img_list) == 0:
-                        img_list.append(img[0])
-                    elif not return_all_images:
-                        img_list[0] = img[0]
-                    else:
-                        img_list.extend(img)
-                else:
-                    if not return_all_images and len(img_list) == 0:
-                        img_list.append(img)
-                    elif not return_all_images:
-                        img_list[0] = img
-                    else:
-                        img_list.append(img)
+        if img is not None:
+            start_point = settings.get('StartPoint')
+            end_point = settings.get('EndPoint')
 
-            if isinstance(sasm, list):
-                profile_list.extend(sasm)
+            if not isinstance(sasm, list):
+                qrange = (start_point, len(sasm.getRawQ())-end_point)
+                sasm.setQrange(qrange)
             else:
-                profile_list.append(sasm)
+                qrange = (start_point, len(sasm[0].getRawQ())-end_point)
+                for each_sasm in sasm:
+                    each_sasm.setQrange(qrange)
 
-    return profile_list, ift_list, series_list, img_list
+            if not isinstance(img, list):
+                img = [img]
+
+            if not return_all_images:
+                img = img[:1]
+
+            imgs = img
+
+        if isinstance(sasm, list):
+            profiles.extend(sasm)
+        else:
+            profiles.append(sasm)
+
+    return profiles, ifts, series, imgs
+
+def _add_loaded_file(loaded, profile_list, ift_list, series_list, img_list,
+    return_all_images):
+    profiles, ifts, series, imgs = loaded
+
+    profile_list.extend(profiles)
+    ift_list.extend(ifts)
+    series_list.extend(series)
+
+    if imgs is not None:
+        if not return_all_images and len(img_list) == 0:
+            img_list.append(imgs[0])
+        elif not return_all_images:
+            img_list[0] = imgs[0]
+        else:
+            img_list.extend(imgs)
+
+# Settings for the load_files worker processes, set once per process by
+# _init_load_worker rather than sent with every file.
+_load_worker_args = {}
+
+def _init_load_worker(settings, return_all_images):
+    _load_worker_args['settings'] = settings
+    _load_worker_args['return_all_images'] = return_all_images
+
+def _load_file_worker(filename):
+    return _try_load_file(filename, _load_worker_args['settings'],
+        _load_worker_args['return_all_images'])
+
+def _try_load_file(filename, settings, return_all_images):
+    """
+    Loads a single file for load_files, returning the loaded data and None,
+    or None and the error message if it couldn't be loaded.
+    """
+    try:
+        loaded = _load_file(filename, settings, return_all_images)
+        error = None
+    except Exception as e:
+        loaded = None
+        error = '{}: {}'.format(type(e).__name__, e)
+
+    return loaded, error
 
 def load_profiles(filename_list, settings=None):
     """
@@ -401,7 +507,55 @@ def load_images(filename_list, settings, frame_num=None):
 
     return img_list, imghdr_list
 
-def load_and_integrate_images(filename_list, settings, return_all_images=False):
+def iter_images(filename_list, settings):
+    """
+    Loads in image files one frame at a time. This is a generator that
+    yields each frame of each file in turn. Frames are read from the
+    files as they are needed, so multi-frame files (such as Eiger HDF5
+    files) can be processed without loading every frame into memory.
+    For example::
+
+        for img, imghdr in raw.iter_images(filenames, settings):
+            process(img)
+
+    Parameters
+    ----------
+    filename_list: list
+        A list of strings containing the full path to each file to be
+        loaded in.
+    settings: :class:`bioxtasraw.RAWSettings.RAWSettings`
+        The RAW settings to be used when loading in the files, such as the
+        image format and detector orientation.
+
+    Yields
+    ------
+    img: :class:`numpy.array`
+        An individual image. This is the same as what is returned by
+        :py:func:`load_images`.
+    imghdr: dict
+        The image header values associated with the image.
+
+    Raises
+    ------
+    SASExceptions.WrongImageFromat
+        If you load in an image that RAW can't read. This could be an error
+        with your settings, or it could fundamentally be an unreadable image
+        type, either due to it being an unknown format or the image being
+        corrupted.
+    """
+    for filename in filename_list:
+        filename = os.path.abspath(os.path.expanduser(filename))
+
+        num_frames, frames = SASFileIO.loadImageFrames(filename, settings)
+
+        for img, imghdr in frames:
+            if img is None:
+                raise SASExceptions.WrongImageFormat('not a valid file!')
+
+            yield img, imghdr
+
+def load_and_integrate_images(filename_list, settings, return_all_images=False,
+    n_proc=1):
     """
     Loads in image files and radially averages them into 1D scattering
     profiles. This is a convenience wrapper for :py:func:`load_files` that
@@ -418,7 +572,16 @@ def load_and_integrate_images(filename_list, settings, return_all_images=False):
     return_all_images: bool
         If True, all loaded images are returned. If false, only the first loaded
         image of the last file is returned. Useful for minimizing memory use
-        if loading and processing a large number of images. False by default.
+        if loading and processing a large number of images. Frames of
+        multi-frame files are read as they are integrated, so with this
+        set to False the whole file is never in memory. False by default.
+    n_proc: int
+        The number of processes to use to load the files. If greater than 1,
+        files are loaded in parallel on a process pool, with the settings sent
+        to each worker process once. Profiles are returned in the same order
+        as the input files. If return_all_images is False, images are dropped
+        in the worker processes, so only the first image of each file is sent
+        back. Default is 1, which loads files sequentially in this process.
 
     Returns
     -------
@@ -428,12 +591,97 @@ def load_and_integrate_images(filename_list, settings, return_all_images=False):
         images.
     img_list: list
         A list of individual images (:class:`numpy.array`) loaded in.
+
+    Raises
+    ------
+    SASExceptions.FileLoadError
+        If any of the files could not be loaded. All files are still
+        attempted, and the exception lists the error for each file that
+        failed.
     """
     profile_list, iftm_list, secm_list, img_list = load_files(filename_list,
-        settings, return_all_images)
+        settings, return_all_images, n_proc)
 
     return profile_list, img_list
 
+def watch_directory(directory, settings=None, poll_interval=0.5,
+    use_inotify=True, settle_time=0., include_modified=False,
+    abort_event=None):
+    """
+    Watches a directory for new files, like RAW's online mode. This is a
+    generator that yields a list of new files each time new files have
+    finished writing to the directory. Files already in the directory when
+    watching starts are not returned. On Linux inotify is used to find new
+    files, and the directory is also rescanned every couple of seconds to
+    find files inotify doesn't see, such as files written by other machines
+    on network filesystems. Otherwise the directory is rescanned, checking
+    only new files. For example::
+
+        for new_files in raw.watch_directory(data_dir, settings):
+            profiles, imgs = raw.load_and_integrate_images(new_files, settings)
+
+    Parameters
+    ----------
+    directory: str
+        The directory to watch.
+    settings: :class:`bioxtasraw.RAWSettings.RAWSettings`, optional
+        The RAW settings. If provided and online filtering is enabled in the
+        settings, the online mode filters ('OnlineFilterList') are applied to
+        the new files. Only files with extensions in the 'CompatibleFormats'
+        setting are returned.
+    poll_interval: float, optional
+        How often, in seconds, to check for new files.
+    use_inotify: bool, optional
+        Whether to use inotify when it is available. Files written by other
+        machines on network filesystems are still found by rescanning the
+        directory, but inotify gives no benefit there, so it can be set to
+        False. Default is True.
+    settle_time: float, optional
+        When rescanning the directory, the minimum time in seconds that a new
+        file's size must be unchanged before it is returned. Files are always
+        unchanged for at least one poll interval before being returned.
+    include_modified: bool, optional
+        If True, files that have already been returned and are then rewritten
+        are returned again. With inotify these are found from the write
+        events. Otherwise every file in the directory is checked for changes
+        every 30 seconds. Default is False.
+    abort_event: :class:`threading.Event`, optional
+        A :class:`threading.Event` or :class:`multiprocessing.Event`. If this
+        event is set, watching stops and the generator returns.
+
+    Yields
+    ------
+    new_files: list
+        A list of the full paths of the new files, sorted by name.
+    """
+    if settings is None:
+        settings = __default_settings
+
+    if abort_event is None:
+        abort_event = threading.Event()
+
+    watcher = SASFileWatcher.FileWatcher(directory,
+        settings.get('OnlineFilterList'), settings.get('EnableOnlineFiltering'),
+        settings.get('CompatibleFormats'), use_inotify, settle_time,
+        include_modified)
+
+    watcher.start()
+
+    try:
+        while not abort_event.is_set():
+            new_files, modified_files = watcher.check()
+
+            if include_modified:
+                new_files = sorted(new_files + modified_files)
+
+            if len(new_files) > 0:
+                yield new_files
+
+            abort_event.wait(poll_interval)
+
+    finally:
+        watcher.stop()
+
 def load_workspace(filename_list, settings=None):
     """
     Loads in profiles, IFTs, and series saved in a RAW workspace.
@@ -687,9 +935,11 @@ def make_profile(q, i, err, name, q_err=None):
 
     return profile
 
-def save_profile(profile, fname=None, datadir='.', settings=None):
+def save_profile(profile, fname=None, datadir='.', settings=None,
+    save_queue=None, collection=None):
     """
-    Saves an individual profile as a .dat file.
+    Saves an individual profile as a .dat file, or adds it to a profile
+    collection file.
 
     Parameters
     ----------
@@ -705,6 +955,16 @@ def save_profile(profile, fname=None, datadir='.', settings=None):
     settings: :class:`bioxtasraw.RAWSettings.RAWSettings`, optional
         The RAW settings to be used when saving, which contain settings for
         how to write the output .dat file.
+    save_queue: :class:`bioxtasraw.SASFileIO.ProfileSaveQueue`, optional
+        If provided, the profile is added to the queue and saved in the
+        background, and this function returns without waiting for the file
+        to be written. Use the queue's join method to wait for the saves to
+        finish, and its errors attribute to check for failed saves.
+    collection: str, optional
+        The filename, without the directory path, of a profile collection
+        .hdf5 file. If provided, the profile is added to that file in
+        datadir (which is created if it doesn't exist) instead of being
+        saved as a .dat file. See :py:func:`save_profile_collection`.
     """
     logger.debug('In save profile')
     if settings is None:
@@ -718,10 +978,115 @@ def save_profile(profile, fname=None, datadir='.', settings=None):
     logger.debug('setting path')
     savepath = os.path.abspath(os.path.expanduser(datadir))
     logger.debug('saving')
-    SASFileIO.saveMeasurement(profile, savepath, settings)
+
+    if save_queue is not None:
+        save_queue.put(profile, savepath, settings, collection=collection)
+    elif collection is not None:
+        SASFileIO.save_profile_collection(os.path.join(savepath, collection),
+            [profile])
+    else:
+        SASFileIO.saveMeasurement(profile, savepath, settings)
+
     logger.debug('done saving profile')
 
 
+def save_profile_collection(profiles, fname, datadir='.'):
+    """
+    Saves profiles into a single profile collection .hdf5 file, rather than
+    as individual .dat files. If the file already exists, the profiles are
+    added to it. Profiles in the collection are stored by name (the
+    profile filename), and can be loaded individually with
+    :py:func:`load_profile_collection`, all together with
+    :py:func:`load_profiles`, or saved as .dat files with
+    :py:func:`export_profile_collection`.
+
+    Parameters
+    ----------
+    profiles: list
+        A list of individual scattering profiles
+        (:class:`bioxtasraw.SASM.SASM`) to be saved.
+    fname: str
+        The collection filename, without the directory path.
+    datadir: str, optional
+        The directory of the collection file. If no directory is provided,
+        the current directory is used.
+
+    Returns
+    -------
+    names: list
+        The names the profiles were saved with in the collection. If a
+        profile with the same name is already in the file, _2, _3, etc. is
+        added to the name, before the extension.
+    """
+    if not isinstance(profiles, list):
+        profiles = [profiles]
+
+    savepath = os.path.abspath(os.path.expanduser(os.path.join(datadir, fname)))
+
+    names = SASFileIO.save_profile_collection(savepath, profiles)
+
+    return names
+
+def load_profile_collection(filename, names=None):
+    """
+    Loads profiles from a profile collection file. Only the requested
+    profiles are read from the file.
+
+    Parameters
+    ----------
+    filename: str
+        The full path to the collection file.
+    names: list, optional
+        The names of the profiles to load. If not provided, all profiles are
+        loaded, in the order they were saved.
+
+    Returns
+    -------
+    profile_list: list
+        A list of individual scattering profiles
+        (:class:`bioxtasraw.SASM.SASM`).
+    """
+    filename = os.path.abspath(os.path.expanduser(filename))
+
+    profile_list = SASFileIO.load_profile_collection(filename, names)
+
+    return profile_list
+
+def export_profile_collection(filename, datadir='.', names=None,
+    settings=None):
+    """
+    Saves profiles from a profile collection file as individual .dat files.
+
+    Parameters
+    ----------
+    filename: str
+        The full path to the collection file.
+    datadir: str, optional
+        The directory to save the .dat files in. If no directory is
+        provided, the current directory is used.
+    names: list, optional
+        The names of the profiles to export. If not provided, all profiles
+        are exported.
+    settings: :class:`bioxtasraw.RAWSettings.RAWSettings`, optional
+        The RAW settings to be used when saving, which contain settings for
+        how to write the output .dat files.
+
+    Returns
+    -------
+    names: list
+        The names of the exported profiles.
+    """
+    if settings is None:
+        settings = __default_settings
+
+    filename = os.path.abspath(os.path.expanduser(filename))
+    savepath = os.path.abspath(os.path.expanduser(datadir))
+
+    names = SASFileIO.export_profile_collection(filename, savepath, settings,
+        names)
+
+    return names
+
 def save_ift(ift, fname=None, datadir='.'):
     """
     Saves an individual ift as a .out (GNOM) or .ift (BIFT) file.
@@ -752,7 +1117,7 @@ def save_ift(ift, fname=None, datadir='.'):
     savepath = os.path.abspath(os.path.expanduser(datadir))
     SASFileIO.saveMeasurement(ift, savepath, settings, filetype=newext)
 
-def save_series(series, fname=None, datadir='.'):
+def save_series(series, fname=None, datadir='.', columnar=False):
     """
     Saves an individual series as a .hdf5 file.
 
@@ -767,6 +1132,15 @@ def save_series(series, fname=None, datadir='.'):
     datadir: str, optional
         The directory to save the profile in. If no directory is provided,
         the current directory is used.
+    columnar: bool, optional
+        If True, each set of profiles in the series (unsubtracted,
+        subtracted, baseline corrected) is saved as single compressed
+        intensity and uncertainty datasets with a shared q vector and a
+        table of per-profile metadata, instead of as a dataset per profile.
+        This is much faster to save and load for long series, and when
+        loaded the individual profiles are only created when they are
+        accessed. These files can only be read by versions of RAW that
+        support the columnar layout. Defaults to False.
     """
     if fname is not None:
         series = copy.deepcopy(series)
@@ -779,7 +1153,7 @@ def save_series(series, fname=None, datadir='.'):
     datadir = os.path.abspath(os.path.expanduser(datadir))
     savepath = os.path.join(datadir, fname)
 
-    SASFileIO.save_series(savepath, series)
+    SASFileIO.save_series(savepath, series, columnar=columnar)
 
 def save_settings(settings, fname, datadir='.'):
     """
@@ -2394,7 +2768,7 @@ def auto_dmax(profile, dmax_thresh=0.01, dmax_low_bound=0.5, dmax_high_bound=1.5
 def bift(profile, idx_min=None, idx_max=None, pr_pts=100, alpha_min=150,
     alpha_max=1e10, alpha_pts=16, dmax_min=10, dmax_max=400, dmax_pts=10,
     mc_runs=300, use_guinier_start=True, single_proc=True, nprocs=None,
-    settings=None):
+    settings=None, engine=None, solver='iterative'):
     """
     Calculates the Bayesian indirect Fourier transform (BIFT) of a scattering
     profile to generate a P(r) function and determine the maximum dimension
@@ -2466,6 +2840,22 @@ def bift(profile, idx_min=None, idx_max=None, pr_pts=100, alpha_min=150,
         pr_Pts, alpha_min, alpha_max, alpha_pts, dmax_min, dmax_max, dmax_pts,
         and mc_runs parameters will be overridden with the values in the
         settings. Default is None.
+    engine: :class:`bioxtasraw.BIFT.BiftEngine`, optional
+        A BIFT process pool to use for the calculation. If provided, the
+        single_proc and nprocs parameters are ignored. Creating one engine
+        and using it for many BIFT calculations avoids starting a new set
+        of processes for each calculation. The engine is not closed by this
+        function. Default is None.
+    solver: {'iterative', 'direct'} str, optional
+        The method used to find the P(r) function for each alpha and Dmax.
+        'iterative' is the standard BIFT iteration. 'direct' solves for the
+        self consistent P(r) function and smoothness prior directly, which
+        is typically several times faster. For any alpha and Dmax where the
+        direct solution doesn't converge, the iterative method is used
+        instead. The direct method also converges for some alpha and Dmax
+        values where the iterative method doesn't, so results can differ
+        for poor quality data. It should be considered experimental.
+        Default is 'iterative'.
 
     Returns
     -------
@@ -2548,6 +2938,8 @@ def bift(profile, idx_min=None, idx_max=None, pr_pts=100, alpha_min=150,
         'mc_runs'   : mc_runs,
         'single_proc' : single_proc,
         'nprocs'    : nprocs,
+        'engine'    : engine,
+        'solver'    : solver,
         }
 
     ift = BIFT.doBift(q, i, err, filename, **bift_settings)
@@ -2764,6 +3156,218 @@ def denss_ift(profile, dmax=None, alpha=None, extrapolate=True, idx_min=None, id
 
     return (ift, dmax, rg, i0, rg_err, i0_err, chi_sq, alpha)
 
+def batch_ift(profiles, method='bift', profile_type='sub', framei=None,
+    framef=None, n_proc=1, engine=None, settings=None, ift_settings=None,
+    seed=None):
+    """
+    Calculates the indirect Fourier transform (IFT) of many scattering
+    profiles, such as every frame across an elution peak in a series. The
+    profiles are distributed across a pool of worker processes, with each
+    IFT run on a single process. Each profile gets its own random number
+    seed, spawned from the seed argument, so the random parts of the
+    calculation (such as the BIFT Monte Carlo error estimate) are
+    independent for each profile and don't depend on n_proc or which
+    process runs the IFT.
+
+    Parameters
+    ----------
+    profiles: list or :class:`bioxtasraw.SECM.SECM`
+        The input profiles. It should either be a list of individual
+        scattering profiles (:class:`bioxtasraw.SASM.SASM`) or a single series
+        object (:class:`bioxtasraw.SECM.SECM`).
+    method: {'bift', 'denss'} str, optional
+        The IFT method to use, either BIFT (:py:func:`bift`) or DENSS
+        (:py:func:`denss_ift`). Default is 'bift'.
+    profile_type: {'unsub', 'sub', 'baseline'} str, optional
+        Only used if a :class:`bioxtasraw.SECM.SECM` is provided for the
+        profiles argument. Determines which type of profile to use from the
+        series. Unsubtracted profiles - 'unsub', subtracted profiles - 'sub',
+        baseline corrected profiles - 'baseline'.
+    framei: int, optional
+        The initial frame of the series (or index in the list of profiles)
+        to use. If not provided, it defaults to the first frame.
+    framef: int, optional
+        The final frame of the series (or index in the list of profiles) to
+        use, inclusive. If not provided, it defaults to the last frame.
+    n_proc: int, optional
+        The number of processes to use. If greater than 1, a process pool is
+        created for the calculation and closed at the end. Default is 1, which
+        runs the IFTs sequentially in this process.
+    engine: :class:`bioxtasraw.BIFT.BiftEngine`, optional
+        An existing pool of worker processes to run the IFTs on. If provided,
+        n_proc is ignored. The engine is not closed by this function, so it
+        can be reused for further batches.
+    settings: :class:`bioxtasraw.RAWSettings.RAWSettings`, optional
+        RAW settings containing relevant parameters. If provided, it is
+        passed to :py:func:`bift` or :py:func:`denss_ift` for each profile.
+        Default is None.
+    ift_settings: dict, optional
+        Additional keyword arguments for :py:func:`bift` or
+        :py:func:`denss_ift`, such as {'mc_runs': 100} or {'dmax': 100}.
+        The single_proc, nprocs, and engine arguments are not allowed, as
+        each IFT is run on a single process.
+    seed: int, optional
+        The seed used to generate the random number seed for each profile.
+        Running the same batch with the same seed gives the same results.
+        If not provided, fresh seeds are generated for each call.
+
+    Returns
+    -------
+    ifts: list
+        A list of the :class:`bioxtasraw.SASM.IFTM` calculated for each
+        profile. The entry is None for any profile where the IFT failed,
+        including if it raised an error. The error is logged as a warning.
+    summary: :class:`numpy.array`
+        An N x 3 array of the Dmax, real space Rg, and real space I(0) for
+        each of the N profiles. Values are -1 for any profile where the IFT
+        failed.
+
+    Raises
+    ------
+    SASExceptions.DataNotCompatible
+        If method is not 'bift' or 'denss', or the frame range is not
+        valid for the series.
+    ValueError
+        If ift_settings contains the single_proc, nprocs, or engine
+        arguments.
+    """
+    if method not in ['bift', 'denss']:
+        raise SASExceptions.DataNotCompatible(('IFT method must be either '
+            '"bift" or "denss", not "{}".'.format(method)))
+
+    if ift_settings is None:
+        ift_settings = {}
+
+    bad_keys = [key for key in ['single_proc', 'nprocs', 'engine']
+        if key in ift_settings]
+
+    if len(bad_keys) > 0:
+        raise ValueError(('ift_settings cannot contain {}, as each IFT is run '
+            'on a single process. Use the n_proc or engine arguments '
+            'instead.'.format(', '.join(bad_keys))))
+
+    if isinstance(profiles, SECM.SECM):
+        if framei is None:
+            framei = 0
+        if framef is None:
+            framef = len(profiles.getAllSASMs())-1
+
+        sasm_list = profiles.getSASMList(framei, framef, profile_type)
+
+    else:
+        if framei is None:
+            framei = 0
+        if framef is None:
+            framef = len(profiles)-1
+
+        sasm_list = profiles[framei:framef+1]
+
+    ifts = [None for sasm in sasm_list]
+    summary = -1*np.ones((len(sasm_list), 3))
+
+    # Forked worker processes all start with the same random state, so each
+    # profile is given its own seed instead
+    seeds = [int(child.generate_state(1)[0]) for child in
+        np.random.SeedSequence(seed).spawn(len(sasm_list))]
+
+    if engine is not None or (n_proc > 1 and len(sasm_list) > 1):
+        # Send copies without plot references, which don't pickle
+        work_list = []
+
+        for index, sasm in enumerate(sasm_list):
+            work_sasm = sasm.copy_no_metadata()
+            work_sasm.setParameter('analysis',
+                copy.deepcopy(sasm.getParameter('analysis')))
+
+            work_list.append((index, work_sasm, method, settings,
+                ift_settings, seeds[index]))
+
+        own_engine = engine is None
+
+        if own_engine:
+            engine = BIFT.BiftEngine(min(n_proc, len(work_list)))
+
+        try:
+            worker_results = engine.imap(_batch_ift_worker, work_list)
+
+            for index, results, analysis, error in worker_results:
+                sasm = sasm_list[index]
+
+                if error is not None:
+                    _log_batch_ift_error(sasm, error)
+
+                if results[0] is not None:
+                    ifts[index] = results[0]
+                    summary[index] = results[1:4]
+
+                    analysis_dict = sasm.getParameter('analysis')
+                    analysis_dict.update(analysis)
+                    sasm.setParameter('analysis', analysis_dict)
+
+        finally:
+            if own_engine:
+                engine.close()
+
+    else:
+        for index, sasm in enumerate(sasm_list):
+            results, error = _batch_ift_inner(sasm, method, settings,
+                ift_settings, seeds[index])
+
+            if error is not None:
+                _log_batch_ift_error(sasm, error)
+
+            if results[0] is not None:
+                ifts[index] = results[0]
+                summary[index] = results[1:4]
+
+    return ifts, summary
+
+def _batch_ift_inner(profile, method, settings, ift_settings, seed):
+    # An error for one profile is treated as a failed IFT, so it doesn't stop
+    # the rest of the batch. The error is returned so it can be reported.
+    # The global random state is restored afterwards, so that a serial batch
+    # doesn't change it for the caller.
+    random_state = np.random.get_state()
+    np.random.seed(seed)
+
+    error = None
+
+    try:
+        if method == 'bift':
+            results = bift(profile, settings=settings, **ift_settings)
+        else:
+            results = denss_ift(profile, settings=settings, **ift_settings)
+    except Exception as e:
+        results = (None, -1, -1, -1)
+        error = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        np.random.set_state(random_state)
+
+    return results, error
+
+def _log_batch_ift_error(profile, error):
+    logger.warning('IFT failed for {}: {}'.format(
+        profile.getParameter('filename'), error))
+
+def _batch_ift_worker(args):
+    index, profile, method, settings, ift_settings, seed = args
+
+    results, error = _batch_ift_inner(profile, method, settings, ift_settings,
+        seed)
+
+    # Send back the results added to the profile analysis dictionary
+    if method == 'bift':
+        key = 'BIFT'
+    else:
+        key = 'denss_ift'
+
+    analysis = {}
+
+    if results[0] is not None:
+        analysis[key] = profile.getParameter('analysis')[key]
+
+    return index, results, analysis, error
+
 def datgnom(profile, rg=None, idx_min=None, idx_max=None, atsas_dir=None,
     use_rg_from='guinier', use_guinier_start=True, cut_8rg=False,
     write_profile=True, datadir=None, filename=None, save_ift=False,
@@ -3338,7 +3942,8 @@ def gnom(profile, dmax, rg=None, idx_min=None, idx_max=None, dmax_zero=True, alp
 
     return ift, dmax, rg, i0, rg_err, i0_err, total_est, chi_sq, alpha, quality
 
-def cormap(profiles, ref_profile=None, correction='Bonferroni', settings=None):
+def cormap(profiles, ref_profile=None, correction='Bonferroni', settings=None,
+    parallel=False):
     """
     Runs the cormap comparison test between the input profiles. If a reference
     profile is provided, then all of the profiles are compared to the reference
@@ -3360,6 +3965,9 @@ def cormap(profiles, ref_profile=None, correction='Bonferroni', settings=None):
         RAW settings containing relevant parameters. If provided, the
         correction parameter will be overridden with the value in the settings.
         Default is None.
+    parallel: bool, optional
+        If True, the comparisons are run in parallel using multiple threads.
+        Default is False.
 
     Returns
     -------
@@ -3386,11 +3994,12 @@ def cormap(profiles, ref_profile=None, correction='Bonferroni', settings=None):
 
     if ref_profile is None:
         (item_data, pvals, corrected_pvals,
-            failed_comparisons) = SASProc.run_cormap_all(profiles, correction)
+            failed_comparisons) = SASProc.run_cormap_all(profiles, correction,
+            parallel)
 
     else:
         pvals, corrected_pvals, failed_comparisons = SASProc.run_cormap_ref(profiles,
-            ref_profile, correction)
+            ref_profile, correction, parallel)
 
     if correction == 'None':
         corrected_pvals = pvals
@@ -5850,7 +6459,8 @@ def pdb2sas(models,
 # Operations on series
 
 
-def svd(series, profile_type='sub', framei=None, framef=None, norm=True):
+def svd(series, profile_type='sub', framei=None, framef=None, norm=True,
+    rank=None):
     """
     Runs singular value decomposition (SVD) on the input series.
 
@@ -5874,6 +6484,11 @@ def svd(series, profile_type='sub', framei=None, framef=None, norm=True):
     norm: bool, optional
         Whether error normalized intensity should be used for EFA. Defaults
         to True. Recommended to not change this.
+    rank: int, optional
+        If provided, only the first rank singular values and vectors are
+        calculated, using a truncated (randomized) SVD. This is much faster
+        and uses much less memory for long series. If not provided (default),
+        the full SVD is calculated.
 
     Returns
     -------
@@ -5928,7 +6543,10 @@ def svd(series, profile_type='sub', framei=None, framef=None, norm=True):
         raise SASExceptions.EFAError(('Initial SVD matrix contained nans or '
             'infinities. SVD could not be carried out'))
 
-    svd_U, svd_s, svd_Vt = np.linalg.svd(D, full_matrices = True)
+    if rank is None:
+        svd_U, svd_s, svd_Vt = np.linalg.svd(D, full_matrices = True)
+    else:
+        svd_U, svd_s, svd_Vt = SASCalc.randomizedSVD(D, rank)
 
     svd_V = svd_Vt.T
 
@@ -5937,7 +6555,7 @@ def svd(series, profile_type='sub', framei=None, framef=None, norm=True):
 def regals(series, comp_settings, profile_type='sub', framei=None,
     framef=None, x_vals=None, min_iter=25, max_iter=1000, tol=0.0001,
     conv_type='Chi^2', use_previous_results=False,
-    previous_results=None):
+    previous_results=None, in_place=False):
     """
     Runs regularized alternating least squares (REGALS) on the input series to
     deconvolve overlapping components in the data.
@@ -6014,6 +6632,14 @@ def regals(series, comp_settings, profile_type='sub', framei=None,
         The mixture output from a previous REGALS run, which will be used as
         the initial profile and concentration vectors for this REGALS run. Only
         used of use_previous_results is True.
+    in_place: bool, optional
+        If True, the REGALS iterations update the mixture in place and reuse
+        the linear systems set up on the first iteration, rather than copying
+        the mixture and building and solving new sparse systems each
+        iteration. This is significantly faster for long series or large
+        numbers of iterations, and gives the same result to within numerical
+        precision. If previous_results is provided it is not modified.
+        Defaults to False.
 
     Returns
     -------
@@ -6048,13 +6674,13 @@ def regals(series, comp_settings, profile_type='sub', framei=None,
     (regals_profiles, regals_ifts, concs, reg_concs, mixture, params,
         residual) = SASCalc.run_full_regals(series, comp_settings, profile_type,
         framei, framef, x_vals, min_iter, max_iter, tol, conv_type,
-        use_previous_results, previous_results)
+        use_previous_results, previous_results, in_place)
 
     return regals_profiles, regals_ifts, concs, reg_concs, mixture, params, residual
 
 def efa(series, ranges, profile_type='sub', framei=None, framef=None,
     method='Hybrid', niter=1000, tol=1e-12, norm=True, force_positive=None,
-    previous_results=None):
+    previous_results=None, efa_svs=None):
     """
     Runs evolving factor analysis (EFA) on the input series to deconvolve
     overlapping elution peaks in the data.
@@ -6083,9 +6709,11 @@ def efa(series, ranges, profile_type='sub', framei=None, framef=None,
     framef: int, optional
         The final frame in the series to use for EFA. If not provided, it
         defaults to the last frame in the series.
-    method: {'Hybrid', 'Iterative', 'Explicit'} str, optional
+    method: {'Hybrid', 'Iterative', 'Explicit', 'Accelerated'} str, optional
         Sets the method used for the EFA rotation step as either 'Hybrid',
-        'Iterative', or 'Explicit'.
+        'Iterative', 'Explicit', or 'Accelerated'. 'Accelerated' is the
+        same as 'Hybrid', but uses Anderson acceleration of the iterations,
+        which typically converges in many fewer iterations.
     niter: int, optional
         The maximum number of iterations to use for the rotation in either
         hybrid or iterative mode. Defaults to 1000. Can be increased if
@@ -6110,6 +6738,12 @@ def efa(series, ranges, profile_type='sub', framei=None, framef=None,
         is a dictionary of the previous results, corresponding to the
         rotation_data dictionary returned by this function. Defaults to None,
         which should be used if no previous results are available.
+    efa_svs: int, optional
+        If provided, the forward and backward EFA singular values are also
+        calculated for the first efa_svs singular values, and returned in the
+        conv_data dictionary. They are calculated incrementally, with the
+        forward and backward passes run concurrently with the rotation.
+        Defaults to None, where they are not calculated.
 
     Returns
     -------
@@ -6127,7 +6761,10 @@ def efa(series, ranges, profile_type='sub', framei=None, framef=None,
         carried out during the rotation, if available; 'final_step' - The
         value of the convergence criteria in the final iteration step, if
         available; 'options' - A dictionary containing the input convergence
-        options; 'failed' - A bool indicating if convergence failed.
+        options; 'failed' - A bool indicating if convergence failed. If
+        efa_svs is provided, also contains 'forward_efa' and 'backward_efa',
+        numpy arrays of the forward and backward EFA singular values, where
+        the first axis is singular value number and the second axis is frame.
     rotation_data: dict
         A dictionary containing the rotation results, if available. If the
         rotation failed to converge, the dictionary is empty. Keys are:
@@ -6148,14 +6785,14 @@ def efa(series, ranges, profile_type='sub', framei=None, framef=None,
 
     efa_profiles, converged, conv_data, rotation_data = SASCalc.run_full_efa(series,
         ranges, profile_type, framei, framef, method, niter, tol, norm,
-        force_positive, previous_results)
+        force_positive, previous_results, efa_svs)
 
     return efa_profiles, converged, conv_data, rotation_data
 
 
 def find_buffer_range(series, profile_type='unsub', int_type='total', q_val=None,
     q_range=None, window_size=5, settings=None, sim_test='CorMap',
-    sim_cor='Bonferroni', sim_thresh=0.01):
+    sim_cor='Bonferroni', sim_thresh=0.01, parallel=False):
     """
     Automatically determine the appropriate buffer range from subtraction from
     the input series. This is designed to work with SEC-SAXS data, but may work
@@ -6204,6 +6841,11 @@ def find_buffer_range(series, profile_type='unsub', int_type='total', q_val=None
         Sets the p value threshold for the similarity test. A higher value is
         a more strict test (range from 0-1). Is overridden if settings are
         provided.
+    parallel: bool, optional
+        If True, each set of candidate windows in the search is validated
+        concurrently on a pool of threads. The first valid window in the
+        search order is always used, so the result is the same as the serial
+        search. Default is False.
 
     Returns
     -------
@@ -6241,7 +6883,7 @@ def find_buffer_range(series, profile_type='unsub', int_type='total', q_val=None
         intensity = np.array([sasm.getIofQRange(q1, q2) for sasm in buffer_sasms])
 
     success, region_start, region_end = SASCalc.findBufferRange(buffer_sasms,
-        intensity, window_size, sim_test, sim_cor, sim_thresh)
+        intensity, window_size, sim_test, sim_cor, sim_thresh, parallel)
 
     return success, region_start, region_end
 
@@ -6380,7 +7022,7 @@ def set_buffer_range(series, buffer_range, int_type='total', q_val=None,
     error_weight=True, vp_density=0.83*10**(-3), vp_cutoff='Default',
     vp_qmax=0.5, vc_protein=True, vc_cutoff='Manual', vc_qmax=0.3,
     vc_a_prot=1.0, vc_b_prot=0.1231, vc_a_rna=0.808, vc_b_rna=0.00934,
-    do_calcs=True, calc_outside_win=False):
+    do_calcs=True, calc_outside_win=False, n_proc=1):
     """
     Sets the buffer range for a series, carries out the subtraction, and
     calculates Rg and MW vs. frame number.
@@ -6481,6 +7123,11 @@ def set_buffer_range(series, buffer_range, int_type='total', q_val=None,
         If True, if an average window_size > 1 is supplied, then Rg and MW will
         be calculated for profiles at the edges of the series without a full
         window range individually.
+    n_proc: int, optional
+        The number of processes to use for calculating Rg and MW. The
+        profiles (or window averages) are independent, so they are divided
+        between a pool of processes. Defaults to 1, which does the
+        calculations in the current process.
 
     Returns
     -------
@@ -6563,7 +7210,7 @@ def set_buffer_range(series, buffer_range, int_type='total', q_val=None,
         success, results = SASCalc.run_secm_calcs(sub_profiles, use_sub_profiles,
             window_size, vc_protein, error_weight, vp_density, vp_cutoff,
             vp_qmax, vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna,
-            vc_b_rna, calc_outside_win)
+            vc_b_rna, calc_outside_win, n_proc)
     else:
         success = False
 
@@ -6607,7 +7254,8 @@ def set_buffer_range(series, buffer_range, int_type='total', q_val=None,
 def series_calc(sub_profiles, window_size=5, settings=None, error_weight=True,
     vp_density=0.83*10**(-3), vp_cutoff='Default', vp_qmax=0.5,
     vc_protein=True, vc_cutoff='Manual', vc_qmax=0.3, vc_a_prot=1.0,
-    vc_b_prot=0.1231, vc_a_rna=0.808, vc_b_rna=0.00934, calc_outside_win=False):
+    vc_b_prot=0.1231, vc_a_rna=0.808, vc_b_rna=0.00934, calc_outside_win=False,
+    n_proc=1):
     """
     Calculates Rg and MW for the input subtracted profiles. If you are working
     with a :class:`SECM.SECM` series object then use :func:`set_buffer_range`
@@ -6664,6 +7312,11 @@ def series_calc(sub_profiles, window_size=5, settings=None, error_weight=True,
         If True, if an average window_size > 1 is supplied, then Rg and MW will
         be calculated for profiles at the edges of the series without a full
         window range individually.
+    n_proc: int, optional
+        The number of processes to use for calculating Rg and MW. The
+        profiles (or window averages) are independent, so they are divided
+        between a pool of processes. Defaults to 1, which does the
+        calculations in the current process.
 
     Returns
     -------
@@ -6725,7 +7378,7 @@ def series_calc(sub_profiles, window_size=5, settings=None, error_weight=True,
     success, results = SASCalc.run_secm_calcs(sub_profiles, use_sub_profiles,
         window_size, vc_protein, error_weight, vp_density, vp_cutoff,
         vp_qmax, vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna,
-        vc_b_rna, calc_outside_win)
+        vc_b_rna, calc_outside_win, n_proc)
 
     if success:
         rg = results['rg']
@@ -6746,9 +7399,413 @@ def series_calc(sub_profiles, window_size=5, settings=None, error_weight=True,
 
     return rg, rger, i0, i0er, vcmw, vcmwer, vpmw
 
+def update_series(series, profiles, frame_list=None, int_type='total',
+    q_val=None, q_range=None, settings=None, calc_thresh=1.02,
+    error_weight=True, vp_cutoff='Default', vp_qmax=0.5, vc_cutoff='Manual',
+    vc_qmax=0.3, vc_a_prot=1.0, vc_b_prot=0.1231, vc_a_rna=0.808,
+    vc_b_rna=0.00934, n_proc=1):
+    """
+    Appends new profiles to a series, like RAW's online mode does for a
+    series that is being collected. If the series already has a buffer range
+    set (see :func:`set_buffer_range`) the new profiles are subtracted and Rg
+    and MW vs. frame number are updated. Only the new profiles are subtracted,
+    and Rg and MW are only recalculated for the averaging windows that contain
+    a new profile, so the cost of an update doesn't depend on the length of
+    the series. The window size, molecule type, and Porod density used are
+    the ones set for the series by :func:`set_buffer_range`.
+
+    Parameters
+    ----------
+    series: :class:`bioxtasraw.SECM.SECM`
+        The series to add the profiles to. The series is modified in place.
+    profiles: list
+        A list of the new profiles (:class:`bioxtasraw.SASM.SASM`) to append.
+    frame_list: list, optional
+        The frame numbers of the new profiles. If not provided, the frames
+        are numbered sequentially from the end of the series.
+    int_type: {'total', 'mean', 'q_val', 'q_range'} str, optional
+        The intensity type used to decide whether Rg and MW are calculated for
+        a subtracted profile. Total integrated intensity - 'total', mean
+        intensity - 'mean', intensity at a particular q value - 'q_val',
+        intensity in a given q range - 'q_range'. Use of q_val or q_range
+        requires the corresponding parameter to be provided. This should
+        match the int_type used to set the buffer range.
+    q_val: float, optional
+        If int_type is 'q_val', the q value used for the intensity is set by
+        this parameter.
+    q_range: list, optional
+        This should have two entries, both floats. The first is the minimum q
+        value of the range, the second the maximum q value of the range. If
+        int_type is 'q_range', the q range used for the intensity is set by
+        this parameter.
+    settings: :class:`bioxtasraw.RAWSettings.RAWSettings`, optional
+        RAW settings containing relevant parameters. If provided, calc_thresh,
+        err_weight, vp_cutoff, vp_qmax, vc_cutoff, and vc_qmax are overridden
+        by the values in the settings.
+    calc_thresh: float, optional
+        If the ratio of the scattering profile intensity to the average buffer
+        intensity is greater than this threshold, the Rg and MW for the profile
+        is calculated. Defaults to 1.02.
+    error_weight: bool, optional
+        Whether to use error weighting when calculating the Rg.
+    vp_cutoff: {''Default', '8/Rg', 'log(I0/I(q))', 'Manual''} str, optional
+        The method to use to calculate the maximum q value used for the
+        Porod volume M.W. calculation. Defaults to 'Default'
+    vp_qmax: float, optional
+        The maximum q value to be used if the 'Manual' cutoff method is
+        selected for the Porod volume M.W. calculation. Defaults to 0.5.
+    vc_cutoff: {''Default', '8/Rg', 'log(I0/I(q))', 'Manual''} str, optional
+        The method to use to calculate the maximum q value used for the
+        M.W. calculation. Defaults to 'Manual'
+    vc_qmax: float, optional
+        The maximum q value to be used if the 'Manual' cutoff method is
+        selected. Defaults to 0.3.
+    vc_a_prot: float
+        The volume of correlation A coefficient for protein. Not recommended
+        to be changed.
+    vc_b_prot: float
+        The volume of correlation B coefficient for protein. Not recommended
+        to be changed. Note that here B is defined as 1/B from the original paper.
+    vc_a_rna: float
+        The volume of correlation A coefficient for RNA. Not recommended to
+        be changed.
+    vc_b_rna: float
+        The volume of correlation B coefficient for RNA. Not recommended to
+        be changed. Note that here B is defined as 1/B from the original paper.
+    n_proc: int, optional
+        The number of processes to use for calculating Rg and MW. Defaults
+        to 1. Only worth increasing when many profiles are added at once.
+
+    Returns
+    -------
+    first_frame: int
+        The index in the series of the first new profile.
+    """
+    first_frame = len(series.getAllSASMs())
+
+    if frame_list is None:
+        frame_list = list(range(first_frame, first_frame+len(profiles)))
+
+    filename_list = [sasm.getParameter('filename') for sasm in profiles]
+
+    series.acquireSemaphore()
+
+    try:
+        series.append(filename_list, profiles, frame_list)
+
+        _update_series_calcs(series, first_frame, int_type, q_val, q_range,
+            settings, calc_thresh, error_weight, vp_cutoff, vp_qmax,
+            vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna,
+            n_proc)
+
+    finally:
+        series.releaseSemaphore()
+
+    return first_frame
+
+def _update_series_calcs(series, first_new_frame, int_type, q_val, q_range,
+    settings, calc_thresh, error_weight, vp_cutoff, vp_qmax, vc_cutoff,
+    vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna, n_proc):
+    """
+    Subtracts the profiles from first_new_frame onwards and updates the Rg
+    and MW values for every window that includes one of them.
+    """
+    if series.average_buffer_sasm is None and not series.already_subtracted:
+        return
+
+    if settings is not None:
+        calc_thresh = settings.get('secCalcThreshold')
+        error_weight = settings.get('errorWeight')
+
+        vp_cutoff = settings.get('MWVpCutoff')
+        vp_qmax = settings.get('MWVpQmax')
+
+        vc_cutoff = settings.get('MWVcCutoff')
+        vc_qmax = settings.get('MWVcQmax')
+
+    new_sasms = series.getAllSASMs()[first_new_frame:]
+
+    if series.already_subtracted:
+        sub_sasms = list(new_sasms)
+        use_sub_sasms = [True for sasm in sub_sasms]
+    else:
+        sub_sasms, use_sub_sasms = SECM.SECM.subtractSASMs(
+            series.average_buffer_sasm, new_sasms, int_type, calc_thresh,
+            q_val, q_range)
+
+    window_size = max(series.window_size, 1)
+
+    # The last window_size subtracted profiles are replaced when appending,
+    # so resend them along with the new profiles. Only windows that overlap
+    # the new profiles change, and they all start at or after first_frame.
+    first_frame = max(first_new_frame - window_size, 0)
+
+    old_sub_sasms = series.subtracted_sasm_list[first_frame:first_new_frame]
+    old_use_sasms = series.use_subtracted_sasm[first_frame:first_new_frame]
+
+    series.appendSubtractedSASMs(old_sub_sasms+sub_sasms,
+        old_use_sasms+use_sub_sasms, len(old_sub_sasms))
+
+    if series.window_size == -1:
+        return
+
+    if series.mol_type == 'RNA':
+        is_protein = False
+    else:
+        is_protein = True
+
+    calc_sasms = series.subtracted_sasm_list[first_frame:]
+    calc_use_sasms = series.use_subtracted_sasm[first_frame:]
+
+    success, results = SASCalc.run_secm_calcs(calc_sasms, calc_use_sasms,
+        window_size, is_protein, error_weight, series.mol_density, vp_cutoff,
+        vp_qmax, vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna,
+        False, n_proc)
+
+    if success:
+        series.appendCalcValues(results['rg'], results['rger'], results['i0'],
+            results['i0er'], results['vcmw'], results['vcmwer'],
+            results['vpmw'], first_frame, window_size)
+    else:
+        empty = np.zeros(len(calc_sasms),dtype=float)-1
+        series.appendCalcValues(empty, empty, empty, empty, empty, empty,
+            empty, first_frame, window_size)
+
+    series.calc_has_data = True
+
+def stream_series(profiles, series=None, buffer_range=None,
+    auto_buffer_frames=20, int_type='total', q_val=None, q_range=None,
+    window_size=5, settings=None, poll_interval=0.5, abort_event=None,
+    calc_thresh=1.02, sim_test='CorMap', sim_cor='Bonferroni', sim_thresh=0.01,
+    error_weight=True, vp_density=0.83*10**(-3), vp_cutoff='Default',
+    vp_qmax=0.5, vc_protein=True, vc_cutoff='Manual', vc_qmax=0.3,
+    vc_a_prot=1.0, vc_b_prot=0.1231, vc_a_rna=0.808, vc_b_rna=0.00934,
+    n_proc=1):
+    """
+    Builds a series from profiles as they become available, for example
+    while a SEC-SAXS sample is being collected. This is a generator that
+    yields the series each time new profiles are added to it. Once a buffer
+    range is available (either provided or automatically found) the new
+    profiles are subtracted and the Rg and MW vs. frame number are updated
+    as described in :func:`update_series`. For example::
+
+        for series, first_frame in raw.stream_series(profile_queue,
+            buffer_range=[[0, 20]], settings=settings):
+            rg = series.getRg()[0][first_frame:]
+
+    Parameters
+    ----------
+    profiles: iterable or :class:`queue.Queue`
+        The source of new profiles. Each item should be either a profile
+        (:class:`bioxtasraw.SASM.SASM`) or a list of profiles. If this is a
+        queue (anything with a ``get`` method, such as a
+        :class:`queue.Queue` or :class:`multiprocessing.Queue`) it is read
+        until a None item is received or abort_event is set, and all
+        profiles waiting in the queue are added in a single update.
+        Otherwise it is iterated over until it is exhausted.
+    series: :class:`bioxtasraw.SECM.SECM`, optional
+        An existing series to add the new profiles to. If not provided a new
+        series is made from the first profiles received.
+    buffer_range: list, optional
+        The buffer range to use, in the same format as for
+        :func:`set_buffer_range`. The buffer range is set once the series
+        contains all of the frames in the range. If neither this nor a buffer
+        range set on the input series is available, the buffer range is
+        automatically found using :func:`find_buffer_range` once the series
+        has at least auto_buffer_frames profiles, and the search is repeated
+        as new profiles arrive until a buffer range is found.
+    auto_buffer_frames: int, optional
+        The minimum number of profiles in the series before an automatic
+        search for the buffer range is done. Defaults to 20.
+    int_type: {'total', 'mean', 'q_val', 'q_range'} str, optional
+        The intensity type to use when finding and setting the buffer range.
+        Total integrated intensity - 'total', mean intensity - 'mean',
+        intensity at a particular q value - 'q_val', intensity in a given q
+        range - 'q_range'. Use of q_val or q_range requires the corresponding
+        parameter to be provided.
+    q_val: float, optional
+        If int_type is 'q_val', the q value used for the intensity is set by
+        this parameter.
+    q_range: list, optional
+        This should have two entries, both floats. The first is the minimum q
+        value of the range, the second the maximum q value of the range. If
+        int_type is 'q_range', the q range used for the intensity is set by
+        this parameter.
+    window_size: int, optional
+        The size of the average window used when calculating Rg and MW. Not
+        used if the input series already has a buffer range set.
+    settings: :class:`bioxtasraw.RAWSettings.RAWSettings`, optional
+        RAW settings containing relevant parameters. If provided, calc_thresh,
+        sim_test, sim_cor, sim_thresh, err_weight, vp_density, vp_cutoff,
+        vp_qmax, vc_protein, vc_cutoff, and vc_qmax are overridden by the
+        values in the settings.
+    poll_interval: float, optional
+        If profiles is a queue, how often in seconds to check abort_event
+        while waiting for new profiles.
+    abort_event: :class:`threading.Event`, optional
+        A :class:`threading.Event` or :class:`multiprocessing.Event`. If this
+        event is set, streaming stops and the generator returns.
+    calc_thresh: float, optional
+        If the ratio of the scattering profile intensity to the average buffer
+        intensity is greater than this threshold, the Rg and MW for the profile
+        is calculated. Defaults to 1.02.
+    sim_test: {'CorMap'} str, optional
+        Sets the type of similarity test to be used. Currently only CorMap is
+        supported as an option. Is overridden if settings are provided.
+    sim_cor: {'Bonferroni', 'None'} str, optional
+        Sets the multiple testing correction to be used as part of the similarity
+        test. Default is Bonferroni. Is overridden if settings are provided.
+    sim_thresh: float, optional
+        Sets the p value threshold for the similarity test. A higher value is
+        a more strict test (range from 0-1). Is overridden if settings are
+        provided.
+    error_weight: bool, optional
+        Whether to use error weighting when calculating the Rg.
+    vp_density: float, optional
+        The density used for the Porod volume M.W. calculation in kDa/A^3.
+        Defaults to 0.83*10**(-3).
+    vp_cutoff: {''Default', '8/Rg', 'log(I0/I(q))', 'Manual''} str, optional
+        The method to use to calculate the maximum q value used for the
+        Porod volume M.W. calculation. Defaults to 'Default'
+    vp_qmax: float, optional
+        The maximum q value to be used if the 'Manual' cutoff method is
+        selected for the Porod volume M.W. calculation. Defaults to 0.5.
+    vc_protein: bool
+        True if the sample is protein, False if the sample is RNA. Determines
+        which set of coefficients to use for calculating M.W.
+    vc_cutoff: {''Default', '8/Rg', 'log(I0/I(q))', 'Manual''} str, optional
+        The method to use to calculate the maximum q value used for the
+        M.W. calculation. Defaults to 'Manual'
+    vc_qmax: float, optional
+        The maximum q value to be used if the 'Manual' cutoff method is
+        selected. Defaults to 0.3.
+    vc_a_prot: float
+        The volume of correlation A coefficient for protein. Not recommended
+        to be changed.
+    vc_b_prot: float
+        The volume of correlation B coefficient for protein. Not recommended
+        to be changed. Note that here B is defined as 1/B from the original paper.
+    vc_a_rna: float
+        The volume of correlation A coefficient for RNA. Not recommended to
+        be changed.
+    vc_b_rna: float
+        The volume of correlation B coefficient for RNA. Not recommended to
+        be changed. Note that here B is defined as 1/B from the original paper.
+    n_proc: int, optional
+        The number of processes to use for calculating Rg and MW. Defaults
+        to 1.
+
+    Yields
+    ------
+    series: :class:`bioxtasraw.SECM.SECM`
+        The updated series.
+    first_frame: int
+        The index in the series of the first profile added in this update.
+    """
+    if settings is None:
+        settings = __default_settings
+
+    if abort_event is None:
+        abort_event = threading.Event()
+
+    calc_kwargs = {'int_type': int_type, 'q_val': q_val, 'q_range': q_range,
+        'settings': settings, 'calc_thresh': calc_thresh,
+        'error_weight': error_weight, 'vp_cutoff': vp_cutoff,
+        'vp_qmax': vp_qmax, 'vc_cutoff': vc_cutoff, 'vc_qmax': vc_qmax,
+        'vc_a_prot': vc_a_prot, 'vc_b_prot': vc_b_prot,
+        'vc_a_rna': vc_a_rna, 'vc_b_rna': vc_b_rna, 'n_proc': n_proc}
+
+    buffer_kwargs = {'int_type': int_type, 'q_val': q_val, 'q_range': q_range,
+        'window_size': window_size, 'settings': settings,
+        'calc_thresh': calc_thresh, 'sim_test': sim_test, 'sim_cor': sim_cor,
+        'sim_thresh': sim_thresh, 'error_weight': error_weight,
+        'vp_density': vp_density, 'vp_cutoff': vp_cutoff, 'vp_qmax': vp_qmax,
+        'vc_protein': vc_protein, 'vc_cutoff': vc_cutoff, 'vc_qmax': vc_qmax,
+        'vc_a_prot': vc_a_prot, 'vc_b_prot': vc_b_prot,
+        'vc_a_rna': vc_a_rna, 'vc_b_rna': vc_b_rna, 'n_proc': n_proc}
+
+    for new_profiles in _iter_stream_profiles(profiles, poll_interval,
+        abort_event):
+
+        if series is None:
+            series = profiles_to_series(new_profiles, settings)
+            first_frame = 0
+        else:
+            first_frame = update_series(series, new_profiles, **calc_kwargs)
+
+        has_buffer = (series.average_buffer_sasm is not None
+            or series.already_subtracted)
+
+        if not has_buffer:
+            num_frames = len(series.getAllSASMs())
+
+            if buffer_range is not None:
+                if num_frames > max(r[1] for r in buffer_range):
+                    set_buffer_range(series, buffer_range, **buffer_kwargs)
+
+            elif num_frames >= auto_buffer_frames:
+                success, region_start, region_end = find_buffer_range(series,
+                    int_type=int_type, q_val=q_val, q_range=q_range,
+                    window_size=window_size, settings=settings,
+                    sim_test=sim_test, sim_cor=sim_cor, sim_thresh=sim_thresh)
+
+                if success:
+                    set_buffer_range(series, [[region_start, region_end]],
+                        **buffer_kwargs)
+
+        yield series, first_frame
+
+def _iter_stream_profiles(profiles, poll_interval, abort_event):
+    """
+    Yields lists of new profiles from an iterable or a queue for
+    stream_series.
+    """
+    if hasattr(profiles, 'get'):
+        while not abort_event.is_set():
+            try:
+                item = profiles.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+
+            new_profiles = []
+            done = item is None
+
+            while item is not None:
+                if isinstance(item, SASM.SASM):
+                    new_profiles.append(item)
+                else:
+                    new_profiles.extend(item)
+
+                try:
+                    item = profiles.get_nowait()
+                except queue.Empty:
+                    break
+
+                done = item is None
+
+            if len(new_profiles) > 0:
+                yield new_profiles
+
+            if done:
+                break
+
+    else:
+        for item in profiles:
+            if abort_event.is_set():
+                break
+
+            if isinstance(item, SASM.SASM):
+                item = [item]
+            else:
+                item = list(item)
+
+            if len(item) > 0:
+                yield item
+
 def find_sample_range(series, profile_type='sub', window_size=5,
     int_type='total', q_val=None, q_range=None, rg=None, vcmw=None, vpmw=None,
-    settings=None, sim_test='CorMap', sim_cor='Bonferroni', sim_thresh=0.01):
+    settings=None, sim_test='CorMap', sim_cor='Bonferroni', sim_thresh=0.01,
+    parallel=False):
     """
     Automatically determine the appropriate sample range to average from
     the input series. This is designed to work with SEC-SAXS data, but may
@@ -6806,6 +7863,11 @@ def find_sample_range(series, profile_type='sub', window_size=5,
         Sets the p value threshold for the similarity test. A higher value is
         a more strict test (range from 0-1). Is overridden if settings are
         provided.
+    parallel: bool, optional
+        If True, each set of candidate windows in the search is validated
+        concurrently on a pool of threads. The first valid window in the
+        search order is always used, so the result is the same as the serial
+        search. Default is False.
 
     Returns
     -------
@@ -6848,7 +7910,7 @@ def find_sample_range(series, profile_type='sub', window_size=5,
 
     success, region_start, region_end = SASCalc.findSampleRange(sub_profiles,
         intensity, rg, vcmw, vpmw, window_size, sim_test, sim_cor,
-        sim_thresh)
+        sim_thresh, parallel)
 
     return success, region_start, region_end
 
@@ -7091,7 +8153,7 @@ def set_sample_range(series, sample_range, profile_type='sub', header_avg_keys=[
 
 def find_baseline_range(series, baseline_type='Integral', profile_type='sub',
     window_size=5, int_type='total', q_val=None, q_range=None, settings=None,
-    sim_test='CorMap', sim_cor='Bonferroni', sim_thresh=0.01):
+    sim_test='CorMap', sim_cor='Bonferroni', sim_thresh=0.01, parallel=False):
     """
     Automatically determine an appropriate range for the baseline
     correction. Currently only works for integral baseline corrections.
@@ -7141,6 +8203,11 @@ def find_baseline_range(series, baseline_type='Integral', profile_type='sub',
         Sets the p value threshold for the similarity test. A higher value is
         a more strict test (range from 0-1). Is overridden if settings are
         provided.
+    parallel: bool, optional
+        If True, each set of candidate windows in the search is validated
+        concurrently on a pool of threads. The first valid window in the
+        search order is always used, so the result is the same as the serial
+        search. Default is False.
 
     Returns
     -------
@@ -7193,7 +8260,8 @@ def find_baseline_range(series, baseline_type='Integral', profile_type='sub',
 
     (start_failed, end_failed, region1_start, region1_end, region2_start,
         region2_end) = SASCalc.findBaselineRange(sub_profiles, intensity,
-        baseline_type, window_size, start_region, sim_test, sim_cor, sim_thresh)
+        baseline_type, window_size, start_region, sim_test, sim_cor, sim_thresh,
+        parallel)
 
     start_found = not start_failed
     end_found = not end_failed
@@ -7408,7 +8476,7 @@ def set_baseline_correction(series, start_range, end_range, baseline_type,
     error_weight=True, vp_density=0.83*10**(-3), vp_cutoff='Default',
     vp_qmax=0.5, vc_protein=True, vc_cutoff='Manual', vc_qmax=0.3,
     vc_a_prot=1.0, vc_b_prot=0.1231, vc_a_rna=0.808, vc_b_rna=0.00934,
-    calc_outside_win=False):
+    calc_outside_win=False, n_proc=1):
     """
     Calculates and sets the baseline correction for the input series. Then
     recalculates the series Rg and M.W. values based on the baseline corrected
@@ -7501,6 +8569,11 @@ def set_baseline_correction(series, start_range, end_range, baseline_type,
         If True, if an average window_size > 1 is supplied, then Rg and MW will
         be calculated for profiles at the edges of the series without a full
         window range individually.
+    n_proc: int, optional
+        The number of processes to use for calculating Rg and MW. The
+        profiles (or window averages) are independent, so they are divided
+        between a pool of processes. Defaults to 1, which does the
+        calculations in the current process.
 
     Returns
     -------
@@ -7587,7 +8660,7 @@ def set_baseline_correction(series, start_range, end_range, baseline_type,
     success, results = SASCalc.run_secm_calcs(bl_cor_profiles, use_sub_profiles,
         window_size, vc_protein, error_weight, vp_density, vp_cutoff,
         vp_qmax, vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna,
-        vc_b_rna, calc_outside_win)
+        vc_b_rna, calc_outside_win, n_proc)
 
     if vc_protein:
         mol_type = 'Protein'
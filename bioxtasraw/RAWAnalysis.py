@@ -17548,6 +17548,9 @@ class EFAControlPanel2(wx.Panel):
 
         nvals = svd_results['input']
 
+        if not efa and self.efa_forward.shape[0] < nvals + 1:
+            efa = True
+
         if self.ctrl_type == 'REGALS':
             self.bkg_components.SetRange((0, nvals))
 
@@ -17659,9 +17662,9 @@ class EFAControlPanel2(wx.Panel):
         wx.CallAfter(self.updateEFAPlot)
 
     def _runEFA(self, A):
-        f_slist = SASCalc.runEFA(A)
-        wx.Yield()
-        b_slist = SASCalc.runEFA(A, False)
+        # Only the singular values that are displayed or saved are calculated
+        nsvs = self.panel1_results['input'] + 1
+        f_slist, b_slist = SASCalc.runForwardBackwardEFA(A, nsvs)
 
         wx.CallAfter(self._processEFAResults, f_slist, b_slist)
 
@@ -18223,7 +18226,7 @@ class EFAControlPanel3(wx.Panel):
 
         method_label = wx.StaticText(rot_box, -1, 'Method:')
         method_control = wx.Choice(rot_box, self.control_ids['method'],
-            choices=['Hybrid', 'Iterative', 'Explicit'])
+            choices=['Hybrid', 'Iterative', 'Explicit', 'Accelerated'])
         method_control.SetStringSelection('Hybrid')
         method_control.Bind(wx.EVT_CHOICE, self._onIterControl)
 
@@ -26469,6 +26472,7 @@ class LCSeriesControlPanel(wx.ScrolledWindow):
                 vc_b_prot = self.raw_settings.get('MWVcBProtein')
                 vc_a_rna = self.raw_settings.get('MWVcARna')
                 vc_b_rna = self.raw_settings.get('MWVcBRna')
+                n_proc = self.raw_settings.get('secCalcNProcs')
 
                 first_update_frame = int(self.original_secm.plot_frame_list[len(self.secm.getAllSASMs())])
                 last_frame = int(self.original_secm.plot_frame_list[-1])
@@ -26488,7 +26492,7 @@ class LCSeriesControlPanel(wx.ScrolledWindow):
                 success, results = SASCalc.run_secm_calcs(sub_sasms,
                     use_sub_sasms, window_size, is_protein, error_weight,
                     vp_density, vp_cutoff, vp_qmax, vc_cutoff, vc_qmax,
-                    vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna)
+                    vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna, n_proc=n_proc)
 
                 if success:
                     new_rg = results['rg']
@@ -27562,6 +27566,7 @@ class LCSeriesControlPanel(wx.ScrolledWindow):
         vc_b_prot = self.raw_settings.get('MWVcBProtein')
         vc_a_rna = self.raw_settings.get('MWVcARna')
         vc_b_rna = self.raw_settings.get('MWVcBRna')
+        n_proc = self.raw_settings.get('secCalcNProcs')
 
 
         if self.secm.intensity_change:
@@ -27652,7 +27657,7 @@ class LCSeriesControlPanel(wx.ScrolledWindow):
         success, results = SASCalc.run_secm_calcs(sub_sasms, use_sub_sasms,
             window_size, is_protein, error_weight, vp_density, vp_cutoff,
             vp_qmax, vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna,
-            vc_b_rna)
+            vc_b_rna, n_proc=n_proc)
 
         if success:
             self.results['calc'] = results
@@ -27668,7 +27673,7 @@ class LCSeriesControlPanel(wx.ScrolledWindow):
             success, results = SASCalc.run_secm_calcs(sub_sasms, use_sub_sasms,
                 window_size, is_protein, error_weight, vp_density, vp_cutoff,
                 vp_qmax, vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna,
-                vc_b_rna)
+                vc_b_rna, n_proc=n_proc)
 
             if success:
                 self.results['buffer']['calc'] = results
@@ -2834,7 +2834,7 @@ class SaveDirectoriesPanel(scrolled.ScrolledPanel):
         self.update_keys = ['ProcessedFilePath' , 'AveragedFilePath' ,
             'SubtractedFilePath', 'BiftFilePath', 'GnomFilePath',
             'AutoSaveOnImageFiles', 'AutoSaveOnAvgFiles', 'AutoSaveOnSub',
-            'AutoSaveOnBift', 'AutoSaveOnGnom']
+            'AutoSaveOnBift', 'AutoSaveOnGnom', 'AutoSaveProcessedCollection']
 
                                                                                       #Set button id , clr button id
         self.directory_data = (
@@ -2852,6 +2852,8 @@ class SaveDirectoriesPanel(scrolled.ScrolledPanel):
         self.auto_save_data = (
             ('Save Processed Image Files Automatically',
                 raw_settings.getId('AutoSaveOnImageFiles')),
+            ('Save Processed Image Files to a Single Collection File',
+                raw_settings.getId('AutoSaveProcessedCollection')),
             ('Save Averaged Data Files Automatically',
                 raw_settings.getId('AutoSaveOnAvgFiles')),
             ('Save Subtracted Data Files Automatically',
@@ -2956,6 +2958,7 @@ class SaveDirectoriesPanel(scrolled.ScrolledPanel):
 
                     if labl_id == self.raw_settings.getId('ProcessedFilePath'):
                         wx.FindWindowById(self.raw_settings.getId('AutoSaveOnImageFiles'), self).SetValue(False)
+                        wx.FindWindowById(self.raw_settings.getId('AutoSaveProcessedCollection'), self).SetValue(False)
                     elif labl_id == self.raw_settings.getId('AveragedFilePath'):
                         wx.FindWindowById(self.raw_settings.getId('AutoSaveOnAvgFiles'), self).SetValue(False)
                     elif labl_id == self.raw_settings.getId('SubtractedFilePath'):
@@ -2971,7 +2974,8 @@ class SaveDirectoriesPanel(scrolled.ScrolledPanel):
         checkbox = wx.FindWindowById(my_id, self)
 
         if checkbox.GetValue():
-            if my_id == self.raw_settings.getId('AutoSaveOnImageFiles'):
+            if (my_id == self.raw_settings.getId('AutoSaveOnImageFiles')
+                or my_id == self.raw_settings.getId('AutoSaveProcessedCollection')):
                 directory = wx.FindWindowById(self.raw_settings.getId('ProcessedFilePath'), self).GetValue()
 
             elif my_id == self.raw_settings.getId('AutoSaveOnAvgFiles'):
@@ -3299,7 +3303,7 @@ class SeriesPanel(scrolled.ScrolledPanel):
 
         self.update_keys = ['secCalcThreshold', 'IBaselineMinIter',
             'IBaselineMaxIter', 'doSVDBinning', 'numSVDBins',
-            'SVDCheckShannonBins', 'warnLinearBaseline']
+            'SVDCheckShannonBins', 'warnLinearBaseline', 'secCalcNProcs']
 
 
         # self.settings = [(('Intensity ratio (to background) threshold for '
@@ -3331,6 +3335,8 @@ class SeriesPanel(scrolled.ScrolledPanel):
                 raw_settings.getId('SVDCheckShannonBins'), 'bool'),
             ('Warn users about mismatched slopes when running a linear baseline correction',
                 raw_settings.getId('warnLinearBaseline'), 'bool'),
+            ('Number of processes for calculating Rg, MW, I0:',
+                raw_settings.getId('secCalcNProcs'), 'int'),
             )
 
         options_sizer = self.createOptions(layout_settings)
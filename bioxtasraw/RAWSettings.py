@@ -219,6 +219,8 @@ class RawGuiSettings(object):
                 'AutoSaveOnBift'       : [False, get_id(), 'bool'],
                 'AutoSaveOnDift'       : [False, get_id(), 'bool'],
                 'AutoSaveOnGnom'       : [False, get_id(), 'bool'],
+                'AutoSaveProcessedCollection' : [False, get_id(), 'bool'],
+                'ProcessedCollectionName'     : ['processed_profiles.hdf5', get_id(), 'text'],
 
                 #IMAGE FORMATS
                 'ImageFormat'          : ['Pilatus', get_id(), 'choice'],
@@ -297,6 +299,7 @@ class RawGuiSettings(object):
                 'numSVDBins'            : [150, get_id(), 'int'],
                 'SVDCheckShannonBins'   : [True, get_id(), 'bool'],
                 'warnLinearBaseline'    : [False, get_id(), 'bool'],
+                'secCalcNProcs'         : [1, get_id(), 'int'],
 
                 #GUI Settings:
                 'csvIncludeData'      : [None],
@@ -492,6 +495,9 @@ class RawGuiSettings(object):
         # all our instance attributes. Always use the dict.copy()
         # method to avoid modifying the original state.
         state = self.__dict__.copy()
+        # Copy the settings dictionary too, so that removing the unpicklable
+        # entries doesn't remove them from the settings being pickled
+        state['_params'] = state['_params'].copy()
         # Remove the unpicklable entries.
         for key in pickle_exclude_keys:
             try:
@@ -517,9 +523,9 @@ class RawGuiSettings(object):
                     # state['_params'][key][1] = wx.WindowIDRef(state['_params'][key][1])
                      state['_params'][key][1] = state['_params'][key][1]
 
-            for key in pickle_exclude_keys:
-                #this is a hack, and only works for this specific case
-                state['_params'][key] = [None]
+        for key in pickle_exclude_keys:
+            #this is a hack, and only works for this specific case
+            state['_params'][key] = [None]
 
         self.__dict__.update(state)
 
@@ -34,14 +34,24 @@ This code matches that as of 4/14/21, commit 138ca04.
 from copy import deepcopy
 import numpy as np
 from scipy import sparse as sp
-from scipy.linalg import eig
+from scipy.linalg import eig, solveh_banded, LinAlgError
+from scipy.sparse.csgraph import reverse_cuthill_mckee
 from scipy.sparse.linalg import spsolve
 
 class regals:
 
-    def __init__(self, I, err):
+    def __init__(self, I, err, in_place = False):
+        """
+        If in_place is True, step updates the input mixture rather than
+        returning a modified copy, and the linear systems for the profiles
+        and concentrations are set up once (see block_system) and reused
+        for every step with the same components and lambda values.
+        """
         self.I = I
         self.err = err
+        self.in_place = in_place
+
+        self._systems = None
 
     def auto_estimate_lambda(self, mix):
 
@@ -50,7 +60,10 @@ class regals:
         mix.lambda_profile = mix.estimate_profile_lambda(self.err)
         mix.lambda_concentration = mix.estimate_concentration_lambda(self.err)
 
-        new_mix = self.step(mix)[0] # take one step and re-estimate
+        if self.in_place:
+            new_mix = self.step(deepcopy(mix))[0] # take one step and re-estimate
+        else:
+            new_mix = self.step(mix)[0] # take one step and re-estimate
 
         mix.lambda_profile = new_mix.estimate_profile_lambda(self.err)
         mix.lambda_concentration = new_mix.estimate_concentration_lambda(self.err)
@@ -59,12 +72,16 @@ class regals:
 
     def fit_concentrations(self, mix):
 
-        mix = deepcopy(mix)
+        if self.in_place:
+            u = self._in_place_systems(mix).solve_concentrations(mix)
 
-        H = mix.H_concentration
-        [AA, Ab] = mix.concentration_problem(self.I, self.err)
+        else:
+            mix = deepcopy(mix)
 
-        u = spsolve(AA + H, Ab)
+            H = mix.H_concentration
+            [AA, Ab] = mix.concentration_problem(self.I, self.err)
+
+            u = spsolve(AA + H, Ab)
 
         u = np.split(u, np.cumsum(mix.k_concentration)[:-1])
 
@@ -73,12 +90,16 @@ class regals:
 
     def fit_profiles(self, mix):
 
-        mix = deepcopy(mix)
+        if self.in_place:
+            u = self._in_place_systems(mix).solve_profiles(mix)
 
-        H = mix.H_profile
-        [AA, Ab] = mix.profile_problem(self.I, self.err)
+        else:
+            mix = deepcopy(mix)
 
-        u = spsolve(AA + H, Ab)
+            H = mix.H_profile
+            [AA, Ab] = mix.profile_problem(self.I, self.err)
+
+            u = spsolve(AA + H, Ab)
 
         u = np.split(u, np.cumsum(mix.k_profile)[:-1])
 
@@ -91,19 +112,55 @@ class regals:
 
     def step(self, mix):
 
-        new_mix = self.fit_concentrations(self.fit_profiles(mix));
+        if self.in_place:
+            # The fits assign new lists of u vectors, so the old ones are kept
+            # without copying
+            old_concentrations = mix.concentrations
+            old_profiles = mix.profiles
+            old_u_concentration = mix.u_concentration
+            old_u_profile = mix.u_profile
+
+            new_mix = self.fit_concentrations(self.fit_profiles(mix))
+
+            new_concentrations = new_mix.concentrations
+            new_profiles = new_mix.profiles
+
+            resid = (self.I - new_profiles @ new_concentrations.T) / self.err
+
+        else:
+            new_mix = self.fit_concentrations(self.fit_profiles(mix));
+
+            old_concentrations = mix.concentrations
+            old_profiles = mix.profiles
+            old_u_concentration = mix.u_concentration
+            old_u_profile = mix.u_profile
+
+            new_concentrations = new_mix.concentrations
+            new_profiles = new_mix.profiles
 
-        resid = (self.I - new_mix.I_reg) / self.err
+            resid = (self.I - new_mix.I_reg) / self.err
 
         params = {}
         params['x2'] = np.mean(resid ** 2)
-        params['delta_concentration'] = np.sum(np.abs(new_mix.concentrations - mix.concentrations),0)
-        params['delta_profile'] = np.sum(np.abs(new_mix.profiles - mix.profiles),0)
-        params['delta_u_concentration'] = np.array([np.sum(np.abs(nupk - upk)) for nupk, upk in zip(new_mix.u_concentration, mix.u_concentration)])
-        params['delta_u_profile'] = np.array([np.sum(np.abs(nupr - upr)) for nupr, upr in zip(new_mix.u_profile, mix.u_profile)])
+        params['delta_concentration'] = np.sum(np.abs(new_concentrations - old_concentrations),0)
+        params['delta_profile'] = np.sum(np.abs(new_profiles - old_profiles),0)
+        params['delta_u_concentration'] = np.array([np.sum(np.abs(nupk - upk)) for nupk, upk in zip(new_mix.u_concentration, old_u_concentration)])
+        params['delta_u_profile'] = np.array([np.sum(np.abs(nupr - upr)) for nupr, upr in zip(new_mix.u_profile, old_u_profile)])
 
         return [new_mix, params, resid]
 
+    def _in_place_systems(self, mix):
+        # The systems only depend on the components and lambda values, so
+        # they are rebuilt if either changes
+        key = (tuple(mix.lambda_concentration), tuple(mix.lambda_profile))
+
+        if (self._systems is None or self._systems.components is not mix.components
+            or self._systems.key != key):
+            self._systems = mixture_systems(mix, self.I, self.err)
+            self._systems.key = key
+
+        return self._systems
+
     def run(self, mix, stop_fun = None, update_fun = None):
 
         if stop_fun is None:
@@ -127,6 +184,131 @@ class regals:
 
 
 
+class mixture_systems:
+    """
+    The concentration and profile linear systems for a mixture, set up for
+    repeated solves with regals in_place mode. The systems have the same
+    blocks as concentration_problem and profile_problem, but the constant
+    part of each block is only calculated once.
+    """
+
+    def __init__(self, mix, I, err):
+        self.components = mix.components
+        self.key = None
+
+        self.w = 1 / np.mean(err,1)
+        self.D = self.w[:,np.newaxis] * I
+
+        self.A_concentration = [comp.concentration.A for comp in mix.components]
+        self.A_profile = [comp.profile.A for comp in mix.components]
+        w_A_profile = [sp.diags(self.w,0) @ Ai for Ai in self.A_profile]
+
+        self.concentration_system = block_system([[A1.T @ A2 for A2 in self.A_concentration]
+            for A1 in self.A_concentration], mix.H_concentration)
+        self.profile_system = block_system([[A1.T @ A2 for A2 in w_A_profile]
+            for A1 in w_A_profile], mix.H_profile)
+
+        self.w_A_profile = w_A_profile
+
+    def solve_concentrations(self, mix):
+        y = self.w[:,np.newaxis] * mix.profiles
+
+        Dy = self.D.T @ y
+        Ab = np.hstack(tuple(A.T @ Dy[:,k] for k, A in enumerate(self.A_concentration)))
+
+        return self.concentration_system.solve(y.T @ y, Ab)
+
+    def solve_profiles(self, mix):
+        c = mix.concentrations
+
+        Dc = self.D @ c
+        Ab = np.hstack(tuple(A.T @ Dc[:,k] for k, A in enumerate(self.w_A_profile)))
+
+        return self.profile_system.solve(c.T @ c, Ab)
+
+
+
+class block_system:
+    """
+    A symmetric linear system (sum over k1, k2 of coef[k1,k2]*B[k1][k2]) + H,
+    where B[k1][k2] is block (k1, k2) of the matrix, and only coef changes
+    between solves. The sparsity pattern, a bandwidth reducing ordering, and
+    where each nonzero element goes in the banded matrix are found once.
+    Each solve then assembles the banded matrix directly and solves it with
+    a banded Cholesky factorization. If the matrix is not positive definite
+    it falls back to spsolve.
+    """
+
+    def __init__(self, B, H):
+        sizes = [B[k][k].shape[0] for k in range(len(B))]
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.n = offsets[-1]
+        self.nc = len(B)
+
+        rows = []
+        cols = []
+        vals = []
+        coef_index = []
+
+        for k1 in range(self.nc):
+            for k2 in range(self.nc):
+                block = sp.coo_matrix(B[k1][k2])
+                rows.append(block.row + offsets[k1])
+                cols.append(block.col + offsets[k2])
+                vals.append(block.data)
+                coef_index.append(np.full(block.nnz, k1*self.nc + k2))
+
+        H = sp.coo_matrix(H)
+        rows.append(H.row)
+        cols.append(H.col)
+        vals.append(H.data)
+        coef_index.append(np.full(H.nnz, self.nc**2)) # Coefficient of 1 for H
+
+        self.rows = np.concatenate(rows)
+        self.cols = np.concatenate(cols)
+        self.vals = np.concatenate(vals)
+        self.coef_index = np.concatenate(coef_index)
+
+        pattern = sp.csr_matrix((np.ones(self.rows.size), (self.rows, self.cols)),
+            shape=(self.n, self.n))
+        self.perm = reverse_cuthill_mckee(pattern, symmetric_mode=True)
+
+        inv_perm = np.empty_like(self.perm)
+        inv_perm[self.perm] = np.arange(self.n)
+
+        prows = inv_perm[self.rows]
+        pcols = inv_perm[self.cols]
+
+        # Only the upper triangle is needed for the banded solve
+        self.upper = prows <= pcols
+
+        if np.any(self.upper):
+            self.bandwidth = int(np.max(pcols[self.upper] - prows[self.upper]))
+        else:
+            self.bandwidth = 0
+
+        self.band_index = ((self.bandwidth + prows[self.upper] - pcols[self.upper])*self.n
+            + pcols[self.upper])
+
+    def solve(self, coef, b):
+        entry_vals = self.vals * np.append(coef.ravel(), 1)[self.coef_index]
+
+        ab = np.bincount(self.band_index, weights=entry_vals[self.upper],
+            minlength=(self.bandwidth+1)*self.n).reshape(self.bandwidth+1, self.n)
+
+        try:
+            x_perm = solveh_banded(ab, b[self.perm])
+            x = np.empty_like(x_perm)
+            x[self.perm] = x_perm
+
+        except (LinAlgError, ValueError):
+            AA = sp.csc_matrix((entry_vals, (self.rows, self.cols)), shape=(self.n, self.n))
+            x = spsolve(AA, b)
+
+        return x
+
+
+
 class mixture:
 
     def __init__(self, components, lambda_concentration = np.array([]), lambda_profile = np.array([]), u_concentration = [], u_profile = []):
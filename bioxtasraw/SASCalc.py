@@ -46,9 +46,13 @@ import math
 import traceback
 import copy
 import tempfile
+import atexit
+import multiprocessing
+import concurrent.futures
 
 import numpy as np
 import scipy.interpolate
+import scipy.linalg
 import scipy.signal
 import scipy.stats as stats
 import scipy.integrate as integrate
@@ -416,69 +420,45 @@ def porodVolume(q, i, err, rg, i0, start = 0, stop = -1, interp = True, rg_qmin=
 
     return pVolume
 
+# The search criteria used by autoRg, in the order they are tried. Each level
+# is (min_window, min_qrg, max_qrg, quality_thresh, data_range_scale), and
+# each successive level relaxes the criteria if no fit was found.
+autorg_levels = [
+    (10, 1.0, 1.35, 0.6, 0),
+    (5, 1.0, 1.35, 0.5, 0),
+    (10, 1.0, 1.35, 0.6, 100),
+    (10, 1.2, 1.5, 0.3, 100),
+    (5, 1.2, 1.5, 0.3, 100),
+    ]
+
 def autoRg(sasm, single_fit=False, error_weight=True):
     #This function automatically calculates the radius of gyration and scattering intensity at zero angle
     #from a given scattering profile. It roughly follows the method used by the autorg function in the atsas package
 
+    # If no fit is found the search criteria are relaxed, following
+    # autorg_levels. Results are the same as running autoRg_inner for each
+    # level, but candidate windows are screened using cumulative sums and
+    # each window is only fit once, no matter how many levels search it.
+
     q = sasm.getQ()
     i = sasm.getI()
     err = sasm.getErr()
 
     qmin = 0
 
-    try:
-        rg, rger, i0, i0er, idx_min, idx_max = autoRg_inner(q, i, err, qmin,
-            single_fit, error_weight, min_window=10, min_qrg=1.0, max_qrg=1.35,
-            quality_thresh=0.6, data_range_scale=0, corr_coefht=2.,
-            win_length_weight=1.0)
-    except Exception: #Catches unexpected numba errors, I hope
-        traceback.print_exc()
-        rg = -1
-        rger = -1
-        i0 = -1
-        i0er = -1
-        idx_min = -1
-        idx_max = -1
+    qs, il, iler = autoRg_transform(q, i, err)
 
-    if rg == -1:
-        #If we don't find a fit, relax the criteria
-        try:
-            rg, rger, i0, i0er, idx_min, idx_max = autoRg_inner(q, i, err, qmin,
-                single_fit, error_weight, min_window=5, min_qrg=1.0, max_qrg=1.35,
-                quality_thresh=0.5, data_range_scale=0, corr_coefht=2.,
-                win_length_weight=1.0)
-        except Exception: #Catches unexpected numba errors, I hope
-            traceback.print_exc()
-            rg = -1
-            rger = -1
-            i0 = -1
-            i0er = -1
-            idx_min = -1
-            idx_max = -1
+    guinier_sums = guinierWindowSums(qs, il, iler, error_weight)
+    fit_cache = {}
 
-    if rg == -1:
-        #If we don't find a fit, relax the criteria
-        try:
-            rg, rger, i0, i0er, idx_min, idx_max = autoRg_inner(q, i, err, qmin,
-                single_fit, error_weight, min_window=10, min_qrg=1.0, max_qrg=1.35,
-                quality_thresh=0.6, data_range_scale=100, corr_coefht=2.,
-                win_length_weight=1.0)
-        except Exception: #Catches unexpected numba errors, I hope
-            traceback.print_exc()
-            rg = -1
-            rger = -1
-            i0 = -1
-            i0er = -1
-            idx_min = -1
-            idx_max = -1
+    for level in autorg_levels:
+        min_window, min_qrg, max_qrg, quality_thresh, data_range_scale = level
 
-    if rg == -1:
-        #If we don't find a fit, relax the criteria
         try:
-            rg, rger, i0, i0er, idx_min, idx_max = autoRg_inner(q, i, err, qmin,
-                single_fit, error_weight, min_window=10, min_qrg=1.2, max_qrg=1.5,
-                quality_thresh=0.3, data_range_scale=100, corr_coefht=2.,
-                win_length_weight=1.0)
+            rg, rger, i0, i0er, idx_min, idx_max = autoRgLevel(q, i, qs, il,
+                iler, guinier_sums, fit_cache, single_fit, error_weight,
+                min_window, min_qrg, max_qrg, quality_thresh, data_range_scale,
+                corr_coefht=2., win_length_weight=1.0)
         except Exception: #Catches unexpected numba errors, I hope
             traceback.print_exc()
             rg = -1
@@ -488,38 +468,311 @@ def autoRg(sasm, single_fit=False, error_weight=True):
             idx_min = -1
             idx_max = -1
 
-    if rg == -1:
-        #If we don't find a fit, relax the criteria
-        try:
-            rg, rger, i0, i0er, idx_min, idx_max = autoRg_inner(q, i, err, qmin,
-                single_fit, error_weight, min_window=5, min_qrg=1.2, max_qrg=1.5,
-                quality_thresh=0.3, data_range_scale=100, corr_coefht=2.,
-                win_length_weight=1.0)
-        except Exception: #Catches unexpected numba errors, I hope
-            traceback.print_exc()
-            rg = -1
-            rger = -1
-            i0 = -1
-            i0er = -1
-            idx_min = -1
-            idx_max = -1
+        if rg != -1:
+            break
+
+    idx_min = idx_min + qmin
+    idx_max = idx_max + qmin
+
+    return rg, rger, i0, i0er, idx_min, idx_max
+
+def autoRgLevel(q, i, qs, il, iler, guinier_sums, fit_cache, single_fit,
+    error_weight, min_window, min_qrg, max_qrg, quality_thresh,
+    data_range_scale, corr_coefht=2., win_length_weight=1.0):
+    """
+    Equivalent to autoRg_inner, using the window sums from guinierWindowSums
+    to skip windows that can't be a good fit. Exact window fits are stored
+    in fit_cache (an empty dict to start) so they can be reused when
+    searching with other criteria.
+    """
+    data_start, data_end = autoRg_data_range(q, i, data_range_scale)
+
+    window_list, data_step = autoRg_window_list(data_start, data_end,
+        min_window)
+
+    starts = [np.arange(data_start, data_end-w, data_step) for w in window_list]
+    ws = [np.full(len(start_range), w) for start_range, w in zip(starts, window_list)]
+
+    starts = np.concatenate(starts).astype(np.int64)
+    ws = np.concatenate(ws).astype(np.int64)
+
+    if len(starts) == 0:
+        return -1, -1, -1, -1, -1, -1
+
+    to_fit = screenGuinierWindows(q, guinier_sums, starts, ws, min_qrg,
+        max_qrg, error_weight)
+
+    # The range refinement uses the Rg of the last window searched
+    to_fit[-1] = True
+
+    starts = starts[to_fit]
+    ws = ws[to_fit]
+    ends = starts + ws
+
+    rows = _getCachedWindowFits(fit_cache, qs, il, iler, starts, ws,
+        error_weight)
+
+    RG, I0, RGer, I0er, a, b = fit_cache['fits'][rows].T
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        good_fit = ((RG > 0.1) & (q[starts]*RG < min_qrg)
+            & (q[ends-1]*RG < max_qrg) & (RGer/RG <= 1))
+
+    rows = rows[good_fit]
+
+    _getCachedWindowQuality(fit_cache, qs, il, iler, rows)
+
+    r_sqr, chi_sqr, reduced_chi_sqr, corr_coef = fit_cache['quality'][rows].T
+
+    good_fit[good_fit] = r_sqr > .15
+
+    if np.any(good_fit):
+        keep = r_sqr > .15
+        fit_starts = starts[good_fit]
+        fit_ends = ends[good_fit]-1
+        fit_rg = RG[good_fit]
+
+        fit_array = np.column_stack((fit_starts, ws[good_fit], q[fit_starts],
+            q[fit_ends], fit_rg, RGer[good_fit], I0[good_fit], I0er[good_fit],
+            q[fit_starts]*fit_rg, q[fit_ends]*fit_rg, r_sqr[keep],
+            chi_sqr[keep], reduced_chi_sqr[keep], corr_coef[keep]))
+
+        rg, rger, i0, i0er, idx_min, idx_max = autoRg_refine(q, qs, il, iler,
+            fit_array, single_fit, error_weight, min_qrg, max_qrg,
+            quality_thresh, corr_coefht, win_length_weight, RG[-1],
+            window_list[-1])
+    else:
+        rg = -1
+        rger = -1
+        i0 = -1
+        i0er = -1
+        idx_min = -1
+        idx_max = -1
 
     return rg, rger, i0, i0er, idx_min, idx_max
 
+def _getCachedWindowFits(fit_cache, qs, il, iler, starts, ws, error_weight):
+    """
+    Returns the rows of fit_cache['fits'] for the given windows, fitting
+    any windows that aren't already in the cache.
+    """
+    keys = starts*(len(qs)+1) + ws
+
+    if 'keys' not in fit_cache:
+        fit_cache['keys'] = np.empty(0, dtype=np.int64)
+        fit_cache['order'] = np.empty(0, dtype=np.int64)
+        fit_cache['fits'] = np.empty((0, 6))
+        fit_cache['quality'] = np.empty((0, 4))
+        fit_cache['has_quality'] = np.empty(0, dtype=bool)
+
+    rows = _findCachedWindows(fit_cache, keys)
+    missing = rows == -1
+
+    if np.any(missing):
+        new_fits = autoRg_fit_windows(qs, il, iler, starts[missing],
+            ws[missing], error_weight)
+
+        num_cached = len(fit_cache['keys'])
+        num_new = len(new_fits)
+
+        fit_cache['keys'] = np.concatenate((fit_cache['keys'], keys[missing]))
+        fit_cache['order'] = np.argsort(fit_cache['keys'], kind='stable')
+        fit_cache['fits'] = np.concatenate((fit_cache['fits'], new_fits))
+        fit_cache['quality'] = np.concatenate((fit_cache['quality'],
+            np.zeros((num_new, 4))))
+        fit_cache['has_quality'] = np.concatenate((fit_cache['has_quality'],
+            np.zeros(num_new, dtype=bool)))
+
+        rows[missing] = np.arange(num_cached, num_cached+num_new)
+
+    return rows
+
+def _findCachedWindows(fit_cache, keys):
+    """
+    Returns the row in the window fit cache of each key, or -1 if it
+    isn't cached.
+    """
+    rows = np.full(len(keys), -1, dtype=np.int64)
+
+    cached_keys = fit_cache['keys']
+
+    if len(cached_keys) > 0:
+        order = fit_cache['order']
+        sorted_keys = cached_keys[order]
+
+        pos = np.searchsorted(sorted_keys, keys)
+        pos[pos == len(sorted_keys)] = 0
+        found = sorted_keys[pos] == keys
+
+        rows[found] = order[pos[found]]
+
+    return rows
+
+def _getCachedWindowQuality(fit_cache, qs, il, iler, rows):
+    """
+    Makes sure the fit quality statistics are cached for the given rows of
+    the window fit cache.
+    """
+    missing = rows[~fit_cache['has_quality'][rows]]
+
+    if len(missing) > 0:
+        keys = fit_cache['keys'][missing]
+        ws = keys % (len(qs)+1)
+        starts = keys // (len(qs)+1)
+        a = fit_cache['fits'][missing, 4]
+        b = fit_cache['fits'][missing, 5]
+
+        fit_cache['quality'][missing] = autoRg_window_qualities(qs, il, iler,
+            starts, ws, a, b)
+        fit_cache['has_quality'][missing] = True
+
+def guinierWindowSums(qs, il, iler, error_weight):
+    """
+    Cumulative sums used by screenGuinierWindows to estimate the Guinier fit
+    of any window of the data in constant time. Points where ln(I) isn't
+    finite are counted separately, as windows with those points never pass
+    the r^2 test. Points where the uncertainty isn't usable are also
+    counted separately, as windows with those points are always fit exactly.
+    Returns an array with rows of the cumulative sums of: bad uncertainty
+    points, good points, x, y, x^2, xy, y^2, w, wx, wy, wx^2, wxy,
+    non-finite ln(I) points.
+    """
+    finite = np.isfinite(il)
+    good = finite & np.isfinite(iler)
+
+    if error_weight:
+        good = good & (iler != 0)
+
+    # Shift the data to reduce the round off error in the sums. This doesn't
+    # change the fit slope or residuals.
+    if np.any(good):
+        x0 = qs[good].mean()
+        y0 = il[good].mean()
+    else:
+        x0 = 0.
+        y0 = 0.
+
+    x = np.where(good, qs-x0, 0.)
+    y = np.where(good, il-y0, 0.)
+
+    if error_weight:
+        weights = np.where(good, 1./np.square(np.where(good, iler, 1.)), 0.)
+    else:
+        weights = good.astype(float)
+
+    vals = np.vstack((finite & ~good, good, x, y, x*x, x*y, y*y, weights,
+        weights*x, weights*y, weights*x*x, weights*x*y, ~finite)).astype(float)
+
+    sums = np.zeros((vals.shape[0], vals.shape[1]+1))
+    sums[:, 1:] = np.cumsum(vals, axis=1)
+
+    return sums
+
 @jit(nopython=True, cache=True, parallel=False)
-def autoRg_inner(q, i, err, qmin, single_fit, error_weight, min_window=10,
-    min_qrg=1.0, max_qrg=1.35, quality_thresh=0.6, data_range_scale=0,
-    corr_coefht=2., win_length_weight=1.0):
-    #Pick the start of the RG fitting range. Note that in autorg, this is done
-    #by looking for strong deviations at low q from aggregation or structure factor
-    #or instrumental scattering, and ignoring those. This function isn't that advanced
-    #so we start at 0.
+def screenGuinierWindows(q, guinier_sums, starts, ws, min_qrg, max_qrg,
+    error_weight, tol=1e-5):
+    """
+    Estimates the Guinier fit of each window from the window sums and
+    returns a bool array that is False for windows that clearly fail the
+    autoRg fit criteria, and True for windows that need an exact fit. The
+    criteria are loosened by tol so that round off in the sums can't
+    exclude a window that passes.
+    """
+    to_fit = np.ones(len(starts), dtype=np.bool_)
+
+    for k in range(len(starts)):
+        start = starts[k]
+        end = starts[k] + ws[k]
+
+        bad = guinier_sums[0, end] - guinier_sums[0, start]
+        n = guinier_sums[1, end] - guinier_sums[1, start]
+
+        # The r^2 of a window with non-finite ln(I) values is NaN, so it
+        # can't pass. Windows with two finite points are still fit, as the
+        # unweighted fit raises an error that fails the whole search.
+        if (guinier_sums[12, end] - guinier_sums[12, start] > 0
+            and bad + n != 2):
+            to_fit[k] = False
+            continue
+
+        if bad > 0 or n <= 2:
+            continue
+
+        sx = guinier_sums[2, end] - guinier_sums[2, start]
+        sy = guinier_sums[3, end] - guinier_sums[3, start]
+        sxx = guinier_sums[4, end] - guinier_sums[4, start]
+        sxy = guinier_sums[5, end] - guinier_sums[5, start]
+        syy = guinier_sums[6, end] - guinier_sums[6, start]
+
+        mx = sx/n
+        my = sy/n
+        sxx_c = sxx - n*mx*mx
+        sxy_c = sxy - n*mx*my
+        ss_tot = syy - n*my*my
+
+        if ss_tot <= 1e-9*syy:
+            continue
+
+        if error_weight:
+            sw = guinier_sums[7, end] - guinier_sums[7, start]
+            swx = guinier_sums[8, end] - guinier_sums[8, start]
+            swy = guinier_sums[9, end] - guinier_sums[9, start]
+            swxx = guinier_sums[10, end] - guinier_sums[10, start]
+            swxy = guinier_sums[11, end] - guinier_sums[11, start]
+
+            if sw <= 0:
+                continue
+
+            mxw = swx/sw
+            myw = swy/sw
+            swxx_c = swxx - sw*mxw*mxw
+            swxy_c = swxy - sw*mxw*myw
+
+            if swxx_c <= 1e-12*swxx:
+                continue
+
+            b = swxy_c/swxx_c
+            cov_b = 1./swxx_c
+            offset = (my - myw) - b*(mx - mxw)
 
-    # Note, in order to speed this up using numba, I had to do some unpythonic things
-    # with declaring lists ahead of time, and making sure lists didn't have multiple
-    # object types in them. It makes the code a bit more messy than the original
-    # version, but numba provides a significant speedup.
+        else:
+            if sxx_c <= 1e-12*sxx:
+                continue
+
+            b = sxy_c/sxx_c
+            offset = 0.
+
+        ss_res = ss_tot - 2*b*sxy_c + b*b*sxx_c + n*offset*offset
+
+        if not error_weight:
+            cov_b = ss_res/(n-2.)/sxx_c
+
+        r_sqr = 1 - ss_res/ss_tot
 
+        if b < 0:
+            rg = np.sqrt(abs(3.*b))
+            rger = abs(0.5*np.sqrt(abs(3./b)))*np.sqrt(abs(cov_b))
+        else:
+            rg = -1.
+            rger = 0.
+
+        # Fall back to an exact fit anywhere the estimate isn't reliable
+        if not (np.isfinite(rg) and np.isfinite(rger) and np.isfinite(r_sqr)):
+            continue
+
+        to_fit[k] = ((rg > 0.1*(1-tol)) and (q[start]*rg < min_qrg*(1+tol))
+            and (q[end-1]*rg < max_qrg*(1+tol)) and (rger <= rg*(1+tol))
+            and (r_sqr > 0.15-tol))
+
+    return to_fit
+
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_data_range(q, i, data_range_scale):
+    """
+    Finds the start and end indices of the autoRg search range. If
+    data_range_scale is 0 it is chosen based on the intensity range of
+    the data.
+    """
     # Have to pick the right Starting range to avoid various weirdnesses in the data
     data_start = (i>0).argmax()
 
@@ -569,11 +822,28 @@ def autoRg_inner(q, i, err, qmin, single_fit, error_weight, min_window=10,
                 found = True
         data_end = idx
 
+    return data_start, data_end
+
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_transform(q, i, err):
+    """
+    Transforms the data for Guinier fitting, returning q^2, ln(I), and the
+    ln(I) uncertainty. This is jitted so that the results are identical
+    whether it is called from autoRg or autoRg_inner.
+    """
     #Start out by transforming as usual.
     qs = np.square(q)
     il = np.log(i)
     iler = np.absolute(err/i)
 
+    return qs, il, iler
+
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_window_list(data_start, data_end, min_window):
+    """
+    Returns the list of window sizes searched by autoRg, and the step
+    between window start points.
+    """
     #Pick a minimum fitting window size. 10 is consistent with atsas autorg.
     min_window = min_window
 
@@ -600,40 +870,192 @@ def autoRg_inner(q, i, err, qmin, single_fit, error_weight, min_window=10,
 
     window_list[-1] = max_window
 
-    num_fits = 0
+    return window_list, data_step
 
-    for w in window_list:
-        num_fits = num_fits + int(math.ceil((data_end-w-data_start)/float(data_step)))
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_window_fit(qs, il, iler, start, w, error_weight):
+    """
+    Guinier fit of a single autoRg window. qs, il, and iler are the q^2,
+    ln(I), and ln(I) uncertainty.
+    """
+    x = qs[start:start+w]
+    y = il[start:start+w]
+    yerr = iler[start:start+w]
 
-    if num_fits < 0:
-        num_fits = 1
+    #Remove NaN and Inf values:
+    x = x[np.where(np.isfinite(y))]
+    yerr = yerr[np.where(np.isfinite(y))]
+    y = y[np.where(np.isfinite(y))]
 
-    start_list = [0 for k in range(num_fits)]
-    w_list = [0 for k in range(num_fits)]
-    q_start_list = [0. for k in range(num_fits)]
-    q_end_list = [0. for k in range(num_fits)]
-    rg_list = [0. for k in range(num_fits)]
-    rger_list = [0. for k in range(num_fits)]
-    i0_list = [0. for k in range(num_fits)]
-    i0er_list = [0. for k in range(num_fits)]
-    qrg_start_list = [0. for k in range(num_fits)]
-    qrg_end_list = [0. for k in range(num_fits)]
-    rsqr_list = [0. for k in range(num_fits)]
-    chi_sqr_list = [0. for k in range(num_fits)]
-    reduced_chi_sqr_list = [0. for k in range(num_fits)]
-    corr_coef_list = [0. for k in range(num_fits)]
 
-    success = np.zeros(num_fits)
+    RG, I0, RGer, I0er, a, b = calcRg(x, y, yerr, transform=False, error_weight=error_weight)
 
-    current_fit = 0
-    #This function takes every window size in the window list, stepts it through the data range, and
-    #fits it to get the RG and I0. If basic conditions are met, qmin*RG<1 and qmax*RG<1.35, and RG>0.1,
-    #We keep the fit.
-    for w in window_list:
-        for start in range(data_start,data_end-w, data_step):
-            x = qs[start:start+w]
-            y = il[start:start+w]
-            yerr = iler[start:start+w]
+    return RG, I0, RGer, I0er, a, b
+
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_window_quality(qs, il, iler, start, w, a, b):
+    """
+    Fit quality statistics for a single autoRg window with fit parameters
+    a and b. The chi squared values and correlation coefficient are only
+    calculated if r^2 > 0.15, otherwise they are returned as 0.
+    """
+    residual = il[start:start+w]-linear_func(qs[start:start+w], a, b)
+
+    r_sqr = 1 - np.square(residual).sum()/np.square(il[start:start+w]-il[start:start+w].mean()).sum()
+
+    chi_sqr = 0.
+    reduced_chi_sqr = 0.
+    corr_coef = 0.
+
+    if r_sqr > .15:
+        chi_sqr = np.square((residual)/iler[start:start+w]).sum()
+
+        #All of my reduced chi_squared values are too small, so I suspect something isn't right with that.
+        #Values less than one tend to indicate either a wrong degree of freedom, or a serious overestimate
+        #of the error bars for the system.
+        dof = w - 2.
+        reduced_chi_sqr = chi_sqr/dof
+
+        #Ideally this would be a pvalue, but I'd have to invest in a lot of intrastructure to actually calculate that in a jitted function
+        corr_coef = 1- spearmanr(residual, qs[start:start+w])
+
+    return r_sqr, chi_sqr, reduced_chi_sqr, corr_coef
+
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_fit_windows(qs, il, iler, starts, ws, error_weight):
+    """
+    Guinier fits of a set of windows. Returns an array with one row of
+    Rg, I0, Rg error, I0 error, a, b per window.
+    """
+    fits = np.empty((len(starts), 6))
+
+    for k in range(len(starts)):
+        RG, I0, RGer, I0er, a, b = autoRg_window_fit(qs, il, iler, starts[k],
+            ws[k], error_weight)
+
+        fits[k, 0] = RG
+        fits[k, 1] = I0
+        fits[k, 2] = RGer
+        fits[k, 3] = I0er
+        fits[k, 4] = a
+        fits[k, 5] = b
+
+    return fits
+
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_window_qualities(qs, il, iler, starts, ws, a, b):
+    """
+    Fit quality statistics of a set of windows. Returns an array with one
+    row of r^2, chi^2, reduced chi^2, and correlation coefficient per window.
+    """
+    quality = np.empty((len(starts), 4))
+
+    for k in range(len(starts)):
+        (r_sqr, chi_sqr, reduced_chi_sqr,
+            corr_coef) = autoRg_window_quality(qs, il, iler, starts[k],
+            ws[k], a[k], b[k])
+
+        quality[k, 0] = r_sqr
+        quality[k, 1] = chi_sqr
+        quality[k, 2] = reduced_chi_sqr
+        quality[k, 3] = corr_coef
+
+    return quality
+
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_refine(q, qs, il, iler, fit_array, single_fit, error_weight, min_qrg,
+    max_qrg, quality_thresh, corr_coefht, win_length_weight, RG, w):
+    """
+    Scores the autoRg candidate fits in fit_array, picks the best one, and
+    refines its q range. RG and w are the Rg and size of the last window
+    searched.
+    """
+    #Now we evaluate the quality of the fits based both on fitting data and on other criteria.
+
+    # Choice of weights is pretty arbitrary, but has been tested against
+    # all the data in the SASBDB (as of 11/2020)
+    qmaxrg_weight = 1
+    qminrg_weight = 1
+    rg_frac_err_weight = 1
+    i0_frac_err_weight = 1
+    r_sqr_weight = 4
+    reduced_chi_sqr_weight = 0
+    window_size_weight = win_length_weight
+    corr_coef_weight = corr_coefht
+
+    weights = np.array([qmaxrg_weight, qminrg_weight, rg_frac_err_weight,
+        i0_frac_err_weight, r_sqr_weight, reduced_chi_sqr_weight,
+        window_size_weight, corr_coef_weight])
+
+    quality = np.zeros(len(fit_array))
+
+    max_window_real = float(fit_array[:,1].max())
+
+
+    #This iterates through all the fits, and calculates a score. The score is out of 1, 1 being the best, 0 being the worst.
+    indices =list(range(len(fit_array)))
+    for a in indices:
+        k=int(a) #This is stupid and should not be necessary. Numba bug?
+
+        #Scores all should be 1 based. Reduced chi_square score is not, hence it not being weighted.
+        qmaxrg_score = 1-abs((fit_array[k,9]-1.3)/1.3)
+        qminrg_score = 1-fit_array[k,8]
+        rg_frac_err_score = 1-fit_array[k,5]/fit_array[k,4]
+        i0_frac_err_score = 1 - fit_array[k,7]/fit_array[k,6]
+        r_sqr_score = fit_array[k,10]
+        reduced_chi_sqr_score = 1/fit_array[k,12] #Not right
+        window_size_score = fit_array[k,1]/max_window_real
+        corr_coef_score = fit_array[k,13]
+
+        scores = np.array([qmaxrg_score, qminrg_score, rg_frac_err_score,
+            i0_frac_err_score, r_sqr_score, reduced_chi_sqr_score,
+            window_size_score, corr_coef_score])
+
+        total_score = (weights*scores).sum()/weights.sum()
+
+        quality[k] = total_score
+
+        # all_scores[k] = scores
+
+    #I have picked an aribtrary threshold here. Not sure if 0.6 is a good quality cutoff or not.
+    if quality.max() > quality_thresh:
+        if not single_fit:
+            idx = quality.argmax()
+            rger = fit_array[:,5][quality>quality[idx]-.1].std()
+            i0er = fit_array[:,7][quality>quality[idx]-.1].std()
+            idx_min = int(fit_array[idx,0])
+            idx_max = int(fit_array[idx,0]+fit_array[idx,1]-1)
+        else:
+            idx = quality.argmax()
+            idx_min = int(fit_array[idx,0])
+            idx_max = int(fit_array[idx,0]+fit_array[idx,1]-1)
+
+
+        # Now refine the range a bit
+        max_quality = quality.max()
+        qual = max_quality
+
+        idx_max_ref = idx_max
+
+        if max_qrg == 1.35:
+            max_qrg_ref = 1.3
+        else:
+            max_qrg_ref = max_qrg
+
+        if q[idx_max]*RG<1.0:
+            quality_scale = 0.9
+            r_thresh = 0.1
+        else:
+            quality_scale = 0.97
+            r_thresh = 0.15
+
+        # Refine upper end of range
+        while qual > quality_scale*max_quality and idx_max_ref < len(q):
+
+            idx_max_ref = idx_max_ref +1
+            x = qs[idx_min:idx_max_ref+1]
+            y = il[idx_min:idx_max_ref+1]
+            yerr = iler[idx_min:idx_max_ref+1]
 
             #Remove NaN and Inf values:
             x = x[np.where(np.isfinite(y))]
@@ -641,15 +1063,16 @@ def autoRg_inner(q, i, err, qmin, single_fit, error_weight, min_window=10,
             y = y[np.where(np.isfinite(y))]
 
 
-            RG, I0, RGer, I0er, a, b = calcRg(x, y, yerr, transform=False, error_weight=error_weight)
+            RG, I0, RGer, I0er, a, b = calcRg(x, y, yerr, transform=False,
+                error_weight=error_weight)
 
-            if RG>0.1 and q[start]*RG<min_qrg and q[start+w-1]*RG<max_qrg and RGer/RG <= 1:
-                residual = il[start:start+w]-linear_func(qs[start:start+w], a, b)
+            if RG>0.1 and q[idx_min]*RG<min_qrg and q[idx_max_ref]*RG<max_qrg_ref and RGer/RG <= 1:
+                residual = il[idx_min:idx_max_ref+1]- linear_func(qs[idx_min:idx_max_ref+1], a, b)
 
-                r_sqr = 1 - np.square(residual).sum()/np.square(il[start:start+w]-il[start:start+w].mean()).sum()
+                r_sqr = (1 - np.square(residual).sum()/np.square(il[idx_min:idx_max_ref+1]-il[idx_min:idx_max_ref+1].mean()).sum())
 
-                if r_sqr > .15:
-                    chi_sqr = np.square((residual)/iler[start:start+w]).sum()
+                if r_sqr > r_thresh:
+                    chi_sqr = np.square(residual/iler[idx_min:idx_max_ref+1]).sum()
 
                     #All of my reduced chi_squared values are too small, so I suspect something isn't right with that.
                     #Values less than one tend to indicate either a wrong degree of freedom, or a serious overestimate
@@ -657,270 +1080,226 @@ def autoRg_inner(q, i, err, qmin, single_fit, error_weight, min_window=10,
                     dof = w - 2.
                     reduced_chi_sqr = chi_sqr/dof
 
-                    #Ideally this would be a pvalue, but I'd have to invest in a lot of intrastructure to actually calculate that in a jitted function
-                    corr_coef = 1- spearmanr(residual, qs[start:start+w])
-
-                    start_list[current_fit] = start
-                    w_list[current_fit] = w
-                    q_start_list[current_fit] = q[start]
-                    q_end_list[current_fit] = q[start+w-1]
-                    rg_list[current_fit] = RG
-                    rger_list[current_fit] = RGer
-                    i0_list[current_fit] = I0
-                    i0er_list[current_fit] = I0er
-                    qrg_start_list[current_fit] = q[start]*RG
-                    qrg_end_list[current_fit] = q[start+w-1]*RG
-                    rsqr_list[current_fit] = r_sqr
-                    chi_sqr_list[current_fit] = chi_sqr
-                    reduced_chi_sqr_list[current_fit] = reduced_chi_sqr
-                    corr_coef_list[current_fit] = corr_coef
-
-                    success[current_fit] = 1
-
-            current_fit = current_fit + 1
-
-    if np.sum(success) > 0:
+                    corr_coef = 1- spearmanr(residual, qs[idx_min:idx_max_ref+1])
 
-        fit_array = np.array([[start_list[k], w_list[k], q_start_list[k],
-            q_end_list[k], rg_list[k], rger_list[k], i0_list[k], i0er_list[k],
-            qrg_start_list[k], qrg_end_list[k], rsqr_list[k], chi_sqr_list[k],
-            reduced_chi_sqr_list[k], corr_coef_list[k]] for k in range(num_fits) if success[k]==1])
+                    qmaxrg_score = 1-abs((q[idx_max_ref]*RG-1.3)/1.3)
+                    qminrg_score = 1-q[idx_min]*RG
+                    rg_frac_err_score = 1-RGer/RG
+                    i0_frac_err_score = 1 - I0er/I0
+                    r_sqr_score = r_sqr
+                    reduced_chi_sqr_score = 1/reduced_chi_sqr #Not right
+                    window_size_score = fit_array[k,1]/max_window_real
+                    corr_coef_score = corr_coef
 
-        #Now we evaluate the quality of the fits based both on fitting data and on other criteria.
-
-        # Choice of weights is pretty arbitrary, but has been tested against
-        # all the data in the SASBDB (as of 11/2020)
-        qmaxrg_weight = 1
-        qminrg_weight = 1
-        rg_frac_err_weight = 1
-        i0_frac_err_weight = 1
-        r_sqr_weight = 4
-        reduced_chi_sqr_weight = 0
-        window_size_weight = win_length_weight
-        corr_coef_weight = corr_coefht
-
-        weights = np.array([qmaxrg_weight, qminrg_weight, rg_frac_err_weight,
-            i0_frac_err_weight, r_sqr_weight, reduced_chi_sqr_weight,
-            window_size_weight, corr_coef_weight])
-
-        quality = np.zeros(len(fit_array))
-
-        max_window_real = float(max(w_list))
-
-
-        #This iterates through all the fits, and calculates a score. The score is out of 1, 1 being the best, 0 being the worst.
-        indices =list(range(len(fit_array)))
-        for a in indices:
-            k=int(a) #This is stupid and should not be necessary. Numba bug?
-
-            #Scores all should be 1 based. Reduced chi_square score is not, hence it not being weighted.
-            qmaxrg_score = 1-abs((fit_array[k,9]-1.3)/1.3)
-            qminrg_score = 1-fit_array[k,8]
-            rg_frac_err_score = 1-fit_array[k,5]/fit_array[k,4]
-            i0_frac_err_score = 1 - fit_array[k,7]/fit_array[k,6]
-            r_sqr_score = fit_array[k,10]
-            reduced_chi_sqr_score = 1/fit_array[k,12] #Not right
-            window_size_score = fit_array[k,1]/max_window_real
-            corr_coef_score = fit_array[k,13]
-
-            scores = np.array([qmaxrg_score, qminrg_score, rg_frac_err_score,
-                i0_frac_err_score, r_sqr_score, reduced_chi_sqr_score,
-                window_size_score, corr_coef_score])
-
-            total_score = (weights*scores).sum()/weights.sum()
-
-            quality[k] = total_score
-
-            # all_scores[k] = scores
-
-        #I have picked an aribtrary threshold here. Not sure if 0.6 is a good quality cutoff or not.
-        if quality.max() > quality_thresh:
-            if not single_fit:
-                idx = quality.argmax()
-                rger = fit_array[:,5][quality>quality[idx]-.1].std()
-                i0er = fit_array[:,7][quality>quality[idx]-.1].std()
-                idx_min = int(fit_array[idx,0])
-                idx_max = int(fit_array[idx,0]+fit_array[idx,1]-1)
-            else:
-                idx = quality.argmax()
-                idx_min = int(fit_array[idx,0])
-                idx_max = int(fit_array[idx,0]+fit_array[idx,1]-1)
+                    scores = np.array([qmaxrg_score, qminrg_score,
+                        rg_frac_err_score, i0_frac_err_score, r_sqr_score,
+                        reduced_chi_sqr_score, window_size_score,
+                        corr_coef_score])
 
 
-            # Now refine the range a bit
-            max_quality = quality.max()
-            qual = max_quality
+                    qual = (weights*scores).sum()/weights.sum()
 
-            idx_max_ref = idx_max
+                    if q[idx_max]*RG<1.0:
+                        quality_scale = 0.9
+                        r_thresh = 0.1
+                    else:
+                        quality_scale = 0.97
+                        r_thresh = 0.15
 
-            if max_qrg == 1.35:
-                max_qrg_ref = 1.3
-            else:
-                max_qrg_ref = max_qrg
+                else:
+                    qual = -1
 
-            if q[idx_max]*RG<1.0:
-                quality_scale = 0.9
-                r_thresh = 0.1
             else:
-                quality_scale = 0.97
-                r_thresh = 0.15
+                qual = -1
 
-            # Refine upper end of range
-            while qual > quality_scale*max_quality and idx_max_ref < len(q):
+            max_quality = max(max_quality, qual)
 
-                idx_max_ref = idx_max_ref +1
-                x = qs[idx_min:idx_max_ref+1]
-                y = il[idx_min:idx_max_ref+1]
-                yerr = iler[idx_min:idx_max_ref+1]
+        idx_max = idx_max_ref -1
 
-                #Remove NaN and Inf values:
-                x = x[np.where(np.isfinite(y))]
-                yerr = yerr[np.where(np.isfinite(y))]
-                y = y[np.where(np.isfinite(y))]
+        # Refine lower end of range
+        idx_min_ref = idx_min
+        qual = max_quality
 
+        while qual > 0.97*max_quality and idx_min_ref > 0:
 
-                RG, I0, RGer, I0er, a, b = calcRg(x, y, yerr, transform=False,
-                    error_weight=error_weight)
+            idx_min_ref = idx_min_ref -1
+            x = qs[idx_min_ref:idx_max+1]
+            y = il[idx_min_ref:idx_max+1]
+            yerr = iler[idx_min_ref:idx_max+1]
 
-                if RG>0.1 and q[idx_min]*RG<min_qrg and q[idx_max_ref]*RG<max_qrg_ref and RGer/RG <= 1:
-                    residual = il[idx_min:idx_max_ref+1]- linear_func(qs[idx_min:idx_max_ref+1], a, b)
+            #Remove NaN and Inf values:
+            x = x[np.where(np.isfinite(y))]
+            yerr = yerr[np.where(np.isfinite(y))]
+            y = y[np.where(np.isfinite(y))]
 
-                    r_sqr = (1 - np.square(residual).sum()/np.square(il[idx_min:idx_max_ref+1]-il[idx_min:idx_max_ref+1].mean()).sum())
 
-                    if r_sqr > r_thresh:
-                        chi_sqr = np.square(residual/iler[idx_min:idx_max_ref+1]).sum()
+            RG, I0, RGer, I0er, a, b = calcRg(x, y, yerr, transform=False,
+                error_weight=error_weight)
 
-                        #All of my reduced chi_squared values are too small, so I suspect something isn't right with that.
-                        #Values less than one tend to indicate either a wrong degree of freedom, or a serious overestimate
-                        #of the error bars for the system.
-                        dof = w - 2.
-                        reduced_chi_sqr = chi_sqr/dof
+            if RG>0.1 and q[idx_min_ref]*RG<min_qrg and q[idx_max]*RG<max_qrg_ref and RGer/RG <= 1:
 
-                        corr_coef = 1- spearmanr(residual, qs[idx_min:idx_max_ref+1])
+                residual = il[idx_min_ref:idx_max+1]- linear_func(qs[idx_min_ref:idx_max+1], a, b)
 
-                        qmaxrg_score = 1-abs((q[idx_max_ref]*RG-1.3)/1.3)
-                        qminrg_score = 1-q[idx_min]*RG
-                        rg_frac_err_score = 1-RGer/RG
-                        i0_frac_err_score = 1 - I0er/I0
-                        r_sqr_score = r_sqr
-                        reduced_chi_sqr_score = 1/reduced_chi_sqr #Not right
-                        window_size_score = fit_array[k,1]/max_window_real
-                        corr_coef_score = corr_coef
+                r_sqr = (1 - np.square(residual).sum()/np.square(il[idx_min_ref:idx_max+1]-il[idx_min_ref:idx_max+1].mean()).sum())
 
-                        scores = np.array([qmaxrg_score, qminrg_score,
-                            rg_frac_err_score, i0_frac_err_score, r_sqr_score,
-                            reduced_chi_sqr_score, window_size_score,
-                            corr_coef_score])
+                if r_sqr > .15:
+                    chi_sqr = (np.square((residual)/iler[idx_min_ref:idx_max+1]).sum())
 
+                    #All of my reduced chi_squared values are too small, so I suspect something isn't right with that.
+                    #Values less than one tend to indicate either a wrong degree of freedom, or a serious overestimate
+                    #of the error bars for the system.
+                    dof = w - 2.
+                    reduced_chi_sqr = chi_sqr/dof
 
-                        qual = (weights*scores).sum()/weights.sum()
+                    corr_coef = 1- spearmanr(residual, qs[idx_min_ref:idx_max+1])
 
-                        if q[idx_max]*RG<1.0:
-                            quality_scale = 0.9
-                            r_thresh = 0.1
-                        else:
-                            quality_scale = 0.97
-                            r_thresh = 0.15
+                    qmaxrg_score = 1-abs((q[idx_max]*RG-1.3)/1.3)
+                    qminrg_score = 1-q[idx_min_ref]*RG
+                    rg_frac_err_score = 1-RGer/RG
+                    i0_frac_err_score = 1 - I0er/I0
+                    r_sqr_score = r_sqr
+                    reduced_chi_sqr_score = 1/reduced_chi_sqr #Not right
+                    window_size_score = fit_array[k,1]/max_window_real
+                    corr_coef_score = corr_coef
 
-                    else:
-                        qual = -1
+                    scores = np.array([qmaxrg_score, qminrg_score,
+                        rg_frac_err_score, i0_frac_err_score, r_sqr_score,
+                        reduced_chi_sqr_score, window_size_score,
+                        corr_coef_score])
 
+                    qual = (weights*scores).sum()/weights.sum()
                 else:
                     qual = -1
 
-                max_quality = max(max_quality, qual)
+            else:
+                qual = -1
+
+            max_quality = max(max_quality, qual)
 
-            idx_max = idx_max_ref -1
+        if idx_min_ref == 0 and qual != -1:
+            idx_min = idx_min_ref
+        else:
+            idx_min = idx_min_ref +1
 
-            # Refine lower end of range
-            idx_min_ref = idx_min
-            qual = max_quality
+        # Recalculate Guinier values with the new min and max idx
+        x = qs[idx_min:idx_max+1]
+        y = il[idx_min:idx_max+1]
+        yerr = iler[idx_min:idx_max+1]
+
+        #Remove NaN and Inf values:
+        x = x[np.where(np.isfinite(y))]
+        yerr = yerr[np.where(np.isfinite(y))]
+        y = y[np.where(np.isfinite(y))]
 
-            while qual > 0.97*max_quality and idx_min_ref > 0:
+        rg, i0, Rger, I0er, a, b = calcRg(x, y, yerr, transform=False,
+            error_weight=error_weight)
 
-                idx_min_ref = idx_min_ref -1
-                x = qs[idx_min_ref:idx_max+1]
-                y = il[idx_min_ref:idx_max+1]
-                yerr = iler[idx_min_ref:idx_max+1]
+        if single_fit:
+            rger = Rger
+            i0er = I0er
 
-                #Remove NaN and Inf values:
-                x = x[np.where(np.isfinite(y))]
-                yerr = yerr[np.where(np.isfinite(y))]
-                y = y[np.where(np.isfinite(y))]
+    else:
+        rg = -1
+        rger = -1
+        i0 = -1
+        i0er = -1
+        idx_min = -1
+        idx_max = -1
 
+    return rg, rger, i0, i0er, idx_min, idx_max
 
-                RG, I0, RGer, I0er, a, b = calcRg(x, y, yerr, transform=False,
-                    error_weight=error_weight)
+@jit(nopython=True, cache=True, parallel=False)
+def autoRg_inner(q, i, err, qmin, single_fit, error_weight, min_window=10,
+    min_qrg=1.0, max_qrg=1.35, quality_thresh=0.6, data_range_scale=0,
+    corr_coefht=2., win_length_weight=1.0):
+    #Pick the start of the RG fitting range. Note that in autorg, this is done
+    #by looking for strong deviations at low q from aggregation or structure factor
+    #or instrumental scattering, and ignoring those. This function isn't that advanced
+    #so we start at 0.
 
-                if RG>0.1 and q[idx_min_ref]*RG<min_qrg and q[idx_max]*RG<max_qrg_ref and RGer/RG <= 1:
+    # Note, in order to speed this up using numba, I had to do some unpythonic things
+    # with declaring lists ahead of time, and making sure lists didn't have multiple
+    # object types in them. It makes the code a bit more messy than the original
+    # version, but numba provides a significant speedup.
 
-                    residual = il[idx_min_ref:idx_max+1]- linear_func(qs[idx_min_ref:idx_max+1], a, b)
+    data_start, data_end = autoRg_data_range(q, i, data_range_scale)
 
-                    r_sqr = (1 - np.square(residual).sum()/np.square(il[idx_min_ref:idx_max+1]-il[idx_min_ref:idx_max+1].mean()).sum())
+    qs, il, iler = autoRg_transform(q, i, err)
 
-                    if r_sqr > .15:
-                        chi_sqr = (np.square((residual)/iler[idx_min_ref:idx_max+1]).sum())
+    window_list, data_step = autoRg_window_list(data_start, data_end,
+        min_window)
 
-                        #All of my reduced chi_squared values are too small, so I suspect something isn't right with that.
-                        #Values less than one tend to indicate either a wrong degree of freedom, or a serious overestimate
-                        #of the error bars for the system.
-                        dof = w - 2.
-                        reduced_chi_sqr = chi_sqr/dof
+    num_fits = 0
 
-                        corr_coef = 1- spearmanr(residual, qs[idx_min_ref:idx_max+1])
+    for w in window_list:
+        num_fits = num_fits + int(math.ceil((data_end-w-data_start)/float(data_step)))
 
-                        qmaxrg_score = 1-abs((q[idx_max]*RG-1.3)/1.3)
-                        qminrg_score = 1-q[idx_min_ref]*RG
-                        rg_frac_err_score = 1-RGer/RG
-                        i0_frac_err_score = 1 - I0er/I0
-                        r_sqr_score = r_sqr
-                        reduced_chi_sqr_score = 1/reduced_chi_sqr #Not right
-                        window_size_score = fit_array[k,1]/max_window_real
-                        corr_coef_score = corr_coef
+    if num_fits < 0:
+        num_fits = 1
 
-                        scores = np.array([qmaxrg_score, qminrg_score,
-                            rg_frac_err_score, i0_frac_err_score, r_sqr_score,
-                            reduced_chi_sqr_score, window_size_score,
-                            corr_coef_score])
+    start_list = [0 for k in range(num_fits)]
+    w_list = [0 for k in range(num_fits)]
+    q_start_list = [0. for k in range(num_fits)]
+    q_end_list = [0. for k in range(num_fits)]
+    rg_list = [0. for k in range(num_fits)]
+    rger_list = [0. for k in range(num_fits)]
+    i0_list = [0. for k in range(num_fits)]
+    i0er_list = [0. for k in range(num_fits)]
+    qrg_start_list = [0. for k in range(num_fits)]
+    qrg_end_list = [0. for k in range(num_fits)]
+    rsqr_list = [0. for k in range(num_fits)]
+    chi_sqr_list = [0. for k in range(num_fits)]
+    reduced_chi_sqr_list = [0. for k in range(num_fits)]
+    corr_coef_list = [0. for k in range(num_fits)]
 
-                        qual = (weights*scores).sum()/weights.sum()
-                    else:
-                        qual = -1
+    success = np.zeros(num_fits)
 
-                else:
-                    qual = -1
+    current_fit = 0
+    #This function takes every window size in the window list, stepts it through the data range, and
+    #fits it to get the RG and I0. If basic conditions are met, qmin*RG<1 and qmax*RG<1.35, and RG>0.1,
+    #We keep the fit.
+    for w in window_list:
+        for start in range(data_start,data_end-w, data_step):
+            RG, I0, RGer, I0er, a, b = autoRg_window_fit(qs, il, iler, start,
+                w, error_weight)
 
-                max_quality = max(max_quality, qual)
+            if RG>0.1 and q[start]*RG<min_qrg and q[start+w-1]*RG<max_qrg and RGer/RG <= 1:
+                (r_sqr, chi_sqr, reduced_chi_sqr,
+                    corr_coef) = autoRg_window_quality(qs, il, iler, start, w,
+                    a, b)
 
-            if idx_min_ref == 0 and qual != -1:
-                idx_min = idx_min_ref
-            else:
-                idx_min = idx_min_ref +1
+                if r_sqr > .15:
+                    start_list[current_fit] = start
+                    w_list[current_fit] = w
+                    q_start_list[current_fit] = q[start]
+                    q_end_list[current_fit] = q[start+w-1]
+                    rg_list[current_fit] = RG
+                    rger_list[current_fit] = RGer
+                    i0_list[current_fit] = I0
+                    i0er_list[current_fit] = I0er
+                    qrg_start_list[current_fit] = q[start]*RG
+                    qrg_end_list[current_fit] = q[start+w-1]*RG
+                    rsqr_list[current_fit] = r_sqr
+                    chi_sqr_list[current_fit] = chi_sqr
+                    reduced_chi_sqr_list[current_fit] = reduced_chi_sqr
+                    corr_coef_list[current_fit] = corr_coef
 
-            # Recalculate Guinier values with the new min and max idx
-            x = qs[idx_min:idx_max+1]
-            y = il[idx_min:idx_max+1]
-            yerr = iler[idx_min:idx_max+1]
+                    success[current_fit] = 1
 
-            #Remove NaN and Inf values:
-            x = x[np.where(np.isfinite(y))]
-            yerr = yerr[np.where(np.isfinite(y))]
-            y = y[np.where(np.isfinite(y))]
+            current_fit = current_fit + 1
 
-            rg, i0, Rger, I0er, a, b = calcRg(x, y, yerr, transform=False,
-                error_weight=error_weight)
+    if np.sum(success) > 0:
 
-            if single_fit:
-                rger = Rger
-                i0er = I0er
+        fit_array = np.array([[start_list[k], w_list[k], q_start_list[k],
+            q_end_list[k], rg_list[k], rger_list[k], i0_list[k], i0er_list[k],
+            qrg_start_list[k], qrg_end_list[k], rsqr_list[k], chi_sqr_list[k],
+            reduced_chi_sqr_list[k], corr_coef_list[k]] for k in range(num_fits) if success[k]==1])
 
-        else:
-            rg = -1
-            rger = -1
-            i0 = -1
-            i0er = -1
-            idx_min = -1
-            idx_max = -1
+        # Note that RG and w are from the last window fit above, which is
+        # what the range refinement has always used.
+        rg, rger, i0, i0er, idx_min, idx_max = autoRg_refine(q, qs, il, iler,
+            fit_array, single_fit, error_weight, min_qrg, max_qrg,
+            quality_thresh, corr_coefht, win_length_weight, RG, w)
 
     else:
         rg = -1
@@ -2676,18 +3055,62 @@ def run_crysol(fnames, path, atsasDir, exp_fnames=None, prefix=None, lm=20,
         if exp_fnames is not None:
             cmd += ' "' + '" "'.join(exp_fnames) + '"'
 
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT, shell=True, cwd=path, env=my_env)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, shell=True, cwd=path, env=my_env)
+
+        return process
+
+    else:
+        raise SASExceptions.NoATSASError('Cannot find crysol.')
+
+
+# Each profile takes ~1 ms, so for short series the calculations are done
+# serially, as sending the profiles to the worker processes costs more than
+# the calculations themselves. For longer series the worker pool is kept
+# and reused by later calls, as series calculations are rerun every time
+# the series is updated (e.g. in online mode).
+secm_parallel_min_calcs = 100
+_secm_pool = None
+_secm_pool_nproc = 0
+_secm_pool_lock = threading.Lock()
+
+def _getSECMPool(n_proc):
+    """
+    Returns the shared run_secm_calcs worker pool, creating it if needed.
+    Should be called with _secm_pool_lock held.
+    """
+    global _secm_pool, _secm_pool_nproc
+
+    if _secm_pool is not None and _secm_pool_nproc != n_proc:
+        _secm_pool.close()
+        _secm_pool.join()
+        _secm_pool = None
+
+    if _secm_pool is None:
+        _secm_pool = multiprocessing.Pool(processes=n_proc)
+        _secm_pool_nproc = n_proc
 
-        return process
+    return _secm_pool
 
-    else:
-        raise SASExceptions.NoATSASError('Cannot find crysol.')
+def closeSECMPool():
+    """
+    Closes the shared run_secm_calcs worker pool, if there is one.
+    """
+    global _secm_pool, _secm_pool_nproc
+
+    with _secm_pool_lock:
+        if _secm_pool is not None:
+            _secm_pool.close()
+            _secm_pool.join()
+            _secm_pool = None
+            _secm_pool_nproc = 0
 
+atexit.register(closeSECMPool)
 
 def run_secm_calcs(subtracted_sasm_list, use_subtracted_sasm, window_size,
     is_protein, error_weight, vp_density, vp_cutoff, vp_qmax, vc_cutoff,
-    vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna, calc_outside_win=False):
+    vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna, calc_outside_win=False,
+    n_proc=1):
 
     #Now calculate the RG, I0, and MW for each SASM
     rg = np.zeros(len(subtracted_sasm_list),dtype=float)
@@ -2700,16 +3123,17 @@ def run_secm_calcs(subtracted_sasm_list, use_subtracted_sasm, window_size,
     vp = np.zeros(len(subtracted_sasm_list),dtype=float)
     vpcor = np.zeros(len(subtracted_sasm_list),dtype=float)
 
+    # List of (index, sasm) for every profile or window average that needs
+    # the calculations, so they can be done serially or in parallel
+    calc_list = []
+
     if window_size == 1:
         for a in range(len(subtracted_sasm_list)):
             current_sasm = subtracted_sasm_list[a]
             use_current_sasm = use_subtracted_sasm[a]
 
             if use_current_sasm:
-                inner_secm_calcs(current_sasm, a, rg, rger, i0, i0er,
-                    vcmw, vcmwer, vpmw, vp, vpcor, is_protein, error_weight,
-                    vp_density, vp_cutoff, vp_qmax, vc_cutoff, vc_qmax,
-                    vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna)
+                calc_list.append((a, current_sasm))
 
             else:
                 rg[a], rger[a], i0[a], i0er[a] = -1, -1, -1, -1
@@ -2719,6 +3143,12 @@ def run_secm_calcs(subtracted_sasm_list, use_subtracted_sasm, window_size,
     else:
         window_idx = []
 
+        stacked = stackSASMs(subtracted_sasm_list)
+
+        if stacked is not None:
+            q, all_i, all_err = stacked
+            win_i, win_err = slidingWindowAverage(all_i, all_err, window_size)
+
         for a in range(len(subtracted_sasm_list)-(window_size-1)):
 
             current_sasm_list = subtracted_sasm_list[a:a+window_size]
@@ -2730,15 +3160,18 @@ def run_secm_calcs(subtracted_sasm_list, use_subtracted_sasm, window_size,
             window_idx.append(index)
 
             if np.all(truth_test):
-                try:
-                    current_sasm = SASProc.average(current_sasm_list, copy_params=False)
-                except SASExceptions.DataNotCompatible:
-                    return False, {}
-
-                inner_secm_calcs(current_sasm, index, rg, rger, i0, i0er,
-                    vcmw, vcmwer, vpmw, vp, vpcor, is_protein, error_weight,
-                    vp_density, vp_cutoff, vp_qmax, vc_cutoff, vc_qmax,
-                    vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna)
+                if stacked is not None:
+                    current_sasm = SASM.SASM(win_i[a], q, win_err[a],
+                        {'filename': current_sasm_list[0].getParameter('filename')},
+                        current_sasm_list[0].getQErr())
+                else:
+                    try:
+                        current_sasm = SASProc.average(current_sasm_list,
+                            copy_params=False)
+                    except SASExceptions.DataNotCompatible:
+                        return False, {}
+
+                calc_list.append((index, current_sasm))
             else:
                 rg[index], rger[index], i0[index], i0er[index] = -1, -1, -1, -1
                 vcmw[index], vcmwer[index] = -1, -1,
@@ -2751,15 +3184,40 @@ def run_secm_calcs(subtracted_sasm_list, use_subtracted_sasm, window_size,
                 if b not in window_idx:
                     if use_subtracted_sasm[b]:
                         current_sasm = subtracted_sasm_list[b]
-                        inner_secm_calcs(current_sasm, b, rg, rger, i0, i0er,
-                            vcmw, vcmwer, vpmw, vp, vpcor, is_protein, error_weight,
-                            vp_density, vp_cutoff, vp_qmax, vc_cutoff, vc_qmax,
-                            vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna)
+                        calc_list.append((b, current_sasm))
                     else:
                         rg[b], rger[b], i0[b], i0er[b] = -1, -1, -1, -1
                         vcmw[b], vcmwer[b] = -1, -1,
                         vpmw[b], vp[b], vpcor[b] = -1, -1, -1
 
+    if n_proc > 1 and len(calc_list) >= secm_parallel_min_calcs:
+        calc_args = (is_protein, error_weight, vp_density, vp_cutoff, vp_qmax,
+            vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna)
+
+        # Send plain arrays rather than the profiles, which can carry plot
+        # references that don't pickle
+        work_list = [(index, sasm.getQ(), sasm.getI(), sasm.getErr(),
+            sasm.getParameter('analysis'), calc_args)
+            for index, sasm in calc_list]
+
+        chunksize = max(len(work_list)//(n_proc*4), 1)
+
+        with _secm_pool_lock:
+            mp_pool = _getSECMPool(n_proc)
+            calc_results = mp_pool.map(_secm_calcs_worker, work_list,
+                chunksize=chunksize)
+
+        for index, values in calc_results:
+            (rg[index], rger[index], i0[index], i0er[index], vcmw[index],
+                vcmwer[index], vpmw[index], vp[index], vpcor[index]) = values
+
+    else:
+        for index, current_sasm in calc_list:
+            inner_secm_calcs(current_sasm, index, rg, rger, i0, i0er,
+                vcmw, vcmwer, vpmw, vp, vpcor, is_protein, error_weight,
+                vp_density, vp_cutoff, vp_qmax, vc_cutoff, vc_qmax,
+                vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna)
+
     #Set everything that's nonsense to -1
     rg[rg<=0] = -1
     rger[rg==-1] = -1
@@ -2792,6 +3250,71 @@ def run_secm_calcs(subtracted_sasm_list, use_subtracted_sasm, window_size,
 
     return True, results
 
+def stackSASMs(sasm_list):
+    """
+    Stacks the intensity and uncertainty of a list of profiles into 2D arrays
+    (one row per profile). Returns None if the profiles don't all have
+    the same q vector.
+    """
+    if len(sasm_list) == 0:
+        return None
+
+    q = sasm_list[0].getQ()
+
+    for sasm in sasm_list[1:]:
+        sasm_q = sasm.getQ()
+        if len(sasm_q) != len(q) or not np.array_equal(sasm_q, q):
+            return None
+
+    all_i = np.array([sasm.getI() for sasm in sasm_list])
+    all_err = np.array([sasm.getErr() for sasm in sasm_list])
+
+    return q, all_i, all_err
+
+def slidingWindowAverage(all_i, all_err, window_size):
+    """
+    Averages every window of window_size consecutive rows of the stacked
+    intensity and uncertainty arrays, propagating the uncertainty the same
+    way as SASProc.average. Row a of the output is the average of input
+    rows a to a+window_size-1. The window sums are accumulated one offset
+    at a time, rather than from a cumulative sum, so that the results are
+    identical to averaging each window separately.
+    """
+    num_windows = all_i.shape[0] - (window_size-1)
+
+    if num_windows <= 0:
+        return (np.empty((0, all_i.shape[1])),
+            np.empty((0, all_err.shape[1])))
+
+    sq_err = np.square(all_err)
+
+    win_i = all_i[:num_windows].copy()
+    win_err = sq_err[:num_windows].copy()
+
+    for j in range(1, window_size):
+        win_i += all_i[j:j+num_windows]
+        win_err += sq_err[j:j+num_windows]
+
+    win_i = win_i/window_size
+    win_err = np.sqrt(win_err)/window_size
+
+    return win_i, win_err
+
+def _secm_calcs_worker(args):
+    """
+    Pool worker for run_secm_calcs. Runs inner_secm_calcs on a single
+    profile and returns the index and calculated values.
+    """
+    index, q, i, err, analysis, calc_args = args
+
+    sasm = SASM.SASM(i, q, err, {'filename': '', 'analysis': analysis})
+
+    values = [np.zeros(1, dtype=float) for j in range(9)]
+
+    inner_secm_calcs(sasm, 0, *values, *calc_args)
+
+    return index, [val[0] for val in values]
+
 def inner_secm_calcs(sasm, index, rg, rger, i0, i0er, vcmw, vcmwer,
     vpmw, vp, vpcor, is_protein, error_weight,  vp_density, vp_cutoff,
     vp_qmax, vc_cutoff, vc_qmax, vc_a_prot, vc_b_prot, vc_a_rna, vc_b_rna):
@@ -2906,8 +3429,15 @@ def linear_baseline(sasms, start_range, end_range):
 
 ###############################################################################
 #EFA below here
-def runEFA(A, forward=True):
-    """Runs the forward or backward evolving factor calculations."""
+def runEFA(A, forward=True, nsvs=None):
+    """
+    Runs the forward or backward evolving factor calculations. If nsvs is
+    provided, only the first nsvs singular values are calculated, using
+    runIncrementalEFA.
+    """
+    if nsvs is not None:
+        return runIncrementalEFA(A, nsvs, forward)
+
     slist = np.zeros_like(A)
 
     jmax = A.shape[1]
@@ -2924,8 +3454,75 @@ def runEFA(A, forward=True):
 
     return slist
 
+def runIncrementalEFA(A, nsvs, forward=True):
+    """
+    Runs the forward or backward evolving factor calculations for the first
+    nsvs singular values. Rather than calculating the SVD of every submatrix
+    A[:, :j+1], the Gram matrix of the submatrix is updated as each column
+    is added and the singular values are calculated from its eigenvalues.
+    While there are fewer columns than rows the column Gram matrix is grown,
+    after that the (fixed size) row Gram matrix gets a rank one update for
+    each column. The cost of each step is then bounded by the number of q
+    points rather than growing with the number of frames.
+
+    Returns an array with nsvs rows (at most the number of rows in A) that
+    matches the first nsvs rows of the runEFA results.
+    """
+    nrows, jmax = A.shape
+
+    nsvs = min(nsvs, nrows)
+    slist = np.zeros((nsvs, jmax))
+
+    if not forward:
+        A = A[:,::-1]
+
+    col_gram = np.zeros((min(nrows, jmax), min(nrows, jmax)))
+    row_gram = None
+
+    for j in range(jmax):
+        num_svs = min(nrows, j+1)
+
+        if j < nrows:
+            new_col = np.dot(A[:, :j+1].T, A[:, j])
+            col_gram[j, :j+1] = new_col
+            col_gram[:j+1, j] = new_col
+
+        if num_svs <= nsvs:
+            # Every singular value is needed, so calculate them directly
+            s = np.linalg.svd(A[:, :j+1], full_matrices = False, compute_uv = False)
+
+        else:
+            if j < nrows:
+                evals = np.linalg.eigvalsh(col_gram[:j+1, :j+1])
+            else:
+                if row_gram is None:
+                    row_gram = np.dot(A[:, :j], A[:, :j].T)
+
+                row_gram += np.outer(A[:, j], A[:, j])
+                evals = np.linalg.eigvalsh(row_gram)
+
+            s = np.sqrt(np.clip(evals[::-1][:nsvs], 0, None))
+
+        slist[:s.size, j] = s
+
+        if j > 0 and num_svs <= nsvs:
+            slist[num_svs-1:, j-1] = s[-1]
+
+    return slist
+
+def runForwardBackwardEFA(A, nsvs=None):
+    """
+    Runs the forward and backward evolving factor calculations concurrently.
+    See runEFA for nsvs. Returns the forward and backward results.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        forward = executor.submit(runEFA, A, True, nsvs)
+        backward = executor.submit(runEFA, A, False, nsvs)
+
+        return forward.result(), backward.result()
+
 def runRotation(D, intensity, err, ranges, force_positive, svd_v, previous_results=None,
-    method='Hybrid', niter=1000, tol=1e-12):
+    method='Hybrid', niter=1000, tol=1e-12, callback=None):
     """
     Runs the full EFA rotation.
 
@@ -2958,22 +3555,30 @@ def runRotation(D, intensity, err, ranges, force_positive, svd_v, previous_resul
         Defaults to None, which should be used if no previous results are available.
 
     :param str method: The method of EFA to be used. Options are 'Hybrid', 'Iterative',
-        and 'Explicit'. Defaults to 'Hybrid'.
+        'Explicit', and 'Accelerated'. Defaults to 'Hybrid'. 'Accelerated'
+        starts like 'Hybrid' but runs the iterations with runAcceleratedEFARotation.
 
     :param int niter: Number of iterations to run in the iterative and hybrid methods.
         Defaults to 1000.
 
     :param float tol: Tolerance for convergence of the iterative and hybrid methods.
         Defaults to 1e-12.
+
+    :param function callback: If provided, it is called after each iteration of
+        the iterative, hybrid, and accelerated methods as callback(k, dck, dt), where
+        k is the iteration number, dck the value of the convergence criteria,
+        and dt the time in seconds that the iteration took. Defaults to None.
     """
 
     init_dict = {'Hybrid'       : initHybridEFA,
                 'Iterative'     : initIterativeEFA,
-                'Explicit'      : initExplicitEFA}
+                'Explicit'      : initExplicitEFA,
+                'Accelerated'   : initHybridEFA}
 
     run_dict = {'Hybrid'        : runIterativeEFARotation,
                 'Iterative'     : runIterativeEFARotation,
-                'Explicit'      : runExplicitEFARotation}
+                'Explicit'      : runExplicitEFARotation,
+                'Accelerated'   : runAcceleratedEFARotation}
 
     #Calculate the initial matrices
     num_sv = ranges.shape[0]
@@ -3001,7 +3606,7 @@ def runRotation(D, intensity, err, ranges, force_positive, svd_v, previous_resul
     V_bar = svd_v[:,:num_sv]
 
     failed, C, T = init_dict[method](M, num_sv, D, C_init, converged, V_bar) #Init takes M, num_sv, and D, C_init, and converged and returns failed, C, and T in that order. If a method doesn't use a particular variable, then it should return None for that result
-    C, failed, converged, dc, k = run_dict[method](M, D, failed, C, V_bar, T, niter, tol, force_positive) #Takes M, D, failed, C, V_bar, T in that order. If a method doesn't use a particular variable, then it should be passed None for that variable.
+    C, failed, converged, dc, k = run_dict[method](M, D, failed, C, V_bar, T, niter, tol, force_positive, callback) #Takes M, D, failed, C, V_bar, T in that order. If a method doesn't use a particular variable, then it should be passed None for that variable.
 
     if not failed:
         if method != 'Explicit':
@@ -3063,7 +3668,8 @@ def runRotation(D, intensity, err, ranges, force_positive, svd_v, previous_resul
 
     return converged, conv_data, rotation_data
 
-def runExplicitEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos):
+def runExplicitEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos,
+    callback=None):
     num_sv = M.shape[1]
 
     for i in range(num_sv):
@@ -3091,7 +3697,8 @@ def runExplicitEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos):
 
     return C, failed, converged, None, None
 
-def runIterativeEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos):
+def runIterativeEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos,
+    callback=None):
     #Carry out the calculation to convergence
     k = 0
     converged = False
@@ -3100,6 +3707,8 @@ def runIterativeEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos):
 
     while k < niter and not converged and not failed:
         k = k+1
+        start = time.perf_counter()
+
         try:
             Cnew = EFAUpdateRotation(M, C, D, force_pos)
         except np.linalg.linalg.LinAlgError:
@@ -3114,6 +3723,9 @@ def runIterativeEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos):
         if dck < tol:
             converged = True
 
+        if callback is not None:
+            callback(k, dck, time.perf_counter() - start)
+
     return C, failed, converged, dc, k
 
 def EFAUpdateRotation(M,C,D, force_pos):
@@ -3154,6 +3766,132 @@ def EFAFirstRotation(M,C,D):
 
     return Cnew
 
+class EFARotationSolver(object):
+    """
+    Calculates the same update as EFAUpdateRotation, but reuses
+    factorizations between iterations. The intensity matrix D only enters
+    the update through pinv(S) D with S = D pinv(P), where P = (M*C)^T, so
+    it can be replaced by the triangular factor R of its QR decomposition,
+    which is calculated once. The two least squares problems, for
+    pinv(P) and pinv(S), are solved using Cholesky factorizations of the
+    small (number of components squared) normal matrices. If either is not
+    positive definite, the pseudo-inverse is used for that iteration.
+    """
+
+    def __init__(self, M, D, force_pos):
+        self.M = M
+        self.R = np.linalg.qr(D, mode='r')
+        self.force_pos = np.array(force_pos, dtype=bool)
+
+    def _pinv(self, A):
+        # Pseudo-inverse of A, which should have more rows than columns
+        try:
+            cho = scipy.linalg.cho_factor(np.dot(A.T, A))
+            A_pinv = scipy.linalg.cho_solve(cho, A.T)
+        except np.linalg.LinAlgError:
+            A_pinv = np.linalg.pinv(A)
+
+        return A_pinv
+
+    def update(self, C):
+        P = np.transpose(self.M*C)
+
+        S = np.dot(self.R, self._pinv(P.T).T)
+
+        Cnew = np.transpose(np.dot(self._pinv(S), self.R))
+
+        Cnew[:, self.force_pos] = np.clip(Cnew[:, self.force_pos], 0, None)
+
+        Cnew = Cnew/np.sum(self.M*Cnew, axis=0) #normalizes by the sum of each column
+
+        return Cnew
+
+def runAcceleratedEFARotation(M, D, failed, C, V_bar, T, niter, tol, force_pos,
+    callback=None, depth=5):
+    """
+    Iterates the EFA rotation to convergence using the EFARotationSolver
+    update, with Anderson acceleration (Walker and Ni, SIAM J. Numer. Anal.
+    49, 1715, 2011) of the fixed point iteration. The next C is a
+    combination of the last depth + 1 updates that minimizes the least
+    squares combination of their residuals. If an accelerated step
+    increases the residual, the history is cleared and an unaccelerated
+    step is taken.
+
+    The convergence criteria is the same as runIterativeEFARotation, the sum
+    of the absolute change in C from an update.
+    """
+    k = 0
+    converged = False
+
+    dc = np.empty(niter)
+
+    solver = EFARotationSolver(M, D, force_pos)
+
+    x_hist = []
+    resid_hist = []
+
+    gx = C
+
+    try:
+        x = C
+        gx = solver.update(x)
+        resid = gx - x
+
+        while k < niter and not converged:
+            start = time.perf_counter()
+
+            dck = np.sum(np.abs(resid))
+            dc[k] = dck
+            k = k+1
+
+            if dck < tol:
+                converged = True
+
+            else:
+                x_hist.append(gx.ravel())
+                resid_hist.append(resid.ravel())
+
+                if len(x_hist) > depth+1:
+                    x_hist.pop(0)
+                    resid_hist.pop(0)
+
+                if len(x_hist) > 1:
+                    d_resid = np.diff(resid_hist, axis=0).T
+                    d_x = np.diff(x_hist, axis=0).T
+                    gamma = np.linalg.lstsq(d_resid, resid.ravel(), rcond=None)[0]
+
+                    new_x = gx - np.dot(d_x, gamma).reshape(gx.shape)
+                    new_gx = solver.update(new_x)
+                    new_resid = new_gx - new_x
+
+                    if np.sum(np.abs(new_resid)) > dck:
+                        x_hist = x_hist[-1:]
+                        resid_hist = resid_hist[-1:]
+                        new_x = None
+
+                else:
+                    new_x = None
+
+                if new_x is None:
+                    new_x = gx
+                    new_gx = solver.update(new_x)
+                    new_resid = new_gx - new_x
+
+                x = new_x
+                gx = new_gx
+                resid = new_resid
+
+            if callback is not None:
+                callback(k, dck, time.perf_counter() - start)
+
+    except np.linalg.LinAlgError:
+        failed = True
+
+    if not np.all(np.isfinite(gx)):
+        failed = True
+
+    return gx, failed, converged, dc[:k], k
+
 def initIterativeEFA(M, num_sv, D, C, converged, V_bar):
 
     #Set a variable to test whether the rotation fails for a numerical reason
@@ -3186,7 +3924,7 @@ def initHybridEFA(M, num_sv, D, C, converged, V_bar):
 
 def run_full_efa(series, ranges, profile_type='sub', framei=None, framef=None,
     method='Hybrid', niter=1000, tol=1e-12, norm=True, force_positive=None,
-    previous_results=None):
+    previous_results=None, efa_svs=None):
     """
     Runs evolving factor analysis (EFA) on the input series to deconvolve
     overlapping elution peaks in the data.
@@ -3215,9 +3953,11 @@ def run_full_efa(series, ranges, profile_type='sub', framei=None, framef=None,
     framef: int, optional
         The final frame in the series to use for EFA. If not provided, it
         defaults to the last frame in the series.
-    method: {'Hybrid', 'Iterative', 'Explicit'} str, optional
+    method: {'Hybrid', 'Iterative', 'Explicit', 'Accelerated'} str, optional
         Sets the method used for the EFA rotation step as either 'Hybrid',
-        'Iterative', or 'Explicit'.
+        'Iterative', 'Explicit', or 'Accelerated'. 'Accelerated' is the
+        same as 'Hybrid', but uses Anderson acceleration of the iterations,
+        which typically converges in many fewer iterations.
     niter: int, optional
         The maximum number of iterations to use for the rotation in either
         hybrid or iterative mode. Defaults to 1000. Can be increased if
@@ -3242,6 +3982,12 @@ def run_full_efa(series, ranges, profile_type='sub', framei=None, framef=None,
         is a dictionary of the previous results, corresponding to the
         rotation_data dictionary returned by this function. Defaults to None,
         which should be used if no previous results are available.
+    efa_svs: int, optional
+        If provided, the forward and backward EFA singular values are also
+        calculated for the first efa_svs singular values, and returned in the
+        conv_data dictionary. They are calculated incrementally, with the
+        forward and backward passes run concurrently with the rotation.
+        Defaults to None, where they are not calculated.
 
     Returns
     -------
@@ -3259,7 +4005,10 @@ def run_full_efa(series, ranges, profile_type='sub', framei=None, framef=None,
         carried out during the rotation, if available; 'final_step' - The
         value of the convergence criteria in the final iteration step, if
         available; 'options' - A dictionary containing the input convergence
-        options; 'failed' - A bool indicating if convergence failed.
+        options; 'failed' - A bool indicating if convergence failed. If
+        efa_svs is provided, also contains 'forward_efa' and 'backward_efa',
+        numpy arrays of the forward and backward EFA singular values, where
+        the first axis is singular value number and the second axis is frame.
     rotation_data: dict
         A dictionary containing the rotation results, if available. If the
         rotation failed to converge, the dictionary is empty. Keys are:
@@ -3310,10 +4059,19 @@ def run_full_efa(series, ranges, profile_type='sub', framei=None, framef=None,
     (svd_U, svd_s, svd_V, svd_U_autocor, svd_V_autocor, intensity, err, svd_a,
         success) = SVDonSASMs(sasm_list, do_binning=False, do_autocorr=False)
 
+    if efa_svs is not None:
+        # The EFA singular values are calculated while the rotation runs
+        efa_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        efa_future = efa_executor.submit(runForwardBackwardEFA, svd_a, efa_svs)
+        efa_executor.shutdown(wait=False)
+
     converged, conv_data, rotation_data = runRotation(svd_a, intensity,
         err, ranges, force_positive, svd_V, previous_results=previous_results,
         method=method, niter=niter, tol=tol)
 
+    if efa_svs is not None:
+        conv_data['forward_efa'], conv_data['backward_efa'] = efa_future.result()
+
     efa_profiles = []
 
     q = copy.deepcopy(sasm_list[0].getQ())
@@ -3371,14 +4129,194 @@ def run_full_efa(series, ranges, profile_type='sub', framei=None, framef=None,
 
     return efa_profiles, converged, conv_data, rotation_data
 
+class RangeSearchData(object):
+    """
+    The profiles of a series stacked into arrays for the buffer, sample, and
+    baseline range searches. The searches test many overlapping windows of
+    frames, so the per-frame arrays are made once, and the CorMap longest
+    runs (for each reference frame, q region, and frame), superposition
+    scale factors, and SVD results are cached so that windows reuse them.
+    Results are identical to validating the profiles directly. Use
+    prepareRangeSearch to create one.
+    """
+
+    def __init__(self, sasms, all_i, all_err):
+        self.num_frames = len(sasms)
+
+        self.i = all_i
+        self.err = all_err
+
+        qi, qf = sasms[0].getQrange()
+        self.num_q = qf - qi
+
+        # Raw intensity, used for superimposing profiles
+        if all(sasm.getScale() == 1 and sasm.getOffset() == 0 for sasm in sasms):
+            self.raw_i = self.i
+        else:
+            self.raw_i = np.array([sasm.getRawI()[qi:qf] for sasm in sasms])
+
+        self._longest_runs = {}
+        self._scales = {}
+        self._svd_results = {}
+
+    def _regionSlice(self, region):
+        if region == 'low':
+            region_slice = slice(0, 100)
+        elif region == 'high':
+            region_slice = slice(self.num_q-100, self.num_q)
+        else:
+            region_slice = slice(0, self.num_q)
+
+        return region_slice
+
+    def superimposeScales(self, ref, frames):
+        """
+        Returns the scale factors for superimposing the frames on the ref
+        frame, as from SASProc.superimpose with the 'Scale' choice.
+        """
+        scales = self._scales.setdefault(ref, np.full(self.num_frames, np.nan))
+        ref_i = self.i[ref]
+
+        for frame in frames:
+            if np.isnan(scales[frame]):
+                frame_i = self.raw_i[frame]
+
+                if not np.all(frame_i == ref_i):
+                    A = np.column_stack([frame_i, np.zeros_like(frame_i)])
+                    scale = np.linalg.lstsq(A, ref_i)[0][0]
+                else:
+                    scale = 1.0
+
+                scales[frame] = abs(scale)
+
+        return scales[frames]
+
+    def longestRuns(self, ref, frames, region, superimpose=False):
+        """
+        Returns the CorMap longest runs of the frames compared to the ref
+        frame in the 'low', 'high', or 'all' q region. If superimpose is
+        True the frames are first scaled to the ref frame.
+        """
+        key = (ref, region, superimpose)
+
+        runs = self._longest_runs.setdefault(key, np.full(self.num_frames, -1,
+            dtype=np.int64))
+        missing = frames[runs[frames] < 0]
+
+        if len(missing) > 0:
+            region_slice = self._regionSlice(region)
+
+            if superimpose:
+                scales = self.superimposeScales(ref, missing)
+                intensities = (self.raw_i[missing]*scales[:, np.newaxis]
+                    + 0.)[:, region_slice]
+            else:
+                intensities = self.i[missing][:, region_slice]
+
+            runs[missing] = SASProc.cormap_longest_ref(
+                self.i[ref][region_slice], np.ascontiguousarray(intensities),
+                np.arange(len(missing)))
+
+        return runs[frames]
+
+    def similarityTest(self, ref, frames, region, sim_test, sim_thresh,
+        superimpose=False):
+        """
+        Equivalent to run_similarity_test for the frames compared to the ref
+        frame in the given q region.
+        """
+        if sim_test == 'CorMap':
+            if region == 'all':
+                num_points = self.num_q
+            else:
+                num_points = 100
+
+            longest = self.longestRuns(ref, frames, region, superimpose)
+            pvals = SASProc.cormap_prob_table(num_points)[longest]
+
+        if np.any(pvals<sim_thresh):
+            similar = False
+        else:
+            similar = True
+
+        return similar, np.argwhere(pvals<sim_thresh).flatten()
+
+    def significantSingularValues(self, frames):
+        """
+        Equivalent to significantSingularValues for the frames.
+        """
+        key = tuple(frames)
+
+        if key not in self._svd_results:
+            svd_a = prepareArraysforSVD(self.i[frames].T, self.err[frames].T)
+            self._svd_results[key] = findSVDSignificance(svd_a)
+
+        return self._svd_results[key]
+
+    def average(self, frames):
+        """
+        Returns the average intensity and uncertainty of the frames, as
+        from SASProc.average.
+        """
+        if len(frames) == 1:
+            avg_i = self.i[frames[0]]
+            avg_err = self.err[frames[0]]
+        else:
+            avg_i = np.mean(self.i[frames], 0)
+            all_err = self.err[frames]
+            avg_err = np.sqrt(np.sum(np.square(all_err), 0))/len(all_err)
+
+        return avg_i, avg_err
+
+def prepareRangeSearch(sasms):
+    """
+    Returns a RangeSearchData for the profiles, or None if the profiles don't
+    all share the same q vector and q range, in which case the range search
+    validates the profiles directly.
+    """
+    stacked = stackSASMs(sasms)
+
+    if stacked is None:
+        return None
+
+    q, all_i, all_err = stacked
+
+    if not np.all(np.isfinite(q)):
+        return None
+
+    qrange = list(sasms[0].getQrange())
+    raw_q = sasms[0].getRawQ()
+
+    for sasm in sasms[1:]:
+        if (list(sasm.getQrange()) != qrange
+            or not np.array_equal(sasm.getRawQ(), raw_q)):
+            return None
+
+    return RangeSearchData(sasms, all_i, all_err)
+
 def validateBuffer(sasms, frame_idx, intensity, sim_test, sim_cor, sim_thresh,
-    fast):
+    fast, search_data=None):
     median = np.median(intensity)
     median_i_idx = (np.absolute(intensity-median)).argmin()
 
-    ref_sasm = sasms[median_i_idx].copy_no_metadata()
-    buffer_sasms = [sasm.copy_no_metadata() for sasm in sasms]
-    qi, qf = ref_sasm.getQrange()
+    if search_data is not None:
+        frames = np.asarray(frame_idx)
+        ref_frame = frames[median_i_idx]
+        num_q = search_data.num_q
+
+        def similarity_test(region):
+            return search_data.similarityTest(ref_frame, frames, region,
+                sim_test, sim_thresh)
+
+    else:
+        ref_sasm = sasms[median_i_idx].copy_no_metadata()
+        buffer_sasms = [sasm.copy_no_metadata() for sasm in sasms]
+        qi, qf = ref_sasm.getQrange()
+        num_q = qf - qi
+
+        def similarity_test(region):
+            return run_region_similarity_test(ref_sasm, buffer_sasms, region,
+                sim_test, sim_cor, sim_thresh)
 
     #Test for frame correlation
     if len(sasms) > 1:
@@ -3421,28 +4359,13 @@ def validateBuffer(sasms, frame_idx, intensity, sim_test, sim_cor, sim_thresh,
 
     #Test for regional frame similarity
     if len(sasms) > 1:
-        if qf-qi>200:
-            ref_sasm.setQrange((qi, qi+100))
-            for sasm in buffer_sasms:
-                sasm.setQrange((qi, qi+100))
-            low_q_similar, low_q_outliers = run_similarity_test(ref_sasm,
-                buffer_sasms, sim_test, sim_cor, sim_thresh)
+        if num_q>200:
+            low_q_similar, low_q_outliers = similarity_test('low')
 
             if fast and not low_q_similar:
-                ref_sasm.setQrange((qi, qf))
-                for sasm in buffer_sasms:
-                    sasm.setQrange((qi, qf))
                 return False, {}, {}, intI_results
 
-            ref_sasm.setQrange((qf-100, qf))
-            for sasm in buffer_sasms:
-                sasm.setQrange((qf-100, qf))
-            high_q_similar, high_q_outliers = run_similarity_test(ref_sasm,
-                buffer_sasms, sim_test, sim_cor, sim_thresh)
-
-            ref_sasm.setQrange((qi, qf))
-            for sasm in buffer_sasms:
-                sasm.setQrange((qi, qf))
+            high_q_similar, high_q_outliers = similarity_test('high')
 
             if fast and not high_q_similar:
                 return False, {}, {}, intI_results
@@ -3461,7 +4384,10 @@ def validateBuffer(sasms, frame_idx, intensity, sim_test, sim_cor, sim_thresh,
 
     #Test for more than one significant singular value
     if len(sasms) > 1:
-        svd_results = significantSingularValues(sasms)
+        if search_data is not None:
+            svd_results = search_data.significantSingularValues(frames)
+        else:
+            svd_results = significantSingularValues(sasms)
 
         if fast and not svd_results['svals']==1:
             return False, {}, svd_results, intI_results
@@ -3471,8 +4397,7 @@ def validateBuffer(sasms, frame_idx, intensity, sim_test, sim_cor, sim_thresh,
 
     #Test for all frame similarity
     if len(sasms) > 1:
-        all_similar, all_outliers = run_similarity_test(ref_sasm,
-            buffer_sasms, sim_test, sim_cor, sim_thresh)
+        all_similar, all_outliers = similarity_test('all')
     else:
         all_similar = True
         all_outliers = []
@@ -3492,6 +4417,37 @@ def validateBuffer(sasms, frame_idx, intensity, sim_test, sim_cor, sim_thresh,
 
     return valid, similarity_results, svd_results, intI_results
 
+def run_region_similarity_test(ref_sasm, sasm_list, region, sim_test, sim_cor,
+    sim_thresh):
+    """
+    Runs the similarity test in the 'low' (first 100 points), 'high' (last
+    100 points) or 'all' q region of the profiles.
+    """
+    if region == 'all':
+        similar, outliers = run_similarity_test(ref_sasm, sasm_list, sim_test,
+            sim_cor, sim_thresh)
+
+    else:
+        qi, qf = ref_sasm.getQrange()
+
+        if region == 'low':
+            test_qrange = (qi, qi+100)
+        else:
+            test_qrange = (qf-100, qf)
+
+        ref_sasm.setQrange(test_qrange)
+        for sasm in sasm_list:
+            sasm.setQrange(test_qrange)
+
+        similar, outliers = run_similarity_test(ref_sasm, sasm_list, sim_test,
+            sim_cor, sim_thresh)
+
+        ref_sasm.setQrange((qi, qf))
+        for sasm in sasm_list:
+            sasm.setQrange((qi, qf))
+
+    return similar, outliers
+
 def run_similarity_test(ref_sasm, sasm_list, sim_test, sim_cor, sim_thresh):
     if sim_test == 'CorMap':
         pvals, corrected_pvals, failed_comparisons = SASProc.run_cormap_ref(sasm_list,
@@ -3504,6 +4460,10 @@ def run_similarity_test(ref_sasm, sasm_list, sim_test, sim_cor, sim_thresh):
 
     return similar, np.argwhere(pvals<sim_thresh).flatten()
 
+# The number of singular values calculated when finding the number of
+# significant singular values during range searches
+significance_svd_rank = 10
+
 def significantSingularValues(sasms):
     """
     Calculates number of significant singular values.
@@ -3511,8 +4471,18 @@ def significantSingularValues(sasms):
     Returns both SVD results and number of significant singular values.
     """
 
-    (svd_U, svd_s, svd_V, svd_U_autocor, svd_V_autocor, i, err, svd_a,
-        continue_svd_analysis) = SVDonSASMs(sasms, do_binning=False)
+    svd_a, i, err, q = prepareSASMsforSVD(sasms, do_binning=False)
+
+    return findSVDSignificance(svd_a)
+
+def findSVDSignificance(svd_a, rank=significance_svd_rank):
+    """
+    Runs the SVD on the (normalized) intensity matrix and calculates the
+    number of significant singular values. Only the first rank singular
+    values and vectors are calculated.
+    """
+    (svd_U, svd_s, svd_V, svd_U_autocor, svd_V_autocor,
+        continue_svd_analysis) = doSVDonSASMs(svd_a, rank=rank)
 
     if continue_svd_analysis:
         svals = findSignificantSingularValues(svd_s, svd_U_autocor, svd_V_autocor)
@@ -3554,6 +4524,17 @@ def prepareSASMsforSVD(sasms, err_norm=True, do_binning=True, bin_to=100):
     i = i.T #Because of how numpy does the SVD, to get U to be the scattering vectors and V to be the other, we have to transpose
     err = err.T
 
+    svd_a = prepareArraysforSVD(i, err, err_norm)
+
+    q = rebinned_sasms[0].getQ()
+
+    return svd_a, i, err, q
+
+def prepareArraysforSVD(i, err, err_norm=True):
+    """
+    Makes the SVD matrix from the intensity and uncertainty, where each
+    column is a profile.
+    """
     err_mean = np.mean(err, axis = 1)
     if int(np.__version__.split('.')[0]) >= 1 and int(np.__version__.split('.')[1])>=10:
         err_avg = np.broadcast_to(err_mean.reshape(err_mean.size,1), err.shape)
@@ -3565,24 +4546,68 @@ def prepareSASMsforSVD(sasms, err_norm=True, do_binning=True, bin_to=100):
     else:
         svd_a = i
 
-    q = rebinned_sasms[0].getQ()
+    return svd_a
 
-    return svd_a, i, err, q
+def randomizedSVD(svd_a, rank, oversample=10, power_iters=4, seed=0):
+    """
+    Calculates the first rank singular values and vectors of svd_a. If
+    the requested rank is close to the size of the matrix an economy SVD
+    is used, otherwise the randomized range finder of Halko, Martinsson,
+    and Tropp (SIAM Review 53, 217, 2011) with a fixed seed, so that
+    repeated calls give the same result.
+
+    Returns U, s, and V^T, with rank columns (rows for V^T).
+    """
+    rank = max(1, min(rank, min(svd_a.shape)))
+    sketch_size = rank + oversample
+
+    if sketch_size >= min(svd_a.shape):
+        svd_U, svd_s, svd_Vt = np.linalg.svd(svd_a, full_matrices=False)
+
+    else:
+        rng = np.random.default_rng(seed)
+        omega = rng.standard_normal((svd_a.shape[1], sketch_size))
 
-def doSVDonSASMs(svd_a, do_autocorr=True):
+        Q, _ = np.linalg.qr(svd_a @ omega)
+
+        # Power iterations, orthonormalized each step for stability
+        for j in range(power_iters):
+            Z, _ = np.linalg.qr(svd_a.T @ Q)
+            Q, _ = np.linalg.qr(svd_a @ Z)
+
+        B = Q.T @ svd_a
+        B_U, svd_s, svd_Vt = np.linalg.svd(B, full_matrices=False)
+        svd_U = Q @ B_U
+
+    return svd_U[:, :rank], svd_s[:rank], svd_Vt[:rank]
+
+def lagOneAutocorrelation(vectors):
+    """
+    Returns the absolute value of the lag-1 autocorrelation of each column
+    of vectors.
+    """
+    return np.abs(np.sum(vectors[:-1]*vectors[1:], axis=0))
+
+def doSVDonSASMs(svd_a, do_autocorr=True, rank=None):
+    """
+    Runs the SVD on svd_a. If rank is None the full SVD is calculated,
+    otherwise only the first rank singular values and vectors are
+    calculated using randomizedSVD.
+    """
     if np.all(np.isfinite(svd_a)):
         try:
-            svd_U, svd_s, svd_Vt = np.linalg.svd(svd_a, full_matrices = True)
+            if rank is None:
+                svd_U, svd_s, svd_Vt = np.linalg.svd(svd_a, full_matrices = True)
+            else:
+                svd_U, svd_s, svd_Vt = randomizedSVD(svd_a, rank)
             success = True
         except Exception:
             success = False
 
         if success and do_autocorr:
             svd_V = svd_Vt.T
-            svd_U_autocor = np.abs(np.array([np.correlate(svd_U[:,k],
-                svd_U[:,k], mode = 'full')[-svd_U.shape[0]+1] for k in range(svd_U.shape[1])]))
-            svd_V_autocor = np.abs(np.array([np.correlate(svd_V[:,k],
-                svd_V[:,k], mode = 'full')[-svd_V.shape[0]+1] for k in range(svd_V.shape[1])]))
+            svd_U_autocor = lagOneAutocorrelation(svd_U)
+            svd_V_autocor = lagOneAutocorrelation(svd_V)
 
         elif success:
             svd_V = svd_Vt.T
@@ -3605,11 +4630,12 @@ def doSVDonSASMs(svd_a, do_autocorr=True):
     return svd_U, svd_s, svd_V, svd_U_autocor, svd_V_autocor, success
 
 
-def SVDonSASMs(sasms, err_norm=True, do_binning=True, bin_to=100, do_autocorr=True):
+def SVDonSASMs(sasms, err_norm=True, do_binning=True, bin_to=100, do_autocorr=True,
+    rank=None):
     svd_a, i, err, q = prepareSASMsforSVD(sasms, err_norm, do_binning, bin_to)
 
     svd_U, svd_s, svd_V, svd_U_autocor, svd_V_autocor, success = doSVDonSASMs(svd_a,
-        do_autocorr)
+        do_autocorr, rank)
 
     return svd_U, svd_s, svd_V, svd_U_autocor, svd_V_autocor, i, err, svd_a, success
 
@@ -3691,7 +4717,7 @@ def findSignificantSingularValues(svd_s, svd_U_autocor, svd_V_autocor):
 
 
 def findBufferRange(buffer_sasms, intensity, avg_window, sim_test, sim_cor,
-    sim_thresh):
+    sim_thresh, parallel=False):
     region_start = None
     region_end = None
 
@@ -3762,10 +4788,13 @@ def findBufferRange(buffer_sasms, intensity, avg_window, sim_test, sim_cor,
 
             search_full_length = False
 
+    search_data = prepareRangeSearch(buffer_sasms)
+
     #Initial search
     failed, region_start, region_end = inner_find_buffer_range(intensity,
         buffer_sasms, start_point, end_point, start_window_size,
-        min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, True)
+        min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, True,
+        search_data, parallel)
 
     if use_peak_search and not search_full_length and failed:
         #Start search to the right from edge of rightmost peak and go to end
@@ -3778,7 +4807,8 @@ def findBufferRange(buffer_sasms, intensity, avg_window, sim_test, sim_cor,
         else:
             failed, region_start, region_end = inner_find_buffer_range(intensity,
                 buffer_sasms, start_point, end_point, start_window_size,
-                min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, False)
+                min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, False,
+                search_data, parallel)
 
     if use_peak_search and not search_full_length and failed:
         #Start search to the left from edge of main peak and go to the left edge of the first peak
@@ -3795,7 +4825,8 @@ def findBufferRange(buffer_sasms, intensity, avg_window, sim_test, sim_cor,
             if end_point != start_point:
                 failed, region_start, region_end = inner_find_buffer_range(intensity,
                     buffer_sasms, start_point, end_point, start_window_size,
-                    min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, True)
+                    min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, True,
+                    search_data, parallel)
 
             else:
                 failed = True
@@ -3815,7 +4846,8 @@ def findBufferRange(buffer_sasms, intensity, avg_window, sim_test, sim_cor,
             if end_point != start_point:
                 failed, region_start, region_end = inner_find_buffer_range(intensity,
                     buffer_sasms, start_point, end_point, start_window_size,
-                    min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, False)
+                    min_window_width, peak_pos, sim_test, sim_cor, sim_thresh, False,
+                    search_data, parallel)
             else:
                 failed = True
 
@@ -3825,7 +4857,7 @@ def findBufferRange(buffer_sasms, intensity, avg_window, sim_test, sim_cor,
 
 def inner_find_buffer_range(intensity, buffer_sasms, start_point, end_point,
     start_window_size, min_window_width, peaks, sim_test, sim_cor, sim_thresh,
-    flip_regions):
+    flip_regions, search_data=None, parallel=False):
 
     found_region = False
     failed = False
@@ -3842,22 +4874,27 @@ def inner_find_buffer_range(intensity, buffer_sasms, start_point, end_point,
         if flip_regions:
             region_starts = region_starts[::-1]
 
-        for idx in region_starts:
+        def validate_region(idx, window_size=window_size):
             region_sasms = buffer_sasms[idx:idx+window_size+1]
             frame_idx = list(range(idx, idx+window_size+1))
             region_intensity = intensity[idx:idx+window_size+1]
 
             if len(peaks) == 0 or np.all([peak not in frame_idx for peak in peaks]):
-                found_region, similarity_results, svd_results, intI_results = validateBuffer(region_sasms,
-                    frame_idx, region_intensity, sim_test, sim_cor, sim_thresh, True)
+                valid, similarity_results, svd_results, intI_results = validateBuffer(region_sasms,
+                    frame_idx, region_intensity, sim_test, sim_cor, sim_thresh, True,
+                    search_data)
 
             else:
-                found_region = False
+                valid = False
 
-            if found_region:
-                region_start = idx
-                region_end = idx+window_size
-                break
+            return valid
+
+        idx = findFirstValidRegion(validate_region, region_starts, parallel)
+
+        if idx is not None:
+            found_region = True
+            region_start = idx
+            region_end = idx+window_size
 
         window_size = int(round(window_size/2.))
 
@@ -3866,14 +4903,59 @@ def inner_find_buffer_range(intensity, buffer_sasms, start_point, end_point,
 
     return failed, region_start, region_end
 
+def findFirstValidRegion(validate, region_starts, parallel=False):
+    """
+    Returns the first region start, in the order given, for which
+    validate(region_start) is True, or None if none are valid. If parallel,
+    batches of region starts are validated concurrently on a thread pool
+    (the CorMap kernels and SVD release the GIL, and the threads share the
+    RangeSearchData caches). The first valid start in the order given is
+    always returned, so the result is the same as the serial search.
+    """
+    if parallel:
+        num_threads = min(os.cpu_count() or 1, len(region_starts))
+    else:
+        num_threads = 1
+
+    if num_threads > 1:
+        with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+            for batch_start in range(0, len(region_starts), num_threads):
+                batch = region_starts[batch_start:batch_start+num_threads]
+
+                for idx, valid in zip(batch, executor.map(validate, batch)):
+                    if valid:
+                        return idx
+
+    else:
+        for idx in region_starts:
+            if validate(idx):
+                return idx
+
+    return None
+
 def validateSample(sub_sasms, frame_idx, intensity, rg, vcmw, vpmw,
-    sim_test, sim_cor, sim_thresh, fast):
+    sim_test, sim_cor, sim_thresh, fast, search_data=None):
     max_i_idx = np.argmax(intensity)
 
-    ref_sasm = sub_sasms[max_i_idx].copy_no_metadata()
-    superimpose_sub_sasms = [sasm.copy_no_metadata() for sasm in sub_sasms]
-    SASProc.superimpose(ref_sasm, superimpose_sub_sasms, 'Scale')
-    qi, qf = ref_sasm.getQrange()
+    if search_data is not None:
+        frames = np.asarray(frame_idx)
+        ref_frame = frames[max_i_idx]
+        num_q = search_data.num_q
+
+        def similarity_test(region):
+            return search_data.similarityTest(ref_frame, frames, region,
+                sim_test, sim_thresh, superimpose=True)
+
+    else:
+        ref_sasm = sub_sasms[max_i_idx].copy_no_metadata()
+        superimpose_sub_sasms = [sasm.copy_no_metadata() for sasm in sub_sasms]
+        SASProc.superimpose(ref_sasm, superimpose_sub_sasms, 'Scale')
+        qi, qf = ref_sasm.getQrange()
+        num_q = qf - qi
+
+        def similarity_test(region):
+            return run_region_similarity_test(ref_sasm, superimpose_sub_sasms,
+                region, sim_test, sim_cor, sim_thresh)
 
     if np.any(rg==-1):
         param_range_valid = False
@@ -3943,29 +5025,13 @@ def validateSample(sub_sasms, frame_idx, intensity, rg, vcmw, vpmw,
 
     #Test for regional frame similarity
     if len(sub_sasms) > 1:
-        if qf-qi>200:
-            ref_sasm.setQrange((qi, qi+100))
-            for sasm in superimpose_sub_sasms:
-                sasm.setQrange((qi, qi+100))
-            low_q_similar, low_q_outliers = run_similarity_test(ref_sasm,
-                superimpose_sub_sasms, sim_test, sim_cor, sim_thresh)
+        if num_q>200:
+            low_q_similar, low_q_outliers = similarity_test('low')
 
             if fast and not low_q_similar:
-                ref_sasm.setQrange((qi, qf))
-                for sasm in superimpose_sub_sasms:
-                    sasm.setQrange((qi, qf))
                 return False, {}, param_results, {}, {}
 
-            ref_sasm.setQrange((qf-100, qf))
-            for sasm in superimpose_sub_sasms:
-                sasm.setQrange((qf-100, qf))
-
-            high_q_similar, high_q_outliers = run_similarity_test(ref_sasm,
-                superimpose_sub_sasms, sim_test, sim_cor, sim_thresh)
-
-            ref_sasm.setQrange((qi, qf))
-            for sasm in superimpose_sub_sasms:
-                sasm.setQrange((qi, qf))
+            high_q_similar, high_q_outliers = similarity_test('high')
 
             if fast and not high_q_similar:
                 return False, {}, param_results, {}, {}
@@ -3984,7 +5050,10 @@ def validateSample(sub_sasms, frame_idx, intensity, rg, vcmw, vpmw,
 
     #Test for more than one significant singular value
     if len(sub_sasms) > 1:
-        svd_results = significantSingularValues(sub_sasms)
+        if search_data is not None:
+            svd_results = search_data.significantSingularValues(frames)
+        else:
+            svd_results = significantSingularValues(sub_sasms)
     else:
         svd_results = {'svals': 1}
 
@@ -4003,12 +5072,16 @@ def validateSample(sub_sasms, frame_idx, intensity, rg, vcmw, vpmw,
 
         while sn_valid and i < len(sort_idx):
             idxs = sort_idx[:i+1]
-            avg_list = [sub_sasms[idx] for idx in idxs]
 
-            average_sasm = SASProc.average(avg_list, forced=True,
-                copy_params=False)
-            avg_i = average_sasm.getI()
-            avg_err = average_sasm.getErr()
+            if search_data is not None:
+                avg_i, avg_err = search_data.average(frames[idxs])
+            else:
+                avg_list = [sub_sasms[idx] for idx in idxs]
+
+                average_sasm = SASProc.average(avg_list, forced=True,
+                    copy_params=False)
+                avg_i = average_sasm.getI()
+                avg_err = average_sasm.getErr()
 
             s_to_n = np.abs(avg_i/avg_err).mean()
 
@@ -4032,8 +5105,7 @@ def validateSample(sub_sasms, frame_idx, intensity, rg, vcmw, vpmw,
 
     #Test for all frame similarity
     if len(sub_sasms) > 1:
-        all_similar, all_outliers = run_similarity_test(ref_sasm,
-            superimpose_sub_sasms, sim_test, sim_cor, sim_thresh)
+        all_similar, all_outliers = similarity_test('all')
     else:
         all_similar = True
         all_outliers = []
@@ -4054,7 +5126,7 @@ def validateSample(sub_sasms, frame_idx, intensity, rg, vcmw, vpmw,
     return valid, similarity_results, param_results, svd_results, sn_results
 
 def findSampleRange(sub_sasms, intensity, rg, vcmw, vpmw, avg_window, sim_test,
-    sim_cor, sim_thresh):
+    sim_cor, sim_thresh, parallel=False):
     win_len = len(intensity)//2
     if win_len % 2 == 0:
         win_len = win_len+1
@@ -4083,6 +5155,8 @@ def findSampleRange(sub_sasms, intensity, rg, vcmw, vpmw, avg_window, sim_test,
     window_size = main_peak_width
     start_point = main_peak_pos - int(round(search_region/2.))
 
+    search_data = prepareRangeSearch(sub_sasms)
+
     found_region = False
     failed = False
 
@@ -4107,7 +5181,7 @@ def findSampleRange(sub_sasms, intensity, rg, vcmw, vpmw, avg_window, sim_test,
                 if mid_point - i*step_size > 0:
                     region_starts.append(mid_point-i*step_size)
 
-        for idx in region_starts:
+        def validate_region(idx, window_size=window_size):
             region_sasms = sub_sasms[idx:idx+window_size+1]
             region_intensity = intensity[idx:idx+window_size+1]
             frame_idx = list(range(idx, idx+window_size+1))
@@ -4119,13 +5193,16 @@ def findSampleRange(sub_sasms, intensity, rg, vcmw, vpmw, avg_window, sim_test,
             (valid, similarity_results, param_results, svd_results,
                 sn_results) = validateSample(region_sasms, frame_idx,
                 region_intensity, rg_region, vcmw_region, vpmw_region,
-                sim_test, sim_cor, sim_thresh, True)
-            found_region = valid
+                sim_test, sim_cor, sim_thresh, True, search_data)
 
-            if found_region:
-                region_start = idx
-                region_end = idx+window_size
-                break
+            return valid
+
+        idx = findFirstValidRegion(validate_region, region_starts, parallel)
+
+        if idx is not None:
+            found_region = True
+            region_start = idx
+            region_end = idx+window_size
 
         window_size = int(round(window_size/2.))
 
@@ -4141,13 +5218,13 @@ def findSampleRange(sub_sasms, intensity, rg, vcmw, vpmw, avg_window, sim_test,
     return success, region_start, region_end
 
 def validateBaseline(sasms, frame_idx, intensity, bl_type, ref_sasms, start,
-    sim_test, sim_cor, sim_thresh, fast):
+    sim_test, sim_cor, sim_thresh, fast, search_data=None):
     other_results = {}
 
     if bl_type == 'Integral':
         valid, similarity_results, svd_results, intI_results = validateBuffer(sasms,
             frame_idx, intensity, sim_test, sim_cor, sim_thresh,
-    fast)
+            fast, search_data)
 
         if fast and not valid:
             return valid, similarity_results, svd_results, intI_results, other_results
@@ -4264,7 +5341,7 @@ def validateBaseline(sasms, frame_idx, intensity, bl_type, ref_sasms, start,
     return valid, similarity_results, svd_results, intI_results, other_results
 
 def findBaselineRange(sub_sasms, intensity, bl_type, avg_window, start_region,
-    sim_test, sim_cor, sim_thresh):
+    sim_test, sim_cor, sim_thresh, parallel=False):
     region1_start = -1
     region1_end = -1
     region2_start = -1
@@ -4301,6 +5378,12 @@ def findBaselineRange(sub_sasms, intensity, bl_type, avg_window, start_region,
         if end_point + window_size > len(intensity) - 1 - window_size:
             end_point = len(intensity) - 1 - window_size
 
+    # Only the integral baseline validation uses the buffer validation
+    if bl_type == 'Integral':
+        search_data = prepareRangeSearch(sub_sasms)
+    else:
+        search_data = None
+
     found_region = False
     start_failed = False
 
@@ -4312,7 +5395,7 @@ def findBaselineRange(sub_sasms, intensity, bl_type, avg_window, start_region,
         (valid, similarity_results, svd_results, intI_results,
             other_results) = validateBaseline(region_sasms, frame_idx,
             region_intensity, bl_type, None, True, sim_test, sim_cor,
-            sim_thresh, True)
+            sim_thresh, True, search_data)
 
         if np.all([peak not in frame_idx for peak in peaks]) and valid:
             found_region = True
@@ -4329,7 +5412,7 @@ def findBaselineRange(sub_sasms, intensity, bl_type, avg_window, start_region,
 
         region_starts = region_starts[::-1]
 
-        for idx in region_starts:
+        def validate_region(idx, window_size=window_size):
             region_sasms = sub_sasms[idx:idx+window_size+1]
             frame_idx = np.arange(idx, idx+window_size+1)
             region_intensity = intensity[idx:idx+window_size+1]
@@ -4337,17 +5420,16 @@ def findBaselineRange(sub_sasms, intensity, bl_type, avg_window, start_region,
             (valid, similarity_results, svd_results, intI_results,
                 other_results) = validateBaseline(region_sasms, frame_idx,
                 region_intensity, bl_type, None, True, sim_test, sim_cor,
-                sim_thresh, True)
+                sim_thresh, True, search_data)
 
-            if np.all([peak not in frame_idx for peak in peaks]) and valid:
-                found_region = True
-            else:
-                found_region = False
+            return np.all([peak not in frame_idx for peak in peaks]) and valid
 
-            if found_region:
-                region1_start = idx
-                region1_end = idx+window_size
-                break
+        idx = findFirstValidRegion(validate_region, region_starts, parallel)
+
+        if idx is not None:
+            found_region = True
+            region1_start = idx
+            region1_end = idx+window_size
 
         window_size = int(round(window_size/2.))
 
@@ -4383,7 +5465,7 @@ def findBaselineRange(sub_sasms, intensity, bl_type, avg_window, start_region,
 
         region_starts = list(range(start_point, end_point, step_size))
 
-        for idx in region_starts:
+        def validate_region(idx, window_size=window_size):
             region_sasms = sub_sasms[idx:idx+window_size+1]
             frame_idx = np.arange(idx, idx+window_size+1)
             region_intensity = intensity[idx:idx+window_size+1]
@@ -4392,22 +5474,21 @@ def findBaselineRange(sub_sasms, intensity, bl_type, avg_window, start_region,
                 (valid, similarity_results, svd_results, intI_results,
                     other_results) = validateBaseline(region_sasms, frame_idx,
                     region_intensity, bl_type, start_sasms, False, sim_test,
-                    sim_cor, sim_thresh, True)
+                    sim_cor, sim_thresh, True, search_data)
             else:
                 (valid, similarity_results, svd_results, intI_results,
                     other_results) = validateBaseline(region_sasms, frame_idx,
                     region_intensity, bl_type, None, True, sim_test, sim_cor,
-                    sim_thresh, True)
+                    sim_thresh, True, search_data)
 
-            if np.all([peak not in frame_idx for peak in peaks]) and valid:
-                found_region = True
-            else:
-                found_region = False
+            return np.all([peak not in frame_idx for peak in peaks]) and valid
 
-            if found_region:
-                region2_start = idx
-                region2_end = idx+window_size
-                break
+        idx = findFirstValidRegion(validate_region, region_starts, parallel)
+
+        if idx is not None:
+            found_region = True
+            region2_start = idx
+            region2_end = idx+window_size
 
         window_size = int(round(window_size/2.))
 
@@ -4595,8 +5676,8 @@ def processBaseline(unsub_sasms, sub_sasms, r1, r2, bl_type, min_iter, max_iter,
 # REGALS stuff
 
 def run_regals(M, intensity, sigma, min_iter=20, max_iter=1000, tol=0.001,
-    conv_type='Chi^2', callback=None, abort_event=None):
-    R = REGALS.regals(intensity, sigma)
+    conv_type='Chi^2', callback=None, abort_event=None, in_place=False):
+    R = REGALS.regals(intensity, sigma, in_place=in_place)
 
     chis = np.empty(max_iter)
     niter = 0
@@ -5030,7 +6111,7 @@ def make_regals_regularized_concs(mixture):
 def run_full_regals(series, comp_settings, profile_type='sub', framei=None,
     framef=None, x_vals=None, min_iter=25, max_iter=1000, tol=0.0001,
     conv_type='Chi^2', use_previous_results=False,
-    previous_results=None):
+    previous_results=None, in_place=False):
     """
     Runs regularized alternating least squares (REGALS) on the input series to
     deconvolve overlapping components in the data.
@@ -5107,6 +6188,14 @@ def run_full_regals(series, comp_settings, profile_type='sub', framei=None,
         The mixture output from a previous REGALS run, which will be used as
         the initial profile and concentration vectors for this REGALS run. Only
         used of use_previous_results is True.
+    in_place: bool, optional
+        If True, the REGALS iterations update the mixture in place and reuse
+        the linear systems set up on the first iteration, rather than copying
+        the mixture and building and solving new sparse systems each
+        iteration. This is significantly faster for long series or large
+        numbers of iterations, and gives the same result to within numerical
+        precision. If previous_results is provided it is not modified.
+        Defaults to False.
 
     Returns
     -------
@@ -5179,7 +6268,8 @@ def run_full_regals(series, comp_settings, profile_type='sub', framei=None,
             ref_q, x_vals, intensity, sigma)
 
     mixture, params, residual = run_regals(mixture, intensity, sigma,
-        min_iter=min_iter, max_iter=max_iter, tol=tol, conv_type=conv_type)
+        min_iter=min_iter, max_iter=max_iter, tol=tol, conv_type=conv_type,
+        in_place=in_place)
 
     regals_profiles = make_regals_sasms(mixture, ref_q, intensity, sigma,
         series, framei, framef, ref_q_err)
@@ -133,3 +133,10 @@ class DIFTError(Exception):
        self.parameter = value
     def __str__(self):
        return repr(self.parameter)
+
+class FileLoadError(Exception):
+    def __init__(self, value, errors=None):
+       self.parameter = value
+       self.errors = errors
+    def __str__(self):
+       return repr(self.parameter)
@@ -42,6 +42,8 @@ import datetime
 from xml.dom import minidom
 import ast
 import traceback
+import threading
+import queue
 
 import numpy as np
 import fabio
@@ -109,6 +111,123 @@ def loadFabio(filename, hdf5_file=None, next_image=None):
 
     return img, img_hdr, num_frames
 
+class ImageFrameSource(object):
+    """
+    Reads the frames of an image file one at a time instead of loading the
+    whole file, so that only a bounded number of frames are in memory at
+    once. For HDF5 files (such as Eiger data) the frames are read directly
+    from the datasets with h5py, in blocks of whole chunks of at most
+    max_block_bytes. Other multi-frame formats are stepped through
+    frame by frame with fabio. Gives the same frames and headers as
+    loadFabio. The file is closed after the last frame is read, so the
+    frames can only be iterated over once.
+    """
+
+    def __init__(self, filename, fabio_img=None, max_block_bytes=16*1024**2):
+        """
+        Parameters
+        ----------
+        filename: str
+            The image file.
+        fabio_img: fabio.fabioimage.FabioImage, optional
+            An already opened fabio image for the file. If not provided,
+            the file is opened with fabio.
+        max_block_bytes: int, optional
+            The maximum size of the block of frames read from an HDF5
+            dataset at once. At least one chunk is always read.
+        """
+        if fabio_img is None:
+            fabio_img = fabio.open(filename)
+
+        self.filename = filename
+        self.max_block_bytes = max_block_bytes
+
+        self._fabio_img = fabio_img
+        self._datasets = self._getDatasets(fabio_img)
+
+        self.nframes = fabio_img.nframes
+
+    def _getDatasets(self, fabio_img):
+        datasets = getattr(fabio_img, 'dataset', None)
+
+        if datasets is None:
+            return None
+
+        if not isinstance(datasets, list):
+            datasets = [datasets]
+
+        if (len(datasets) == 0
+            or not all(isinstance(ds, h5py.Dataset) for ds in datasets)):
+            return None
+
+        return datasets
+
+    def __len__(self):
+        return self.nframes
+
+    def __iter__(self):
+        for start, imgs, hdrs in self.iterBlocks():
+            for img, hdr in zip(imgs, hdrs):
+                yield img, hdr
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _blockSize(self, ds):
+        frame_bytes = max(int(np.prod(ds.shape[1:]))*ds.dtype.itemsize, 1)
+        block_size = max(self.max_block_bytes//frame_bytes, 1)
+
+        if ds.chunks is not None:
+            chunk_frames = ds.chunks[0]
+            block_size = max(block_size//chunk_frames, 1)*chunk_frames
+
+        return block_size
+
+    def iterBlocks(self):
+        """
+        Yields (start, imgs, hdrs) for each block of frames read, where
+        start is the index of the first frame in the block, imgs is an
+        array or list of the frames, and hdrs is a list of their headers.
+        The file is closed once all frames have been read.
+        """
+        try:
+            if self._datasets is not None and self.nframes > 1:
+                start = 0
+                hdr = self._fabio_img.header
+
+                for ds in self._datasets:
+                    if ds.ndim == 2:
+                        yield start, [ds[()]], [dict(hdr)]
+                        start += 1
+                        continue
+
+                    block_size = self._blockSize(ds)
+
+                    for i in range(0, ds.shape[0], block_size):
+                        imgs = ds[i:i+block_size]
+                        yield start, imgs, [dict(hdr) for j in range(len(imgs))]
+                        start += len(imgs)
+
+            else:
+                fabio_img = self._fabio_img
+
+                yield 0, [fabio_img.data], [fabio_img.getheader()]
+
+                for i in range(1, self.nframes):
+                    fabio_img = fabio_img.next()
+                    yield i, [fabio_img.data], [fabio_img.getheader()]
+
+        finally:
+            self.close()
+
+    def close(self):
+        if self._fabio_img is not None:
+            self._fabio_img.close()
+            self._fabio_img = None
+
 def loadTiffImage(filename):
     ''' Load TIFF image '''
     try:
@@ -300,6 +419,143 @@ def loadSAXSLAB300Image(filename):
 #--- ## Parse Counter Files and Headers ##
 ##########################################
 
+#Counter/log files are shared by every image in a run, so they are parsed
+#once and kept here keyed by path. Entries are reparsed when the file
+#modification time or size changes, e.g. as the log grows in online mode.
+_header_file_cache = OrderedDict()
+_header_file_cache_lock = threading.Lock()
+_header_file_cache_max = 32
+
+def getCachedHeaderFile(filename, parse_func):
+    """
+    Returns the parsed contents of a header source file (such as a
+    beamline counter log), using a cached copy if the file is unchanged.
+
+    Parameters
+    ----------
+    filename: str
+        The path to the header file.
+    parse_func: function
+        The function that parses the file. It should take the filename as
+        its only argument. The result is shared, and should not be modified
+        by the caller.
+
+    Returns
+    -------
+    parsed: object
+        The result of parse_func for the current version of the file.
+    """
+    filename = os.path.abspath(filename)
+    key = (filename, parse_func)
+
+    stat = os.stat(filename)
+    file_id = (stat.st_mtime, stat.st_size)
+
+    with _header_file_cache_lock:
+        cached = _header_file_cache.get(key)
+
+        if cached is not None and cached[0] == file_id:
+            _header_file_cache.move_to_end(key)
+            return cached[1]
+
+    parsed = parse_func(filename)
+
+    with _header_file_cache_lock:
+        _header_file_cache[key] = (file_id, parsed)
+        _header_file_cache.move_to_end(key)
+
+        while len(_header_file_cache) > _header_file_cache_max:
+            _header_file_cache.popitem(last=False)
+
+    return parsed
+
+def clearHeaderFileCache():
+    """Clears all cached header source files."""
+    with _header_file_cache_lock:
+        _header_file_cache.clear()
+
+def _parseCHESSCountFile(countFilename):
+    """
+    Reads a CHESS spec counter file, and indexes the start (#S), date (#D)
+    and label (#L) lines of each scan by scan number.
+    """
+    with open(countFilename,'r') as f:
+        allLines = f.readlines()
+
+    scans = {}
+    current = None
+
+    for line_num, eachLine in enumerate(allLines):
+        splitline = eachLine.split()
+
+        if len(splitline) > 1:
+            if splitline[0] == '#S':
+                if splitline[1] not in scans:
+                    current = [line_num, None, None]
+                    scans[splitline[1]] = current
+                else:
+                    current = None
+
+            elif current is not None:
+                if splitline[0] == '#D':
+                    current[1] = line_num
+
+                elif splitline[0] == '#L':
+                    current[2] = line_num
+                    current = None
+
+    return allLines, scans
+
+def getCHESSScanLines(countFilename, filenumber):
+    """
+    Returns the lines of a CHESS counter file and the line indices of the
+    start, date and labels of the given scan (None if not found).
+    """
+    allLines, scans = getCachedHeaderFile(countFilename, _parseCHESSCountFile)
+
+    start_idx, date_idx, label_idx = scans.get(str(filenumber), (None, None, None))
+
+    return allLines, start_idx, date_idx, label_idx
+
+def _parseBioCATlog(countFilename):
+    """
+    Reads a BioCAT log file into the header counters, the column labels,
+    the line of the labels, all of the lines, and a dictionary of the data
+    line numbers keyed by image name.
+    """
+    with open(countFilename,'r') as f:
+        allLines=f.readlines()
+
+    header = {}
+    labels = None
+    offset = 0
+
+    for i, line in enumerate(allLines):
+        if line.startswith('#'):
+            if line.startswith('#Filename') or line.startswith('#image'):
+                labels = line.strip('#').split('\t')
+                offset = i
+            else:
+                key = line.strip('#').split(':')[0].strip()
+                val = ':'.join(line.strip('#').split(':')[1:])
+                if key in header:
+                    header[key] = header[key] + '\n' + val.strip()
+                else:
+                    header[key] = val.strip()
+        else:
+            break
+
+    frames = {}
+
+    for line_num in range(offset+1, len(allLines)):
+        name = allLines[line_num].split('\t')[0].strip()
+
+        if name:
+            frames[name] = line_num
+            frames.setdefault(os.path.splitext(name)[0], line_num)
+
+    return header, labels, offset, allLines, frames
+
 def parseCSVHeaderFile(filename, new_filename=None):
     counters = {}
 
@@ -454,31 +710,8 @@ def parseCHESSEIGER4MCountFile(filename, new_filename=None):
 
     countFilename = os.path.join(dir, countFile)
 
-    with open(countFilename,'r') as f:
-        allLines = f.readlines()
-
-    line_num = 0
-    start_found = False
-    start_idx = None
-    label_idx = None
-    date_idx = None
-
-    for eachLine in allLines:
-        splitline = eachLine.split()
-
-        if len(splitline) > 1:
-            if splitline[0] == '#S' and splitline[1] == str(filenumber):
-                start_found = True
-                start_idx = line_num
-
-            if splitline[0] == '#D' and start_found:
-                date_idx = line_num
-
-            if splitline[0] == '#L' and start_found:
-                label_idx = line_num
-                break
-
-        line_num = line_num + 1
+    allLines, start_idx, date_idx, label_idx = getCHESSScanLines(countFilename,
+        filenumber)
 
     counters = {}
     try:
@@ -522,31 +755,8 @@ def parseCHESSG1CountFile(filename, new_filename=None):
 
     countFilename = os.path.join(dir, countFile)
 
-    with open(countFilename,'r') as f:
-        allLines = f.readlines()
-
-    line_num = 0
-    start_found = False
-    start_idx = None
-    label_idx = None
-    date_idx = None
-
-    for eachLine in allLines:
-        splitline = eachLine.split()
-
-        if len(splitline) > 1:
-            if splitline[0] == '#S' and splitline[1] == str(filenumber):
-                start_found = True
-                start_idx = line_num
-
-            if splitline[0] == '#D' and start_found:
-                date_idx = line_num
-
-            if splitline[0] == '#L' and start_found:
-                label_idx = line_num
-                break
-
-        line_num = line_num + 1
+    allLines, start_idx, date_idx, label_idx = getCHESSScanLines(countFilename,
+        filenumber)
 
     counters = {}
     try:
@@ -588,31 +798,8 @@ def parseCHESSG1CountFileWAXS(filename, new_filename=None):
 
     countFilename = os.path.join(dir, countFile)
 
-    with open(countFilename,'r') as f:
-        allLines = f.readlines()
-
-    line_num = 0
-    start_found = False
-    start_idx = None
-    label_idx = None
-    date_idx = None
-
-    for eachLine in allLines:
-        splitline = eachLine.split()
-
-        if len(splitline) > 1:
-            if splitline[0] == '#S' and splitline[1] == str(filenumber):
-                start_found = True
-                start_idx = line_num
-
-            if splitline[0] == '#D' and start_found:
-                date_idx = line_num
-
-            if splitline[0] == '#L' and start_found:
-                label_idx = line_num
-                break
-
-        line_num = line_num + 1
+    allLines, start_idx, date_idx, label_idx = getCHESSScanLines(countFilename,
+        filenumber)
 
     counters = {}
     try:
@@ -657,31 +844,8 @@ def parseCHESSG1CountFileEiger(filename, new_filename=None):
 
     countFilename = os.path.join(dirname, countFile)
 
-    with open(countFilename,'r') as f:
-        allLines = f.readlines()
-
-    line_num = 0
-    start_found = False
-    start_idx = None
-    label_idx = None
-    date_idx = None
-
-    for eachLine in allLines:
-        splitline = eachLine.split()
-
-        if len(splitline) > 1:
-            if splitline[0] == '#S' and splitline[1] == str(filenumber):
-                start_found = True
-                start_idx = line_num
-
-            if splitline[0] == '#D' and start_found:
-                date_idx = line_num
-
-            if splitline[0] == '#L' and start_found:
-                label_idx = line_num
-                break
-
-        line_num = line_num + 1
+    allLines, start_idx, date_idx, label_idx = getCHESSScanLines(countFilename,
+        filenumber)
 
     counters = {}
 
@@ -792,34 +956,19 @@ def parseBioCATlogfile(filename, new_filename=None):
         countFilename=os.path.join(datadir, '_'.join(fname.split('_')[:-1])+'.log')
         searchName='.'.join(fname.split('.')[:-1])
 
-    with open(countFilename,'r') as f:
-        allLines=f.readlines()
+    header, labels, offset, allLines, frames = getCachedHeaderFile(countFilename,
+        _parseBioCATlog)
 
     line_num=0
 
-    counters = {}
-
-    offset = 0
-
-    for i, line in enumerate(allLines):
-        if line.startswith('#'):
-            if line.startswith('#Filename') or line.startswith('#image'):
-                labels = line.strip('#').split('\t')
-                offset = i
-            else:
-                key = line.strip('#').split(':')[0].strip()
-                val = ':'.join(line.strip('#').split(':')[1:])
-                if key in counters:
-                    counters[key] = counters[key] + '\n' + val.strip()
-                else:
-                    counters[key] = val.strip()
-        else:
-            break
+    counters = dict(header)
 
     test_idx = int(searchName.split('_')[-1]) + offset
 
     if test_idx < len(allLines) and searchName in allLines[test_idx]:
         line_num = test_idx
+    elif searchName in frames:
+        line_num = frames[searchName]
     else:
         for a in range(1,len(allLines)):
             if searchName in allLines[a]:
@@ -905,11 +1054,8 @@ def parseCHESSEigerFilename(filename):
 
     return (countFilename, filenumber, frame_number)
 
-def parseBL19U2HeaderFile(filename, new_filename=None):
-    fname, ext = os.path.splitext(filename)
-
-    countFilename=fname + '.txt'
-
+def _parseColonHeaderFile(countFilename):
+    """Reads a header file of 'name: value' lines into a dictionary."""
     counters = {}
 
     with open(countFilename, 'r') as f:
@@ -920,6 +1066,15 @@ def parseBL19U2HeaderFile(filename, new_filename=None):
 
     return counters
 
+def parseBL19U2HeaderFile(filename, new_filename=None):
+    fname, ext = os.path.splitext(filename)
+
+    countFilename=fname + '.txt'
+
+    counters = dict(getCachedHeaderFile(countFilename, _parseColonHeaderFile))
+
+    return counters
+
 
 def parsePetraIIIP12EigerFile(filename, new_filename = None):
     if new_filename:
@@ -935,13 +1090,7 @@ def parsePetraIIIP12EigerFile(filename, new_filename = None):
 
     countFilename = os.path.join(header_path, header_name)
 
-    counters = {}
-
-    with open(countFilename, 'r') as f:
-        for line in f:
-            name = line.split(':')[0]
-            value = ':'.join(line.split(':')[1:])
-            counters[name.strip()] = value.strip()
+    counters = dict(getCachedHeaderFile(countFilename, _parseColonHeaderFile))
 
     return counters
 
@@ -1063,7 +1212,8 @@ def loadAllHeaders(filename, image_type, header_type, raw_settings):
 
 def loadHeader(filename, new_filename, header_type):
     ''' returns header information based on the *image* filename
-     and the type of headerfile     '''
+     and the type of headerfile. Counter/log files are parsed once and
+     shared between calls (see getCachedHeaderFile). '''
 
     if header_type != 'None':
         try:
@@ -1132,6 +1282,44 @@ def loadImage(filename, raw_settings, hdf5_file=None, next_image=None):
 
     return img, imghdr, num_frames
 
+def loadImageFrames(filename, raw_settings, hdf5_file=None):
+    ''' Returns the number of frames in an image file and an iterator
+    that yields (img, imghdr) for each frame. Formats read with fabio are
+    read lazily using an ImageFrameSource, other formats are loaded all at
+    once with loadImage. The images are the same as those from loadImage.'''
+    image_type = raw_settings.get('ImageFormat')
+
+    if all_image_types.get(image_type) != loadFabio:
+        img, imghdr, _ = loadImage(filename, raw_settings, hdf5_file)
+
+        return len(img), zip(img, imghdr)
+
+    try:
+        source = ImageFrameSource(filename, hdf5_file)
+    except (ValueError, TypeError, KeyError, fabio.fabioutils.NotGoodReader, Exception) as msg:
+        raise SASExceptions.WrongImageFormat('Error loading image, ' + str(msg))
+
+    return source.nframes, _iterImageFrames(source, raw_settings)
+
+def _iterImageFrames(source, raw_settings):
+    fliplr = raw_settings.get('DetectorFlipLR')
+    flipud = raw_settings.get('DetectorFlipUD')
+
+    try:
+        for img, imghdr in source:
+            if fliplr:
+                img = np.fliplr(img)
+            if flipud:
+                img = np.flipud(img)
+
+            yield img, imghdr
+
+    except Exception as msg:
+        raise SASExceptions.WrongImageFormat('Error loading image, ' + str(msg))
+
+    finally:
+        source.close()
+
 #################################
 #--- ** MAIN LOADING FUNCTION **
 #################################
@@ -1151,6 +1339,9 @@ def loadFile(filename, raw_settings, no_processing=False, return_all_images=True
         print(str(msg))
         file_type = None
 
+    if file_type == 'hdf5' and is_profile_collection(filename):
+        file_type = 'profile_collection'
+
     if file_type == 'hdf5':
         try:
             hdf5_file = fabio.open(filename)
@@ -1182,6 +1373,10 @@ def loadFile(filename, raw_settings, no_processing=False, return_all_images=True
         sasm = loadHdf5File(filename, raw_settings)
         img = None
 
+    elif file_type == 'profile_collection':
+        sasm = load_profile_collection(filename)
+        img = None
+
     else:
         sasm = loadAsciiFile(filename, file_type)
         img = None
@@ -1236,6 +1431,62 @@ four_col_fit = re.compile(start_match + (num_match+sep_match)*3 + num_match + en
 five_col_fit = re.compile(start_match + (num_match+sep_match)*4 + num_match + end_match)
 seven_col_fit = re.compile(start_match + (num_match+sep_match)*6 + num_match + end_match)
 
+def readDataBlock(lines, start, ncols):
+    """
+    Reads the block of numeric data lines beginning at lines[start] in bulk,
+    instead of matching and converting each line separately. The block ends
+    at the first blank line or line containing a '#'.
+
+    Parameters
+    ----------
+    lines: list
+        The lines of the file.
+    start: int
+        The index of the first line of the block, which should match one
+        of the ascii data regular expressions.
+    ncols: int
+        The minimum number of columns in the block.
+
+    Returns
+    -------
+    end: int
+        The index of the line after the end of the block.
+    data: numpy.array
+        A 2D array of the block data. This is None if the block has
+        anything that the line by line regular expressions wouldn't read
+        the same way, such as a changing number of columns, text or
+        non-finite values, or mixed separators. The caller should fall
+        back to reading the lines separately in that case.
+    """
+    end = start
+
+    while end < len(lines) and '#' not in lines[end] and lines[end].strip():
+        end += 1
+
+    block = lines[start:end]
+
+    if len(block) == 0:
+        return end, None
+
+    if ',' in block[0]:
+        delimiter = ','
+    else:
+        delimiter = None
+
+    try:
+        data = np.loadtxt(block, delimiter=delimiter, comments=None, ndmin=2)
+    except ValueError:
+        return end, None
+
+    # The regular expressions need a digit before the decimal point
+    block_text = '\n' + ''.join(block)
+
+    if (data.shape[1] < ncols or not np.all(np.isfinite(data))
+        or any(sep + '.' in block_text for sep in ('\n', ' ', '\t', ',', '-', '+'))):
+        return end, None
+
+    return end, data
+
 
 def loadAsciiFile(filename, file_type):
     ascii_formats = {'rad'          : loadRadFile,
@@ -1281,6 +1532,12 @@ def loadAsciiFile(filename, file_type):
 
 
 def loadImageFile(filename, raw_settings, hdf5_file=None, return_all_images=True):
+    """
+    Loads an image file and radially averages every frame in it. Frames
+    are read from the file as they are integrated (see loadImageFrames),
+    so for multi-frame files only the frames being integrated, and any
+    returned images, are kept in memory.
+    """
     hdr_fmt = raw_settings.get('ImageHdrFormat')
 
     if hdf5_file is not None:
@@ -1288,88 +1545,81 @@ def loadImageFile(filename, raw_settings, hdf5_file=None, return_all_images=True
     else:
         is_hdf5 = False
 
-    load_one_frame = False
-
-    if is_hdf5 and hdf5_file.nframes > 1:
-        num_frames = hdf5_file.nframes
-        load_one_frame = True
-    else:
-        num_frames = 1
+    num_frames, frames = loadImageFrames(filename, raw_settings, hdf5_file)
 
+    multi_frame = num_frames > 1 or is_hdf5
 
     loaded_data = []
     sasm_list = []
 
-    for file_num in range(num_frames):
-        if load_one_frame:
-            new_data, new_hdr, _ = loadImage(filename, raw_settings, hdf5_file, file_num)
+    offset = 0
 
-        else:
-            new_data, new_hdr, _ = loadImage(filename, raw_settings, hdf5_file)
+    for frame_num, (img, img_hdr) in enumerate(frames):
+        if return_all_images or frame_num == 0:
+            loaded_data.append(img)
 
-        if return_all_images:
-            loaded_data.extend(new_data)
-        elif not return_all_images and file_num == 0:
-            loaded_data.append(new_data[0])
+        if frame_num == 0 and multi_frame:
 
-        offset = 0
+            temp_filename = os.path.split(filename)[1].split('.')
 
-        #Process all loaded images into sasms
-        for i in range(len(new_data)):
-            img = new_data[i]
-            img_hdr = new_hdr[i]
+            if len(temp_filename) > 1:
+                temp_filename[-2] = temp_filename[-2] + '_%05i' %(1)
+            else:
+                temp_filename[0] = temp_filename[0] + '_%05i' %(1)
 
-            if i == 0 and (len(new_data) > 1 or is_hdf5):
+            new_filename = '.'.join(temp_filename)
 
-                temp_filename = os.path.split(filename)[1].split('.')
+            base_hdr = hdrfile_info = loadHeader(filename, new_filename, hdr_fmt)
 
-                if len(temp_filename) > 1:
-                    temp_filename[-2] = temp_filename[-2] + '_%05i' %(i+1)
-                else:
-                    temp_filename[0] = temp_filename[0] + '_%05i' %(i+1)
+            if not filename.endswith('master.h5'):
+                sname_offset = int(os.path.splitext(filename)[0].split('_')[-1])-1
+            else:
+                sname_offset = 0
 
-                new_filename = '.'.join(temp_filename)
+            if 'Number_of_images_per_file' in base_hdr:
+                mult = int(base_hdr['Number_of_images_per_file'])
+            elif is_hdf5:
+                mult = 1
+            else:
+                mult = num_frames
 
-                base_hdr = hdrfile_info = loadHeader(filename, new_filename, hdr_fmt)
+            offset = sname_offset*mult
 
-                if not filename.endswith('master.h5'):
-                    sname_offset = int(os.path.splitext(filename)[0].split('_')[-1])-1
-                else:
-                    sname_offset = 0
+        if multi_frame:
+            temp_filename = os.path.split(filename)[1].split('.')
 
-                if 'Number_of_images_per_file' in base_hdr:
-                    mult = int(base_hdr['Number_of_images_per_file'])
-                else:
-                    mult = len(new_data)
+            if len(temp_filename) > 1:
+                temp_filename[-2] = temp_filename[-2] + '_%05i' %(frame_num+offset+1)
+            else:
+                temp_filename[0] = temp_filename[0] + '_%05i' %(frame_num+offset+1)
 
-                offset = sname_offset*mult
+            new_filename = '.'.join(temp_filename)
+        else:
+            new_filename = os.path.split(filename)[1]
 
-            if len(new_data) > 1 or is_hdf5:
-                temp_filename = os.path.split(filename)[1].split('.')
+        hdrfile_info = loadHeader(filename, new_filename, hdr_fmt)
 
-                if len(temp_filename) > 1:
-                    temp_filename[-2] = temp_filename[-2] + '_%05i' %(i+file_num+offset+1)
-                else:
-                    temp_filename[0] = temp_filename[0] + '_%05i' %(i+file_num+offset+1)
+        parameters = {'imageHeader' : img_hdr,
+                      'counters'    : hdrfile_info,
+                      'filename'    : new_filename,
+                      'load_path'   : filename}
 
-                new_filename = '.'.join(temp_filename)
-            else:
-                new_filename = os.path.split(filename)[1]
+        sasm = processImage(img, parameters, raw_settings)
 
-            hdrfile_info = loadHeader(filename, new_filename, hdr_fmt)
+        sasm_list.append(sasm)
 
-            parameters = {'imageHeader' : img_hdr,
-                          'counters'    : hdrfile_info,
-                          'filename'    : new_filename,
-                          'load_path'   : filename}
+    return sasm_list, loaded_data
 
-            sasm = processImage(img, parameters, raw_settings)
+def processImage(img, parameters, raw_settings):
+    setConcFromCounters(parameters, raw_settings)
 
-            sasm_list.append(sasm)
+    sasm = SASImage.integrateCalibrateNormalize(img, parameters, raw_settings)
 
-    return sasm_list, loaded_data
+    setUVVisFromHeader(sasm, parameters, raw_settings)
 
-def processImage(img, parameters, raw_settings):
+    return sasm
+
+def setConcFromCounters(parameters, raw_settings):
     for key in parameters['counters']:
         if key.lower().find('concentration') > -1 or key.lower().find('mg/ml') > -1:
             if ('BioCAT' in raw_settings.get('ImageHdrFormat') and
@@ -1385,9 +1635,7 @@ def processImage(img, parameters, raw_settings):
                 parameters['Conc'] = parameters['counters'][key]
                 break
 
-
-    sasm = SASImage.integrateCalibrateNormalize(img, parameters, raw_settings)
-
+def setUVVisFromHeader(sasm, parameters, raw_settings):
     img_hdr = parameters['imageHeader']
     hdrfile_info = parameters['counters']
 
@@ -1401,8 +1649,6 @@ def processImage(img, parameters, raw_settings):
                                                      'UVTransmission'     : uvvis[1],
                                                      'UVDarkTransmission' : uvvis[2]}
 
-    return sasm
-
 def loadHdf5File(filename, raw_settings):
     """
     General notes:
@@ -2190,6 +2436,9 @@ def load_series_sasm(group, data_name, q_raw=None, use_group_q=True, q_err_raw=N
     return sasm_data
 
 def load_series_sasm_list(group, excluded_keys=['raw', 'q', 'q_err']):
+    if group.attrs.get('layout', '') == 'columnar':
+        return load_series_sasm_block(group)
+
     q_raw = None
     q_err_raw = None
     sasm_list = []
@@ -2217,6 +2466,36 @@ def load_series_sasm_list(group, excluded_keys=['raw', 'q', 'q_err']):
 
     return sasm_list
 
+def load_series_sasm_block(group):
+    """
+    Loads the profiles in a group saved by save_series_sasm_block as a
+    SECM.LazySASMList, so SASMs are only made for profiles when they are used.
+    """
+    q_raw = group['q'][()]
+
+    if q_raw.ndim == 2:
+        q_err_raw = q_raw[:,1]
+        q_raw = q_raw[:,0]
+    else:
+        q_err_raw = None
+
+    i_raw = group['intensity'][()]
+    err_raw = group['uncertainty'][()]
+
+    metadata = group['frame_metadata'][()]
+
+    parameters = [param.decode('utf-8') if isinstance(param, bytes) else param
+        for param in metadata['parameters']]
+
+    selected_qrange = np.column_stack((metadata['qrange_start'],
+        metadata['qrange_end']))
+
+    sasm_list = SECM.LazySASMList(q_raw, i_raw, err_raw, parameters,
+        metadata['scale_factor'], metadata['offset_value'],
+        metadata['q_scale_factor'], selected_qrange, q_err_raw, loadDatHeader)
+
+    return sasm_list
+
 def load_series(name):
     # Check whether save_name is an hdf5 file (i.e. function called by save worksapace) or file name (function called for a single series)
     try:
@@ -2457,42 +2736,49 @@ def makeSeriesFile(secm_data, settings):
         if key not in secm_data:
             secm_data[key] = default_dict[key]
 
-    sasm_list = []
+    if isinstance(secm_data['sasm_list'], SECM.LazySASMList):
+        sasm_list = secm_data['sasm_list']
 
-    for sasm_data in secm_data['sasm_list']:
+    else:
+        sasm_list = []
 
-        if 'q_binned' in sasm_data:
-            q = sasm_data['q_binned']
-            i = sasm_data['i_binned']
-            err = sasm_data['err_binned']
-            q_err = None
-        else:
-            q = sasm_data['q_raw']
-            i = sasm_data['i_raw']
-            err = sasm_data['err_raw']
-            q_err = sasm_data['q_err_raw']
+        for sasm_data in secm_data['sasm_list']:
 
-        new_sasm = SASM.SASM(i, q, err, sasm_data['parameters'], q_err)
+            if 'q_binned' in sasm_data:
+                q = sasm_data['q_binned']
+                i = sasm_data['i_binned']
+                err = sasm_data['err_binned']
+                q_err = None
+            else:
+                q = sasm_data['q_raw']
+                i = sasm_data['i_raw']
+                err = sasm_data['err_raw']
+                q_err = sasm_data['q_err_raw']
 
-        new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
-            sasm_data['q_scale_factor'])
+            new_sasm = SASM.SASM(i, q, err, sasm_data['parameters'], q_err)
 
-        new_sasm.setQrange(sasm_data['selected_qrange'])
+            new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
+                sasm_data['q_scale_factor'])
 
-        try:
-            new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
-        except KeyError:
-            pass
+            new_sasm.setQrange(sasm_data['selected_qrange'])
+
+            try:
+                new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
+            except KeyError:
+                pass
 
-        new_sasm._update()
+            new_sasm._update()
 
-        sasm_list.append(new_sasm)
+            sasm_list.append(new_sasm)
 
     new_secm = SECM.SECM(secm_data['file_list'], sasm_list,
         secm_data['frame_list'], secm_data['parameters'], settings)
 
-    new_secm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
-            sasm_data['q_scale_factor'])
+    if isinstance(sasm_list, SECM.LazySASMList):
+        new_secm.setScaleValues(*sasm_list.getScaleValues(-1))
+    else:
+        new_secm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
+                sasm_data['q_scale_factor'])
 
     new_secm.series_type = secm_data['series_type']
     new_secm.window_size = secm_data['window_size']
@@ -2513,45 +2799,49 @@ def makeSeriesFile(secm_data, settings):
         new_secm.setCalcValues(secm_data['rg'], secm_data['rger'], secm_data['i0'],
             secm_data['i0er'], secm_data['mw'], secm_data['mwer'],
             np.zeros_like(secm_data['mw'])-1)
-    else:
-        new_secm.setCalcValues(secm_data['rg'], secm_data['rger'], secm_data['i0'],
-            secm_data['i0er'], secm_data['vcmw'], secm_data['vcmwer'],
-            secm_data['vpmw'])
-
-
-    subtracted_sasm_list = []
-
-    for sasm_data in secm_data['subtracted_sasm_list']:
-
-        if sasm_data != -1:
-            if 'q_binned' in sasm_data:
-                q = sasm_data['q_binned']
-                i = sasm_data['i_binned']
-                err = sasm_data['err_binned']
-                q_err = None
-            else:
-                q = sasm_data['q_raw']
-                i = sasm_data['i_raw']
-                err = sasm_data['err_raw']
-                q_err = sasm_data['q_err_raw']
+    else:
+        new_secm.setCalcValues(secm_data['rg'], secm_data['rger'], secm_data['i0'],
+            secm_data['i0er'], secm_data['vcmw'], secm_data['vcmwer'],
+            secm_data['vpmw'])
 
-            new_sasm = SASM.SASM(i, q, err, sasm_data['parameters'], q_err)
 
-            new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
-                sasm_data['q_scale_factor'])
+    if isinstance(secm_data['subtracted_sasm_list'], SECM.LazySASMList):
+        subtracted_sasm_list = secm_data['subtracted_sasm_list']
 
-            new_sasm.setQrange(sasm_data['selected_qrange'])
+    else:
+        subtracted_sasm_list = []
 
-            try:
-                new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
-            except KeyError:
-                pass
+        for sasm_data in secm_data['subtracted_sasm_list']:
 
-            new_sasm._update()
-        else:
-            new_sasm = -1
+            if sasm_data != -1:
+                if 'q_binned' in sasm_data:
+                    q = sasm_data['q_binned']
+                    i = sasm_data['i_binned']
+                    err = sasm_data['err_binned']
+                    q_err = None
+                else:
+                    q = sasm_data['q_raw']
+                    i = sasm_data['i_raw']
+                    err = sasm_data['err_raw']
+                    q_err = sasm_data['q_err_raw']
 
-        subtracted_sasm_list.append(new_sasm)
+                new_sasm = SASM.SASM(i, q, err, sasm_data['parameters'], q_err)
+
+                new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
+                    sasm_data['q_scale_factor'])
+
+                new_sasm.setQrange(sasm_data['selected_qrange'])
+
+                try:
+                    new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
+                except KeyError:
+                    pass
+
+                new_sasm._update()
+            else:
+                new_sasm = -1
+
+            subtracted_sasm_list.append(new_sasm)
 
     new_secm.setSubtractedSASMs(subtracted_sasm_list, secm_data['use_subtracted_sasm'])
 
@@ -2561,65 +2851,73 @@ def makeSeriesFile(secm_data, settings):
     new_secm.baseline_extrap = secm_data['baseline_extrap']
     new_secm.baseline_fit_results = secm_data['baseline_fit_results']
 
-    baseline_subtracted_sasm_list = []
+    if isinstance(secm_data['baseline_subtracted_sasm_list'], SECM.LazySASMList):
+        baseline_subtracted_sasm_list = secm_data['baseline_subtracted_sasm_list']
 
-    for sasm_data in secm_data['baseline_subtracted_sasm_list']:
+    else:
+        baseline_subtracted_sasm_list = []
 
-        if sasm_data != -1:
-            if 'q_binned' in sasm_data:
-                q = sasm_data['q_binned']
-                i = sasm_data['i_binned']
-                err = sasm_data['err_binned']
-                q_err = None
-            else:
-                q = sasm_data['q_raw']
-                i = sasm_data['i_raw']
-                err = sasm_data['err_raw']
-                q_err = sasm_data['q_err_raw']
+        for sasm_data in secm_data['baseline_subtracted_sasm_list']:
 
-            new_sasm = SASM.SASM(i, q, err, sasm_data['parameters'], q_err)
+            if sasm_data != -1:
+                if 'q_binned' in sasm_data:
+                    q = sasm_data['q_binned']
+                    i = sasm_data['i_binned']
+                    err = sasm_data['err_binned']
+                    q_err = None
+                else:
+                    q = sasm_data['q_raw']
+                    i = sasm_data['i_raw']
+                    err = sasm_data['err_raw']
+                    q_err = sasm_data['q_err_raw']
 
-            new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
-                sasm_data['q_scale_factor'])
+                new_sasm = SASM.SASM(i, q, err, sasm_data['parameters'], q_err)
 
-            new_sasm.setQrange(sasm_data['selected_qrange'])
+                new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
+                    sasm_data['q_scale_factor'])
 
-            try:
-                new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
-            except KeyError:
-                pass
+                new_sasm.setQrange(sasm_data['selected_qrange'])
 
-            new_sasm._update()
-        else:
-            new_sasm = -1
+                try:
+                    new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
+                except KeyError:
+                    pass
+
+                new_sasm._update()
+            else:
+                new_sasm = -1
 
-        baseline_subtracted_sasm_list.append(new_sasm)
+            baseline_subtracted_sasm_list.append(new_sasm)
 
     new_secm.setBCSubtractedSASMs(baseline_subtracted_sasm_list, secm_data['use_baseline_subtracted_sasm'])
 
-    baseline_corr = []
+    if isinstance(secm_data['baseline_corr'], SECM.LazySASMList):
+        baseline_corr = secm_data['baseline_corr']
 
-    for sasm_data in secm_data['baseline_corr']:
+    else:
+        baseline_corr = []
 
-        if sasm_data != -1:
-            new_sasm = SASM.SASM(sasm_data['i_raw'], sasm_data['q_raw'],
-                sasm_data['err_raw'], sasm_data['parameters'])
+        for sasm_data in secm_data['baseline_corr']:
 
-            new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
-                sasm_data['q_scale_factor'])
+            if sasm_data != -1:
+                new_sasm = SASM.SASM(sasm_data['i_raw'], sasm_data['q_raw'],
+                    sasm_data['err_raw'], sasm_data['parameters'])
 
-            new_sasm.setQrange(sasm_data['selected_qrange'])
+                new_sasm.setScaleValues(sasm_data['scale_factor'], sasm_data['offset_value'],
+                    sasm_data['q_scale_factor'])
 
-            try:
-                new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
-            except KeyError:
-                pass
+                new_sasm.setQrange(sasm_data['selected_qrange'])
 
-            new_sasm._update()
-        else:
-            new_sasm = -1
+                try:
+                    new_sasm.setParameter('analysis', sasm_data['parameters_analysis'])
+                except KeyError:
+                    pass
 
-        baseline_corr.append(new_sasm)
+                new_sasm._update()
+            else:
+                new_sasm = -1
+
+            baseline_corr.append(new_sasm)
 
     new_secm.baseline_corr = baseline_corr
 
@@ -3414,10 +3712,26 @@ def makeDatFile(lines, filename):
 
     header = []
     header_start = False
+    bulk_read = not is_foxs_fit and not is_sans_data
 
-    for j, line in enumerate(lines):
+    j = 0
+
+    while j < len(lines):
+        line = lines[j]
         iq_match = iq_pattern.match(line)
 
+        if iq_match and bulk_read:
+            block_end, data = readDataBlock(lines, j, 3)
+
+            if data is not None:
+                q.extend(data[:, 0].tolist())
+                i.extend(data[:, 1].tolist())
+                err.extend(np.abs(data[:, 2]).tolist())
+                j = block_end
+                continue
+            else:
+                bulk_read = False
+
         if iq_match:
             if is_foxs_fit:
                 if ',' in line:
@@ -3471,10 +3785,10 @@ def makeDatFile(lines, filename):
         elif header_start and not iq_match:
             header.append(lines[j])
 
+        j = j + 1
+
     if len(header)>0:
-        hdr_str = ''
-        for each_line in header:
-            hdr_str=hdr_str+each_line.lstrip('#')
+        hdr_str = ''.join([each_line.lstrip('#') for each_line in header])
 
         hdict = loadDatHeader(hdr_str)
 
@@ -3771,10 +4085,34 @@ def loadTxtFile(filename):
                       'counters' : fileHeader}
 
         if len(fileHeader) == 0:
-            q, i, err = _match_txt_lines(firstLine, q, i, err, fit_list)
+            lines = [firstLine] + f.readlines()
+        else:
+            lines = f.readlines()
 
-        for line in f:
-            q, i, err = _match_txt_lines(line, q, i, err, fit_list)
+    bulk_read = True
+
+    j = 0
+
+    while j < len(lines):
+        if bulk_read and any(fit.match(lines[j]) for fit in fit_list):
+            block_end, data = readDataBlock(lines, j, 2)
+
+            if data is not None:
+                q.extend(data[:, 0].tolist())
+                i.extend(data[:, 1].tolist())
+
+                # Comma separated lines with more than three values don't
+                # have an error column
+                if data.shape[1] == 3 or (data.shape[1] > 3 and ',' not in lines[j]):
+                    err.extend(data[:, 2].tolist())
+
+                j = block_end
+                continue
+            else:
+                bulk_read = False
+
+        q, i, err = _match_txt_lines(lines[j], q, i, err, fit_list)
+        j = j + 1
 
     i = np.array(i)
     q = np.array(q)
@@ -3850,6 +4188,108 @@ def saveMeasurement(sasm, save_path, raw_settings, filetype = '.dat'):
 
                 raise SASExceptions.HeaderSaveError(e)
 
+class ProfileSaveQueue(object):
+    """
+    Saves profiles with saveMeasurement in a background thread, so that
+    autosaving processed, averaged or subtracted files doesn't hold up
+    integration. Profiles are copied when they are added to the queue, so
+    they can be changed afterwards without affecting the saved file.
+
+    Errors raised while saving are collected in the errors list as
+    (filename, exception) tuples, and passed to the error_callback if one
+    is provided. Call join to wait until everything in the queue has been
+    saved, and stop when done with the queue. Files still in the queue when
+    the program exits without calling stop may not be saved.
+    """
+
+    def __init__(self, max_size=0, error_callback=None):
+        """
+        Parameters
+        ----------
+        max_size: int, optional
+            The maximum number of profiles waiting to be saved. If the queue
+            is full, put blocks until there is space. If 0, there is no
+            limit.
+        error_callback: function, optional
+            Called from the save thread with the profile and the exception
+            if a profile can't be saved.
+        """
+        self.error_callback = error_callback
+        self.errors = []
+
+        self._queue = queue.Queue(max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, sasm, save_path, raw_settings, filetype='.dat',
+        collection=None):
+        """
+        Adds profiles to be saved. Takes the same arguments as
+        saveMeasurement. If collection is provided, the profiles are
+        instead added to the profile collection file with that name in
+        save_path. The save thread is started if needed.
+        """
+        if not isinstance(sasm, list):
+            sasm = [sasm]
+
+        sasm = [copy.deepcopy(each_sasm) for each_sasm in sasm]
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+        self._queue.put((sasm, save_path, raw_settings, filetype, collection))
+
+    def join(self):
+        """Waits until all of the profiles in the queue have been saved."""
+        self._queue.join()
+
+    def stop(self):
+        """Saves all remaining profiles, then stops the save thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+
+            try:
+                if item is None:
+                    break
+
+                sasm, save_path, raw_settings, filetype, collection = item
+
+                if collection is not None:
+                    try:
+                        save_profile_collection(os.path.join(save_path,
+                            collection), sasm)
+                    except Exception as e:
+                        for each_sasm in sasm:
+                            self.errors.append((each_sasm.getParameter('filename'), e))
+
+                            if self.error_callback is not None:
+                                self.error_callback(each_sasm, e)
+
+                else:
+                    for each_sasm in sasm:
+                        try:
+                            saveMeasurement(each_sasm, save_path, raw_settings,
+                                filetype)
+                        except Exception as e:
+                            self.errors.append((each_sasm.getParameter('filename'), e))
+
+                            if self.error_callback is not None:
+                                self.error_callback(each_sasm, e)
+            finally:
+                self._queue.task_done()
+
 def saveSECItem(save_path, secm_dict):
 
     with open(save_path, 'wb') as f:
@@ -3931,7 +4371,12 @@ def save_series_sasm(profile_group, sasm_data, dataset_name, descrip='',
     dset.attrs['parameters'] = formatHeader(sasm_data['parameters'])
     dset.attrs['description'] = descrip
 
-def save_series_sasm_list(profile_group, sasm_list, frame_num_offset=0):
+def save_series_sasm_list(profile_group, sasm_list, frame_num_offset=0,
+    columnar=False):
+
+    if columnar and can_save_series_sasm_block(sasm_list):
+        save_series_sasm_block(profile_group, sasm_list, frame_num_offset)
+        return
 
     if len(sasm_list) > 1:
         save_single_q = all([np.array_equal(sasm['q'], sasm_list[0]['q']) for sasm in sasm_list[1:]])
@@ -4066,7 +4511,109 @@ def save_series_sasm_list(profile_group, sasm_list, frame_num_offset=0):
         save_series_sasm(profile_group, sasm_data, "{:06d}".format(frame_num),
             save_single_q=save_single_q, save_single_q_raw=save_single_q_raw)
 
-def save_series(save_name, seriesm, save_gui_data=False):
+def can_save_series_sasm_block(sasm_list):
+    """
+    Checks whether a list of extracted profiles can be saved as a block,
+    which requires that they all have the same raw q vector.
+    """
+    if len(sasm_list) == 0 or any([sasm_data == -1 for sasm_data in sasm_list]):
+        return False
+
+    q_raw = sasm_list[0]['q_raw']
+    q_err_raw = sasm_list[0]['q_err_raw']
+
+    if len(q_raw) == 0:
+        return False
+
+    for sasm_data in sasm_list[1:]:
+        if not np.array_equal(sasm_data['q_raw'], q_raw):
+            return False
+
+        if q_err_raw is None:
+            if sasm_data['q_err_raw'] is not None:
+                return False
+
+        elif (sasm_data['q_err_raw'] is None
+            or not np.array_equal(sasm_data['q_err_raw'], q_err_raw)):
+            return False
+
+    return True
+
+def save_series_sasm_block(profile_group, sasm_list, frame_num_offset=0):
+    """
+    Saves a list of extracted profiles that share a raw q vector as a single
+    q dataset, chunked and compressed 2D intensity and uncertainty datasets
+    with one row per profile, and a table of the scale, offset, q range, and
+    metadata of each profile. The raw (unscaled and untrimmed) values are
+    saved, as the scaled values can be recalculated from them.
+    """
+    profile_group.attrs['layout'] = 'columnar'
+
+    q_raw = sasm_list[0]['q_raw']
+    q_err_raw = sasm_list[0]['q_err_raw']
+
+    if q_err_raw is not None:
+        data = np.column_stack((q_raw, q_err_raw))
+    else:
+        data = q_raw
+
+    q_dataset = profile_group.create_dataset('q', data=data)
+    q_dataset.attrs['description'] = ('The raw q vector (without q scaling or '
+        'trimming) for all profiles in the intensity and uncertainty datasets '
+        'in this group. If present, column 1 is dQ.')
+
+    i_data = np.array([sasm_data['i_raw'] for sasm_data in sasm_list])
+    err_data = np.array([sasm_data['err_raw'] for sasm_data in sasm_list])
+
+    chunks = (min(len(sasm_list), 64), i_data.shape[1])
+
+    i_dset = profile_group.create_dataset('intensity', data=i_data,
+        chunks=chunks, compression='gzip', shuffle=True)
+    i_dset.attrs['description'] = ('Each row is the raw I(q) (without scaling '
+        'or offset) of subsequent profiles in the series.')
+
+    err_dset = profile_group.create_dataset('uncertainty', data=err_data,
+        chunks=chunks, compression='gzip', shuffle=True)
+    err_dset.attrs['description'] = ('Each row is the raw sigma(q) (without '
+        'scaling) of subsequent profiles in the series.')
+
+    try:
+        dtype = h5py.string_dtype() #h5py 2.10, python 3
+    except Exception:
+        if six.PY3:
+            dtype = h5py.special_dtype(vlen=str) #h5py < 2.10, python3
+        else:
+            dtype = h5py.special_dtype(vlen=unicode) #h5py < 2.10, python2
+
+    metadata_dtype = np.dtype([('frame', np.int64), ('scale_factor', float),
+        ('offset_value', float), ('q_scale_factor', float),
+        ('qrange_start', np.int64), ('qrange_end', np.int64),
+        ('parameters', dtype)])
+
+    metadata = np.empty(len(sasm_list), dtype=metadata_dtype)
+
+    for j, sasm_data in enumerate(sasm_list):
+        metadata[j] = (j + frame_num_offset, sasm_data['scale_factor'],
+            sasm_data['offset_value'], sasm_data['q_scale_factor'],
+            sasm_data['selected_qrange'][0], sasm_data['selected_qrange'][1],
+            formatHeader(sasm_data['parameters']))
+
+    metadata_dset = profile_group.create_dataset('frame_metadata',
+        data=metadata)
+    metadata_dset.attrs['description'] = ('The frame number, scale factor, '
+        'offset, q scale factor, q range (start and end index), and '
+        'parameters (header) of each profile, corresponding to the rows of '
+        'the intensity and uncertainty datasets.')
+
+def save_series(save_name, seriesm, save_gui_data=False, columnar=False):
+    """
+    Saves a series as a RAW hdf5 file, or into the provided hdf5 group. If
+    columnar is True, each set of profiles that share a q vector is saved as
+    a block (see save_series_sasm_block) rather than a dataset per profile,
+    which is much faster to save and load for long series, and is loaded
+    with the profiles only made into SASMs when they are used. Files saved
+    with columnar=True cannot be loaded by older versions of RAW.
+    """
 
     seriesm_dict = seriesm.extractAll()
 
@@ -4122,12 +4669,12 @@ def save_series(save_name, seriesm, save_gui_data=False):
                 gname = '_'.join(gname.split('_')[:-1]) + '_{}'.format(j)
 
         series_group = save_name.create_group(gname)
-        inner_save_series(series_group, seriesm_data, save_gui_data)
+        inner_save_series(series_group, seriesm_data, save_gui_data, columnar)
     else:
         with h5py.File(save_name, 'w', driver='core', libver='earliest') as f:
-            inner_save_series(f, seriesm_data, save_gui_data)
+            inner_save_series(f, seriesm_data, save_gui_data, columnar)
 
-def inner_save_series(f, seriesm_data, save_gui_data):
+def inner_save_series(f, seriesm_data, save_gui_data, columnar=False):
     f.attrs['file_type'] = 'RAW_Series'
     f.attrs['raw_version'] = RAWGlobals.version
     f.attrs['parameters'] = formatHeader(seriesm_data['parameters'])
@@ -4187,7 +4734,8 @@ def inner_save_series(f, seriesm_data, save_gui_data):
     profiles = f.create_group('profiles')
     profiles.attrs['profile_type'] = 'input'
     profiles.attrs['description'] = ('Input scattering profiles without processing.')
-    save_series_sasm_list(profiles, seriesm_data['sasm_list'])
+    save_series_sasm_list(profiles, seriesm_data['sasm_list'],
+        columnar=columnar)
 
     if (seriesm_data['average_buffer_sasm'] is None
         or seriesm_data['average_buffer_sasm'] == -1):
@@ -4204,14 +4752,16 @@ def inner_save_series(f, seriesm_data, save_gui_data):
     sub_profiles.attrs['profile_type'] = 'subtracted'
     sub_profiles.attrs['description'] = ('Subtracted scattering profiles.')
     sub_profiles.attrs['use_subtracted_sasm'] = seriesm_data['use_subtracted_sasm']
-    save_series_sasm_list(sub_profiles, seriesm_data['subtracted_sasm_list'])
+    save_series_sasm_list(sub_profiles, seriesm_data['subtracted_sasm_list'],
+        columnar=columnar)
 
     baseline_profiles = f.create_group('baseline_subtracted_profiles')
     baseline_profiles.attrs['profile_type'] = 'subtracted_and_baseline_corrected'
     baseline_profiles.attrs['description'] = ('Baseline corrected and subtracted '
         'scattering profiles.')
     baseline_profiles.attrs['use_baseline_subtracted_sasm'] = seriesm_data['use_baseline_subtracted_sasm']
-    save_series_sasm_list(baseline_profiles, seriesm_data['baseline_subtracted_sasm_list'])
+    save_series_sasm_list(baseline_profiles,
+        seriesm_data['baseline_subtracted_sasm_list'], columnar=columnar)
 
 
     # Add intensities
@@ -4371,7 +4921,8 @@ def inner_save_series(f, seriesm_data, save_gui_data):
     else:
         frame_num_offset = 0
 
-    save_series_sasm_list(correction, seriesm_data['baseline_corr'])
+    save_series_sasm_list(correction, seriesm_data['baseline_corr'],
+        columnar=columnar)
 
     fit_params = baseline.create_dataset("fit_parameters",
         data=seriesm_data['baseline_fit_results'])
@@ -4464,6 +5015,240 @@ def inner_save_sasm_hdf5(f, sasm_data, save_gui_data):
 
     save_series_sasm(f, sasm_data, "data")
 
+class ProfileCollectionWriter(object):
+    """
+    Appends profiles to a profile collection file, a single HDF5 file that
+    holds many profiles and their metadata, as an alternative to saving
+    each profile as a separate .dat file. Each profile is stored in the same
+    layout as a single profile .hdf5 file, in a group named by the profile
+    filename, so any profile can be read by name without reading the rest
+    of the file. Profiles are only ever added, so the file can be written
+    to as profiles are made, for example in online mode.
+
+    The file is only open while profiles are being added, so other
+    processes can read it in between, for example to load the profiles
+    collected so far during a run.
+
+    If the file already exists, new profiles are added to it. A profile
+    with the same name as one already in the file is saved with _2, _3,
+    etc. appended to the name.
+    """
+
+    def __init__(self, filename, lock_timeout=10.):
+        """
+        Parameters
+        ----------
+        filename: str
+            The collection file to create or add to.
+        lock_timeout: float, optional
+            If the file is open in another process, how long to keep trying
+            to open it, in seconds, before giving up.
+        """
+        self.filename = filename
+        self.lock_timeout = lock_timeout
+
+        with openProfileCollection(filename, 'a', lock_timeout) as f:
+            if len(f.keys()) == 0 and 'file_type' not in f.attrs:
+                f.attrs['file_type'] = 'RAW_Profile_Collection'
+                f.attrs['raw_version'] = RAWGlobals.version
+                f.create_group('profiles', track_order=True)
+
+            elif not is_profile_collection(f):
+                raise SASExceptions.UnrecognizedDataFormat(('{} exists and is '
+                    'not a profile collection file.').format(filename))
+
+    def append(self, sasm):
+        """
+        Adds profiles to the file. The file is opened once for all of the
+        profiles and closed again before returning.
+
+        Parameters
+        ----------
+        sasm: :class:`bioxtasraw.SASM.SASM` or list
+            The profile or list of profiles to add.
+
+        Returns
+        -------
+        names: list
+            The names the profiles were saved with in the file.
+        """
+        if not isinstance(sasm, list):
+            sasm = [sasm]
+
+        names = []
+
+        with openProfileCollection(self.filename, 'a', self.lock_timeout) as f:
+            profiles = f['profiles']
+
+            for each_sasm in sasm:
+                name = each_sasm.getParameter('filename')
+
+                if name in profiles:
+                    root, ext = os.path.splitext(name)
+
+                    j = 2
+                    while '{}_{}{}'.format(root, j, ext) in profiles:
+                        j += 1
+
+                    name = '{}_{}{}'.format(root, j, ext)
+
+                sasm_group = profiles.create_group(name)
+                inner_save_sasm_hdf5(sasm_group, each_sasm.extractAll(), False)
+
+                names.append(name)
+
+        return names
+
+def openProfileCollection(filename, mode='r', lock_timeout=10.):
+    """
+    Opens a profile collection file with h5py. Writers only have the file
+    open while adding profiles, so if the file is locked by another process
+    opening it is retried for up to lock_timeout seconds.
+    """
+    start = time.time()
+
+    while True:
+        try:
+            f = h5py.File(filename, mode)
+            break
+        except BlockingIOError:
+            if time.time() - start > lock_timeout:
+                raise
+
+            time.sleep(0.05)
+
+    return f
+
+def is_profile_collection(name):
+    """
+    Returns True if name, either a filename or an open h5py file, is a
+    profile collection file. Returns False if the file isn't an HDF5 file
+    or isn't marked as a collection. Errors reading the file (including
+    it being locked by another process) are raised.
+    """
+    try:
+        name.parent
+        is_hdf5 = True
+    except Exception:
+        is_hdf5 = False
+
+    if is_hdf5:
+        file_type = name.attrs.get('file_type', '')
+        has_profiles = 'profiles' in name
+
+    else:
+        if not h5py.is_hdf5(name):
+            return False
+
+        with openProfileCollection(name, 'r') as f:
+            file_type = f.attrs.get('file_type', '')
+            has_profiles = 'profiles' in f
+
+    return file_type == 'RAW_Profile_Collection' and has_profiles
+
+def save_profile_collection(save_name, sasm_list):
+    """
+    Adds the profiles to a profile collection file, creating it if it
+    doesn't exist. Returns the names the profiles were saved with.
+    """
+    writer = ProfileCollectionWriter(save_name)
+    names = writer.append(sasm_list)
+
+    return names
+
+def get_profile_collection_names(name):
+    """Returns the names of the profiles in a profile collection file."""
+    with openProfileCollection(name, 'r') as f:
+        names = list(f['profiles'].keys())
+
+    return names
+
+def load_profile_collection(name, profile_names=None):
+    """
+    Loads profiles from a profile collection file.
+
+    Parameters
+    ----------
+    name: str
+        The collection filename.
+    profile_names: list, optional
+        The names of the profiles to load. Only these profiles are read
+        from the file. If not provided, all profiles are loaded, in the
+        order they were added.
+
+    Returns
+    -------
+    sasm_list: list
+        The loaded profiles.
+    """
+    sasm_list = []
+
+    with openProfileCollection(name, 'r') as f:
+        if not is_profile_collection(f):
+            raise SASExceptions.UnrecognizedDataFormat(('{} is not a profile '
+                'collection file.').format(name))
+
+        profiles = f['profiles']
+
+        if profile_names is None:
+            profile_names = list(profiles.keys())
+
+        for profile_name in profile_names:
+            sasm_list.append(_load_collection_profile(profiles, profile_name))
+
+    return sasm_list
+
+def _load_collection_profile(profiles, profile_name):
+    if profile_name not in profiles:
+        raise KeyError('No profile named {} in {}'.format(profile_name,
+            profiles.file.filename))
+
+    sasm, line_data, item_data = inner_load_sasm_hdf5(profiles[profile_name])
+
+    sasm.setParameter('filename', profile_name)
+
+    return sasm
+
+def export_profile_collection(name, save_path, raw_settings, profile_names=None):
+    """
+    Saves profiles from a profile collection file as individual .dat files
+    in save_path, reading one profile at a time. If profile_names isn't
+    provided, all profiles are saved. Profiles whose names would give the
+    same .dat filename (such as profile.dat and profile.sub) are saved with
+    a _2, _3, etc. suffix. Returns the names of the profiles that were saved.
+    """
+    saved_roots = set()
+
+    with openProfileCollection(name, 'r') as f:
+        if not is_profile_collection(f):
+            raise SASExceptions.UnrecognizedDataFormat(('{} is not a profile '
+                'collection file.').format(name))
+
+        profiles = f['profiles']
+
+        if profile_names is None:
+            profile_names = list(profiles.keys())
+
+        for profile_name in profile_names:
+            sasm = _load_collection_profile(profiles, profile_name)
+
+            root = os.path.splitext(profile_name)[0]
+            save_root = root
+
+            j = 2
+            while save_root in saved_roots:
+                save_root = '{}_{}'.format(root, j)
+                j += 1
+
+            saved_roots.add(save_root)
+
+            if save_root != root:
+                sasm.setParameter('filename', save_root + '.dat')
+
+            saveMeasurement(sasm, save_path, raw_settings)
+
+    return profile_names
+
 def save_ift_hdf5(save_name, iftm, save_gui_data=False):
 
     iftm_dict = iftm.extractAll()
@@ -5803,17 +6588,76 @@ def writeHeader(d, f2, ignore_list = []):
 
     f2.write('\n\n')
 
+# Indented JSON of header values, keyed by their compact JSON (which is fast
+# to make), so that values shared by many profiles, such as the calibration
+# parameters of a series, are only formatted once.
+_header_part_cache = OrderedDict()
+_header_part_cache_lock = threading.Lock()
+_header_part_cache_max = 256
+_header_part_cache_max_len = 100000
+
 def formatHeader(d):
     d = translateHeader(d)
 
-    header = json.dumps(d, indent = 4, sort_keys = True, cls = SASUtils.MyEncoder)
+    if all(isinstance(key, str) for key in d):
+        # Each top level value is formatted separately, so the history can
+        # be left out of a long header without formatting everything again
+        parts = OrderedDict((key, _formatHeaderPart(key, d[key]))
+            for key in sorted(d))
 
-    if header.count('\n') > 3000:
-        try:
-            del d['history']
-            header = json.dumps(d, indent = 4, sort_keys = True, cls = SASUtils.MyEncoder)
-        except Exception:
-            pass
+        header = _joinHeaderParts(parts)
+
+        if header.count('\n') > 3000 and 'history' in parts:
+            del parts['history']
+            header = _joinHeaderParts(parts)
+
+    else:
+        header = json.dumps(d, indent = 4, sort_keys = True, cls = SASUtils.MyEncoder)
+
+        if header.count('\n') > 3000:
+            try:
+                del d['history']
+                header = json.dumps(d, indent = 4, sort_keys = True, cls = SASUtils.MyEncoder)
+            except Exception:
+                pass
+
+    return header
+
+def _formatHeaderPart(key, value):
+    """
+    Returns the key and value as they appear in the header written by
+    json.dumps with indent=4.
+    """
+    compact = json.dumps(value, sort_keys = True, cls = SASUtils.MyEncoder)
+
+    if compact[:1] in ('[', '{') and len(compact) > 2:
+        with _header_part_cache_lock:
+            formatted = _header_part_cache.get(compact)
+
+            if formatted is not None:
+                _header_part_cache.move_to_end(compact)
+
+        if formatted is None:
+            formatted = json.dumps(value, indent = 4, sort_keys = True,
+                cls = SASUtils.MyEncoder).replace('\n', '\n    ')
+
+            if len(compact) <= _header_part_cache_max_len:
+                with _header_part_cache_lock:
+                    _header_part_cache[compact] = formatted
+
+                    while len(_header_part_cache) > _header_part_cache_max:
+                        _header_part_cache.popitem(last=False)
+    else:
+        # Indentation doesn't change scalars or empty containers
+        formatted = compact
+
+    return '    ' + json.dumps(key) + ': ' + formatted
+
+def _joinHeaderParts(parts):
+    if len(parts) > 0:
+        header = '{\n' + ',\n'.join(parts.values()) + '\n}'
+    else:
+        header = '{}'
 
     return header
 
@@ -5823,7 +6667,8 @@ def translateHeader(header, to_sasbdb=True):
     to add compatibility with SASBDB while maintaining compatibility with older
     RAW formats and RAW internals.
     """
-    new_header = copy.deepcopy(header)
+    # Nested dictionaries are replaced below, so a shallow copy is enough
+    new_header = copy.copy(header)
 
     for key in header.keys():
         if isinstance(header[key], dict):
@@ -5872,18 +6717,33 @@ def writeRadFile(m, filename, header_on_top = True, use_header = True):
         else:
             f.write('#{:^13}  {:^14}  {:^14}  {:^14}\n'.format('Q', 'I(Q)', 'Error', 'dQ'))
 
-        for idx in range(q_min, q_max):
-            if m.q_err is None:
-                line = ('%.8E  %.8E  %.8E\n') % ( m.q[idx], m.i[idx], m.err[idx])
-            else:
-                line = ('%.8E  %.8E  %.8E  %.8E\n') % ( m.q[idx], m.i[idx], m.err[idx], m.q_err[idx])
-            f.write(line)
+        if m.q_err is None:
+            columns = [m.q, m.i, m.err]
+        else:
+            columns = [m.q, m.i, m.err, m.q_err]
+
+        f.write(formatDataBlock([col[q_min:q_max] for col in columns]))
 
         f.write('\n')
         if header_on_top == False:
             f.write('\n')
             writeHeader(d, f)
 
+def formatDataBlock(columns, fmt='%.8E', sep='  '):
+    """
+    Formats columns of numbers as lines of text in one call, rather than
+    line by line. Each value is formatted with fmt, values are separated by
+    sep, and every line (including the last) ends with a newline.
+    """
+    if len(columns) == 0 or len(columns[0]) == 0:
+        return ''
+
+    data = np.column_stack(columns)
+
+    line_fmt = sep.join([fmt]*data.shape[1]) + '\n'
+
+    return (line_fmt*data.shape[0]) % tuple(data.ravel().tolist())
+
 def writeIftFile(m, filename, use_header = True):
     ''' Writes an ASCII file from an IFT measurement object created by BIFT'''
 
@@ -5896,9 +6756,7 @@ def writeIftFile(m, filename, use_header = True):
         f.write('# BIFT\n')
         f.write('#{:^13}  {:^14}  {:^14}\n'.format('R', 'P(R)', 'Error'))
 
-        for idx in range(0,len(m.p)):
-            line = ('%.8E  %.8E  %.8E\n') %( m.r[idx], m.p[idx], m.err[idx])
-            f.write(line)
+        f.write(formatDataBlock([m.r, m.p, m.err]))
 
         f.write('\n\n')
 
@@ -5908,15 +6766,11 @@ def writeIftFile(m, filename, use_header = True):
         fit = m.i_fit
 
         f.write('#{:^13}  {:^14}  {:^14}  {:^14}\n'.format('Q', 'I(Q)', 'Error', 'Fit'))
-        for idx in range(0,len(orig_q)):
-            line = ('%.8E  %.8E  %.8E  %.8E\n') %( orig_q[idx], orig_i[idx], orig_err[idx], fit[idx])
-            f.write(line)
+        f.write(formatDataBlock([orig_q, orig_i, orig_err, fit]))
 
         f.write('\n\n')
         f.write('#{:^13}  {:^14}\n'.format('Q_extrap', 'Fit_extrap'))
-        for idx in range(len(m.q_extrap)):
-            line = '{:.8E}  {:.8E}\n'.format(m.q_extrap[idx],m.i_extrap[idx])
-            f.write(line)
+        f.write(formatDataBlock([m.q_extrap, m.i_extrap]))
 
         ignore_list = ['all_posteriors', 'alpha_points', 'fit', 'orig_i', 'orig_q',
                        'orig_err', 'dmax_points', 'orig_sasm', 'fit_sasm']
@@ -0,0 +1,568 @@
+"""
+#******************************************************************************
+# This file is part of RAW.
+#
+#    RAW is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RAW is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with RAW.  If not, see <http://www.gnu.org/licenses/>.
+#
+#******************************************************************************
+
+This file contains the directory watcher used for online mode. It doesn't
+depend on the GUI, so it is used both by the online mode controller in the
+GUI and by the API.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+from builtins import object, range, map, zip
+from io import open
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import platform
+import struct
+import time
+
+# inotify event flags, from sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_event_header = struct.Struct('iIII')
+
+def checkFilters(filename, filt_list):
+    """
+    Checks a file name against the online mode filters. Each filter is a
+    list of [mode, text, position] where mode is 'Ignore' or 'Open only with',
+    and position is 'At start', 'Anywhere', or 'At end'. Returns True if the
+    file should be loaded.
+    """
+    load = True
+
+    for item in filt_list:
+        if item[0]=='Ignore':
+            if item[2]=='At start':
+                if filename.startswith(item[1]):
+                    load=False
+            elif item[2]=='Anywhere':
+                if filename.find(item[1])!=-1:
+                    load=False
+            else:
+                if filename.endswith(item[1]):
+                    load=False
+        else:
+            if item[2]=='At start':
+                if not filename.startswith(item[1]):
+                    load=False
+            elif item[2]=='Anywhere':
+                if not filename.find(item[1])!=-1:
+                    load=False
+            else:
+                if not filename.endswith(item[1]):
+                    load=False
+
+    return load
+
+class Inotify(object):
+    """
+    A minimal ctypes wrapper around the Linux inotify interface that watches
+    a single directory. Raises OSError if inotify isn't available.
+    """
+
+    def __init__(self, directory):
+        if platform.system() != 'Linux':
+            raise OSError('inotify is only available on Linux.')
+
+        libc_name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        mask = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+            | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+        wd = libc.inotify_add_watch(self._fd,
+            os.fsencode(os.path.abspath(directory)), ctypes.c_uint32(mask))
+
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            self._fd = None
+            raise OSError(err, os.strerror(err))
+
+    def read(self):
+        """
+        Returns a list of (mask, name) tuples for all events that have
+        happened since the last read. Doesn't block.
+        """
+        events = []
+
+        while self._fd is not None:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                else:
+                    raise
+
+            if not data:
+                break
+
+            pos = 0
+
+            while pos + _event_header.size <= len(data):
+                wd, mask, cookie, length = _event_header.unpack_from(data, pos)
+                pos += _event_header.size
+
+                name = data[pos:pos+length].rstrip(b'\0')
+                pos += length
+
+                events.append((mask, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class FileWatcher(object):
+    """
+    Watches a directory for new files, for online mode. On Linux inotify is
+    used to find new files without scanning the directory. Elsewhere, or if
+    inotify can't be used, the directory is rescanned with os.scandir, but
+    only when its modification time changes. Rescans only list the file
+    names, only new files are checked. Inotify doesn't see files written by
+    other machines on network filesystems, so when it is used the directory
+    is also rescanned every rescan_interval seconds.
+
+    A file is only reported once it has finished writing. That is either when
+    it is closed after writing or moved into the directory (inotify only),
+    or when its size and modification time haven't changed between two
+    checks at least settle_time seconds apart.
+
+    Files that have already been reported (or existed when the watcher was
+    started) and are then rewritten are reported as modified. With inotify
+    these are found from the write events. Otherwise they can only be found
+    by checking every file, so that is done every modified_interval seconds
+    if check_modified is True.
+
+    Files that exist when the watcher is started are never reported as new.
+    Use check periodically to get the new files.
+    """
+
+    # With inotify, files that are created or written but never get a close
+    # or move event (e.g. hard links) are reported once they haven't changed
+    # for this many seconds.
+    inotify_settle_time = 10.
+
+    def __init__(self, directory, filt_list=None, enable_filt=False,
+        compatible_formats=None, use_inotify=True, settle_time=0.,
+        check_modified=False, rescan_interval=2., modified_interval=30.):
+        """
+        Parameters
+        ----------
+        directory: str
+            The directory to watch.
+        filt_list: list, optional
+            The online mode filters, as in the 'OnlineFilterList' setting.
+        enable_filt: bool, optional
+            Whether the filters are applied.
+        compatible_formats: list, optional
+            If provided, only files with these extensions (e.g. '.tiff') are
+            reported.
+        use_inotify: bool, optional
+            Whether to use inotify if it is available. If False, the directory
+            is always rescanned.
+        settle_time: float, optional
+            The minimum time, in seconds, that a file's size and modification
+            time must be unchanged before it is considered finished when
+            rescanning the directory.
+        check_modified: bool, optional
+            If True, the size and modification time of every file is kept so
+            that rewritten files are only reported if they changed, and so
+            that files rewritten with a different size can be told apart
+            (see check). If inotify isn't used, every file is also checked
+            for changes every modified_interval seconds. With inotify, files
+            rewritten on this machine are always reported as modified.
+        rescan_interval: float, optional
+            When inotify is used, how often, in seconds, the directory is
+            also rescanned to find files that inotify doesn't report. If
+            None, only inotify is used.
+        modified_interval: float, optional
+            When inotify isn't used and check_modified is True, how often, in
+            seconds, every file is checked for changes.
+        """
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.use_inotify = use_inotify
+        self.settle_time = settle_time
+        self.check_modified = check_modified
+        self.rescan_interval = rescan_interval
+        self.modified_interval = modified_interval
+
+        self.setFilters(filt_list, enable_filt)
+        self.compatible_formats = compatible_formats
+
+        self._inotify = None
+        self._known = {}
+        self._pending = {}
+        self._dir_mtime = None
+        self._last_scan = 0
+        self._last_rescan = 0
+        self._last_modified_check = 0
+        self._check_num = 0
+        self._running = False
+
+    def setFilters(self, filt_list, enable_filt):
+        if filt_list is None:
+            filt_list = []
+
+        self.filt_list = filt_list
+        self.enable_filt = enable_filt
+
+    def start(self):
+        """
+        Starts watching the directory. Files already in it are skipped.
+        """
+        self.stop()
+
+        self._known = {}
+        self._pending = {}
+
+        if self.use_inotify:
+            try:
+                self._inotify = Inotify(self.directory)
+            except Exception:
+                self._inotify = None
+
+        # Scan after setting up the watch so that nothing is missed in between
+        self._dir_mtime = os.stat(self.directory).st_mtime
+
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if self.check_modified:
+                    self._known[entry.name] = self._getStat(entry)
+                else:
+                    self._known[entry.name] = None
+
+        self._last_scan = time.time()
+        self._last_rescan = self._last_scan
+        self._last_modified_check = self._last_scan
+        self._running = True
+
+    def stop(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+        self._running = False
+
+    def isRunning(self):
+        return self._running
+
+    def usingInotify(self):
+        return self._inotify is not None
+
+    def skip(self, file_list):
+        """
+        Marks files (names in the watched directory) as already seen, so they
+        aren't reported. Used for files that RAW itself saves in the watched
+        directory.
+        """
+        for name in file_list:
+            name = os.path.split(name)[1]
+            self._pending.pop(name, None)
+            self._known[name] = self._getStat(os.path.join(self.directory,
+                name))
+
+    def check(self, resized_as_new=False, return_ignored=False):
+        """
+        Checks for files that are new or have been modified since the last
+        check.
+
+        Parameters
+        ----------
+        resized_as_new: bool, optional
+            If True, modified files whose size changed are returned with the
+            new files instead of the modified files. This needs
+            check_modified to be True to know the previous size.
+        return_ignored: bool, optional
+            If True, the files that were rejected by the filters are also
+            returned.
+
+        Returns
+        -------
+        new_files: list
+            The full paths of new files that have finished writing and pass
+            the filters, sorted by name.
+        modified_files: list
+            The full paths of files that had already been reported and have
+            since been rewritten, sorted by name.
+        ignored_files: list
+            Only returned if return_ignored is True. The full paths of new
+            or modified files that didn't pass the filters, sorted by name.
+        """
+        if not self._running:
+            if return_ignored:
+                return [], [], []
+            else:
+                return [], []
+
+        self._check_num += 1
+
+        finished = set()
+        modified = set()
+        resized = set()
+
+        now = time.time()
+
+        if self._inotify is not None:
+            rescan = self._readEvents(finished, modified, resized)
+
+            if (self.rescan_interval is not None
+                and now - self._last_rescan >= self.rescan_interval):
+                rescan = True
+
+            if rescan:
+                self._last_rescan = now
+        else:
+            rescan = True
+
+        if rescan:
+            self._scan()
+
+        if (self._inotify is None and self.check_modified
+            and now - self._last_modified_check >= self.modified_interval):
+            self._last_modified_check = now
+            self._checkKnown()
+
+        self._checkPending(finished, modified, resized)
+
+        if resized_as_new:
+            finished.update(resized)
+        else:
+            modified.update(resized)
+
+        new_files = []
+        modified_files = []
+        ignored_files = []
+
+        for name in sorted(finished):
+            accept = self._accept(name)
+
+            if accept:
+                new_files.append(os.path.join(self.directory, name))
+            elif accept is None:
+                ignored_files.append(os.path.join(self.directory, name))
+
+        for name in sorted(modified - finished):
+            accept = self._accept(name)
+
+            if accept:
+                modified_files.append(os.path.join(self.directory, name))
+            elif accept is None:
+                ignored_files.append(os.path.join(self.directory, name))
+
+        if return_ignored:
+            return new_files, modified_files, sorted(ignored_files)
+        else:
+            return new_files, modified_files
+
+    def _readEvents(self, finished, modified, resized):
+        rescan = False
+
+        now = time.time()
+
+        for mask, name in self._inotify.read():
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so fall back to a scan
+                rescan = True
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # The directory went away, stop watching it
+                self._inotify.close()
+                self._inotify = None
+                continue
+
+            if not name or mask & IN_ISDIR:
+                continue
+
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._known.pop(name, None)
+                self._pending.pop(name, None)
+
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._pending.pop(name, None)
+
+                stat = self._getStat(os.path.join(self.directory, name))
+
+                if name in self._known:
+                    self._setChanged(name, stat, modified, resized)
+                else:
+                    self._setFinished(name, stat, finished)
+
+            elif mask & (IN_CREATE | IN_MODIFY):
+                # New files, or known files being rewritten, are reported
+                # when they're closed, or once they stop changing if they
+                # never get a close event
+                if name not in self._pending:
+                    self._addPending(name, os.path.join(self.directory, name),
+                        now, True)
+
+        return rescan
+
+    def _scan(self):
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            self.stop()
+            raise
+
+        now = time.time()
+
+        # Directory modification times can be coarse, so always rescan if
+        # the last change was recent.
+        if (dir_mtime == self._dir_mtime and now - dir_mtime > 2
+            and self._last_scan > dir_mtime):
+            return
+
+        self._dir_mtime = dir_mtime
+        self._last_scan = now
+
+        current = set()
+
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name = entry.name
+                current.add(name)
+
+                if name not in self._known and name not in self._pending:
+                    self._addPending(name, entry, now)
+
+        for name in list(self._known.keys()):
+            if name not in current:
+                del self._known[name]
+
+        for name in list(self._pending.keys()):
+            if name not in current:
+                del self._pending[name]
+
+    def _checkKnown(self):
+        now = time.time()
+
+        for name, old_stat in self._known.items():
+            if name not in self._pending:
+                stat = self._getStat(os.path.join(self.directory, name))
+
+                if stat is not None and stat != old_stat:
+                    self._pending[name] = (stat, now, self._check_num, False)
+
+    def _addPending(self, name, path, now, from_event=False):
+        self._pending[name] = (self._getStat(path), now, self._check_num,
+            from_event)
+
+    def _checkPending(self, finished, modified, resized):
+        now = time.time()
+
+        for name in list(self._pending.keys()):
+            old_stat, seen_time, seen_check, from_event = self._pending[name]
+
+            # Files seen by inotify normally get a close event, files only
+            # seen by a rescan don't
+            if from_event and self._inotify is not None:
+                settle_time = max(self.settle_time, self.inotify_settle_time)
+            else:
+                settle_time = self.settle_time
+
+            stat = self._getStat(os.path.join(self.directory, name))
+
+            if stat is None:
+                del self._pending[name]
+
+            elif stat != old_stat:
+                self._pending[name] = (stat, now, self._check_num, from_event)
+
+            elif seen_check < self._check_num and now - seen_time >= settle_time:
+                # Unchanged since an earlier check, so it's done being written
+                del self._pending[name]
+
+                if name in self._known:
+                    self._setChanged(name, stat, modified, resized)
+                else:
+                    self._setFinished(name, stat, finished)
+
+    def _setFinished(self, name, stat, finished):
+        self._known[name] = stat if self.check_modified else None
+        finished.add(name)
+
+    def _setChanged(self, name, stat, modified, resized):
+        old_stat = self._known[name]
+
+        # Files passed to skip keep their stat, so RAW's own writes aren't
+        # reported as modifications
+        if old_stat is None or old_stat != stat:
+            if old_stat is not None and stat is not None and old_stat[1] != stat[1]:
+                resized.add(name)
+            else:
+                modified.add(name)
+
+        self._known[name] = stat if self.check_modified else None
+
+    def _getStat(self, path):
+        try:
+            if isinstance(path, os.DirEntry):
+                stat = path.stat()
+            else:
+                stat = os.stat(path)
+            stat = (stat.st_mtime, stat.st_size)
+        except OSError:
+            stat = None
+
+        return stat
+
+    def _accept(self, name):
+        """
+        Returns True if the file should be reported, None if it is rejected
+        by the filters, and False otherwise.
+        """
+        if os.path.isdir(os.path.join(self.directory, name)):
+            return False
+
+        if self.compatible_formats is not None:
+            ext = os.path.splitext(name)[1]
+
+            if ext not in self.compatible_formats:
+                return False
+
+        if self.enable_filt and not checkFilters(name, self.filt_list):
+            return None
+
+        return True
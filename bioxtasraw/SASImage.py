@@ -29,6 +29,11 @@ from io import open
 import sys
 import math
 import os
+import copy
+import collections
+import hashlib
+import threading
+import weakref
 
 import numpy as np
 import pyFAI
@@ -111,433 +116,620 @@ def getBindListDataFromHeader(raw_settings, img_hdr, file_hdr, keys):
 def integrateCalibrateNormalize(img, parameters, raw_settings):
     use_hdr_config = raw_settings.get('UseHeaderForConfig')
 
-    img_hdr = parameters['imageHeader']
-    file_hdr = parameters['counters']
-
     # Loads a different configuration file based on definition in the image header
     if use_hdr_config:
-        prefix = getBindListDataFromHeader(raw_settings, img_hdr, file_hdr, keys = ['Config Prefix'])[0]
+        loadHeaderConfig(parameters, raw_settings)
 
-        if prefix is None:
-           raise SASExceptions.ImageLoadError(['"Use header for new config load" is enabled in General Settings.\n',
-                                               'The binding "Config Prefix" was however not found in header,',
-                                               'not set in header options (See "Image/Header Format" in options) or not a number.'])
-        else:
-            prefix = str(int(prefix))
+    setup = IntegrationSetup(raw_settings)
 
-        settings_folder = raw_settings.get('HdrLoadConfigDir')
+    return setup.integrate(img, parameters)
 
-        # If the folder is not set.. look in the folder where the image is
-        if settings_folder == 'None' or settings_folder == '':
-            settings_folder, fname = os.path.split(parameters['load_path'])
+def loadHeaderConfig(parameters, raw_settings):
+    img_hdr = parameters['imageHeader']
+    file_hdr = parameters['counters']
 
-        settings_path = os.path.join(settings_folder, str(prefix) + '.cfg')
+    prefix = getBindListDataFromHeader(raw_settings, img_hdr, file_hdr, keys = ['Config Prefix'])[0]
 
-        if not os.path.exists(settings_path):
-            raise SASExceptions.ImageLoadError(['"Use header for new config load" is enabled in General Settings.\n',
-                                                'Config file ' + settings_path + ' does not exist.',
-                                                'Check the path in the "General Settings" options. Clear the field to make RAW look for the config file in the same folder as the image.'])
+    if prefix is None:
+       raise SASExceptions.ImageLoadError(['"Use header for new config load" is enabled in General Settings.\n',
+                                           'The binding "Config Prefix" was however not found in header,',
+                                           'not set in header options (See "Image/Header Format" in options) or not a number.'])
+    else:
+        prefix = str(int(prefix))
+
+    settings_folder = raw_settings.get('HdrLoadConfigDir')
+
+    # If the folder is not set.. look in the folder where the image is
+    if settings_folder == 'None' or settings_folder == '':
+        settings_folder, fname = os.path.split(parameters['load_path'])
+
+    settings_path = os.path.join(settings_folder, str(prefix) + '.cfg')
+
+    if not os.path.exists(settings_path):
+        raise SASExceptions.ImageLoadError(['"Use header for new config load" is enabled in General Settings.\n',
+                                            'Config file ' + settings_path + ' does not exist.',
+                                            'Check the path in the "General Settings" options. Clear the field to make RAW look for the config file in the same folder as the image.'])
+
+    RAWSettings.loadSettings(raw_settings, settings_path, auto_load = True)
+
+    mask_dict = raw_settings.get('Masks')
+    img_dim = raw_settings.get('MaskDimension')
+
+    #Create the masks
+    for each_key in mask_dict:
+        masks = mask_dict[each_key][1]
+
+        if masks is not None:
+            mask_img = SASMask.createMaskMatrix(img_dim, masks)
+            mask_param = mask_dict[each_key]
+            mask_param[0] = mask_img
+            mask_param[1] = masks
+            mask_param[2] = np.logical_not(mask_img)
+
+class IntegrationSetup(object):
+    """
+    Holds everything needed to radially average an image that doesn't depend
+    on the image data: the integration settings, the masks, and the detector
+    geometry. The detector geometry and integrator are kept in the module
+    geometry cache, so they are reused between images with the same
+    calibration and mask.
+    """
+
+    def __init__(self, raw_settings):
+        self.raw_settings = raw_settings
+
+        self.mask_dict = raw_settings.get('Masks')
+
+        # Get settings
+        self.use_hdr_mask = raw_settings.get('UseHeaderForMask')
+        self.use_hdr_calib = raw_settings.get('UseHeaderForCalib')
+
+        self.do_normalization = raw_settings.get('EnableNormalization')
+        self.normlist = raw_settings.get('NormalizationList')
+
+        self.do_flatfield = raw_settings.get('NormFlatfieldEnabled')
+        self.flatfield_image = raw_settings.get('NormFlatfieldImage')
+        self.do_darkcorrection = raw_settings.get('DarkCorrEnabled')
+        self.dark_image = raw_settings.get('DarkCorrImage')
+
+        self.do_solidangle = raw_settings.get('DoSolidAngleCorrection')
+        self.do_polarization = raw_settings.get('DoPolarizationCorrection')
+        self.polarization_factor = raw_settings.get('PolarizationFactor')
+
+        self.zinger_removal = raw_settings.get('ZingerRemovalRadAvg')
+        self.zinger_thres = raw_settings.get('ZingerRemovalRadAvgStd')
+        self.zinger_iter = raw_settings.get('ZingerRemovalRadAvgIter')
+
+        self.integration_method = raw_settings.get('IntegrationMethod')
+        self.angular_unit = raw_settings.get('AngularUnit')
+        self.error_model = raw_settings.get('ErrorModel')
+        self.use_image_for_variance = raw_settings.get('UseImageForVariance')
+
+        if not self.do_polarization:
+            self.polarization_factor = None
+
+        if not self.do_flatfield:
+            self.flatfield_image = None
+
+        if not self.do_darkcorrection:
+            self.dark_image = None
+
+        #Absolute scale values
+        self.abs_scale_water = raw_settings.get('NormAbsWater')
+        self.abs_scale_water_factor = float(raw_settings.get('NormAbsWaterConst'))
+        self.abs_scale_gc = raw_settings.get('NormAbsCarbon')
+        self.abs_scale_gc_ignore_bkg = raw_settings.get('NormAbsCarbonIgnoreBkg')
+        self.abs_scale_gc_factor = float(raw_settings.get('NormAbsCarbonConst'))
+
+        self.sd_distance = raw_settings.get('SampleDistance')
+        self.pixel_size_x = raw_settings.get('DetectorPixelSizeX')
+        self.pixel_size_y = raw_settings.get('DetectorPixelSizeY')
+        self.wavelength = raw_settings.get('WaveLength')
+        self.bin_size = int(raw_settings.get('Binsize'))
+        self.bin_type = raw_settings.get('BinType')
+        self.x_c = float(raw_settings.get('Xcenter'))
+        self.y_c = float(raw_settings.get('Ycenter'))
+        self.det_tilt = raw_settings.get('DetectorTilt')
+        self.det_tilt_plan_rot = raw_settings.get('DetectorTiltPlanRot')
+
+        self.metadata = None
+        if raw_settings.get('EnableMetadata'):
+            meta_list = raw_settings.get('MetadataList')
+            if meta_list is not None and len(meta_list) > 0:
+                self.metadata = {key:value for (key, value) in meta_list}
+
+    def getMasks(self, img, img_hdr):
+        """
+        Returns the beamstop mask (inverted for pyFAI), the transparent
+        beamstop mask, and a key identifying the beamstop mask for the
+        geometry cache.
+        """
+        if self.use_hdr_mask:
+            # ********************
+            # If the file is a SAXSLAB file, then get mask parameters from the header and modify the mask
+            # then apply it...
+            #
+            # Mask should be not be changed, but should be created here. If no mask information is found, then
+            # use the user created mask. There should be a force user mask setting.
+            #
+            # ********************
+            try:
+                mask_patches = SASMask.createMaskFromHdr(img, img_hdr,
+                    flipped = self.raw_settings.get('DetectorFlipped90'))
+                bs_mask_patches = self.mask_dict['BeamStopMask'][1]
+                tbs_mask = self.mask_dict['TransparentBSMask'][0]
+
+                if bs_mask_patches is not None:
+                    all_mask_patches = mask_patches + bs_mask_patches
+                else:
+                    all_mask_patches = mask_patches
 
-        RAWSettings.loadSettings(raw_settings, settings_path, auto_load = True)
+                bs_mask = SASMask.createMaskMatrix(img.shape, all_mask_patches)
 
-        mask_dict = raw_settings.get('Masks')
-        img_dim = raw_settings.get('MaskDimension')
+                if bs_mask is not None:
+                    bs_mask = np.logical_not(bs_mask) #Invert mask for pyFAI
 
-        #Create the masks
-        for each_key in mask_dict:
-            masks = mask_dict[each_key][1]
+            except KeyError:
+                raise SASExceptions.HeaderMaskLoadError('bsmask_configuration not found in header.')
 
-            if masks is not None:
-                mask_img = SASMask.createMaskMatrix(img_dim, masks)
-                mask_param = mask_dict[each_key]
-                mask_param[0] = mask_img
-                mask_param[1] = masks
-                mask_param[2] = np.logical_not(mask_img)
+        else:
+            bs_mask = self.mask_dict['BeamStopMask'][2]
+            tbs_mask = self.mask_dict['TransparentBSMask'][0]
+
+        return bs_mask, tbs_mask, getMaskKey(bs_mask)
+
+    def getCalibration(self, img_shape, img_hdr, file_hdr):
+        """
+        Returns the calibration values (distance, pixel sizes, wavelength,
+        beam center, and tilts) to use for an image. These come from the
+        settings unless header values are used for the calibration.
+        """
+        sd_distance = self.sd_distance
+        pixel_size_x = self.pixel_size_x
+        pixel_size_y = self.pixel_size_y
+        wavelength = self.wavelength
+        x_c = self.x_c
+        y_c = self.y_c
+        det_tilt = self.det_tilt
+        det_tilt_plan_rot = self.det_tilt_plan_rot
+
+        # Get values from image header if applicable
+        if self.use_hdr_calib:
+            result = getBindListDataFromHeader(self.raw_settings, img_hdr, file_hdr,
+                keys=['Sample Detector Distance', 'Detector X Pixel Size',
+                'Detector Y Pixel Size', 'Wavelength', 'Beam X Center',
+                'Beam Y Center', 'Detector Tilt', 'Detector Tilt Plane Rotation',
+                'Detector Pixel Size'])
+
+            if result[0] is not None:
+                sd_distance = result[0]
+            if result[1] is not None:
+                pixel_size_x = result[1]
+            if result[2] is not None:
+                pixel_size_y = result[2]
+            if result[3] is not None:
+                wavelength = result[3]
+            if result[4] is not None:
+                x_c = result[4]
+            if result[5] is not None:
+                y_c = result[5]
+            if result[6] is not None:
+                det_tilt = result[6]
+            if result[7] is not None:
+                det_tilt_plan_rot = result[7]
+            if result[8] is not None:
+                pixel_size_x = result[8]
+                pixel_size_y = result[8]
+                # Backwards compatability with old bindings for pixel size
+
+            # For historical reasons, the header bind list used to return pixel size
+            # in mm. So if the pixel is unrealistically small, put it into microns.
+            # I'm sure this is going to come back to bite me at some point.
+            if pixel_size_x < 1:
+                pixel_size_x = pixel_size_x*1000
+
+            if pixel_size_y < 1:
+                pixel_size_y = pixel_size_y*1000
+
+        # ********* WARNING WARNING WARNING ****************#
+        # Hmm.. axes start from the lower left, but array coords starts
+        # from upper left:
+        #####################################################
+        y_c = img_shape[0]-y_c
+
+        return (sd_distance, pixel_size_x, pixel_size_y, wavelength, x_c, y_c,
+            det_tilt, det_tilt_plan_rot)
+
+    def getGeometry(self, img_shape, calibration, bs_mask, mask_key):
+        """
+        Returns the geometry cache entry for the given image shape,
+        calibration, and beamstop mask, creating it if it isn't already
+        cached. See GeometryCache for the contents of an entry.
+        """
+        key = (tuple(img_shape), calibration, mask_key, self.bin_type,
+            self.bin_size, self.angular_unit, self.do_solidangle,
+            self.polarization_factor)
+
+        entry = geometry_cache.get(key)
+
+        if entry is None:
+            entry = self._makeGeometry(img_shape, calibration, bs_mask)
+            geometry_cache.add(key, entry)
+
+        # Keep the settings pointed at the integrator in use, as before
+        if self.raw_settings.get('AzimuthalIntegrator') is not entry['ai']:
+            self.raw_settings.set('AzimuthalIntegrator', entry['ai'])
+
+        return entry
+
+    def _makeGeometry(self, img_shape, calibration, bs_mask):
+        (sd_distance, pixel_size_x, pixel_size_y, wavelength, x_c, y_c,
+            det_tilt, det_tilt_plan_rot) = calibration
+
+        # Find the maximum distance to the edge in the image:
+        ylen, xlen = img_shape
+
+        xlen = int(xlen)
+        ylen = int(ylen)
+        maxlen1 = int(max(xlen - x_c, ylen - y_c, xlen - (xlen - x_c), ylen - (ylen - y_c)))
+
+        diag1 = int(np.sqrt((xlen-x_c)**2 + y_c**2))
+        diag2 = int(np.sqrt((x_c**2 + y_c**2)))
+        diag3 = int(np.sqrt((x_c**2 + (ylen-y_c)**2)))
+        diag4 = int(np.sqrt((xlen-x_c)**2 + (ylen-y_c)**2))
+
+        maxlen = int(max(diag1, diag2, diag3, diag4, maxlen1))
+
+        if abs(det_tilt) > 5:
+            # Make sure we have enough q points for highly tilted detectors, otherwise some data may be lost
+            # This is a real hack. Better would be to calculate the actual extent
+            # based on the known calibration parameters, but that's hard
+            maxlen*=4
+
+        if self.bin_type == 'Linear' and self.bin_size != 1:
+            npts = maxlen//self.bin_size
+        else:
+            npts = maxlen
 
-    else:
-        mask_dict = raw_settings.get('Masks')
+        #Put everything in appropriate units
+        wavelength = wavelength*1e-10 #convert wl to m
 
-    # Get settings
-    use_hdr_mask = raw_settings.get('UseHeaderForMask')
-    use_hdr_calib = raw_settings.get('UseHeaderForCalib')
+        ai = makeAzimuthalIntegrator(wavelength, sd_distance, x_c, y_c,
+            det_tilt, det_tilt_plan_rot, pixel_size_x, pixel_size_y)
 
-    do_normalization = raw_settings.get('EnableNormalization')
-    normlist = raw_settings.get('NormalizationList')
+        if pixel_size_x == pixel_size_y and self.angular_unit == 'q_A^-1':
+            qmin_theta = SASCalib.calcTheta(sd_distance*1e-3, pixel_size_x*1e-6, 0)
+            qmin = ((4 * math.pi * math.sin(qmin_theta)) / (wavelength*1e10))
 
-    do_flatfield = raw_settings.get('NormFlatfieldEnabled')
-    flatfield_image = raw_settings.get('NormFlatfieldImage')
-    do_darkcorrection = raw_settings.get('DarkCorrEnabled')
-    dark_image = raw_settings.get('DarkCorrImage')
+            qmax_theta = SASCalib.calcTheta(sd_distance*1e-3, pixel_size_x*1e-6, maxlen)
+            qmax = ((4 * math.pi * math.sin(qmax_theta)) / (wavelength*1e10))
 
-    do_solidangle = raw_settings.get('DoSolidAngleCorrection')
-    do_polarization = raw_settings.get('DoPolarizationCorrection')
-    polarization_factor = raw_settings.get('PolarizationFactor')
+            q_range = (qmin, qmax)
 
-    zinger_removal = raw_settings.get('ZingerRemovalRadAvg')
-    zinger_thres = raw_settings.get('ZingerRemovalRadAvgStd')
-    zinger_iter = raw_settings.get('ZingerRemovalRadAvgIter')
+        else:
+            q_range = None
+
+        if bs_mask is None:
+            bs_mask = np.zeros(img_shape)
+
+        entry = {
+            'ai'            : ai,
+            'mask'          : bs_mask,
+            'npts'          : npts,
+            'q_range'       : q_range,
+            }
+
+        return entry
+
+    def getNormFactor(self, parameters, img_hdr, file_hdr):
+        """
+        Returns the multiplicative normalization factor (in the divisible
+        form pyFAI expects), and whether all the normalizations were
+        multiplicative. Adds the normalization metadata to the parameters.
+        """
+        all_norms_mult = True
+        norm_factor = 1.0
+        #Calculate the normalization parameter if applicable
+        if self.normlist is not None and self.do_normalization:
+            parameters['normalizations']['Counter_norms'] = self.normlist
+
+            for op, expr in self.normlist:
+                if op != '/' and op != '*':
+                    all_norms_mult = False
+                    break
 
-    integration_method = raw_settings.get('IntegrationMethod')
-    angular_unit = raw_settings.get('AngularUnit')
-    error_model = raw_settings.get('ErrorModel')
-    use_image_for_variance = raw_settings.get('UseImageForVariance')
-    ai = raw_settings.get('AzimuthalIntegrator')
+                else:
+                    val = calcExpression(expr, img_hdr, file_hdr)
 
-    if not do_polarization:
-        polarization_factor = None
+                    if val is not None:
+                        val = float(val)
+                    else:
+                        raise ValueError
+                    if op == '/':
+                        if val == 0:
+                            raise ValueError('Divide by Zero when normalizing')
+                        else:
+                            norm_factor = norm_factor/val
+
+                    elif op == '*':
+                        if val == 0:
+                           raise ValueError('Multiply by Zero when normalizing')
+                        else:
+                            norm_factor = norm_factor*val
+
+            if not all_norms_mult:
+                norm_factor = 1.0
+
+        if self.abs_scale_water:
+            parameters['normalizations']['Absolute_scale'] = {}
+            parameters['normalizations']['Absolute_scale']['Method'] = 'Water'
+            parameters['normalizations']['Absolute_scale']['Absolute_scale_factor'] = self.abs_scale_water_factor
+
+            norm_factor = norm_factor * self.abs_scale_water_factor
+
+        elif self.abs_scale_gc and self.abs_scale_gc_ignore_bkg:
+            parameters['normalizations']['Absolute_scale'] = {}
+            parameters['normalizations']['Absolute_scale']['Method'] = 'Glassy_carbon'
+            parameters['normalizations']['Absolute_scale']['Ignore_background'] = True
+            parameters['normalizations']['Absolute_scale']['Absolute_scale_factor'] = self.abs_scale_gc_factor
+
+            norm_factor = norm_factor * self.abs_scale_gc_factor
+
+        # pyFAI expects a divisible normalization factor
+        norm_factor = 1./norm_factor
+
+        return norm_factor, all_norms_mult
+
+    def integrate(self, img, parameters):
+        """
+        Radially averages, calibrates, and normalizes a single image,
+        returning a SASM.
+        """
+        img_hdr = parameters['imageHeader']
+        file_hdr = parameters['counters']
+
+        if self.use_image_for_variance:
+            variance = img
+            error_model = None
+        else:
+            variance = None
+            error_model = self.error_model
+
+        bs_mask, tbs_mask, mask_key = self.getMasks(img, img_hdr)
+
+        calibration = self.getCalibration(img.shape, img_hdr, file_hdr)
+
+        (sd_distance, pixel_size_x, pixel_size_y, wavelength, x_c, y_c,
+            det_tilt, det_tilt_plan_rot) = calibration
+
+        geometry = self.getGeometry(img.shape, calibration, bs_mask, mask_key)
+
+        # Create radially averaged file metadata
+        parameters['normalizations'] = {}
+        if self.do_solidangle:
+            parameters['normalizations']['Solid_Angle_Correction'] = 'On'
+
+        parameters['normalizations']['Polarization'] = {'Used' : self.do_polarization}
+        if self.do_polarization:
+            parameters['normalizations']['Polarization']['Factor'] = self.polarization_factor
+
+        calibrate_dict = {'Sample_Detector_Distance'    : sd_distance,
+                        'Detector_X_Pixel_Size'         : pixel_size_x,
+                        'Detector_Y_Pixel_Size'         : pixel_size_y,
+                        'Wavelength'                    : wavelength,
+                        'Beam_Center_X'                 : x_c,
+                        'Beam_Center_Y'                 : y_c,
+                        'Detector Tilt'                 : det_tilt,
+                        'Detector Tilt Plane Rotation'  : det_tilt_plan_rot,
+                        'Radial_Average_Method'         : 'pyFAI',
+                        'Integration Method'            : self.integration_method,
+                        }
+
+        parameters['calibration_params'] = calibrate_dict
+        parameters['raw_version'] = RAWGlobals.version
+        parameters['config_file'] = self.raw_settings.get('CurrentCfg')
+
+        if self.metadata is not None:
+            parameters['metadata'] = copy.copy(self.metadata)
+
+        # Calculate the ROI if applicable
+        if tbs_mask is not None:
+            roi_counter = img[tbs_mask==1].sum()
+            parameters['counters']['roi_counter'] = roi_counter
+
+        norm_factor, all_norms_mult = self.getNormFactor(parameters, img_hdr,
+            file_hdr)
+
+        ai = geometry['ai']
+
+        integration_kwargs = {
+            'mask'                  : geometry['mask'],
+            'variance'              : variance,
+            'correctSolidAngle'     : self.do_solidangle,
+            'error_model'           : error_model,
+            'unit'                  : self.angular_unit,
+            'radial_range'          : geometry['q_range'],
+            'method'                : self.integration_method,
+            'normalization_factor'  : norm_factor,
+            'polarization_factor'   : self.polarization_factor,
+            'flat'                  : self.flatfield_image,
+            'dark'                  : self.dark_image,
+            }
+
+        #Carry out the integration
+        if not self.zinger_removal:
+            integrate_func = ai.integrate1d
 
-    if use_image_for_variance:
-        variance = img
-        error_model = None
-    else:
-        variance = None
-
-    if not do_flatfield:
-        flatfield_image = None
-
-    if not do_darkcorrection:
-        dark_image = None
-
-    #Absolute scale values
-    abs_scale_water = raw_settings.get('NormAbsWater')
-    abs_scale_water_factor = float(raw_settings.get('NormAbsWaterConst'))
-    abs_scale_gc = raw_settings.get('NormAbsCarbon')
-    abs_scale_gc_ignore_bkg = raw_settings.get('NormAbsCarbonIgnoreBkg')
-    abs_scale_gc_factor = float(raw_settings.get('NormAbsCarbonConst'))
-
-    sd_distance = raw_settings.get('SampleDistance')
-    pixel_size_x = raw_settings.get('DetectorPixelSizeX')
-    pixel_size_y = raw_settings.get('DetectorPixelSizeY')
-    wavelength = raw_settings.get('WaveLength')
-    bin_size = int(raw_settings.get('Binsize'))
-    bin_type = raw_settings.get('BinType')
-    x_c = float(raw_settings.get('Xcenter'))
-    y_c = float(raw_settings.get('Ycenter'))
-    det_tilt = raw_settings.get('DetectorTilt')
-    det_tilt_plan_rot = raw_settings.get('DetectorTiltPlanRot')
-
-
-    # Load mask
-    if use_hdr_mask:
-        # ********************
-        # If the file is a SAXSLAB file, then get mask parameters from the header and modify the mask
-        # then apply it...
-        #
-        # Mask should be not be changed, but should be created here. If no mask information is found, then
-        # use the user created mask. There should be a force user mask setting.
-        #
-        # ********************
-        try:
-            mask_patches = SASMask.createMaskFromHdr(img, img_hdr, flipped = raw_settings.get('DetectorFlipped90'))
-            bs_mask_patches = mask_dict['BeamStopMask'][1]
-            tbs_mask = mask_dict['TransparentBSMask'][0]
-
-            if bs_mask_patches is not None:
-                all_mask_patches = mask_patches + bs_mask_patches
-            else:
-                all_mask_patches = mask_patches
+        else:
+            integrate_func = ai.sigma_clip_ng
 
-            bs_mask = SASMask.createMaskMatrix(img.shape, all_mask_patches)
+            integration_kwargs['thres'] = self.zinger_thres
+            integration_kwargs['max_iter'] = self.zinger_iter
 
-            if bs_mask is not None:
-                bs_mask = np.logical_not(bs_mask) #Invert mask for pyFAI
+        q, iq, errorbars = integrate_func(img, geometry['npts'], **integration_kwargs)
 
-        except KeyError:
-            raise SASExceptions.HeaderMaskLoadError('bsmask_configuration not found in header.')
+        errorbars = np.nan_to_num(errorbars)
 
-    else:
-        bs_mask = mask_dict['BeamStopMask'][2]
-        tbs_mask = mask_dict['TransparentBSMask'][0]
-
-    if bs_mask is None:
-        bs_mask = np.zeros(img.shape)
-
-    # Get values from image header if applicable
-    if use_hdr_calib:
-        result = getBindListDataFromHeader(raw_settings, img_hdr, file_hdr,
-            keys=['Sample Detector Distance', 'Detector X Pixel Size',
-            'Detector Y Pixel Size', 'Wavelength', 'Beam X Center',
-            'Beam Y Center', 'Detector Tilt', 'Detector Tilt Plane Rotation',
-            'Detector Pixel Size'])
-
-        if result[0] is not None:
-            sd_distance = result[0]
-        if result[1] is not None:
-            pixel_size_x = result[1]
-        if result[2] is not None:
-            pixel_size_y = result[2]
-        if result[3] is not None:
-            wavelength = result[3]
-        if result[4] is not None:
-            x_c = result[4]
-        if result[5] is not None:
-            y_c = result[5]
-        if result[6] is not None:
-            det_tilt = result[6]
-        if result[7] is not None:
-            det_tilt_plan_rot = result[7]
-        if result[8] is not None:
-            pixel_size_x = result[8]
-            pixel_size_y = result[8]
-            # Backwards compatability with old bindings for pixel size
-
-        # For historical reasons, the header bind list used to return pixel size
-        # in mm. So if the pixel is unrealistically small, put it into microns.
-        # I'm sure this is going to come back to bite me at some point.
-        if pixel_size_x < 1:
-            pixel_size_x = pixel_size_x*1000
-
-        if pixel_size_y < 1:
-            pixel_size_y = pixel_size_y*1000
-
-    # ********* WARNING WARNING WARNING ****************#
-    # Hmm.. axes start from the lower left, but array coords starts
-    # from upper left:
-    #####################################################
-    y_c = img.shape[0]-y_c
-
-    # Find the maximum distance to the edge in the image:
-    # img = np.float64(img)
-    ylen, xlen = img.shape
-
-    xlen = int(xlen)
-    ylen = int(ylen)
-    maxlen1 = int(max(xlen - x_c, ylen - y_c, xlen - (xlen - x_c), ylen - (ylen - y_c)))
-
-    diag1 = int(np.sqrt((xlen-x_c)**2 + y_c**2))
-    diag2 = int(np.sqrt((x_c**2 + y_c**2)))
-    diag3 = int(np.sqrt((x_c**2 + (ylen-y_c)**2)))
-    diag4 = int(np.sqrt((xlen-x_c)**2 + (ylen-y_c)**2))
-
-    maxlen = int(max(diag1, diag2, diag3, diag4, maxlen1))
-
-    if abs(det_tilt) > 5:
-        # Make sure we have enough q points for highly tilted detectors, otherwise some data may be lost
-        # This is a real hack. Better would be to calculate the actual extent
-        # based on the known calibration parameters, but that's hard
-        maxlen*=4
-
-    if bin_type == 'Linear' and bin_size != 1:
-        npts = maxlen//bin_size
-    else:
-        npts = maxlen
-
-
-    # Create radially averaged file metadata
-    parameters['normalizations'] = {}
-    if do_solidangle:
-        parameters['normalizations']['Solid_Angle_Correction'] = 'On'
-
-    parameters['normalizations']['Polarization'] = {'Used' : do_polarization}
-    if do_polarization:
-        parameters['normalizations']['Polarization']['Factor'] = polarization_factor
-
-    calibrate_dict = {'Sample_Detector_Distance'    : sd_distance,
-                    'Detector_X_Pixel_Size'         : pixel_size_x,
-                    'Detector_Y_Pixel_Size'         : pixel_size_y,
-                    'Wavelength'                    : wavelength,
-                    'Beam_Center_X'                 : x_c,
-                    'Beam_Center_Y'                 : y_c,
-                    'Detector Tilt'                 : det_tilt,
-                    'Detector Tilt Plane Rotation'  : det_tilt_plan_rot,
-                    'Radial_Average_Method'         : 'pyFAI',
-                    'Integration Method'            : integration_method,
-                    }
-
-    parameters['calibration_params'] = calibrate_dict
-    parameters['raw_version'] = RAWGlobals.version
-    parameters['config_file'] = raw_settings.get('CurrentCfg')
-
-    if raw_settings.get('EnableMetadata'):
-        meta_list = raw_settings.get('MetadataList')
-        if meta_list is not None and len(meta_list) > 0:
-            metadata = {key:value for (key, value) in meta_list}
-            parameters['metadata'] = metadata
-
-    # Calculate the ROI if applicable
-    if tbs_mask is not None:
-        roi_counter = img[tbs_mask==1].sum()
-        parameters['counters']['roi_counter'] = roi_counter
-
-    all_norms_mult = True
-    norm_factor = 1.0
-    #Calculate the normalization parameter if applicable
-    if normlist is not None and do_normalization:
-        parameters['normalizations']['Counter_norms'] = normlist
-
-        for op, expr in normlist:
-            if op != '/' and op != '*':
-                all_norms_mult = False
-                break
+        sasm = SASM.SASM(iq, q, errorbars, parameters)
+
+        img_hdr = sasm.getParameter('imageHeader')
+        file_hdr = sasm.getParameter('counters')
+
+        if self.normlist is not None and self.do_normalization and not all_norms_mult:
+            for each in self.normlist:
+                op, expr = each
 
-            else:
                 val = calcExpression(expr, img_hdr, file_hdr)
 
                 if val is not None:
                     val = float(val)
                 else:
                     raise ValueError
+
                 if op == '/':
-                    if val == 0:
-                        raise ValueError('Divide by Zero when normalizing')
-                    else:
-                        norm_factor = norm_factor/val
+                   if val == 0:
+                       raise ValueError('Divide by Zero when normalizing')
+
+                   sasm.scaleRawIntensity(1./val)
+
+                elif op == '+':
+                    sasm.offsetRawIntensity(val)
 
                 elif op == '*':
                     if val == 0:
                        raise ValueError('Multiply by Zero when normalizing')
-                    else:
-                        norm_factor = norm_factor*val
-
-        if not all_norms_mult:
-            norm_factor = 1.0
-
-    if abs_scale_water:
-        parameters['normalizations']['Absolute_scale'] = {}
-        parameters['normalizations']['Absolute_scale']['Method'] = 'Water'
-        parameters['normalizations']['Absolute_scale']['Absolute_scale_factor'] = abs_scale_water_factor
-
-        norm_factor = norm_factor * abs_scale_water_factor
-
-    elif abs_scale_gc and abs_scale_gc_ignore_bkg:
-        parameters['normalizations']['Absolute_scale'] = {}
-        parameters['normalizations']['Absolute_scale']['Method'] = 'Glassy_carbon'
-        parameters['normalizations']['Absolute_scale']['Ignore_background'] = True
-        parameters['normalizations']['Absolute_scale']['Absolute_scale_factor'] = abs_scale_gc_factor
-
-        norm_factor = norm_factor * abs_scale_gc_factor
 
-    # pyFAI expects a divisible normalization factor
-    norm_factor = 1./norm_factor
+                    sasm.scaleRawIntensity(val)
 
-    #Put everything in appropriate units
-    wavelength = wavelength*1e-10 #convert wl to m
+                elif op == '-':
+                    sasm.offsetRawIntensity(-val)
 
-    if ai is None:
-        try:
-            ai = pyFAI.integrator.azimuthal.AzimuthalIntegrator()
-        except AttributeError:
-            ai = pyFAI.azimuthalIntegrator.AzimuthalIntegrator()
+        if self.bin_type == 'Log10' and self.bin_size != 1:
+            sasm = SASProc.logBinning(sasm, len(q)//self.bin_size)
 
-        try:
-            ai.wavelength = wavelength
-        except Exception:
-            ai.set_wavelength(wavelength)
+        return sasm
 
+def makeAzimuthalIntegrator(wavelength, sd_distance, x_c, y_c, det_tilt,
+    det_tilt_plan_rot, pixel_size_x, pixel_size_y):
+    """
+    Returns a new azimuthal integrator for the given geometry (wavelength
+    in m, distance in mm, pixel sizes in microns).
+    """
     try:
-        ai_wl = ai.wavelength
-    except Exception:
-        ai_wl = ai.get_wavelength()
-
-    if wavelength != ai_wl:
-        try:
-            ai.wavelength = wavelength
-        except Exception:
-            ai.set_wavelength(wavelength)
+        ai = pyFAI.integrator.azimuthal.AzimuthalIntegrator()
+    except AttributeError:
+        ai = pyFAI.azimuthalIntegrator.AzimuthalIntegrator()
 
     try:
-        ai_settings = ai.getFit2D()
-        try:
-            pixel2 = ai.pixel2
-        except Exception:
-            pixel2 = ai.get_pixel2()
-
-        try:
-            pixel1 = ai.pixel1
-        except Exception:
-            pixel1 = ai.get_pixel1()
-
-        reinitialize_ai = not (round(ai_settings['directDist'], 6) == round(sd_distance, 6)
-            and round(ai_settings['centerX'], 6) == round(x_c, 6)
-            and round(ai_settings['centerY'], 6) == round(y_c, 6)
-            and round(ai_settings['tilt'], 6) == round(det_tilt, 6)
-            and round(ai_settings['tiltPlanRotation'], 6) == round(det_tilt_plan_rot, 6)
-            and round(pixel2*1e6, 6) == round(pixel_size_x, 6)
-            and round(pixel1*1e6, 6) == round(pixel_size_y, 6))
+        ai.wavelength = wavelength
     except Exception:
-        reinitialize_ai = True
-
-    if reinitialize_ai:
-        ai.setFit2D(sd_distance, x_c, y_c, det_tilt, det_tilt_plan_rot, pixel_size_x,
-            pixel_size_y)
-
-        raw_settings.set('AzimuthalIntegrator', ai)
+        ai.set_wavelength(wavelength)
 
-    if pixel_size_x == pixel_size_y and angular_unit == 'q_A^-1':
-        qmin_theta = SASCalib.calcTheta(sd_distance*1e-3, pixel_size_x*1e-6, 0)
-        qmin = ((4 * math.pi * math.sin(qmin_theta)) / (wavelength*1e10))
+    ai.setFit2D(sd_distance, x_c, y_c, det_tilt, det_tilt_plan_rot, pixel_size_x,
+        pixel_size_y)
 
-        qmax_theta = SASCalib.calcTheta(sd_distance*1e-3, pixel_size_x*1e-6, maxlen)
-        qmax = ((4 * math.pi * math.sin(qmax_theta)) / (wavelength*1e10))
+    return ai
 
-        q_range = (qmin, qmax)
+# Mask keys by the id of the mask array. Masks are replaced rather than
+# modified when they change, so the key only has to be calculated once for
+# each mask array.
+_mask_keys = {}
+_mask_keys_lock = threading.Lock()
 
-    else:
-        q_range = None
-
-    integration_kwargs = {
-        'mask'                  : bs_mask,
-        'variance'              : variance,
-        'correctSolidAngle'     : do_solidangle,
-        'error_model'           : error_model,
-        'unit'                  : angular_unit,
-        'radial_range'          : q_range,
-        'method'                : integration_method,
-        'normalization_factor'  : norm_factor,
-        'polarization_factor'   : polarization_factor,
-        'flat'                  : flatfield_image,
-        'dark'                  : dark_image,
-        }
-
-    #Carry out the integration
-    if not zinger_removal:
-        integrate_func = ai.integrate1d
-
-    else:
-        integrate_func = ai.sigma_clip_ng
+def getMaskKey(mask):
+    """
+    Returns a key identifying the contents of a mask, for use in the
+    geometry cache. The key is calculated once per mask array and then
+    reused.
+    """
+    if mask is None:
+        return None
 
-        integration_kwargs['thres'] = zinger_thres
-        integration_kwargs['max_iter'] = zinger_iter
+    mask_id = id(mask)
 
-    q, iq, errorbars = integrate_func(img, npts, **integration_kwargs)
+    with _mask_keys_lock:
+        cached = _mask_keys.get(mask_id)
 
-    errorbars = np.nan_to_num(errorbars)
+    if cached is not None and cached[0]() is mask:
+        key = cached[1]
 
-    sasm = SASM.SASM(iq, q, errorbars, parameters)
-
-    img_hdr = sasm.getParameter('imageHeader')
-    file_hdr = sasm.getParameter('counters')
-
-    if normlist is not None and do_normalization and not all_norms_mult:
-        for each in normlist:
-            op, expr = each
-
-            val = calcExpression(expr, img_hdr, file_hdr)
-
-            if val is not None:
-                val = float(val)
+    else:
+        contig_mask = np.ascontiguousarray(mask)
+        key = (contig_mask.shape, str(contig_mask.dtype),
+            hashlib.md5(contig_mask.tobytes()).hexdigest())
+
+        def remove_key(ref, mask_id=mask_id):
+            with _mask_keys_lock:
+                if mask_id in _mask_keys and _mask_keys[mask_id][0] is ref:
+                    del _mask_keys[mask_id]
+
+        with _mask_keys_lock:
+            _mask_keys[mask_id] = (weakref.ref(mask, remove_key), key)
+
+    return key
+
+class GeometryCache(object):
+    """
+    A least recently used cache of the detector geometry used to radially
+    average images. Entries are keyed on the image shape, calibration
+    (distance, pixel sizes, wavelength, beam center, and tilts), beamstop mask,
+    and binning settings. Each entry is a dictionary holding the azimuthal
+    integrator ('ai'), the beamstop mask passed to pyFAI ('mask'), the number
+    of radial bins ('npts'), and the q range ('q_range'). The solid angle
+    and polarization correction arrays aren't stored in the entry, as pyFAI
+    already keeps them on the integrator after the first integration.
+
+    Hits and misses are counted so that reuse can be checked with getInfo.
+    """
+
+    def __init__(self, max_size=4):
+        self.max_size = max_size
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                entry = self._entries[key]
             else:
-                raise ValueError
-
-            if op == '/':
-               if val == 0:
-                   raise ValueError('Divide by Zero when normalizing')
-
-               sasm.scaleRawIntensity(1./val)
-
-            elif op == '+':
-                sasm.offsetRawIntensity(val)
-
-            elif op == '*':
-                if val == 0:
-                   raise ValueError('Multiply by Zero when normalizing')
-
-                sasm.scaleRawIntensity(val)
-
-            elif op == '-':
-                sasm.offsetRawIntensity(-val)
-
-    if bin_type == 'Log10' and bin_size != 1:
-        sasm = SASProc.logBinning(sasm, len(q)//bin_size)
-
-    return sasm
+                self.misses += 1
+                entry = None
+
+        return entry
+
+    def add(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > max(self.max_size, 1):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def getInfo(self):
+        with self._lock:
+            info = {
+                'hits'      : self.hits,
+                'misses'    : self.misses,
+                'evictions' : self.evictions,
+                'size'      : len(self._entries),
+                'max_size'  : self.max_size,
+                }
+
+        return info
+
+geometry_cache = GeometryCache()
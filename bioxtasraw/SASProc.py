@@ -32,6 +32,7 @@ from io import open
 import copy
 import traceback
 import os
+import concurrent.futures
 import numpy as np
 import scipy.interpolate as interp
 import numba
@@ -894,7 +895,137 @@ def measure_longest(data):
         max_len = 0
     return max_len
 
-def run_cormap_all(sasm_list, correction='None'):
+@numba.jit(nopython=True, cache=True)
+def cormap_longest_run(data1, data2):
+    """Finds the longest consecutive region of positive or negative values
+    of data2-data1. Equivalent to measure_longest(data2-data1)."""
+    n = data1.size
+
+    has_zero = False
+    all_zero = True
+
+    for k in range(n):
+        d = data2[k] - data1[k]
+        if d == 0:
+            has_zero = True
+        else:
+            all_zero = False
+
+    if all_zero:
+        return 0
+
+    # If there are no zeros measure_longest only looks at data>0, otherwise
+    # values that are neither positive nor negative (0, NaN) are their own runs
+    longest = 0
+    run = 0
+    last_sign = 2
+
+    for k in range(n):
+        d = data2[k] - data1[k]
+
+        if d > 0:
+            sign = 1
+        elif d < 0 or not has_zero:
+            sign = -1
+        else:
+            sign = 0
+
+        if sign == last_sign:
+            run += 1
+        else:
+            run = 1
+            last_sign = sign
+
+        if run > longest:
+            longest = run
+
+    return longest
+
+@numba.jit(nopython=True, cache=True, nogil=True)
+def cormap_longest_all(intensities, rows):
+    """Longest runs for all pairs of rows of intensities, for the given
+    rows. Only the upper triangle of the returned array is filled."""
+    m = intensities.shape[0]
+    longest = np.zeros((m, m), dtype=np.int64)
+
+    for j in rows:
+        for k in range(j+1, m):
+            longest[j, k] = cormap_longest_run(intensities[j], intensities[k])
+
+    return longest
+
+@numba.jit(nopython=True, cache=True, nogil=True)
+def cormap_longest_ref(ref_intensity, intensities, rows):
+    """Longest runs for the given rows of intensities compared to a
+    reference. Other rows are returned as 0."""
+    longest = np.zeros(intensities.shape[0], dtype=np.int64)
+
+    for j in rows:
+        longest[j] = cormap_longest_run(ref_intensity, intensities[j])
+
+    return longest
+
+def _run_cormap_kernel(kernel, args, num_rows, parallel):
+    """Runs one of the cormap longest run kernels. If parallel, the rows are
+    split between threads, as the kernels release the GIL. Threads are used
+    rather than numba's parallel mode, which isn't safe to use before forking
+    a multiprocessing pool."""
+    if parallel:
+        num_threads = min(os.cpu_count() or 1, num_rows)
+    else:
+        num_threads = 1
+
+    if num_threads > 1:
+        # Rows are interleaved to balance the triangular all vs. all work
+        row_sets = [np.arange(start, num_rows, num_threads)
+            for start in range(num_threads)]
+
+        with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+            results = list(executor.map(lambda rows: kernel(*args, rows),
+                row_sets))
+
+        longest = sum(results)
+
+    else:
+        longest = kernel(*args, np.arange(num_rows))
+
+    return longest
+
+# Cache of rounded CorMap probabilities, keyed by the number of points. Each
+# value is an array indexed by the longest run.
+_cormap_prob_tables = {}
+
+def cormap_prob_table(n):
+    """Returns the table of rounded CorMap probabilities for n points."""
+    if n not in _cormap_prob_tables:
+        table = np.array([round(prob, 6) for prob in sascalc_exts.LROH.table(n)])
+        _cormap_prob_tables[n] = table
+
+    return _cormap_prob_tables[n]
+
+def _cormap_q_key(q):
+    """Key for grouping profiles with matching q vectors, or None if the
+    q vector can never match another one."""
+    q = np.round(q, 5)
+
+    if not np.all(np.isfinite(q)):
+        key = None
+    else:
+        key = (q+0.).tobytes()
+
+    return key
+
+def _cormap_groups(q_keys):
+    """Groups indices with matching q keys."""
+    groups = {}
+
+    for index, key in enumerate(q_keys):
+        if key is not None:
+            groups.setdefault(key, []).append(index)
+
+    return list(groups.values())
+
+def run_cormap_all(sasm_list, correction='None', parallel=False):
     pvals = np.ones((len(sasm_list), len(sasm_list)))
     corrected_pvals = np.ones_like(pvals)
     failed_comparisons = []
@@ -904,29 +1035,43 @@ def run_cormap_all(sasm_list, correction='None'):
 
     item_data = []
 
+    intensities = []
+    q_keys = []
+
+    for sasm in sasm_list:
+        qmin, qmax = sasm.getQrange()
+        intensities.append(sasm.i[qmin:qmax])
+        q_keys.append(_cormap_q_key(sasm.q[qmin:qmax]))
+
+    # Profiles with matching q vectors are compared as a single batch
+    longest = np.full((len(sasm_list), len(sasm_list)), -1, dtype=np.int64)
+    probs = -np.ones_like(pvals)
+
+    for group in _cormap_groups(q_keys):
+        if len(group) > 1:
+            group_i = np.stack([intensities[index] for index in group])
+            group_idx = np.array(group)
+
+            group_longest = _run_cormap_kernel(cormap_longest_all, (group_i,),
+                len(group), parallel)
+
+            group_longest = group_longest + group_longest.T
+
+            n = group_i.shape[1]
+            prob_table = cormap_prob_table(n)
+
+            longest[np.ix_(group_idx, group_idx)] = group_longest
+            probs[np.ix_(group_idx, group_idx)] = prob_table[group_longest]
+
     for index1 in range(len(sasm_list)):
         sasm1 = sasm_list[index1]
-        qmin1, qmax1 = sasm1.getQrange()
-        i1 = sasm1.i[qmin1:qmax1]
         for index2 in range(1, len(sasm_list[index1:])):
             sasm2 = sasm_list[index1+index2]
-            qmin2, qmax2 = sasm2.getQrange()
-            i2 = sasm2.i[qmin2:qmax2]
-
-            if np.all(np.round(sasm1.q[qmin1:qmax1], 5) == np.round(sasm2.q[qmin2:qmax2], 5)):
-                try:
-                    n, c, prob = cormap_pval(i1, i2)
-                except SASExceptions.CorMapError:
-                    n = 0
-                    c = -1
-                    prob = -1
-                    failed_comparisons.append((sasm1.getParameter('filename'),
-                        sasm2.getParameter('filename')))
 
-            else:
-                n = 0
-                c = -1
-                prob = -1
+            c = longest[index1, index1+index2]
+            prob = probs[index1, index1+index2]
+
+            if c == -1:
                 failed_comparisons.append((sasm1.getParameter('filename'),
                     sasm2.getParameter('filename')))
 
@@ -947,34 +1092,40 @@ def run_cormap_all(sasm_list, correction='None'):
 
             item_data.append([str(index1), str(index1+index2),
                 sasm1.getParameter('filename'), sasm2.getParameter('filename'),
-                c, prob, c_prob]
+                int(c), float(prob), c_prob]
                 )
 
     return item_data, pvals, corrected_pvals, failed_comparisons
 
-def run_cormap_ref(sasm_list, ref_sasm, correction='None'):
+def run_cormap_ref(sasm_list, ref_sasm, correction='None', parallel=False):
     pvals = np.ones(len(sasm_list), dtype=float)
     failed_comparisons = []
 
+    ref_key = _cormap_q_key(ref_sasm.getQ())
+    ref_i = ref_sasm.getI()
+
+    matched = [index for index, sasm in enumerate(sasm_list)
+        if ref_key is not None and _cormap_q_key(sasm.getQ()) == ref_key]
+
+    if len(matched) > 0:
+        intensities = np.stack([sasm_list[index].getI() for index in matched])
+
+        longest = _run_cormap_kernel(cormap_longest_ref, (ref_i, intensities),
+            len(matched), parallel)
+
+        prob_table = cormap_prob_table(len(ref_i))
+
+        pvals[matched] = prob_table[longest]
+
+    unmatched = np.ones(len(sasm_list), dtype=bool)
+    unmatched[matched] = False
+
     for index, sasm in enumerate(sasm_list):
-        if np.all(np.round(sasm.getQ(), 5) == np.round(ref_sasm.getQ(), 5)):
-            try:
-                n, c, prob = cormap_pval(ref_sasm.getI(), sasm.getI())
-            except SASExceptions.CorMapError:
-                n = 0
-                c = -1
-                prob = -1
-                failed_comparisons.append((ref_sasm.getParameter('filename'),
-                    sasm.getParameter('filename')))
-        else:
-            n = 0
-            c = -1
-            prob = -1
+        if unmatched[index]:
+            pvals[index] = -1
             failed_comparisons.append((ref_sasm.getParameter('filename'),
                 sasm.getParameter('filename')))
 
-        pvals[index] = prob
-
     if correction == 'Bonferroni':
         corrected_pvals = pvals*len(sasm_list)
         corrected_pvals[corrected_pvals>1] = 1
@@ -34,14 +34,17 @@ import os
 import copy
 import threading
 import itertools
+from collections.abc import MutableSequence
 
 import numpy as np
+import scipy.integrate as integrate
 
 raw_path = os.path.abspath(os.path.join('.', __file__, '..', '..'))
 if raw_path not in os.sys.path:
     os.sys.path.append(raw_path)
 
 import bioxtasraw.SASExceptions as SASExceptions
+import bioxtasraw.SASM as SASM
 import bioxtasraw.SASProc as SASProc
 
 class SECM(object):
@@ -173,8 +176,8 @@ class SECM(object):
             self._parameters['filename'] = filename
 
         #Extract initial mean and total intensity variables
-        self.mean_i = np.array([sasm.getMeanI() for sasm in self._sasm_list])
-        self.total_i = np.array([sasm.getTotalI() for sasm in self._sasm_list])
+        self.mean_i = _profileValues(self._sasm_list, 'getMeanI')
+        self.total_i = _profileValues(self._sasm_list, 'getTotalI')
 
         #Make sure we have as many frame numbers as sasm objects
 
@@ -282,67 +285,68 @@ class SECM(object):
     def _update(self):
         ''' updates modified intensity after scale, normalization and offset changes '''
 
-        for i, sasm in enumerate(self._sasm_list):
-            sasm.scale(self._scale_factor)
-            sasm.offset(self._offset_value)
-
-            if self._q_range is not None:
-                sasm.setQrange((self._q_range[0], self._q_range[1]+1))
-
-            self.mean_i[i] = sasm.getMeanI()
-            self.total_i[i] = sasm.getTotalI()
+        self._updateSASMs(self._sasm_list, self._q_range, self.mean_i,
+            self.total_i, self.I_of_q, self.qrange_I)
 
-            if self.qref > 0:
-                self.I_of_q[i] = sasm.getIofQ(self.qref)
+        self._updateSASMs(self.subtracted_sasm_list, self._sub_q_range,
+            self.mean_i_sub, self.total_i_sub, self.I_of_q_sub,
+            self.qrange_I_sub)
 
-            if self.qrange[0] != 0 and self.qrange[1] != 0:
-                self.qrange_I[i] = sasm.getIofQRange(self.qrange[0], self.qrange[1])
+        self._updateSASMs(self.baseline_subtracted_sasm_list,
+            self._bc_sub_q_range, self.mean_i_bcsub, self.total_i_bcsub,
+            self.I_of_q_bcsub, self.qrange_I_bcsub)
 
-        for i, sasm in enumerate(self.subtracted_sasm_list):
+        for i, sasm in enumerate(self.baseline_corr):
             sasm.scale(self._scale_factor)
             sasm.offset(self._offset_value)
 
             if self._sub_q_range is not None:
                 sasm.setQrange((self._sub_q_range[0], self._sub_q_range[1]+1))
 
-            self.mean_i_sub[i] = sasm.getMeanI()
-            self.total_i_sub[i] = sasm.getTotalI()
+        if self.average_buffer_sasm is not None:
+            self.average_buffer_sasm.scale(self._scale_factor)
+            self.average_buffer_sasm.offset(self._offset_value)
 
-            if self.qref > 0:
-                self.I_of_q_sub[i] = sasm.getIofQ(self.qref)
+            if self._sub_q_range is not None:
+                self.average_buffer_sasm.setQrange((self._sub_q_range[0], self._sub_q_range[1]+1))
 
-            if self.qrange[0] != 0 and self.qrange[1] != 0:
-                self.qrange_I_sub[i] = sasm.getIofQRange(self.qrange[0], self.qrange[1])
+    def _updateSASMs(self, sasm_list, q_range, mean_i, total_i, I_of_q,
+        qrange_I):
+        ''' applies the series scale, offset, and q range to a list of profiles
+        and updates the corresponding intensity arrays '''
 
-        for i, sasm in enumerate(self.baseline_subtracted_sasm_list):
-            sasm.scale(self._scale_factor)
-            sasm.offset(self._offset_value)
+        if isinstance(sasm_list, LazySASMList):
+            sasm_list.scale(self._scale_factor)
+            sasm_list.offset(self._offset_value)
 
-            if self._bc_sub_q_range is not None:
-                sasm.setQrange((self._bc_sub_q_range[0], self._bc_sub_q_range[1]+1))
+            if q_range is not None:
+                sasm_list.setQrange((q_range[0], q_range[1]+1))
 
-            self.mean_i_bcsub[i] = sasm.getMeanI()
-            self.total_i_bcsub[i] = sasm.getTotalI()
+            mean_i[:] = sasm_list.getMeanI()
+            total_i[:] = sasm_list.getTotalI()
 
             if self.qref > 0:
-                self.I_of_q_bcsub[i] = sasm.getIofQ(self.qref)
+                I_of_q[:] = sasm_list.getIofQ(self.qref)
 
             if self.qrange[0] != 0 and self.qrange[1] != 0:
-                self.qrange_I_bcsub[i] = sasm.getIofQRange(self.qrange[0], self.qrange[1])
+                qrange_I[:] = sasm_list.getIofQRange(self.qrange[0], self.qrange[1])
 
-        for i, sasm in enumerate(self.baseline_corr):
-            sasm.scale(self._scale_factor)
-            sasm.offset(self._offset_value)
+        else:
+            for i, sasm in enumerate(sasm_list):
+                sasm.scale(self._scale_factor)
+                sasm.offset(self._offset_value)
 
-            if self._sub_q_range is not None:
-                sasm.setQrange((self._sub_q_range[0], self._sub_q_range[1]+1))
+                if q_range is not None:
+                    sasm.setQrange((q_range[0], q_range[1]+1))
 
-        if self.average_buffer_sasm is not None:
-            self.average_buffer_sasm.scale(self._scale_factor)
-            self.average_buffer_sasm.offset(self._offset_value)
+                mean_i[i] = sasm.getMeanI()
+                total_i[i] = sasm.getTotalI()
 
-            if self._sub_q_range is not None:
-                self.average_buffer_sasm.setQrange((self._sub_q_range[0], self._sub_q_range[1]+1))
+                if self.qref > 0:
+                    I_of_q[i] = sasm.getIofQ(self.qref)
+
+                if self.qrange[0] != 0 and self.qrange[1] != 0:
+                    qrange_I[i] = sasm.getIofQRange(self.qrange[0], self.qrange[1])
 
 
     def append(self, filename_list, sasm_list, frame_list):
@@ -516,10 +520,15 @@ class SECM(object):
     def _calcTime(self, sasm_list):
         time=list(self.time)
 
+        if isinstance(sasm_list, LazySASMList):
+            all_parameters = sasm_list.iterParameters()
+        else:
+            all_parameters = (sasm.getAllParameters() for sasm in sasm_list)
+
         if self.hdr_format == 'G1, CHESS' or self.hdr_format == 'G1 WAXS, CHESS':
-            for sasm in sasm_list:
-                if 'counters' in sasm.getAllParameters():
-                    file_hdr = sasm.getParameter('counters')
+            for parameters in all_parameters:
+                if 'counters' in parameters:
+                    file_hdr = parameters['counters']
 
                     if '#C' not in list(file_hdr.values()):
                         if 'Time' in file_hdr:
@@ -541,9 +550,9 @@ class SECM(object):
                                 time.append(sasm_time+self.time[-1])
 
         elif self.hdr_format == 'BioCAT, APS':
-            for sasm in sasm_list:
-                if 'counters' in sasm.getAllParameters():
-                    file_hdr = sasm.getParameter('counters')
+            for parameters in all_parameters:
+                if 'counters' in parameters:
+                    file_hdr = parameters['counters']
 
                     if 'start_time' in file_hdr:
                         time.append(float(file_hdr['start_time']))
@@ -874,9 +883,12 @@ class SECM(object):
         all_data['use_baseline_subtracted_sasm'] = self.use_baseline_subtracted_sasm
 
 
-        all_data['sasm_list'] = []
-        for idx in range(len(self._sasm_list)):
-            all_data['sasm_list'].append(self._sasm_list[idx].extractAll())
+        if isinstance(self._sasm_list, LazySASMList):
+            all_data['sasm_list'] = self._sasm_list.extractAll()
+        else:
+            all_data['sasm_list'] = []
+            for idx in range(len(self._sasm_list)):
+                all_data['sasm_list'].append(self._sasm_list[idx].extractAll())
 
         if self.average_buffer_sasm is None or self.average_buffer_sasm == -1:
             all_data['average_buffer_sasm'] = self.average_buffer_sasm
@@ -884,26 +896,9 @@ class SECM(object):
             all_data['average_buffer_sasm'] = self.average_buffer_sasm.extractAll()
 
 
-        all_data['subtracted_sasm_list'] = []
-        for idx in range(len(self.subtracted_sasm_list)):
-            if self.subtracted_sasm_list[idx] != -1:
-                all_data['subtracted_sasm_list'].append(self.subtracted_sasm_list[idx].extractAll())
-            else:
-                all_data['subtracted_sasm_list'].append(-1)
-
-        all_data['baseline_subtracted_sasm_list'] = []
-        for idx in range(len(self.baseline_subtracted_sasm_list)):
-            if self.baseline_subtracted_sasm_list[idx] != -1:
-                all_data['baseline_subtracted_sasm_list'].append(self.baseline_subtracted_sasm_list[idx].extractAll())
-            else:
-                all_data['baseline_subtracted_sasm_list'].append(-1)
-
-        all_data['baseline_corr'] = []
-        for idx in range(len(self.baseline_corr)):
-            if self.baseline_corr[idx] != -1:
-                all_data['baseline_corr'].append(self.baseline_corr[idx].extractAll())
-            else:
-                all_data['baseline_corr'].append(-1)
+        all_data['subtracted_sasm_list'] = _extractSASMList(self.subtracted_sasm_list)
+        all_data['baseline_subtracted_sasm_list'] = _extractSASMList(self.baseline_subtracted_sasm_list)
+        all_data['baseline_corr'] = _extractSASMList(self.baseline_corr)
 
 
         # Here's some stupid python 2 compatibility stuff
@@ -1099,13 +1094,13 @@ class SECM(object):
             The intensity of each profile at the given q value.
         """
         self.qref=float(qref)
-        self.I_of_q = np.array([sasm.getIofQ(qref) for sasm in self.getAllSASMs()])
+        self.I_of_q = _profileValues(self.getAllSASMs(), 'getIofQ', qref)
 
         if self.subtracted_sasm_list:
-            self.I_of_q_sub = np.array([sasm.getIofQ(qref) for sasm in self.subtracted_sasm_list])
+            self.I_of_q_sub = _profileValues(self.subtracted_sasm_list, 'getIofQ', qref)
 
         if self.baseline_subtracted_sasm_list:
-            self.I_of_q_bcsub = np.array([sasm.getIofQ(qref) for sasm in self.baseline_subtracted_sasm_list])
+            self.I_of_q_bcsub = _profileValues(self.baseline_subtracted_sasm_list, 'getIofQ', qref)
 
         return self.I_of_q
 
@@ -1128,13 +1123,16 @@ class SECM(object):
             The total intensity of each profile in the given q range.
         """
         self.qrange = qrange
-        self.qrange_I = np.array([sasm.getIofQRange(qrange[0], qrange[1]) for sasm in self.getAllSASMs()])
+        self.qrange_I = _profileValues(self.getAllSASMs(), 'getIofQRange',
+            qrange[0], qrange[1])
 
         if self.subtracted_sasm_list:
-            self.qrange_I_sub = np.array([sasm.getIofQRange(qrange[0], qrange[1]) for sasm in self.subtracted_sasm_list])
+            self.qrange_I_sub = _profileValues(self.subtracted_sasm_list,
+                'getIofQRange', qrange[0], qrange[1])
 
         if self.baseline_subtracted_sasm_list:
-            self.qrange_I_bcsub = np.array([sasm.getIofQRange(qrange[0], qrange[1]) for sasm in self.baseline_subtracted_sasm_list])
+            self.qrange_I_bcsub = _profileValues(self.baseline_subtracted_sasm_list,
+                'getIofQRange', qrange[0], qrange[1])
 
         return self.qrange_I
 
@@ -1720,24 +1718,36 @@ class SECM(object):
             A list of bools indicating whether or not the subtracted profiles
             should be used when calculating parameters such as Rg.
         """
-        for i, sasm in enumerate(sub_sasm_list):
-            sasm.scale(self._scale_factor)
-            sasm.offset(self._offset_value)
+        if isinstance(sub_sasm_list, LazySASMList):
+            sub_sasm_list.scale(self._scale_factor)
+            sub_sasm_list.offset(self._offset_value)
 
             if self._sub_q_range is not None:
-                sasm.setQrange((self._sub_q_range[0], self._sub_q_range[1]+1))
+                sub_sasm_list.setQrange((self._sub_q_range[0], self._sub_q_range[1]+1))
+
+            self.subtracted_sasm_list = sub_sasm_list
+
+        else:
+            for i, sasm in enumerate(sub_sasm_list):
+                sasm.scale(self._scale_factor)
+                sasm.offset(self._offset_value)
+
+                if self._sub_q_range is not None:
+                    sasm.setQrange((self._sub_q_range[0], self._sub_q_range[1]+1))
+
+            self.subtracted_sasm_list = list(sub_sasm_list)
 
-        self.subtracted_sasm_list = list(sub_sasm_list)
         self.use_subtracted_sasm = list(use_sub_sasm)
 
-        self.mean_i_sub = np.array([sasm.getMeanI() for sasm in sub_sasm_list])
-        self.total_i_sub = np.array([sasm.getTotalI() for sasm in sub_sasm_list])
+        self.mean_i_sub = _profileValues(sub_sasm_list, 'getMeanI')
+        self.total_i_sub = _profileValues(sub_sasm_list, 'getTotalI')
 
         if self.qref>0:
-            self.I_of_q_sub = np.array([sasm.getIofQ(self.qref) for sasm in sub_sasm_list])
+            self.I_of_q_sub = _profileValues(sub_sasm_list, 'getIofQ', self.qref)
 
         if self.qrange != (0,0):
-            self.qrange_I_sub = np.array([sasm.getIofQRange(self.qrange[0], self.qrange[1]) for sasm in sub_sasm_list])
+            self.qrange_I_sub = _profileValues(sub_sasm_list, 'getIofQRange',
+                self.qrange[0], self.qrange[1])
 
     def appendSubtractedSASMs(self, sub_sasm_list, use_sasm_list, window_size):
         """
@@ -1791,24 +1801,36 @@ class SECM(object):
             A list of bools indicating whether or not the profiles should be
             used when calculating parameters such as Rg.
         """
-        for i, sasm in enumerate(sub_sasm_list):
-            sasm.scale(self._scale_factor)
-            sasm.offset(self._offset_value)
+        if isinstance(sub_sasm_list, LazySASMList):
+            sub_sasm_list.scale(self._scale_factor)
+            sub_sasm_list.offset(self._offset_value)
 
             if self._bc_sub_q_range is not None:
-                sasm.setQrange((self._bc_sub_q_range[0], self._bc_sub_q_range[1]+1))
+                sub_sasm_list.setQrange((self._bc_sub_q_range[0], self._bc_sub_q_range[1]+1))
+
+            self.baseline_subtracted_sasm_list = sub_sasm_list
+
+        else:
+            for i, sasm in enumerate(sub_sasm_list):
+                sasm.scale(self._scale_factor)
+                sasm.offset(self._offset_value)
+
+                if self._bc_sub_q_range is not None:
+                    sasm.setQrange((self._bc_sub_q_range[0], self._bc_sub_q_range[1]+1))
+
+            self.baseline_subtracted_sasm_list = list(sub_sasm_list)
 
-        self.baseline_subtracted_sasm_list = list(sub_sasm_list)
         self.use_baseline_subtracted_sasm = list(use_sub_sasm)
 
-        self.mean_i_bcsub = np.array([sasm.getMeanI() for sasm in sub_sasm_list])
-        self.total_i_bcsub = np.array([sasm.getTotalI() for sasm in sub_sasm_list])
+        self.mean_i_bcsub = _profileValues(sub_sasm_list, 'getMeanI')
+        self.total_i_bcsub = _profileValues(sub_sasm_list, 'getTotalI')
 
         if self.qref>0:
-            self.I_of_q_bcsub = np.array([sasm.getIofQ(self.qref) for sasm in sub_sasm_list])
+            self.I_of_q_bcsub = _profileValues(sub_sasm_list, 'getIofQ', self.qref)
 
         if self.qrange != (0,0):
-            self.qrange_I_bcsub = np.array([sasm.getIofQRange(self.qrange[0], self.qrange[1]) for sasm in sub_sasm_list])
+            self.qrange_I_bcsub = _profileValues(sub_sasm_list, 'getIofQRange',
+                self.qrange[0], self.qrange[1])
 
     def appendBCSubtractedSASMs(self, sub_sasm_list, use_sasm_list, window_size):
         """
@@ -1850,3 +1872,440 @@ class SECM(object):
             qrange_I_bcsub = np.array([sasm.getIofQRange(self.qrange[0], self.qrange[1]) for sasm in sub_sasm_list])
             self.qrange_I_bcsub = np.concatenate((self.qrange_I_bcsub[:-window_size],
                 qrange_I_bcsub))
+
+
+def _profileValues(sasm_list, method, *args):
+    """
+    Calls a SASM method that returns a single value, such as getMeanI, for
+    every profile in sasm_list and returns the values as an array.
+    """
+    if isinstance(sasm_list, LazySASMList):
+        values = getattr(sasm_list, method)(*args)
+    else:
+        values = np.array([getattr(sasm, method)(*args) for sasm in sasm_list])
+
+    return values
+
+def _extractSASMList(sasm_list):
+    if isinstance(sasm_list, LazySASMList):
+        all_data = sasm_list.extractAll()
+    else:
+        all_data = []
+        for sasm in sasm_list:
+            if sasm != -1:
+                all_data.append(sasm.extractAll())
+            else:
+                all_data.append(-1)
+
+    return all_data
+
+
+class LazySASMList(MutableSequence):
+    """
+    A list of scattering profiles that share a q vector, stored as 2D arrays
+    of the raw intensity and uncertainty (one row per profile) along with
+    the scale, offset, q scale, q range, and metadata of each profile. This
+    is how the profiles in a columnar series file are loaded. A
+    :class:`bioxtasraw.SASM.SASM` is only made for a profile when it is
+    accessed (e.g. through :func:`SECM.getSASM` or :func:`SECM.getSASMList`),
+    after which the same SASM is returned on every access, so otherwise the
+    list behaves like a list of SASMs.
+
+    The :func:`getMeanI`, :func:`getTotalI`, :func:`getIofQ`, and
+    :func:`getIofQRange` methods return the values for every profile in the
+    list, calculated directly from the arrays for profiles that have not
+    been accessed. The :func:`scale`, :func:`offset`, and :func:`setQrange`
+    methods apply to every profile in the list.
+    """
+
+    def __init__(self, q, i, err, parameters, scale_factor=None,
+        offset_value=None, q_scale_factor=None, selected_qrange=None,
+        q_err=None, parse_parameters=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        q: numpy.array
+            The raw q vector shared by all of the profiles.
+        i: numpy.array
+            The raw intensity of the profiles, with one row per profile.
+        err: numpy.array
+            The raw uncertainty of the profiles, with one row per profile.
+        parameters: list
+            The metadata for each profile. Items should either be a dict, or
+            be converted to a dict by parse_parameters.
+        scale_factor: numpy.array, optional
+            The scale factor of each profile. Defaults to 1.
+        offset_value: numpy.array, optional
+            The offset value of each profile. Defaults to 0.
+        q_scale_factor: numpy.array, optional
+            The q scale factor of each profile. Defaults to 1.
+        selected_qrange: numpy.array, optional
+            The q range of each profile, with one row of (start, end) per
+            profile. Defaults to the full q range.
+        q_err: numpy.array, optional
+            The raw q uncertainty shared by all of the profiles. Usually
+            only used for SANS data.
+        parse_parameters: function, optional
+            A function that converts an item of parameters into the
+            metadata dict of a profile. Only called when a profile is
+            accessed.
+        """
+        self._q = np.asarray(q)
+        self._i = np.asarray(i)
+        self._err = np.asarray(err)
+
+        if q_err is not None:
+            self._q_err = np.asarray(q_err)
+        else:
+            self._q_err = None
+
+        nframes = self._i.shape[0]
+
+        self._parameters = list(parameters)
+        self._parse_parameters = parse_parameters
+
+        if scale_factor is None:
+            self._scale_factor = np.ones(nframes)
+        else:
+            self._scale_factor = np.array(scale_factor, dtype=float)
+
+        if offset_value is None:
+            self._offset_value = np.zeros(nframes)
+        else:
+            self._offset_value = np.array(offset_value, dtype=float)
+
+        if q_scale_factor is None:
+            self._q_scale_factor = np.ones(nframes)
+        else:
+            self._q_scale_factor = np.array(q_scale_factor, dtype=float)
+
+        if selected_qrange is None:
+            self._selected_qrange = np.tile([0, len(self._q)], (nframes, 1))
+        else:
+            self._selected_qrange = np.array(selected_qrange,
+                dtype=int).reshape(nframes, 2)
+
+        # _rows gives the array row of each profile in the list (-1 if the
+        # profile was added as a SASM), _sasms the SASM if it has been made
+        self._rows = list(range(nframes))
+        self._sasms = [None for j in range(nframes)]
+
+    def __len__(self):
+        return len(self._sasms)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._getSASM(j) for j in range(*index.indices(len(self)))]
+        else:
+            return self._getSASM(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            self._sasms[index] = value
+            self._rows[index] = [-1 for sasm in value]
+        else:
+            self._sasms[index] = value
+            self._rows[index] = -1
+
+    def __delitem__(self, index):
+        del self._sasms[index]
+        del self._rows[index]
+
+    def insert(self, index, value):
+        self._sasms.insert(index, value)
+        self._rows.insert(index, -1)
+
+    def __deepcopy__(self, memo):
+        # The intensity and uncertainty arrays are never modified, so they
+        # are shared with the copy
+        new_list = copy.copy(self)
+
+        new_list._parameters = copy.deepcopy(self._parameters, memo)
+        new_list._scale_factor = self._scale_factor.copy()
+        new_list._offset_value = self._offset_value.copy()
+        new_list._q_scale_factor = self._q_scale_factor.copy()
+        new_list._selected_qrange = self._selected_qrange.copy()
+        new_list._rows = list(self._rows)
+        new_list._sasms = copy.deepcopy(self._sasms, memo)
+
+        return new_list
+
+    def _getSASM(self, index):
+        sasm = self._sasms[index]
+
+        if sasm is None:
+            sasm = self._makeSASM(self._rows[index])
+            self._sasms[index] = sasm
+
+        return sasm
+
+    def _makeSASM(self, row):
+        parameters = self._parameters[row]
+
+        if self._parse_parameters is not None and not isinstance(parameters, dict):
+            parameters = self._parse_parameters(parameters)
+        else:
+            parameters = copy.deepcopy(parameters)
+
+        sasm = SASM.SASM(self._i[row], self._q, self._err[row], parameters,
+            self._q_err)
+
+        sasm.setScaleValues(float(self._scale_factor[row]),
+            float(self._offset_value[row]), float(self._q_scale_factor[row]))
+        sasm.setQrange(list(map(int, self._selected_qrange[row])))
+
+        return sasm
+
+    def _unmadeRows(self):
+        positions = np.array([j for j, sasm in enumerate(self._sasms)
+            if sasm is None], dtype=int)
+        rows = np.array(self._rows, dtype=int)[positions]
+
+        return positions, rows
+
+    def _calcValues(self, sasm_func, array_func):
+        """
+        Calculates a value for every profile in the list. array_func is
+        called with the scaled and trimmed q and intensity of each set of
+        unmade profiles that share a q range, with one row per profile.
+        """
+        values = np.empty(len(self))
+
+        positions, rows = self._unmadeRows()
+
+        if len(positions) > 0:
+            qranges = self._selected_qrange[rows]
+
+            for qrange in np.unique(qranges, axis=0):
+                in_group = np.all(qranges == qrange, axis=1)
+                group_rows = rows[in_group]
+
+                q = (self._q[qrange[0]:qrange[1]]
+                    * self._q_scale_factor[group_rows, np.newaxis])
+                i = (self._i[group_rows, qrange[0]:qrange[1]]
+                    * self._scale_factor[group_rows, np.newaxis]
+                    + self._offset_value[group_rows, np.newaxis])
+
+                values[positions[in_group]] = array_func(q, i)
+
+        for j, sasm in enumerate(self._sasms):
+            if sasm is not None:
+                values[j] = sasm_func(sasm)
+
+        return values
+
+    def getMeanI(self):
+        """
+        Gets the mean intensity of every profile in the list.
+
+        Returns
+        -------
+        mean_intensity: numpy.array
+            The mean intensity of each profile.
+        """
+        if len(self._q) == 0:
+            return np.zeros(len(self)) - 1
+
+        return self._calcValues(lambda sasm: sasm.getMeanI(),
+            lambda q, i: i.mean(axis=1))
+
+    def getTotalI(self):
+        """
+        Gets the total integrated intensity of every profile in the list.
+
+        Returns
+        -------
+        total_intensity: numpy.array
+            The total intensity of each profile.
+        """
+        if len(self._q) == 0:
+            return np.zeros(len(self)) - 1
+
+        return self._calcValues(lambda sasm: sasm.getTotalI(),
+            lambda q, i: integrate.trapezoid(i, q, axis=1))
+
+    def getIofQ(self, qref):
+        """
+        Gets the intensity of every profile in the list at a specific q
+        value (or the closest such value in each profile).
+
+        Parameters
+        ----------
+        qref: float
+            The reference q to get the intensity at.
+
+        Returns
+        -------
+        intensity: numpy.array
+            The intensity of each profile at the q point nearest qref.
+        """
+        def array_func(q, i):
+            index = np.argmin(np.absolute(q-qref), axis=1)
+            return i[np.arange(i.shape[0]), index]
+
+        return self._calcValues(lambda sasm: sasm.getIofQ(qref), array_func)
+
+    def getIofQRange(self, q1, q2):
+        """
+        Gets the total integrated intensity of every profile in the list in
+        the q range from q1 to q2 (or the closest such values in each profile).
+
+        Parameters
+        ----------
+        q1: float
+            The starting q value in the q range
+        q2: float
+            The ending q value in the q range.
+
+        Returns
+        -------
+        total_intensity: numpy.array
+            The total intensity of each profile in the q range.
+        """
+        def array_func(q, i):
+            index1 = np.argmin(np.absolute(q-q1), axis=1)
+            index2 = np.argmin(np.absolute(q-q2), axis=1)
+
+            segments = np.diff(q, axis=1) * (i[:, 1:] + i[:, :-1]) / 2.0
+            seg_index = np.arange(segments.shape[1])
+            in_range = ((seg_index >= index1[:, np.newaxis])
+                & (seg_index < index2[:, np.newaxis]))
+
+            return np.sum(np.where(in_range, segments, 0), axis=1)
+
+        return self._calcValues(lambda sasm: sasm.getIofQRange(q1, q2),
+            array_func)
+
+    def scale(self, scale_factor):
+        """
+        Applies an absolute scale to the intensity of every profile in the
+        list. See :func:`bioxtasraw.SASM.SASM.scale`.
+
+        Parameters
+        ----------
+        scale_factor: float
+            The scale factor to be applied to the the profile intensity and
+            uncertainty.
+        """
+        positions, rows = self._unmadeRows()
+        self._scale_factor[rows] = abs(scale_factor)
+
+        for sasm in self._sasms:
+            if sasm is not None:
+                sasm.scale(scale_factor)
+
+    def offset(self, offset_value):
+        """
+        Applies an absolute offset to the intensity of every profile in the
+        list. See :func:`bioxtasraw.SASM.SASM.offset`.
+
+        Parameters
+        ----------
+        offset_value: float
+            The offset to be applied to the profile intensity.
+        """
+        positions, rows = self._unmadeRows()
+        self._offset_value[rows] = offset_value
+
+        for sasm in self._sasms:
+            if sasm is not None:
+                sasm.offset(offset_value)
+
+    def setQrange(self, qrange):
+        """
+        Sets the q range used for every profile in the list. See
+        :func:`bioxtasraw.SASM.SASM.setQrange`.
+
+        Parameters
+        ----------
+        qrange: tuple or list
+            A tuple or list with two items. The first item is the starting
+            index of the q vector to be used, the second item is the ending
+            index of the q vector to be used, such that q[start:end] returns
+            the desired q range.
+        """
+        positions, rows = self._unmadeRows()
+
+        if len(rows) > 0:
+            if qrange[0] < 0 or qrange[1] > len(self._q):
+                msg = ('Qrange: ' + str(qrange) + ' is not a valid q-range for a '
+                    'q-vector of length ' + str(len(self._q)-1))
+                raise SASExceptions.InvalidQrange(msg)
+
+            self._selected_qrange[rows] = list(map(int, qrange))
+
+        for sasm in self._sasms:
+            if sasm is not None:
+                sasm.setQrange(qrange)
+
+    def getScaleValues(self, index):
+        """
+        Gets the scale factor, offset value, and q scale factor of a profile
+        without making a SASM for it.
+
+        Parameters
+        ----------
+        index: int
+            The index of the profile in the list.
+
+        Returns
+        -------
+        scale_values: tuple
+            The scale factor, offset value, and q scale factor.
+        """
+        sasm = self._sasms[index]
+
+        if sasm is not None:
+            scale_values = (sasm.getScale(), sasm.getOffset(),
+                sasm._q_scale_factor)
+        else:
+            row = self._rows[index]
+            scale_values = (float(self._scale_factor[row]),
+                float(self._offset_value[row]),
+                float(self._q_scale_factor[row]))
+
+        return scale_values
+
+    def iterParameters(self):
+        """
+        Iterates over the metadata of every profile in the list without
+        making SASMs for the profiles.
+        """
+        for j, sasm in enumerate(self._sasms):
+            if sasm is not None:
+                yield sasm.getAllParameters()
+            else:
+                parameters = self._parameters[self._rows[j]]
+
+                if (self._parse_parameters is not None
+                    and not isinstance(parameters, dict)):
+                    parameters = self._parse_parameters(parameters)
+
+                yield parameters
+
+    def extractAll(self):
+        """
+        Extracts the data of every profile in the list, as with
+        :func:`bioxtasraw.SASM.SASM.extractAll`. Profiles that have not been
+        accessed are extracted without being kept as SASMs.
+
+        Returns
+        -------
+        all_data: list
+            A list of the extracted data dictionary of each profile.
+        """
+        all_data = []
+
+        for j, sasm in enumerate(self._sasms):
+            if sasm is None:
+                sasm = self._makeSASM(self._rows[j])
+
+            if sasm != -1:
+                all_data.append(sasm.extractAll())
+            else:
+                all_data.append(-1)
+
+        return all_data
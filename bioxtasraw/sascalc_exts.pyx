@@ -3,6 +3,10 @@ from builtins import object, range, map, zip
 from io import open
 
 import math
+import os
+
+import numpy as np
+cimport cython
 
 """
 The following code impliments the pairwise probability test for differences in curves,
@@ -16,15 +20,53 @@ __license__ = "MIT"
 __copyright__ = "2017, ESRF"
 """
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _run_probabilities(double[::1] table, long n):
+    """Fills table[c] with the probability of a run of heads longer than c-2
+    in n-1 tosses of a fair coin, for 2 <= c <= n. Uses the recursion
+    q(m) = q(m-1) + (1-q(m-k-2))/2**(k+2) for the probability q(m) of a run
+    longer than k in m tosses, which only adds positive terms."""
+    cdef long c, k, m, size
+    cdef double step, prev
+    cdef double[::1] history = np.zeros(n+2)
+
+    for c in range(2, n+1):
+        k = c - 2
+        size = k + 2
+        step = 2.0**(-(k+2))
+
+        # history holds q for the last k+2 values of m, as a ring buffer
+        for m in range(size):
+            history[m] = 0.
+
+        prev = 0.
+        for m in range(k+1, n):
+            if m == k+1:
+                prev = 2.0**(-(k+1))
+            else:
+                prev = prev + (1. - history[(m-k-2) % size])*step
+            history[m % size] = prev
+
+        table[c] = min(prev, 1.0)
+
 class LongestRunOfHeads(object):
     """Implements the "longest run of heads" by Mark F. Schilling
     The College Mathematics Journal, Vol. 21, No. 3, (1990), pp. 196-207
 
     See: http://www.maa.org/sites/default/files/pdf/upload_library/22/Polya/07468342.di020742.02p0021g.pdf
+
+    Probabilities for a run of heads or tails are calculated iteratively
+    for all run lengths at once, and stored in a table for each number of
+    tosses. If cache_dir is set, tables are saved there and loaded
+    by later processes.
     """
-    def __init__(self):
+    def __init__(self, cache_dir=None):
         "We store already calculated values for (n,c)"
         self.knowledge = {}
+        self.tables = {}
+        self.cache_dir = cache_dir
 
     def A(self, n, c):
         """Calculate A(number_of_toss, length_of_longest_run)
@@ -39,11 +81,17 @@ class LongestRunOfHeads(object):
         elif (n, c) in self.knowledge:
             return self.knowledge[(n, c)]
         else:
-            s = 0
-            for j in range(c, -1, -1):
-                s += self.A(n - 1 - j, c)
-            self.knowledge[(n, c)] = s
-            return s
+            # A(m, c) is the sum of the previous c+1 values, so it is built up
+            # from m = 0 with a running sum rather than by recursion.
+            vals = [2 ** m for m in range(c+1)]
+            s = sum(vals)
+
+            for m in range(c+1, n+1):
+                vals.append(s)
+                s = 2*s - vals[m-c-1]
+
+            self.knowledge[(n, c)] = vals[n]
+            return vals[n]
 
     def B(self, n, c):
         """Calculate B(number_of_toss, length_of_longest_run)
@@ -81,12 +129,65 @@ class LongestRunOfHeads(object):
         than c. So in this case, we want to know probability of c, means
         we need to calculate probability of a run of length >c-1
         """
-        c=c-1
-        if c >= n:
+        if c > n:
             return 0
-        delta = 2**n - self.B(n, c)
-        if delta <= 0:
-            return 0
-        return min(2.0**(math.log(delta, 2) - n), 1.0)
+        return self.table(n)[c]
+
+    def table(self, n):
+        """Probabilities of the longest run of heads or tails, as returned by
+        probaB, for all run lengths c from 0 to n in n tosses. The value for
+        c=0 is 1.
+
+        :param n: number of coin toss in the experiment, an integer
+        :return: A numpy array of the probabilities, indexed by c
+        """
+        if n not in self.tables:
+            table = self._load_table(n)
+
+            if table is None:
+                table = np.zeros(n+1)
+                table[0] = 1
+                if n > 0:
+                    table[1] = 1
+                _run_probabilities(table, n)
+
+                self._save_table(n, table)
+
+            self.tables[n] = table
+
+        return self.tables[n]
+
+    def _table_path(self, n):
+        return os.path.join(self.cache_dir, 'lroh_{}.npy'.format(n))
+
+    def _load_table(self, n):
+        table = None
+
+        if self.cache_dir is not None:
+            try:
+                table = np.load(self._table_path(n))
+            except Exception:
+                table = None
+
+            if table is not None and table.shape != (n+1,):
+                table = None
+
+        return table
+
+    def _save_table(self, n, table):
+        if self.cache_dir is not None:
+            try:
+                if not os.path.exists(self.cache_dir):
+                    os.mkdir(self.cache_dir)
+
+                # Write to a temporary file first so that other processes
+                # never load a partial table
+                tmp_path = '{}.{}.tmp'.format(self._table_path(n), os.getpid())
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, table)
+                os.replace(tmp_path, self._table_path(n))
+            except Exception:
+                pass
 
-LROH = LongestRunOfHeads()
+LROH = LongestRunOfHeads(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'lroh_tables'))
@@ -0,0 +1,152 @@
+"""
+#******************************************************************************
+# This file is part of RAW.
+#
+#    RAW is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RAW is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with RAW.  If not, see <http://www.gnu.org/licenses/>.
+#
+#******************************************************************************
+
+Compares SASCalc.autoRg against the previous approach of running
+autoRg_inner once for each set of search criteria, using the profiles
+and series in the test data. Checks that the results are identical and
+reports the timing for the profiles that are fit with the first search
+criteria (easy) and those that needed the criteria relaxed (hard).
+
+Run from the top level RAW directory:
+python utils/benchmark_autorg.py
+"""
+
+import os
+import sys
+import glob
+import time
+import contextlib
+
+import numpy as np
+
+raw_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if raw_path not in sys.path:
+    sys.path.append(raw_path)
+
+import bioxtasraw.RAWAPI as raw
+import bioxtasraw.SASCalc as SASCalc
+import bioxtasraw.SASProc as SASProc
+
+data_dir = os.path.join(raw_path, 'Tests', 'data')
+
+
+def old_autorg(sasm, single_fit=False, error_weight=True):
+    q = sasm.getQ()
+    i = sasm.getI()
+    err = sasm.getErr()
+
+    level_used = -1
+
+    for level, criteria in enumerate(SASCalc.autorg_levels):
+        min_window, min_qrg, max_qrg, quality_thresh, data_range_scale = criteria
+
+        try:
+            results = SASCalc.autoRg_inner(q, i, err, 0, single_fit,
+                error_weight, min_window=min_window, min_qrg=min_qrg,
+                max_qrg=max_qrg, quality_thresh=quality_thresh,
+                data_range_scale=data_range_scale, corr_coefht=2.,
+                win_length_weight=1.0)
+        except Exception:
+            results = (-1, -1, -1, -1, -1, -1)
+
+        if results[0] != -1:
+            level_used = level
+            break
+
+    return results, level_used
+
+def load_profiles():
+    fnames = (sorted(glob.glob(os.path.join(data_dir, '*.dat')))
+        + sorted(glob.glob(os.path.join(data_dir, 'series_dats', '*.dat')))
+        + sorted(glob.glob(os.path.join(data_dir, 'multiseries_dats', '*.dat'))))
+
+    profiles = []
+
+    for fname in fnames:
+        try:
+            profiles.extend(raw.load_profiles([fname]))
+        except Exception:
+            pass
+
+    series = raw.load_series([os.path.join(data_dir, 'clean_BSA_001.hdf5')])[0]
+    sub_profiles = raw.set_buffer_range(series, [[18, 53]], do_calcs=False)[0]
+
+    profiles.extend(sub_profiles)
+
+    for j in range(len(sub_profiles)-4):
+        profiles.append(SASProc.average(sub_profiles[j:j+5], copy_params=False))
+
+    return profiles
+
+def time_autorg(func, profile, repeats):
+    start = time.perf_counter()
+    for j in range(repeats):
+        result = func(profile)
+    return (time.perf_counter() - start)/repeats, result
+
+def main(repeats=3):
+    profiles = load_profiles()
+
+    timings = {'easy': [0., 0., 0], 'hard': [0., 0., 0], 'none': [0., 0., 0]}
+    mismatches = 0
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+        # Compile the jitted functions before timing
+        old_autorg(profiles[0])
+        SASCalc.autoRg(profiles[0])
+
+        for profile in profiles:
+            old_time, (old_result, level) = time_autorg(old_autorg,
+                profile, repeats)
+            new_time, new_result = time_autorg(SASCalc.autoRg, profile,
+                repeats)
+
+            if not np.array_equal(np.array(old_result, dtype=float),
+                np.array(new_result, dtype=float)):
+                mismatches += 1
+
+            if level == 0:
+                key = 'easy'
+            elif level > 0:
+                key = 'hard'
+            else:
+                key = 'none'
+
+            timings[key][0] += old_time
+            timings[key][1] += new_time
+            timings[key][2] += 1
+
+    print('{} profiles, {} with different results'.format(len(profiles),
+        mismatches))
+    print('{:<30}{:>8}{:>14}{:>14}{:>10}'.format('Profiles', 'Number',
+        'Old (ms/fit)', 'New (ms/fit)', 'Speedup'))
+
+    labels = {'easy': 'Fit with first criteria', 'hard': 'Fit with relaxed criteria',
+        'none': 'No fit found'}
+
+    for key in ['easy', 'hard', 'none']:
+        old_time, new_time, number = timings[key]
+
+        if number > 0:
+            print('{:<30}{:>8}{:>14.3f}{:>14.3f}{:>10.2f}'.format(labels[key],
+                number, old_time/number*1000, new_time/number*1000,
+                old_time/new_time))
+
+if __name__ == '__main__':
+    main()
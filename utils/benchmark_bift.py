@@ -0,0 +1,129 @@
+"""
+#******************************************************************************
+# This file is part of RAW.
+#
+#    RAW is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RAW is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with RAW.  If not, see <http://www.gnu.org/licenses/>.
+#
+#******************************************************************************
+
+Regression benchmark for the BIFT solvers. Runs BIFT with the standard
+iterative solver and the direct solver on profiles from the test data,
+and reports the timing and the differences in Dmax, Rg, I(0), evidence,
+chi squared, and the P(r) function.
+
+Run from the top level RAW directory:
+python utils/benchmark_bift.py [mc_runs]
+"""
+
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+raw_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if raw_path not in sys.path:
+    sys.path.append(raw_path)
+
+import bioxtasraw.RAWAPI as raw
+import bioxtasraw.SASProc as SASProc
+
+data_dir = os.path.join(raw_path, 'Tests', 'data')
+
+
+def load_profiles():
+    profiles = raw.load_profiles([os.path.join(data_dir, 'glucose_isomerase.dat'),
+        os.path.join(data_dir, 'lys_saxs.dat')])
+
+    # Averages across the elution peak of a series
+    series = raw.load_series([os.path.join(data_dir, 'clean_BSA_001.hdf5')])[0]
+    sub_profiles = raw.set_buffer_range(series, [[18, 53]], do_calcs=False)[0]
+
+    for start in [150, 170, 190, 210]:
+        avg = SASProc.average(sub_profiles[start:start+10], copy_params=False)
+        avg.setParameter('filename', 'BSA_{}-{}'.format(start, start+9))
+        profiles.append(avg)
+
+    for profile in profiles:
+        raw.auto_guinier(profile)
+
+    return profiles
+
+def run_bift(profile, solver, mc_runs):
+    start = time.perf_counter()
+
+    np.random.seed(1)
+    results = raw.bift(profile, mc_runs=mc_runs, solver=solver)
+
+    return time.perf_counter() - start, results
+
+def main(mc_runs=300):
+    profiles = load_profiles()
+
+    # Compile the jitted functions before timing
+    for solver in ['iterative', 'direct']:
+        run_bift(profiles[0], solver, 1)
+
+    header = '{:<22}{:>10}{:>10}{:>9}{:>9}{:>9}{:>9}{:>10}{:>9}'
+    row = '{:<22}{:>10.2f}{:>10.2f}{:>9.2f}{:>9.2f}{:>9.4f}{:>9.4f}{:>10.4f}{:>9.2f}'
+
+    print(header.format('Profile', 'Dmax', 'Dmax', 'Rg', 'Rg', 'Rel. I0',
+        'Rel. Ev', 'Max P(r)', 'Speedup'))
+    print(header.format('', 'iter.', 'direct', 'iter.', 'direct', 'diff', 'diff',
+        'diff', ''))
+
+    total_old = 0
+    total_new = 0
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+
+        for profile in profiles:
+            old_time, old_res = run_bift(profile, 'iterative', mc_runs)
+            new_time, new_res = run_bift(profile, 'direct', mc_runs)
+
+            total_old += old_time
+            total_new += new_time
+
+            old_ift = old_res[0]
+            new_ift = new_res[0]
+
+            name = profile.getParameter('filename')
+
+            if old_ift is None or new_ift is None:
+                print('{:<22} BIFT failed (iterative: {}, direct: {})'.format(name,
+                    old_ift is not None, new_ift is not None))
+                continue
+
+            i0_diff = abs(new_res[3] - old_res[3])/abs(old_res[3])
+            ev_diff = abs(new_res[10] - old_res[10])/abs(old_res[10])
+
+            # Compare P(r) on a common r grid, relative to the P(r) maximum
+            r = np.linspace(0, min(old_ift.r[-1], new_ift.r[-1]), 200)
+            old_pr = np.interp(r, old_ift.r, old_ift.p)
+            new_pr = np.interp(r, new_ift.r, new_ift.p)
+            pr_diff = np.abs(new_pr - old_pr).max()/old_ift.p.max()
+
+            print(row.format(name[:21], old_res[1], new_res[1], old_res[2],
+                new_res[2], i0_diff, ev_diff, pr_diff, old_time/new_time))
+
+    print('Total time: iterative {:.1f} s, direct {:.1f} s'.format(total_old,
+        total_new))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,131 @@
+"""
+#******************************************************************************
+# This file is part of RAW.
+#
+#    RAW is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RAW is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with RAW.  If not, see <http://www.gnu.org/licenses/>.
+#
+#******************************************************************************
+
+
+Compares the evolving factor analysis (EFA) forward and backward singular
+values calculated with a full SVD for every frame (SASCalc.runEFA) against
+the incremental calculation (SASCalc.runForwardBackwardEFA), using the BSA
+series from the test data and a long series made by padding it with buffer
+frames. Reports the timing and the largest relative difference.
+
+Also compares the 'Hybrid' and 'Accelerated' EFA rotation methods for
+several sets of component ranges on the BSA series, reporting the number of
+iterations, the timing, and the largest difference in the concentrations.
+
+Run from the top level RAW directory:
+python utils/benchmark_efa.py [nsvs]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+raw_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if raw_path not in sys.path:
+    sys.path.append(raw_path)
+
+import bioxtasraw.RAWAPI as raw
+import bioxtasraw.SASCalc as SASCalc
+
+data_dir = os.path.join(raw_path, 'Tests', 'data')
+
+
+def load_data():
+    series = raw.load_series([os.path.join(data_dir, 'clean_BSA_001.hdf5')])[0]
+    sasms = series.getAllSASMs()
+
+    svd_a = SASCalc.prepareSASMsforSVD(sasms, do_binning=False)[0]
+
+    # Pads the series with randomly chosen buffer frames before the peak
+    rng = np.random.default_rng(0)
+    buffer_a = svd_a[:, 18:117]
+    padding = buffer_a[:, rng.integers(0, buffer_a.shape[1], 1250)]
+    long_a = np.column_stack((padding, svd_a[:, 117:]))
+
+    return [('BSA (324 frames)', svd_a), ('BSA (1,457 frames)', long_a)]
+
+def main(nsvs=5):
+    header = '{:<22}{:>10}{:>10}{:>10}{:>14}'
+    row = '{:<22}{:>10.2f}{:>10.2f}{:>10.2f}{:>14.2e}'
+
+    print(header.format('Series', 'Old (s)', 'New (s)', 'Speedup', 'Max rel. diff'))
+
+    for name, svd_a in load_data():
+        start = time.perf_counter()
+        old_forward = SASCalc.runEFA(svd_a)
+        old_backward = SASCalc.runEFA(svd_a, False)
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_forward, new_backward = SASCalc.runForwardBackwardEFA(svd_a, nsvs)
+        new_time = time.perf_counter() - start
+
+        diff = max(np.max(np.abs(new_forward - old_forward[:nsvs])/old_forward[:nsvs]),
+            np.max(np.abs(new_backward - old_backward[:nsvs])/old_backward[:nsvs]))
+
+        print(row.format(name, old_time, new_time, old_time/new_time, diff))
+
+def rotation_main():
+    series = raw.load_series([os.path.join(data_dir, 'clean_BSA_001.hdf5')])[0]
+    raw.set_buffer_range(series, [[81, 116]])
+
+    all_ranges = [[[130, 187], [149, 230]], [[100, 190], [150, 260]],
+        [[120, 170], [140, 200], [160, 240]], [[110, 200], [125, 250]]]
+
+    header = '{:<34}{:>8}{:>8}{:>10}{:>10}{:>10}'
+    row = '{:<34}{:>8}{:>8}{:>10.1f}{:>10.1f}{:>10.1e}'
+
+    print(header.format('Ranges', 'Hybrid', 'Accel.', 'Hybrid', 'Accel.',
+        'Max C'))
+    print(header.format('', 'iter.', 'iter.', '(ms)', '(ms)', 'diff'))
+
+    for ranges in all_ranges:
+        framei = ranges[0][0]
+        framef = max(efa_range[1] for efa_range in ranges)
+
+        results = []
+
+        for method in ['Hybrid', 'Accelerated']:
+            start = time.perf_counter()
+            efa_results = raw.efa(series, ranges, framei=framei,
+                framef=framef, method=method)
+            results.append((time.perf_counter() - start, efa_results))
+
+        (old_time, old_res), (new_time, new_res) = results
+
+        if old_res[1] and new_res[1]:
+            diff = np.abs(old_res[3]['C'] - new_res[3]['C']).max()
+        else:
+            diff = np.nan
+
+        name = ', '.join('{}-{}'.format(*efa_range) for efa_range in ranges)
+
+        print(row.format(name, old_res[2]['iterations'],
+            new_res[2]['iterations'], old_time*1000, new_time*1000, diff))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
+
+    print('')
+    rotation_main()
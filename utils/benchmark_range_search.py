@@ -0,0 +1,104 @@
+"""
+#******************************************************************************
+# This file is part of RAW.
+#
+#    RAW is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RAW is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with RAW.  If not, see <http://www.gnu.org/licenses/>.
+#
+#******************************************************************************
+
+Benchmark for the automatic buffer, sample, and baseline range searches.
+Runs the searches with and without the stacked RangeSearchData on the BSA
+series from the test data and on a long (2,000 frame) series made by
+repeating its buffer frames, checks that the results are the same, and
+reports the timing.
+
+Run from the top level RAW directory:
+python utils/benchmark_range_search.py
+"""
+
+import os
+import sys
+import copy
+import time
+import warnings
+
+raw_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if raw_path not in sys.path:
+    sys.path.append(raw_path)
+
+import bioxtasraw.RAWAPI as raw
+import bioxtasraw.SASCalc as SASCalc
+
+data_dir = os.path.join(raw_path, 'Tests', 'data')
+
+
+def load_series():
+    series = raw.load_series([os.path.join(data_dir, 'clean_BSA_001.hdf5')])[0]
+    raw.set_buffer_range(series, [[81, 116]])
+
+    sasms = series.getAllSASMs()
+    buffer_sasms = sasms[18:117]
+
+    long_sasms = ([copy.deepcopy(buffer_sasms[j % len(buffer_sasms)])
+        for j in range(1750)] + [copy.deepcopy(sasm) for sasm in sasms[117:]])
+
+    long_series = raw.profiles_to_series(long_sasms)
+    success, start, end = raw.find_buffer_range(long_series)
+    raw.set_buffer_range(long_series, [[start, end]])
+
+    return [('BSA (324 frames)', series), ('BSA (2,000 frames)', long_series)]
+
+def run_searches(series):
+    results = []
+
+    for name, func, kwargs in [
+        ('Buffer', raw.find_buffer_range, {}),
+        ('Sample', raw.find_sample_range, {}),
+        ('Baseline (integral)', raw.find_baseline_range, {'baseline_type': 'Integral'}),
+        ('Baseline (linear)', raw.find_baseline_range, {'baseline_type': 'Linear'}),
+        ]:
+        start = time.perf_counter()
+        res = func(series, **kwargs)
+        results.append((name, time.perf_counter() - start, res))
+
+    return results
+
+def main():
+    prepare_range_search = SASCalc.prepareRangeSearch
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+
+        all_series = load_series()
+
+        # Compile the jitted functions before timing
+        run_searches(all_series[0][1])
+
+        print('{:<20}{:<22}{:>10}{:>10}{:>9}{:>6}'.format('Series', 'Search',
+            'Old (s)', 'New (s)', 'Speedup', 'Same'))
+
+        for series_name, series in all_series:
+            SASCalc.prepareRangeSearch = lambda sasms: None
+            old_results = run_searches(series)
+
+            SASCalc.prepareRangeSearch = prepare_range_search
+            new_results = run_searches(series)
+
+            for old, new in zip(old_results, new_results):
+                print('{:<20}{:<22}{:>10.3f}{:>10.3f}{:>9.2f}{:>6}'.format(
+                    series_name, old[0], old[1], new[1], old[1]/new[1],
+                    str(old[2] == new[2])))
+
+if __name__ == '__main__':
+    main()